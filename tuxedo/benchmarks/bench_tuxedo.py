@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+"""
+Benchmark `tuxedo` against a throwaway local PostgreSQL instance.
+
+For every requested size the script:
+- starts a private PostgreSQL cluster (initdb in a temp dir, unix socket only, fsync off);
+- creates FreeRADIUS-shaped `radcheck` / `radusergroup` tables, runs `tuxedo migrate` and seeds N users;
+- measures SQL generation cost of every `FreeradiusBackend` operation (no database involved);
+- measures latency/throughput of every backend operation executed through `PostgresExecutor`;
+- measures `tuxedo` CLI wall time and peak RSS for the read paths (one child process per run).
+
+Results are written as one JSON document (see `--output`), so runs before/after an upgrade can be diffed.
+
+Usage (as a non-root user, with the PostgreSQL server binaries and a driver installed):
+
+    python3 -m pip install -e './tuxedo[postgres]'
+    python3 tuxedo/benchmarks/bench_tuxedo.py --sizes 1000,100000 --output bench.json
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import glob
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Iterator
+
+from tuxedo import __version__
+from tuxedo.backends import FreeradiusBackend
+from tuxedo.bulk import CopyTextStream
+from tuxedo.config import FreeradiusSchema, PostgresConfig
+from tuxedo.db import PostgresExecutor, close_pools, get_pool
+from tuxedo.sql import SQLStatement
+
+DEFAULT_SIZES = "1000,10000"
+MAX_USERS = 1_000_000
+
+# Seeded data shape (per user): one Cleartext-Password row, 1-2 group memberships,
+# and a block for every 20th user (half of them already expired).
+GROUPS = 50
+BLOCK_EVERY = 20
+
+# FreeRADIUS' own PostgreSQL schema (raddb/mods-config/sql/main/postgresql/schema.sql), reduced to the tables tuxedo uses.
+FREERADIUS_SCHEMA_SQL = """
+CREATE TABLE radcheck (
+  id serial PRIMARY KEY,
+  username text NOT NULL DEFAULT '',
+  attribute text NOT NULL DEFAULT '',
+  op varchar(2) NOT NULL DEFAULT '==',
+  value text NOT NULL DEFAULT ''
+);
+CREATE INDEX radcheck_username ON radcheck (username, attribute);
+CREATE TABLE radusergroup (
+  id serial PRIMARY KEY,
+  username text NOT NULL DEFAULT '',
+  groupname text NOT NULL DEFAULT '',
+  priority integer NOT NULL DEFAULT 0
+);
+CREATE INDEX radusergroup_username ON radusergroup (username);
+"""
+
+
+def _seed_sql(users: int) -> list[str]:
+    return [
+        f"""
+INSERT INTO radcheck (username, attribute, op, value)
+SELECT format('u%s', lpad(i::text, 7, '0')), 'Cleartext-Password', ':=', md5(i::text)
+  FROM generate_series(1, {users}) AS i;
+""",
+        f"""
+INSERT INTO radusergroup (username, groupname, priority)
+SELECT format('u%s', lpad(i::text, 7, '0')), format('g%s', i % {GROUPS}), 0
+  FROM generate_series(1, {users}) AS i
+UNION ALL
+SELECT format('u%s', lpad(i::text, 7, '0')), format('g%s', (i * 7 + 3) % {GROUPS}), 10
+  FROM generate_series(1, {users}, 3) AS i;
+""",
+        f"""
+INSERT INTO vpn_groups (name, description)
+SELECT format('g%s', i), 'seeded' FROM generate_series(0, {GROUPS - 1}) AS i
+UNION ALL SELECT 'default', 'fallback';
+""",
+        f"""
+INSERT INTO vpn_user_blocklist (username, reason, expires_at)
+SELECT format('u%s', lpad(i::text, 7, '0')), 'BENCH',
+       CASE WHEN i % {BLOCK_EVERY * 2} = 0 THEN NOW() - interval '1 day' ELSE NOW() + interval '1 day' END
+  FROM generate_series({BLOCK_EVERY}, {users}, {BLOCK_EVERY}) AS i;
+""",
+    ]
+
+
+def _find_pg_bin(explicit: str | None) -> str:
+    if explicit:
+        return explicit
+    initdb = shutil.which("initdb")
+    if initdb:
+        return os.path.dirname(initdb)
+    with contextlib.suppress(OSError, subprocess.CalledProcessError):
+        out = subprocess.run(["pg_config", "--bindir"], check=True, capture_output=True, text=True).stdout.strip()
+        if os.path.exists(os.path.join(out, "initdb")):
+            return out
+    candidates = sorted(glob.glob("/usr/lib/postgresql/*/bin/initdb"), key=lambda p: int(p.split("/")[4]))
+    if candidates:
+        return os.path.dirname(candidates[-1])
+    raise RuntimeError("initdb not found: install the PostgreSQL server package or pass --pg-bin")
+
+
+def _dsn(socket_dir: str, dbname: str) -> str:
+    return f"host={socket_dir} dbname={dbname} user=postgres"
+
+
+@contextlib.contextmanager
+def temp_postgres(pg_bin: str, *, keep: bool) -> Iterator[str]:
+    """Run a private PostgreSQL cluster for the duration of the block; yields its socket (and work) directory."""
+    if hasattr(os, "geteuid") and os.geteuid() == 0:
+        raise RuntimeError("initdb refuses to run as root: run the benchmark as an unprivileged user")
+    workdir = tempfile.mkdtemp(prefix="tuxedo-bench-")
+    datadir = os.path.join(workdir, "data")
+    log = os.path.join(workdir, "postgres.log")
+    subprocess.run(
+        [os.path.join(pg_bin, "initdb"), "-D", datadir, "-U", "postgres", "-A", "trust", "-E", "UTF8", "--locale=C", "--no-sync"],
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+    options = f"-k {workdir} -c listen_addresses='' -c fsync=off -c synchronous_commit=off -c full_page_writes=off"
+    pg_ctl = os.path.join(pg_bin, "pg_ctl")
+    subprocess.run([pg_ctl, "-D", datadir, "-l", log, "-o", options, "-w", "start"], check=True, stdout=subprocess.DEVNULL)
+    try:
+        yield workdir
+    finally:
+        close_pools()
+        subprocess.run([pg_ctl, "-D", datadir, "-m", "fast", "-w", "stop"], stdout=subprocess.DEVNULL)
+        if keep:
+            sys.stderr.write(f"kept cluster data in {workdir}\n")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _percentile(sorted_samples: list[float], pct: float) -> float:
+    idx = min(len(sorted_samples) - 1, max(0, int(round(pct / 100 * len(sorted_samples) + 0.5)) - 1))
+    return sorted_samples[idx]
+
+
+def _summary(samples: list[float]) -> dict[str, Any]:
+    """Latency stats in milliseconds plus sequential throughput (ops/s) for samples given in seconds."""
+    ordered = sorted(samples)
+    total = sum(ordered)
+    return {
+        "n": len(ordered),
+        "mean_ms": round(total / len(ordered) * 1000, 4),
+        "p50_ms": round(_percentile(ordered, 50) * 1000, 4),
+        "p95_ms": round(_percentile(ordered, 95) * 1000, 4),
+        "p99_ms": round(_percentile(ordered, 99) * 1000, 4),
+        "min_ms": round(ordered[0] * 1000, 4),
+        "max_ms": round(ordered[-1] * 1000, 4),
+        "ops_per_sec": round(len(ordered) / total, 2) if total > 0 else None,
+    }
+
+
+def _timed(fn: Callable[[], Any]) -> float:
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+def _import_rows(prefix: str, count: int) -> Iterator[tuple[Any, ...]]:
+    for i in range(count):
+        blocked = i % BLOCK_EVERY == 0
+        yield (f"{prefix}{i:07d}", f"pw{i}", f"g{i % GROUPS}", 0, blocked, "BENCH" if blocked else None, None)
+
+
+def bench_sqlgen(backend: FreeradiusBackend, *, loops: int) -> dict[str, Any]:
+    """Statement-building cost per operation (pure Python, no database)."""
+    ops: dict[str, Callable[[], Any]] = {
+        "migrate": backend.migrate,
+        "create_user": lambda: backend.create_user("alice", "secret"),
+        "change_user": lambda: backend.change_user("alice", password="secret"),
+        "delete_user": lambda: backend.delete_user("alice"),
+        "create_group": lambda: backend.create_group("admins", description="d"),
+        "change_group": lambda: backend.change_group("admins", rename_to=None, description="d"),
+        "delete_group": lambda: backend.delete_group("admins"),
+        "add_user_to_group": lambda: backend.add_user_to_group("alice", "admins", priority=0),
+        "remove_user_from_group": lambda: backend.remove_user_from_group("alice", "admins"),
+        "ensure_user_has_any_group": lambda: backend.ensure_user_has_any_group("alice", groupname="default", priority=0),
+        "block_user": lambda: backend.block_user("alice", reason="MANUAL", duration="1h"),
+        "unblock_user": lambda: backend.unblock_user("alice"),
+        "import_users": lambda: backend.import_users(CopyTextStream(())),
+        "preview_delete_group": lambda: backend.preview_delete_group("admins"),
+        "preflight_user_has_password": lambda: backend.preflight_user_has_password("alice"),
+        "preflight_users_directory": backend.preflight_users_directory,
+        "show_users": lambda: backend.show_users(limit=100, after="u0000100", use_directory=True),
+        "show_groups": backend.show_groups,
+        "show_blocks": lambda: backend.show_blocks(all_blocks=False, limit=100, after="u0000100"),
+        "find_user": lambda: backend.find_user("u00001%", limit=100, use_directory=True),
+        "find_group": lambda: backend.find_group("admins"),
+    }
+    results: dict[str, Any] = {}
+    for name, fn in ops.items():
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - started
+        results[name] = {"loops": loops, "us_per_call": round(elapsed / loops * 1e6, 3)}
+    return results
+
+
+def bench_backend(backend: FreeradiusBackend, executor: PostgresExecutor, *, users: int, iterations: int, import_rows: int) -> dict[str, Any]:
+    """Every backend operation executed through `PostgresExecutor.run` (one transaction per call, like the CLI)."""
+    run = executor.run
+    samples: dict[str, list[float]] = {}
+
+    def measure(name: str, statements) -> None:
+        samples.setdefault(name, []).append(_timed(lambda: run(statements)))
+
+    probe = f"u{max(1, users // 2):07d}"
+    for i in range(iterations):
+        measure("preflight_users_directory", backend.preflight_users_directory())
+        measure("preflight_user_has_password", backend.preflight_user_has_password(probe))
+        measure("show_users_page_directory", backend.show_users(limit=100, after=probe, use_directory=True))
+        measure("show_users_page_union", backend.show_users(limit=100, after=probe, use_directory=False))
+        measure("show_groups", backend.show_groups())
+        measure("show_blocks_page", backend.show_blocks(all_blocks=False, limit=100))
+        measure("find_user_exact_directory", backend.find_user(probe, use_directory=True))
+        measure("find_user_exact_union", backend.find_user(probe, use_directory=False))
+        measure("find_user_substring_directory", backend.find_user(f"%{probe[-4:]}%", limit=100, use_directory=True))
+        measure("find_user_substring_union", backend.find_user(f"%{probe[-4:]}%", limit=100, use_directory=False))
+        measure("find_group", backend.find_group("g1"))
+        measure("preview_delete_group", backend.preview_delete_group("g1"))
+
+        user = f"bench_{i}"
+        group = f"bench_group_{i}"
+        measure("create_user", backend.create_user(user, "secret"))
+        measure("ensure_user_has_any_group", backend.ensure_user_has_any_group(user, groupname="default", priority=0))
+        measure("change_user", backend.change_user(user, password="secret2"))
+        measure("create_group", backend.create_group(group, description="bench"))
+        measure("change_group", backend.change_group(group, rename_to=None, description="bench2"))
+        measure("add_user_to_group", backend.add_user_to_group(user, group, priority=5))
+        measure("remove_user_from_group", backend.remove_user_from_group(user, group))
+        measure("block_user", backend.block_user(user, reason="BENCH", duration="1h"))
+        measure("unblock_user", backend.unblock_user(user))
+        measure("delete_group", backend.delete_group(group))
+        measure("delete_user", backend.delete_user(user))
+
+    # Full-table reads are expensive at 1M users: fewer repetitions.
+    for _ in range(max(1, iterations // 10)):
+        measure("show_users_all_directory", backend.show_users(use_directory=True))
+        measure("show_users_all_union", backend.show_users(use_directory=False))
+        measure("show_blocks_all", backend.show_blocks(all_blocks=True))
+        measure("migrate_noop", backend.migrate())
+
+    results: dict[str, Any] = {name: _summary(s) for name, s in samples.items()}
+
+    stream_rows = 0
+
+    def stream_all() -> None:
+        nonlocal stream_rows
+        with executor.stream(backend.show_users(use_directory=True)[0], chunk_size=1000) as (_, rows):
+            stream_rows = sum(1 for _ in rows)
+
+    elapsed = _timed(stream_all)
+    results["stream_show_users"] = {
+        "rows": stream_rows,
+        "seconds": round(elapsed, 4),
+        "rows_per_sec": round(stream_rows / elapsed, 1) if elapsed > 0 else None,
+    }
+
+    import_samples = []
+    for i in range(max(1, min(iterations, 5))):
+        source = CopyTextStream(_import_rows(f"imp{i}_", import_rows))
+        import_samples.append(_timed(lambda: run(backend.import_users(source))))
+    results["import_users"] = {**_summary(import_samples), "rows_per_call": import_rows}
+    results["import_users"]["rows_per_sec"] = round(import_rows / (sum(import_samples) / len(import_samples)), 1)
+    return results
+
+
+def _run_cli(argv: list[str], *, config_path: str) -> tuple[float, int, int]:
+    """Run `python -m tuxedo ARGV` once; returns (wall seconds, peak RSS in KiB, exit code)."""
+    cmd = [sys.executable, "-m", "tuxedo", *argv, "--config", config_path]
+    env = {**os.environ, "TUXEDO_SOCKET": ""}
+    started = time.perf_counter()
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env)
+    # wait4() reports the rusage of this child alone (RUSAGE_CHILDREN would aggregate all of them).
+    _, status, usage = os.wait4(proc.pid, 0)
+    elapsed = time.perf_counter() - started
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return elapsed, int(usage.ru_maxrss), proc.returncode
+
+
+CLI_READ_PATHS: dict[str, list[str]] = {
+    "help": ["--help"],
+    "show_users_sql": ["show", "users", "--sql"],
+    "show_users_text": ["show", "users"],
+    "show_users_ndjson": ["show", "users", "--output", "ndjson"],
+    "show_users_json": ["show", "users", "--output", "json"],
+    "show_users_page": ["show", "users", "--limit", "100"],
+    "show_groups": ["show", "groups"],
+    "show_blocks_all_csv": ["show", "blocks", "--all", "--output", "csv"],
+    "find_user_prefix": ["find", "user", "u00001*"],
+    "find_user_substring": ["find", "user", "*999*", "--limit", "100"],
+    "find_group": ["find", "group", "g1"],
+}
+
+
+def bench_cli(config_path: str, *, runs: int) -> dict[str, Any]:
+    results: dict[str, Any] = {}
+    for name, argv in CLI_READ_PATHS.items():
+        walls: list[float] = []
+        peak_rss = 0
+        for _ in range(runs):
+            wall, rss, code = _run_cli(argv, config_path=config_path)
+            if code != 0:
+                raise RuntimeError(f"tuxedo {' '.join(argv)} exited with {code}")
+            walls.append(wall)
+            peak_rss = max(peak_rss, rss)
+        results[name] = {"argv": argv, **_summary(walls), "peak_rss_kib": peak_rss}
+    return results
+
+
+def _table_sizes(executor: PostgresExecutor) -> dict[str, Any]:
+    rows = executor.run(
+        [
+            _plain(
+                "table sizes",
+                """
+SELECT relname, pg_total_relation_size(c.oid)
+  FROM pg_class c
+ WHERE relname IN ('radcheck', 'radusergroup', 'vpn_groups', 'vpn_user_blocklist', 'vpn_users')
+ ORDER BY relname;
+""",
+            )
+        ]
+    )[0].rows
+    return {str(name): int(size) for name, size in rows or []}
+
+
+def _plain(title: str, sql: str) -> SQLStatement:
+    return SQLStatement(title=title, sql=sql.strip())
+
+
+def bench_size(pg_bin: str, workdir: str, users: int, args: argparse.Namespace) -> dict[str, Any]:
+    # One database per size, so sizes never see each other's rows.
+    dbname = f"bench_{users}"
+    subprocess.run([os.path.join(pg_bin, "createdb"), "-h", workdir, "-U", "postgres", dbname], check=True)
+
+    pg = PostgresConfig(dsn=_dsn(workdir, dbname), driver=args.driver, statement_timeout_seconds=3600)
+    executor = PostgresExecutor(pg)
+    backend = FreeradiusBackend(FreeradiusSchema())
+
+    executor.run([_plain("freeradius schema", FREERADIUS_SCHEMA_SQL)])
+    migrate_seconds = _timed(lambda: executor.run(backend.migrate()))
+    # Seeding goes through the users-directory triggers installed by migrate, as production writes do.
+    seed_seconds = _timed(lambda: executor.run([_plain(f"seed {idx}", sql) for idx, sql in enumerate(_seed_sql(users))]))
+    executor.run([_plain("analyze", "ANALYZE;")])
+
+    config_path = os.path.join(workdir, f"tuxedo-{users}.ini")
+    with open(config_path, "w", encoding="utf-8") as fh:
+        fh.write(f"[postgres]\ndsn = {pg.dsn}\ndriver = {args.driver}\nstatement_timeout_seconds = 3600\n")
+
+    result = {
+        "users": users,
+        "seed_seconds": round(seed_seconds, 3),
+        "migrate_seconds": round(migrate_seconds, 3),
+        "table_bytes": _table_sizes(executor),
+        "backend": bench_backend(
+            backend, executor, users=users, iterations=args.iterations, import_rows=args.import_rows
+        ),
+        "cli": bench_cli(config_path, runs=args.cli_runs),
+    }
+    close_pools()
+    return result
+
+
+def _parse_sizes(raw: str) -> list[int]:
+    sizes = []
+    for part in raw.split(","):
+        part = part.strip().lower().replace("_", "")
+        if not part:
+            continue
+        mult = {"k": 1000, "m": 1_000_000}.get(part[-1], 1)
+        value = int(part[:-1] if mult > 1 else part) * mult
+        if not 1 <= value <= MAX_USERS:
+            raise ValueError(f"size out of range (1..{MAX_USERS}): {part}")
+        sizes.append(value)
+    return sizes
+
+
+def main(argv: list[str] | None = None) -> int:
+    p = argparse.ArgumentParser(description="Benchmark tuxedo against a disposable local PostgreSQL.")
+    p.add_argument("--sizes", default=DEFAULT_SIZES, help=f"Comma-separated user counts, e.g. 1k,100k,1m (default: {DEFAULT_SIZES}).")
+    p.add_argument("--iterations", type=int, default=50, help="Repetitions per backend operation (default: 50).")
+    p.add_argument("--sqlgen-loops", type=int, default=2000, help="Calls per SQL generation measurement (default: 2000).")
+    p.add_argument("--import-rows", type=int, default=1000, help="Rows per `import_users` call (default: 1000).")
+    p.add_argument("--cli-runs", type=int, default=5, help="Runs per CLI read path (default: 5).")
+    p.add_argument("--driver", default="auto", choices=["auto", "psycopg", "psycopg2"])
+    p.add_argument("--pg-bin", help="Directory with initdb/pg_ctl (default: PATH, pg_config, /usr/lib/postgresql/*/bin).")
+    p.add_argument("--keep", action="store_true", help="Keep the temporary cluster directory.")
+    p.add_argument("--output", default="-", help="Write the JSON report here ('-': stdout).")
+    args = p.parse_args(argv)
+
+    sizes = _parse_sizes(args.sizes)
+    report: dict[str, Any] = {
+        "meta": {
+            "tuxedo_version": __version__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "driver": args.driver,
+            "iterations": args.iterations,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "sqlgen": bench_sqlgen(FreeradiusBackend(FreeradiusSchema()), loops=args.sqlgen_loops),
+        "sizes": [],
+    }
+
+    pg_bin = _find_pg_bin(args.pg_bin)
+    with temp_postgres(pg_bin, keep=args.keep) as workdir:
+        pg = PostgresConfig(dsn=_dsn(workdir, "postgres"), driver=args.driver)
+        report["meta"]["server_version"] = PostgresExecutor(pg).run([_plain("version", "SHOW server_version;")])[0].rows[0][0]
+        report["meta"]["driver_loaded"] = get_pool(pg).driver.name
+        for users in sizes:
+            sys.stderr.write(f"benchmarking {users} users...\n")
+            report["sizes"].append(bench_size(pg_bin, workdir, users, args))
+
+    payload = json.dumps(report, indent=2, default=str) + "\n"
+    if args.output == "-":
+        sys.stdout.write(payload)
+    else:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            fh.write(payload)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
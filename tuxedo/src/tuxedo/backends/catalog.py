@@ -0,0 +1,440 @@
+from __future__ import annotations
+
+import functools
+import zlib
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Mapping
+
+from ..config import FreeradiusSchema
+from ..sql import SQLStatement
+
+
+@dataclass(frozen=True, slots=True)
+class CatalogStatement:
+    """
+    One fixed-shape statement of the catalog: its SQL text and parameter layout.
+
+    `layout` names the value behind each `%s`, in order (a name may repeat); values named in `sensitive`
+    are redacted when printing SQL. `name` is the server-side prepared statement name: it includes a
+    checksum of the SQL text, so two schema configs in one process never share a name.
+
+    This is `@dataclass(frozen=True, slots=True)`: fields are read-only after creation and no new attributes can be added.
+    """
+
+    name: str
+    title: str
+    sql: str
+    layout: tuple[str, ...] = ()
+    sensitive: frozenset[str] = frozenset()
+
+    def bind(self, **values: Any) -> SQLStatement:
+        unknown = set(values) - set(self.layout)
+        if unknown:
+            raise TypeError(f"{self.name}: unexpected parameters: {', '.join(sorted(unknown))}")
+        return SQLStatement(
+            title=self.title,
+            sql=self.sql,
+            params=tuple(values[key] for key in self.layout),
+            sensitive_params=frozenset(idx for idx, key in enumerate(self.layout) if key in self.sensitive),
+            prepare_name=self.name,
+        )
+
+
+def _entry(
+    key: str,
+    title: str,
+    sql: str,
+    layout: tuple[str, ...] = (),
+    sensitive: frozenset[str] = frozenset(),
+) -> tuple[str, CatalogStatement]:
+    sql = sql.strip()
+    if sql.count("%s") != len(layout):
+        raise RuntimeError(f"statement catalog: {key}: {sql.count('%s')} placeholders, {len(layout)} layout names")
+    name = f"tuxedo_{key}_{zlib.crc32(sql.encode('utf-8')):08x}"
+    return key, CatalogStatement(name=name, title=title, sql=sql, layout=layout, sensitive=sensitive)
+
+
+@functools.lru_cache(maxsize=None)
+def statement_catalog(schema: FreeradiusSchema) -> Mapping[str, CatalogStatement]:
+    """
+    SQL of every fixed-shape `FreeradiusBackend` operation, rendered once per schema config.
+
+    Backend methods only bind values, and executors can prepare these statements once per
+    connection (see `db._PreparedStatements`). Every placeholder has a type the server can infer
+    (a cast or a column comparison), which `PREPARE` requires.
+    """
+    rc = schema.radcheck_table
+    ug = schema.radusergroup_table
+    groups = schema.groups_table
+    blocklist = schema.blocklist_table
+    partitions = _radacct_partitions_sql(schema.radacct_table)
+    return MappingProxyType(
+        dict(
+            [
+                _entry(
+                    "preflight_users_directory",
+                    "Preflight: users directory table exists",
+                    "SELECT to_regclass(%s::text) IS NOT NULL AS present;",
+                    ("table",),
+                ),
+                _entry(
+                    "preflight_user_has_password",
+                    "Preflight: user exists (password in radcheck)",
+                    f"""
+SELECT 1
+  FROM {rc}
+ WHERE username = %s
+   AND attribute = 'Cleartext-Password'
+   AND op = ':='
+ LIMIT 1;
+""",
+                    ("username",),
+                ),
+                _entry(
+                    "ensure_user_has_any_group",
+                    "Ensure user has at least one group (radusergroup)",
+                    f"""
+INSERT INTO {ug} (username, groupname, priority)
+SELECT %s::text, %s::text, %s::int
+WHERE NOT EXISTS (
+  SELECT 1
+    FROM {ug}
+   WHERE username = %s::text
+);
+""",
+                    ("username", "groupname", "priority", "username"),
+                ),
+                _entry(
+                    "create_user",
+                    "Upsert user password (radcheck)",
+                    f"""
+WITH desired AS (
+  SELECT %s::text AS username, %s::text AS password
+),
+updated AS (
+  UPDATE {rc}
+     SET value = (SELECT password FROM desired)
+   WHERE username = (SELECT username FROM desired)
+     AND attribute = 'Cleartext-Password'
+     AND op = ':='
+     AND value IS DISTINCT FROM (SELECT password FROM desired)
+  RETURNING 1
+),
+inserted AS (
+  INSERT INTO {rc} (username, attribute, op, value)
+  SELECT (SELECT username FROM desired), 'Cleartext-Password', ':=', (SELECT password FROM desired)
+   WHERE NOT EXISTS (
+     SELECT 1
+       FROM {rc}
+      WHERE username = (SELECT username FROM desired)
+        AND attribute = 'Cleartext-Password'
+        AND op = ':='
+   )
+  RETURNING 1
+)
+SELECT
+  CASE
+    WHEN EXISTS (SELECT 1 FROM updated) OR EXISTS (SELECT 1 FROM inserted) THEN 1
+    ELSE 0
+  END AS changed;
+""",
+                    ("username", "password"),
+                    frozenset({"password"}),
+                ),
+                _entry(
+                    "delete_user_blocks",
+                    "Unblock user (vpn_user_blocklist)",
+                    f"DELETE FROM {blocklist} WHERE username = %s;",
+                    ("username",),
+                ),
+                _entry(
+                    "delete_user_memberships",
+                    "Remove group memberships (radusergroup)",
+                    f"DELETE FROM {ug} WHERE username = %s;",
+                    ("username",),
+                ),
+                _entry(
+                    "delete_user_credentials",
+                    "Remove user credentials (radcheck)",
+                    f"DELETE FROM {rc} WHERE username = %s;",
+                    ("username",),
+                ),
+                _entry(
+                    "create_group",
+                    "Create group (vpn_groups)",
+                    f"""
+INSERT INTO {groups} (name, description)
+VALUES (%s, %s)
+ON CONFLICT (name) DO UPDATE
+  SET description = EXCLUDED.description;
+""",
+                    ("groupname", "description"),
+                ),
+                _entry(
+                    "delete_group_memberships",
+                    "Delete group memberships and reassign orphans (radusergroup)",
+                    f"""
+WITH removed AS (
+  DELETE FROM {ug}
+   WHERE groupname = %s::text
+  RETURNING username
+),
+affected AS (
+  SELECT DISTINCT username FROM removed
+),
+orphans AS (
+  SELECT a.username
+    FROM affected a
+   WHERE NOT EXISTS (
+     SELECT 1
+       FROM {ug} ug
+      WHERE ug.username = a.username
+   )
+),
+inserted AS (
+  INSERT INTO {ug} (username, groupname, priority)
+  SELECT o.username, %s::text, %s::int
+    FROM orphans o
+   WHERE NOT EXISTS (
+     SELECT 1
+       FROM {ug} ug
+      WHERE ug.username = o.username
+        AND ug.groupname = %s::text
+   )
+  RETURNING 1
+)
+SELECT
+  (SELECT COUNT(*) FROM removed) AS removed_rows,
+  (SELECT COUNT(*) FROM affected) AS affected_users,
+  (SELECT COUNT(*) FROM inserted) AS reassigned_users;
+""",
+                    ("groupname", "target_group", "target_priority", "target_group"),
+                ),
+                _entry(
+                    "delete_group",
+                    "Delete group (vpn_groups)",
+                    f"DELETE FROM {groups} WHERE name = %s;",
+                    ("groupname",),
+                ),
+                _entry(
+                    "rename_group_memberships",
+                    "Rename group memberships (radusergroup)",
+                    f"UPDATE {ug} SET groupname = %s WHERE groupname = %s;",
+                    ("rename_to", "groupname"),
+                ),
+                _entry(
+                    "rename_group",
+                    "Rename group (vpn_groups)",
+                    f"UPDATE {groups} SET name = %s WHERE name = %s;",
+                    ("rename_to", "groupname"),
+                ),
+                _entry(
+                    "update_group_description",
+                    "Update group description (vpn_groups)",
+                    f"UPDATE {groups} SET description = %s WHERE name = %s;",
+                    ("description", "groupname"),
+                ),
+                _entry(
+                    "add_user_to_group",
+                    "Upsert group membership (radusergroup)",
+                    f"""
+WITH desired AS (
+  SELECT %s::text AS username, %s::text AS groupname, %s::int AS priority
+),
+updated AS (
+  UPDATE {ug}
+     SET priority = (SELECT priority FROM desired)
+   WHERE username = (SELECT username FROM desired)
+     AND groupname = (SELECT groupname FROM desired)
+     AND priority IS DISTINCT FROM (SELECT priority FROM desired)
+  RETURNING 1
+),
+inserted AS (
+  INSERT INTO {ug} (username, groupname, priority)
+  SELECT (SELECT username FROM desired), (SELECT groupname FROM desired), (SELECT priority FROM desired)
+   WHERE NOT EXISTS (
+     SELECT 1
+       FROM {ug}
+      WHERE username = (SELECT username FROM desired)
+        AND groupname = (SELECT groupname FROM desired)
+   )
+  RETURNING 1
+)
+SELECT
+  CASE
+    WHEN EXISTS (SELECT 1 FROM updated) OR EXISTS (SELECT 1 FROM inserted) THEN 1
+    ELSE 0
+  END AS changed;
+""",
+                    ("username", "groupname", "priority"),
+                ),
+                _entry(
+                    "remove_user_from_group",
+                    "Remove group membership and prevent orphans (radusergroup)",
+                    f"""
+WITH removed AS (
+  DELETE FROM {ug}
+   WHERE username = %s::text
+     AND groupname = %s::text
+  RETURNING username
+),
+orphans AS (
+  SELECT DISTINCT r.username
+    FROM removed r
+   WHERE NOT EXISTS (
+     SELECT 1
+       FROM {ug} ug
+      WHERE ug.username = r.username
+   )
+),
+inserted AS (
+  INSERT INTO {ug} (username, groupname, priority)
+  SELECT o.username, %s::text, %s::int
+    FROM orphans o
+   WHERE NOT EXISTS (
+     SELECT 1
+       FROM {ug} ug
+      WHERE ug.username = o.username
+        AND ug.groupname = %s::text
+   )
+  RETURNING 1
+)
+SELECT
+  (SELECT COUNT(*) FROM removed) AS removed_rows,
+  (SELECT COUNT(*) FROM inserted) AS inserted_fallback;
+""",
+                    ("username", "groupname", "target_group", "target_priority", "target_group"),
+                ),
+                _entry(
+                    "preview_delete_group",
+                    "Delete group impact (members/orphans)",
+                    f"""
+WITH members AS (
+  SELECT DISTINCT username
+    FROM {ug}
+   WHERE groupname = %s::text
+),
+counts AS (
+  SELECT m.username, COUNT(DISTINCT ug.groupname) AS groups_total
+    FROM members m
+    JOIN {ug} ug
+      ON ug.username = m.username
+   GROUP BY m.username
+)
+SELECT
+  (SELECT COUNT(*) FROM members) AS members_total,
+  (SELECT COUNT(*) FROM counts WHERE groups_total <= 1) AS would_be_orphans;
+""",
+                    ("groupname",),
+                ),
+                _entry(
+                    "block_user",
+                    "Upsert user block (vpn_user_blocklist)",
+                    f"""
+INSERT INTO {blocklist} (username, reason, created_at, expires_at)
+VALUES (%s, %s, NOW(), NOW() + %s::bigint * INTERVAL '1 second')
+ON CONFLICT (username) DO UPDATE
+  SET reason = EXCLUDED.reason,
+      created_at = EXCLUDED.created_at,
+      expires_at = EXCLUDED.expires_at;
+""",
+                    ("username", "reason", "seconds"),
+                ),
+                _entry(
+                    "unblock_user",
+                    "Delete user block (vpn_user_blocklist)",
+                    f"DELETE FROM {blocklist} WHERE username = %s;",
+                    ("username",),
+                ),
+                _entry(
+                    "find_group_summary",
+                    "Group summary",
+                    f"""
+SELECT
+  d.groupname,
+  (g.name IS NOT NULL)::int AS defined_in_vpn_groups,
+  g.description,
+  (SELECT COUNT(*) FROM {ug} WHERE groupname = d.groupname) AS members
+FROM (SELECT %s::text AS groupname) d
+LEFT JOIN {groups} g
+  ON g.name = d.groupname;
+""",
+                    ("groupname",),
+                ),
+                _entry(
+                    "find_group_members",
+                    "Group members",
+                    f"""
+SELECT username, priority
+  FROM {ug}
+ WHERE groupname = %s
+ ORDER BY priority, username;
+""",
+                    ("groupname",),
+                ),
+                _entry(
+                    "radacct_relkind",
+                    "Preflight: radacct table kind",
+                    "SELECT (SELECT relkind FROM pg_class WHERE oid = to_regclass(%s::text))::text AS relkind;",
+                    ("table",),
+                ),
+                _entry(
+                    "radacct_status",
+                    "radacct partitions",
+                    f"""
+{partitions}
+SELECT partition, range_from, range_to, bound, rows_estimate, total_bytes, pg_size_pretty(total_bytes) AS total_size
+  FROM parts
+ ORDER BY range_to NULLS LAST, partition;
+""",
+                    ("table",),
+                ),
+                _entry(
+                    "radacct_archive_candidates",
+                    "radacct partitions to archive",
+                    f"""
+{partitions}
+SELECT partition, range_from, range_to, rows_estimate, total_bytes
+  FROM parts
+ WHERE range_to <= NOW() - %s::bigint * INTERVAL '1 second'
+ ORDER BY range_to;
+""",
+                    ("table", "seconds"),
+                ),
+            ]
+        )
+    )
+
+
+def _radacct_partitions_sql(table: str) -> str:
+    """
+    `parts` CTE: one row per partition of `table` with its range bounds (NULL for MINVALUE/MAXVALUE/DEFAULT),
+    or the table itself while it is not partitioned yet. Bounds are parsed from `pg_get_expr(relpartbound)`.
+    """
+    return """
+WITH parent AS (
+  SELECT to_regclass(%s::text) AS oid
+),
+members AS (
+  SELECT c.oid, pg_get_expr(c.relpartbound, c.oid) AS bound
+    FROM parent p
+    JOIN pg_inherits i ON i.inhparent = p.oid
+    JOIN pg_class c ON c.oid = i.inhrelid
+  UNION ALL
+  SELECT c.oid, 'not partitioned'
+    FROM parent p
+    JOIN pg_class c ON c.oid = p.oid
+   WHERE c.relkind = 'r'
+),
+parts AS (
+  SELECT
+    m.oid::regclass::text AS partition,
+    substring(m.bound FROM $re$FROM \\('([^']+)'\\)$re$)::timestamptz AS range_from,
+    substring(m.bound FROM $re$TO \\('([^']+)'\\)$re$)::timestamptz AS range_to,
+    m.bound,
+    GREATEST(c.reltuples, 0)::bigint AS rows_estimate,
+    pg_total_relation_size(m.oid) AS total_bytes
+  FROM members m
+  JOIN pg_class c ON c.oid = m.oid
+)""".strip()
@@ -1,9 +1,66 @@
 from __future__ import annotations
 
+import datetime
 from dataclasses import dataclass
+from typing import Any, Collection, Mapping, Sequence
 
-from ..config import FreeradiusSchema
+from ..config import FreeradiusSchema, _is_safe_identifier
 from ..sql import SQLStatement
+from .catalog import CatalogStatement, statement_catalog
+
+_IMPORT_STAGE_TABLE = "tuxedo_import_stage"
+_APPLY_STAGE_TABLE = "tuxedo_apply_stage"
+_APPLY_USERS_TABLE = "tuxedo_apply_users"
+_APPLY_MEMBERS_TABLE = "tuxedo_apply_members"
+_APPLY_GROUPS_TABLE = "tuxedo_apply_groups"
+_APPLY_TOUCHED_TABLE = "tuxedo_apply_touched"
+
+# radcheck attributes that carry a user's password (`op = ':='`); `apply` keeps exactly one of them per user.
+PASSWORD_ATTRIBUTES = (
+    "Cleartext-Password",
+    "Crypt-Password",
+    "MD5-Password",
+    "SMD5-Password",
+    "SHA-Password",
+    "SSHA-Password",
+    "SHA2-Password",
+    "SSHA2-256-Password",
+    "SSHA2-512-Password",
+    "NT-Password",
+)
+_USERS_DIR_SYNC_FUNCTION = "tuxedo_users_directory_sync"
+# Statements touching more usernames than this (imports, apply) lock the whole users directory instead of each
+# name: advisory locks take shared lock table slots (`max_locks_per_transaction`).
+_USERS_DIR_LOCK_MAX_NAMES = 64
+# Refresh function of releases that named it independently of `usage_table_prefix`; `migrate` drops it.
+_LEGACY_USAGE_REFRESH_FUNCTION = "tuxedo_usage_refresh"
+_COUNTERS_TRACK_FUNCTION = "tuxedo_user_counters_track"
+_COUNTERS_RECOUNT_FUNCTION = "tuxedo_user_counters_recount"
+_COUNTERS_TRIGGER = "tuxedo_user_counters"
+
+# Sessions re-read on every refresh: late commits of accounting rows stamped up to this long before the watermark.
+_USAGE_REFRESH_OVERLAP = "15 minutes"
+# Closed sessions keep their counted totals this long, so repeated Stop packets are not counted twice.
+_USAGE_SESSION_RETENTION = "2 days"
+# Below this many radacct rows, `migrate` builds the acctupdatetime index itself (it blocks writes while it runs).
+# The per-user counter indexes follow the same rule.
+_USAGE_INDEX_MAX_ROWS = 1000000
+
+# `tuxedo usage --by` breakdowns (default: one row per user).
+USAGE_GROUPINGS = ("nas", "day")
+
+# `tuxedo radacct archive` output formats (files are gzip-compressed).
+RADACCT_ARCHIVE_FORMATS = ("ndjson", "csv")
+
+# `tuxedo doctor indexes` plans the hot lookups for these values (they need not exist).
+_DOCTOR_SAMPLE_USER = "tuxedo-doctor"
+_DOCTOR_SAMPLE_GROUP = "tuxedo-doctor"
+_DOCTOR_SAMPLE_IP = "192.0.2.1"
+
+
+def _ident_tail(name: str) -> str:
+    # "public.vpn_users" -> "vpn_users" (index names cannot be schema-qualified).
+    return name.rsplit(".", 1)[-1]
 
 
 def _parse_duration_seconds(value: str | None) -> int | None:
@@ -32,6 +89,93 @@ def _parse_duration_seconds(value: str | None) -> int | None:
     return n * multipliers[unit]
 
 
+def _qualified_like(table: str, tail: str) -> str:
+    # "public.radacct", "radacct_legacy" -> "public.radacct_legacy" (same schema as `table`).
+    schema, dot, _ = table.rpartition(".")
+    return f"{schema}{dot}{tail}"
+
+
+def _month_boundary_literal(boundary: datetime.date) -> str:
+    if boundary.day != 1:
+        raise ValueError(f"Invalid partition boundary: {boundary.isoformat()} (must be the first day of a month)")
+    return f"{boundary.isoformat()} 00:00:00+00"
+
+
+def _check_partition_name(partition: str) -> None:
+    # Partition names come back from the catalog query; they are interpolated into DDL, so validate them here.
+    if not _is_safe_identifier(partition):
+        raise ValueError(f"Invalid partition name: {partition!r}")
+
+
+def _check_limit(limit: int | None) -> None:
+    if limit is not None and int(limit) < 1:
+        raise ValueError(f"Invalid limit: {limit!r} (must be >= 1)")
+
+
+@dataclass(frozen=True, slots=True)
+class _PageSQL:
+    where: str
+    limit: str
+    order_limit: str
+
+
+def _keyset_page(
+    column: str,
+    *,
+    limit: int | None,
+    after: str | None,
+    indent: str = "",
+) -> tuple[_PageSQL, tuple[object, ...]]:
+    """
+    Keyset pagination fragments for queries ordered by `column`.
+
+    `after` continues strictly after the given key (`column > %s`), `limit` caps the page size
+    (`order_limit` also carries the ORDER BY, for subqueries that are not ordered otherwise).
+    Unlike OFFSET, the cost of a page does not grow with its position.
+    """
+    _check_limit(limit)
+    params: list[object] = []
+    where = ""
+    if after is not None:
+        where = f"\n{indent}   AND {column} > %s"
+        params.append(after)
+    limit_sql = ""
+    order_limit_sql = ""
+    if limit is not None:
+        limit_sql = f"\n{indent} LIMIT %s"
+        order_limit_sql = f"\n{indent} ORDER BY {column}{limit_sql}"
+        params.append(int(limit))
+    return _PageSQL(where=where, limit=limit_sql, order_limit=order_limit_sql), tuple(params)
+
+
+@dataclass(frozen=True, slots=True)
+class IndexAdvice:
+    """
+    An index the hot lookups need (`tuxedo doctor indexes`): `columns` of `table`, partial when `where` is set.
+
+    The index is named `<table>_<suffix>` (`<partition>_<suffix>` on each partition of a partitioned table).
+    An existing index covers it when its leading key columns are the first `match_columns` of `columns`
+    (all of them when 0) and it either has no predicate or the same one.
+
+    This is `@dataclass(frozen=True, slots=True)`: fields are read-only after creation and no new attributes can be added.
+    """
+
+    table: str
+    suffix: str
+    columns: tuple[str, ...]
+    where: str = ""
+    match_columns: int = 0
+    used_by: str = ""
+
+    @property
+    def name(self) -> str:
+        return f"{_ident_tail(self.table)}_{self.suffix}"
+
+    @property
+    def definition(self) -> str:
+        return f"({', '.join(self.columns)})" + (f" WHERE {self.where}" if self.where else "")
+
+
 @dataclass(frozen=True, slots=True)
 class FreeradiusBackend:
     """
@@ -45,6 +189,11 @@ class FreeradiusBackend:
 
     schema: FreeradiusSchema
 
+    @property
+    def _catalog(self) -> Mapping[str, CatalogStatement]:
+        # Fixed-shape statements are rendered once per schema (cached), not on every call.
+        return statement_catalog(self.schema)
+
     def migrate(self) -> list[SQLStatement]:
         return [
             SQLStatement(
@@ -72,119 +221,741 @@ CREATE TABLE IF NOT EXISTS {self.schema.blocklist_table} (
                 title="Create blocklist expires index",
                 sql=f"CREATE INDEX IF NOT EXISTS idx_vpn_user_blocklist_expires ON {self.schema.blocklist_table} (expires_at);",
             ),
+            *self._migrate_blocklist_lifecycle(),
+            *self._migrate_users_directory(),
+            *self._migrate_usage_rollup(),
+            *self._migrate_user_counters(),
         ]
 
-    def preflight_user_has_password(self, username: str) -> list[SQLStatement]:
+    def _migrate_blocklist_lifecycle(self) -> list[SQLStatement]:
+        """
+        Indexes for the block lifecycle, plus the archive table used by `blocks sweep --archive`.
+
+        "Active" depends on NOW(), which a partial index predicate cannot use. Instead:
+        - `..._expiring (expires_at) WHERE expires_at IS NOT NULL` holds only temporary blocks. The sweeper
+          walks it oldest-first, and it answers "temporary block still in force" checks. Permanent blocks stay out of it.
+        - `..._recent (created_at DESC, username)` matches the `show blocks` order and keyset, so a page is a
+          short index scan. The sweeper keeps expired rows from piling up in front of the active ones.
+        """
+        blocklist = self.schema.blocklist_table
+        tail = _ident_tail(blocklist)
         return [
             SQLStatement(
-                title="Preflight: user exists (password in radcheck)",
+                title="Create partial index for expiring blocks",
                 sql=f"""
-SELECT 1
-  FROM {self.schema.radcheck_table}
- WHERE username = %s
-   AND attribute = 'Cleartext-Password'
-   AND op = ':='
- LIMIT 1;
+CREATE INDEX IF NOT EXISTS idx_{tail}_expiring
+  ON {blocklist} (expires_at)
+  WHERE expires_at IS NOT NULL;
 """.strip(),
-                params=(username,),
-                sensitive_params=frozenset(),
-            )
+            ),
+            SQLStatement(
+                title="Create blocklist listing index",
+                sql=f"CREATE INDEX IF NOT EXISTS idx_{tail}_recent ON {blocklist} (created_at DESC, username);",
+            ),
+            SQLStatement(
+                title="Create blocklist archive table",
+                sql=f"""
+CREATE TABLE IF NOT EXISTS {self.schema.blocklist_archive_table} (
+  username TEXT NOT NULL,
+  reason TEXT,
+  created_at TIMESTAMPTZ NOT NULL,
+  expires_at TIMESTAMPTZ,
+  archived_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+""".strip(),
+            ),
+            SQLStatement(
+                title="Create blocklist archive index",
+                sql=(
+                    f"CREATE INDEX IF NOT EXISTS idx_{_ident_tail(self.schema.blocklist_archive_table)}_username "
+                    f"ON {self.schema.blocklist_archive_table} (username, archived_at);"
+                ),
+            ),
         ]
 
-    def ensure_user_has_any_group(self, username: str, *, groupname: str, priority: int) -> list[SQLStatement]:
+    def _migrate_users_directory(self) -> list[SQLStatement]:
+        """
+        `vpn_users`: one row per known username, kept in sync by statement-level triggers on
+        radcheck / radusergroup / vpn_user_blocklist, so user listing and search do not have to
+        UNION three full tables. A pg_trgm GIN index makes `ILIKE '%lic%'` an index lookup.
+
+        The sync takes a transaction-level advisory lock per username it touches (one exclusive lock on the
+        whole directory for statements touching more than `_USERS_DIR_LOCK_MAX_NAMES` names), so a reference
+        added by a concurrent transaction is committed, and visible to the `NOT EXISTS` check, before a
+        directory row is deleted (READ COMMITTED). `tuxedo migrate` backfills and prunes the whole directory.
+        """
+        users = self.schema.users_table
+        sources = (self.schema.radcheck_table, self.schema.radusergroup_table, self.schema.blocklist_table)
+
+        def not_referenced(indent: str) -> str:
+            return "\n".join(
+                f"{indent}AND NOT EXISTS (SELECT 1 FROM {table} s WHERE s.username = o.username)" for table in sources
+            )
+
+        trigger_statements = []
+        for table in sources:
+            for event, referencing in (
+                ("INSERT", "NEW TABLE AS new_rows"),
+                ("UPDATE", "OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+                ("DELETE", "OLD TABLE AS old_rows"),
+            ):
+                trigger = f"tuxedo_users_dir_{event.lower()}"
+                trigger_statements.extend(
+                    [
+                        SQLStatement(
+                            title=f"Drop {users} {event} trigger ({table})",
+                            sql=f"DROP TRIGGER IF EXISTS {trigger} ON {table};",
+                        ),
+                        SQLStatement(
+                            title=f"Sync {users} on {event} ({table})",
+                            sql=f"""
+CREATE TRIGGER {trigger}
+  AFTER {event} ON {table}
+  REFERENCING {referencing}
+  FOR EACH STATEMENT EXECUTE FUNCTION {_USERS_DIR_SYNC_FUNCTION}();
+""".strip(),
+                        ),
+                    ]
+                )
+
+        trgm_index = f"idx_{_ident_tail(users)}_username_trgm"
+        union_sources = "\n    UNION\n".join(f"    SELECT username FROM {table}" for table in sources)
         return [
             SQLStatement(
-                title="Ensure user has at least one group (radusergroup)",
+                title="Create users directory table",
                 sql=f"""
-INSERT INTO {self.schema.radusergroup_table} (username, groupname, priority)
-SELECT %s::text, %s::text, %s::int
-WHERE NOT EXISTS (
-  SELECT 1
-    FROM {self.schema.radusergroup_table}
-   WHERE username = %s::text
+CREATE TABLE IF NOT EXISTS {users} (
+  username TEXT PRIMARY KEY
 );
 """.strip(),
-                params=(username, groupname, int(priority), username),
-            )
-        ]
+            ),
+            SQLStatement(
+                title="Create users directory sync function",
+                sql=f"""
+CREATE OR REPLACE FUNCTION {_USERS_DIR_SYNC_FUNCTION}() RETURNS trigger
+LANGUAGE plpgsql AS $fn$
+DECLARE
+  v_names TEXT[];
+  v_name TEXT;
+BEGIN
+  -- Serialize with concurrent writers of the same usernames before reading the sources (sorted: no deadlocks).
+  IF TG_OP = 'INSERT' THEN
+    SELECT array_agg(DISTINCT n.username ORDER BY n.username) INTO v_names FROM new_rows n WHERE n.username <> '';
+  ELSIF TG_OP = 'UPDATE' THEN
+    SELECT array_agg(DISTINCT r.username ORDER BY r.username) INTO v_names
+      FROM (SELECT username FROM new_rows UNION ALL SELECT username FROM old_rows) r
+     WHERE r.username <> '';
+  ELSE
+    SELECT array_agg(DISTINCT o.username ORDER BY o.username) INTO v_names FROM old_rows o WHERE o.username <> '';
+  END IF;
+  IF cardinality(v_names) > {_USERS_DIR_LOCK_MAX_NAMES} THEN
+    PERFORM pg_advisory_xact_lock(hashtext('{_USERS_DIR_SYNC_FUNCTION}'));
+  ELSIF v_names IS NOT NULL THEN
+    PERFORM pg_advisory_xact_lock_shared(hashtext('{_USERS_DIR_SYNC_FUNCTION}'));
+    FOREACH v_name IN ARRAY v_names LOOP
+      PERFORM pg_advisory_xact_lock(hashtext('{_USERS_DIR_SYNC_FUNCTION}'), hashtext(v_name));
+    END LOOP;
+  END IF;
 
-    def create_user(self, username: str, password: str) -> list[SQLStatement]:
-        return [
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    INSERT INTO {users} (username)
+    SELECT DISTINCT n.username
+      FROM new_rows n
+     WHERE n.username IS NOT NULL AND n.username <> ''
+    ON CONFLICT (username) DO NOTHING;
+  END IF;
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    DELETE FROM {users} u
+     USING (SELECT DISTINCT username FROM old_rows) o
+     WHERE u.username = o.username
+{not_referenced("       ")};
+  END IF;
+  RETURN NULL;
+END
+$fn$;
+""".strip(),
+            ),
+            *trigger_statements,
             SQLStatement(
-                title="Upsert user password (radcheck)",
+                title="Backfill users directory",
                 sql=f"""
-WITH desired AS (
-  SELECT %s::text AS username, %s::text AS password
-),
-updated AS (
-  UPDATE {self.schema.radcheck_table}
-     SET value = (SELECT password FROM desired)
-   WHERE username = (SELECT username FROM desired)
-     AND attribute = 'Cleartext-Password'
-     AND op = ':='
-     AND value IS DISTINCT FROM (SELECT password FROM desired)
-  RETURNING 1
-),
-inserted AS (
-  INSERT INTO {self.schema.radcheck_table} (username, attribute, op, value)
-  SELECT (SELECT username FROM desired), 'Cleartext-Password', ':=', (SELECT password FROM desired)
-   WHERE NOT EXISTS (
-     SELECT 1
-       FROM {self.schema.radcheck_table}
-      WHERE username = (SELECT username FROM desired)
-        AND attribute = 'Cleartext-Password'
-        AND op = ':='
-   )
-  RETURNING 1
+INSERT INTO {users} (username)
+SELECT username
+  FROM (
+{union_sources}
+  ) u
+ WHERE username IS NOT NULL AND username <> ''
+ON CONFLICT (username) DO NOTHING;
+""".strip(),
+            ),
+            SQLStatement(
+                title="Prune stale users directory rows",
+                sql=f"""
+DELETE FROM {users} o
+ WHERE o.username IS NOT NULL
+{not_referenced("   ")};
+""".strip(),
+            ),
+            SQLStatement(
+                title="Enable pg_trgm (best effort)",
+                sql="""
+DO $do$
+BEGIN
+  CREATE EXTENSION IF NOT EXISTS pg_trgm;
+-- feature_not_supported: PostgreSQL 15+ when the contrib package is not installed.
+EXCEPTION WHEN insufficient_privilege OR undefined_file OR feature_not_supported THEN
+  RAISE NOTICE 'pg_trgm is not available (%); wildcard user search will not use a trigram index', SQLERRM;
+END
+$do$;
+""".strip(),
+            ),
+            SQLStatement(
+                title="Create users directory trigram index",
+                sql=f"""
+DO $do$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+    EXECUTE 'CREATE INDEX IF NOT EXISTS {trgm_index} ON {users} USING gin (username gin_trgm_ops)';
+  END IF;
+END
+$do$;
+""".strip(),
+            ),
+        ]
+
+    def _migrate_usage_rollup(self) -> list[SQLStatement]:
+        """
+        Usage rollup: per-user, per-NAS octets, session seconds and last-seen, per UTC day (`<prefix>_daily`)
+        and all-time (`<prefix>_totals`, with the last session's labels for the accounting exporter).
+
+        `<prefix>_refresh()` maintains it incrementally. It reads only the radacct rows past the
+        watermark (`radacctid` above the last one seen, or `acctupdatetime` within `_USAGE_REFRESH_OVERLAP`
+        of the last one seen) and adds each session's growth since it was last counted (`<prefix>_sessions`),
+        on the day of the update. Totals survive radacct archiving.
+        """
+        radacct = self.schema.radacct_table
+        daily = self.schema.usage_table("daily")
+        totals = self.schema.usage_table("totals")
+        sessions = self.schema.usage_table("sessions")
+        watermark = self.schema.usage_table("watermark")
+        update_index = f"{_ident_tail(radacct)}_acctupdatetime_idx"
+        function = self.schema.usage_refresh_function
+        refresh_function = f"""
+CREATE OR REPLACE FUNCTION {function}()
+RETURNS TABLE (
+  rows_read BIGINT,
+  sessions_changed BIGINT,
+  sessions_new BIGINT,
+  input_octets BIGINT,
+  output_octets BIGINT,
+  last_radacctid BIGINT,
+  last_update TIMESTAMPTZ,
+  skipped BOOLEAN
 )
-SELECT
-  CASE
-    WHEN EXISTS (SELECT 1 FROM updated) OR EXISTS (SELECT 1 FROM inserted) THEN 1
-    ELSE 0
-  END AS changed;
+LANGUAGE plpgsql
+-- Plan the watermark scan for the actual bounds every time (a generic plan cannot use the indexes well).
+SET plan_cache_mode = force_custom_plan
+AS $fn$
+#variable_conflict use_column
+DECLARE
+  v_wm_id BIGINT;
+  v_wm_time TIMESTAMPTZ;
+  v_read BIGINT;
+  v_changed BIGINT;
+  v_new BIGINT;
+  v_in BIGINT;
+  v_out BIGINT;
+  v_max_id BIGINT;
+  v_max_time TIMESTAMPTZ;
+BEGIN
+  -- One refresh at a time; a concurrent caller (exporter scrape, timer) returns right away.
+  IF NOT pg_try_advisory_xact_lock(hashtext('{function}')) THEN
+    RETURN QUERY
+      SELECT 0::bigint, 0::bigint, 0::bigint, 0::bigint, 0::bigint, w.last_radacctid, w.last_update, TRUE
+        FROM {watermark} w;
+    RETURN;
+  END IF;
+
+  SELECT w.last_radacctid, w.last_update INTO v_wm_id, v_wm_time FROM {watermark} w;
+
+  WITH changed AS (
+    SELECT r.radacctid,
+           r.username,
+           COALESCE(r.nasipaddress, '0.0.0.0'::inet) AS nasipaddress,
+           COALESCE(__INPUT_OCTETS__, 0) AS input_octets,
+           COALESCE(__OUTPUT_OCTETS__, 0) AS output_octets,
+           COALESCE(
+             r.acctsessiontime::bigint,
+             GREATEST(0, EXTRACT(EPOCH FROM (r.acctstoptime - r.acctstarttime)))::bigint,
+             0
+           ) AS session_seconds,
+           COALESCE(r.acctstoptime, r.acctupdatetime, r.acctstarttime, NOW()) AS seen_at,
+           r.acctstoptime IS NOT NULL AS closed,
+           r.acctupdatetime,
+           r.framedipaddress,
+           r.callingstationid,
+           r.connectinfo_start
+      FROM {radacct} r
+     WHERE r.radacctid > COALESCE(v_wm_id, 0)
+        OR r.acctupdatetime >= v_wm_time - INTERVAL '{_USAGE_REFRESH_OVERLAP}'
+  ),
+  moved AS (
+    SELECT c.*,
+           s.radacctid IS NULL AS is_new,
+           GREATEST(c.input_octets - COALESCE(s.input_octets, 0), 0) AS d_in,
+           GREATEST(c.output_octets - COALESCE(s.output_octets, 0), 0) AS d_out,
+           GREATEST(c.session_seconds - COALESCE(s.session_seconds, 0), 0) AS d_seconds
+      FROM changed c
+      LEFT JOIN {sessions} s ON s.radacctid = c.radacctid
+     WHERE c.username IS NOT NULL
+       AND c.username <> ''
+       AND (s.radacctid IS NULL
+            OR (c.closed AND s.closed_at IS NULL)
+            OR (c.input_octets, c.output_octets, c.session_seconds)
+               IS DISTINCT FROM (s.input_octets, s.output_octets, s.session_seconds))
+  ),
+  saved AS (
+    INSERT INTO {sessions} AS s (radacctid, input_octets, output_octets, session_seconds, closed_at)
+    SELECT radacctid, input_octets, output_octets, session_seconds, CASE WHEN closed THEN NOW() END
+      FROM moved
+    ON CONFLICT (radacctid) DO UPDATE
+       SET input_octets = EXCLUDED.input_octets,
+           output_octets = EXCLUDED.output_octets,
+           session_seconds = EXCLUDED.session_seconds,
+           closed_at = COALESCE(s.closed_at, EXCLUDED.closed_at)
+  ),
+  per_day AS (
+    INSERT INTO {daily} AS d
+      (username, nasipaddress, usage_day, input_octets, output_octets, session_seconds, sessions, last_seen_at)
+    SELECT username,
+           nasipaddress,
+           (seen_at AT TIME ZONE 'UTC')::date,
+           SUM(d_in),
+           SUM(d_out),
+           SUM(d_seconds),
+           COUNT(*) FILTER (WHERE is_new),
+           MAX(seen_at)
+      FROM moved
+     GROUP BY 1, 2, 3
+    ON CONFLICT (username, nasipaddress, usage_day) DO UPDATE
+       SET input_octets = d.input_octets + EXCLUDED.input_octets,
+           output_octets = d.output_octets + EXCLUDED.output_octets,
+           session_seconds = d.session_seconds + EXCLUDED.session_seconds,
+           sessions = d.sessions + EXCLUDED.sessions,
+           last_seen_at = GREATEST(d.last_seen_at, EXCLUDED.last_seen_at)
+  ),
+  per_nas AS (
+    INSERT INTO {totals} AS t
+      (username, nasipaddress, input_octets, output_octets, session_seconds, sessions, last_seen_at,
+       framedipaddress, callingstationid, connectinfo_start)
+    SELECT username,
+           nasipaddress,
+           SUM(d_in),
+           SUM(d_out),
+           SUM(d_seconds),
+           COUNT(*) FILTER (WHERE is_new),
+           MAX(seen_at),
+           (array_agg(framedipaddress ORDER BY seen_at DESC, radacctid DESC))[1],
+           (array_agg(callingstationid ORDER BY seen_at DESC, radacctid DESC))[1],
+           (array_agg(connectinfo_start ORDER BY seen_at DESC, radacctid DESC))[1]
+      FROM moved
+     GROUP BY 1, 2
+    ON CONFLICT (username, nasipaddress) DO UPDATE
+       SET input_octets = t.input_octets + EXCLUDED.input_octets,
+           output_octets = t.output_octets + EXCLUDED.output_octets,
+           session_seconds = t.session_seconds + EXCLUDED.session_seconds,
+           sessions = t.sessions + EXCLUDED.sessions,
+           last_seen_at = GREATEST(t.last_seen_at, EXCLUDED.last_seen_at),
+           framedipaddress = CASE WHEN EXCLUDED.last_seen_at >= t.last_seen_at
+                                  THEN EXCLUDED.framedipaddress ELSE t.framedipaddress END,
+           callingstationid = CASE WHEN EXCLUDED.last_seen_at >= t.last_seen_at
+                                   THEN EXCLUDED.callingstationid ELSE t.callingstationid END,
+           connectinfo_start = CASE WHEN EXCLUDED.last_seen_at >= t.last_seen_at
+                                    THEN EXCLUDED.connectinfo_start ELSE t.connectinfo_start END
+  )
+  SELECT (SELECT COUNT(*) FROM changed),
+         COUNT(*),
+         COUNT(*) FILTER (WHERE is_new),
+         COALESCE(SUM(d_in), 0),
+         COALESCE(SUM(d_out), 0),
+         (SELECT MAX(radacctid) FROM changed),
+         (SELECT MAX(acctupdatetime) FROM changed)
+    INTO v_read, v_changed, v_new, v_in, v_out, v_max_id, v_max_time
+    FROM moved;
+
+  -- NAS clocks ahead of ours must not push the watermark past rows that are still to come.
+  UPDATE {watermark} w
+     SET last_radacctid = GREATEST(w.last_radacctid, v_max_id),
+         last_update = GREATEST(w.last_update, LEAST(v_max_time, NOW())),
+         refreshed_at = NOW();
+
+  DELETE FROM {sessions} s WHERE s.closed_at < NOW() - INTERVAL '{_USAGE_SESSION_RETENTION}';
+
+  RETURN QUERY
+    SELECT v_read, v_changed, v_new, v_in, v_out, w.last_radacctid, w.last_update, FALSE
+      FROM {watermark} w;
+END
+$fn$
+""".strip()
+        statements = [
+            SQLStatement(
+                title="Create usage rollup table (per user, NAS and day)",
+                sql=f"""
+CREATE TABLE IF NOT EXISTS {daily} (
+  username TEXT NOT NULL,
+  nasipaddress INET NOT NULL,
+  usage_day DATE NOT NULL,
+  input_octets BIGINT NOT NULL DEFAULT 0,
+  output_octets BIGINT NOT NULL DEFAULT 0,
+  session_seconds BIGINT NOT NULL DEFAULT 0,
+  sessions INTEGER NOT NULL DEFAULT 0,
+  last_seen_at TIMESTAMPTZ NOT NULL,
+  PRIMARY KEY (username, nasipaddress, usage_day)
+);
 """.strip(),
-                params=(username, password),
-                sensitive_params=frozenset({1}),
-            )
+            ),
+            SQLStatement(
+                title="Create usage rollup day index",
+                sql=f"CREATE INDEX IF NOT EXISTS idx_{_ident_tail(daily)}_day ON {daily} (usage_day);",
+            ),
+            SQLStatement(
+                title="Create usage totals table (per user and NAS)",
+                sql=f"""
+CREATE TABLE IF NOT EXISTS {totals} (
+  username TEXT NOT NULL,
+  nasipaddress INET NOT NULL,
+  input_octets BIGINT NOT NULL DEFAULT 0,
+  output_octets BIGINT NOT NULL DEFAULT 0,
+  session_seconds BIGINT NOT NULL DEFAULT 0,
+  sessions BIGINT NOT NULL DEFAULT 0,
+  last_seen_at TIMESTAMPTZ NOT NULL,
+  framedipaddress INET,
+  callingstationid TEXT,
+  connectinfo_start TEXT,
+  PRIMARY KEY (username, nasipaddress)
+);
+""".strip(),
+            ),
+            SQLStatement(
+                title="Create usage session state table",
+                sql=f"""
+CREATE TABLE IF NOT EXISTS {sessions} (
+  radacctid BIGINT PRIMARY KEY,
+  input_octets BIGINT NOT NULL,
+  output_octets BIGINT NOT NULL,
+  session_seconds BIGINT NOT NULL,
+  closed_at TIMESTAMPTZ
+);
+""".strip(),
+            ),
+            SQLStatement(
+                title="Create usage session retention index",
+                sql=(
+                    f"CREATE INDEX IF NOT EXISTS idx_{_ident_tail(sessions)}_closed "
+                    f"ON {sessions} (closed_at) WHERE closed_at IS NOT NULL;"
+                ),
+            ),
+            SQLStatement(
+                title="Create usage watermark table",
+                sql=f"""
+CREATE TABLE IF NOT EXISTS {watermark} (
+  id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+  last_radacctid BIGINT NOT NULL DEFAULT 0,
+  last_update TIMESTAMPTZ,
+  refreshed_at TIMESTAMPTZ
+);
+""".strip(),
+            ),
+            SQLStatement(
+                title="Initialize usage watermark",
+                sql=f"INSERT INTO {watermark} (id) VALUES (TRUE) ON CONFLICT (id) DO NOTHING;",
+            ),
+            SQLStatement(
+                title="Create usage refresh function",
+                sql=f"""
+DO $do$
+DECLARE
+  input_expr TEXT := 'r.acctinputoctets::bigint';
+  output_expr TEXT := 'r.acctoutputoctets::bigint';
+BEGIN
+  IF (
+    SELECT COUNT(*)
+      FROM pg_attribute
+     WHERE attrelid = to_regclass('{radacct}')
+       AND attname IN ('acctinputgigawords', 'acctoutputgigawords')
+       AND NOT attisdropped
+  ) = 2 THEN
+    input_expr := '(r.acctinputoctets::bigint + COALESCE(r.acctinputgigawords, 0)::bigint * 4294967296)';
+    output_expr := '(r.acctoutputoctets::bigint + COALESCE(r.acctoutputgigawords, 0)::bigint * 4294967296)';
+  END IF;
+  EXECUTE replace(replace($src$
+{refresh_function}
+$src$, '__INPUT_OCTETS__', input_expr), '__OUTPUT_OCTETS__', output_expr);
+END
+$do$;
+""".strip(),
+            ),
+            SQLStatement(
+                title="Create radacct acctupdatetime index (small tables only)",
+                sql=f"""
+DO $do$
+DECLARE
+  rel REGCLASS := to_regclass('{radacct}');
+BEGIN
+  IF rel IS NULL OR EXISTS (
+    SELECT 1
+      FROM pg_index i
+      JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+     WHERE i.indrelid = rel AND a.attname = 'acctupdatetime'
+  ) THEN
+    RETURN;
+  END IF;
+  IF (
+    SELECT COALESCE(SUM(GREATEST(c.reltuples, 0)), 0)
+      FROM pg_class c
+     WHERE c.oid = rel OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = rel)
+  ) < {_USAGE_INDEX_MAX_ROWS} THEN
+    EXECUTE 'CREATE INDEX IF NOT EXISTS {update_index} ON {radacct} (acctupdatetime)';
+  ELSE
+    RAISE NOTICE 'usage refresh: {radacct} has no acctupdatetime index; build it off-peak with: tuxedo doctor indexes --apply';
+  END IF;
+END
+$do$;
+""".strip(),
+            ),
         ]
+        if function != _LEGACY_USAGE_REFRESH_FUNCTION:
+            statements.append(
+                SQLStatement(
+                    title="Drop the unprefixed usage refresh function",
+                    sql=f"DROP FUNCTION IF EXISTS {_LEGACY_USAGE_REFRESH_FUNCTION}();",
+                )
+            )
+        return statements
 
-    def delete_user(self, username: str) -> list[SQLStatement]:
+    def _migrate_user_counters(self) -> list[SQLStatement]:
+        """
+        Per-user counters for the authorization path: open sessions and today's octets (UTC day), one row per
+        user in `<counters_table>`. A row trigger on radacct applies each insert/update/delete as a delta, so the
+        FreeRADIUS policy and sqlcounter queries become primary key lookups instead of radacct scans.
+
+        The trigger is created and the table seeded from a full recount in the same transaction: CREATE TRIGGER
+        blocks radacct writes until it commits, so no accounting row is missed or counted twice.
+        `tuxedo counters verify` compares the table with a fresh recount (`tuxedo_user_counters_recount()`).
+        """
+        radacct = self.schema.radacct_table
+        counters = self.schema.counters_table
+        # Same open sessions index as `radacct partition-prepare` builds.
+        open_index = _qualified_like(radacct, f"{_ident_tail(radacct)}_open_sessions_idx")
+        user_day_index = _qualified_like(radacct, f"{_ident_tail(radacct)}_user_start_idx")
+        track_function = f"""
+CREATE OR REPLACE FUNCTION {_COUNTERS_TRACK_FUNCTION}()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $fn$
+DECLARE
+  v_today DATE := (NOW() AT TIME ZONE 'UTC')::date;
+  v_day_start TIMESTAMPTZ := v_today::timestamp AT TIME ZONE 'UTC';
+  v_old_user TEXT;
+  v_new_user TEXT;
+  v_old_active INTEGER := 0;
+  v_new_active INTEGER := 0;
+  v_old_octets BIGINT := 0;
+  v_new_octets BIGINT := 0;
+BEGIN
+  IF TG_OP <> 'INSERT' THEN
+    v_old_user := NULLIF(OLD.username, '');
+    v_old_active := (OLD.acctstoptime IS NULL)::int;
+    IF OLD.acctstarttime >= v_day_start THEN
+      v_old_octets := __OLD_OCTETS__;
+    END IF;
+  END IF;
+  IF TG_OP <> 'DELETE' THEN
+    v_new_user := NULLIF(NEW.username, '');
+    v_new_active := (NEW.acctstoptime IS NULL)::int;
+    IF NEW.acctstarttime >= v_day_start THEN
+      v_new_octets := __NEW_OCTETS__;
+    END IF;
+  END IF;
+  -- An update of the same user's row is one delta (one upsert of one row).
+  IF v_old_user IS NOT DISTINCT FROM v_new_user THEN
+    v_new_active := v_new_active - v_old_active;
+    v_new_octets := v_new_octets - v_old_octets;
+    v_old_user := NULL;
+  END IF;
+
+  INSERT INTO {counters} AS c (username, active_sessions, usage_day, day_octets, updated_at)
+  SELECT d.username, d.active_sessions, v_today, d.day_octets, NOW()
+    FROM (VALUES (v_old_user, -v_old_active, -v_old_octets),
+                 (v_new_user, v_new_active, v_new_octets)) AS d (username, active_sessions, day_octets)
+   WHERE d.username IS NOT NULL
+     AND (d.active_sessions <> 0 OR d.day_octets <> 0)
+  -- Around midnight UTC a transaction that started yesterday can commit after one from today: usage_day never
+  -- moves backwards, and such a late transaction's octets (yesterday's) do not touch today's total.
+  ON CONFLICT (username) DO UPDATE
+     SET active_sessions = c.active_sessions + EXCLUDED.active_sessions,
+         day_octets = CASE
+                        WHEN EXCLUDED.usage_day > c.usage_day THEN EXCLUDED.day_octets
+                        WHEN EXCLUDED.usage_day = c.usage_day THEN c.day_octets + EXCLUDED.day_octets
+                        ELSE c.day_octets
+                      END,
+         usage_day = GREATEST(c.usage_day, EXCLUDED.usage_day),
+         updated_at = EXCLUDED.updated_at;
+  RETURN NULL;
+END
+$fn$
+""".strip()
+        recount_function = f"""
+CREATE OR REPLACE FUNCTION {_COUNTERS_RECOUNT_FUNCTION}(p_username TEXT DEFAULT NULL)
+RETURNS TABLE (username TEXT, active_sessions BIGINT, day_octets BIGINT)
+LANGUAGE plpgsql
+STABLE
+AS $fn$
+#variable_conflict use_column
+BEGIN
+  RETURN QUERY
+    SELECT r.username::text,
+           COUNT(*) FILTER (WHERE r.acctstoptime IS NULL),
+           COALESCE(SUM(__OCTETS__) FILTER (
+             WHERE r.acctstarttime >= (NOW() AT TIME ZONE 'UTC')::date::timestamp AT TIME ZONE 'UTC'
+           ), 0)::bigint
+      FROM {radacct} r
+     WHERE (r.acctstoptime IS NULL
+            OR r.acctstarttime >= (NOW() AT TIME ZONE 'UTC')::date::timestamp AT TIME ZONE 'UTC')
+       AND r.username <> ''
+       AND (p_username IS NULL OR r.username = p_username)
+     GROUP BY r.username;
+END
+$fn$
+""".strip()
         return [
             SQLStatement(
-                title="Unblock user (vpn_user_blocklist)",
-                sql=f"DELETE FROM {self.schema.blocklist_table} WHERE username = %s;",
-                params=(username,),
+                title="Create per-user counters table",
+                sql=f"""
+CREATE TABLE IF NOT EXISTS {counters} (
+  username TEXT PRIMARY KEY,
+  active_sessions INTEGER NOT NULL DEFAULT 0,
+  usage_day DATE NOT NULL,
+  day_octets BIGINT NOT NULL DEFAULT 0,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+""".strip(),
+            ),
+            SQLStatement(
+                title="Create per-user counters functions",
+                sql=f"""
+DO $do$
+DECLARE
+  octets TEXT := 'COALESCE(__ROW__.acctinputoctets::bigint, 0) + COALESCE(__ROW__.acctoutputoctets::bigint, 0)';
+BEGIN
+  IF (
+    SELECT COUNT(*)
+      FROM pg_attribute
+     WHERE attrelid = to_regclass('{radacct}')
+       AND attname IN ('acctinputgigawords', 'acctoutputgigawords')
+       AND NOT attisdropped
+  ) = 2 THEN
+    octets := 'COALESCE(__ROW__.acctinputoctets::bigint + COALESCE(__ROW__.acctinputgigawords, 0)::bigint * 4294967296, 0)'
+           || ' + COALESCE(__ROW__.acctoutputoctets::bigint + COALESCE(__ROW__.acctoutputgigawords, 0)::bigint * 4294967296, 0)';
+  END IF;
+  EXECUTE replace(replace($src$
+{track_function}
+$src$, '__OLD_OCTETS__', replace(octets, '__ROW__', 'OLD')), '__NEW_OCTETS__', replace(octets, '__ROW__', 'NEW'));
+  EXECUTE replace($src$
+{recount_function}
+$src$, '__OCTETS__', replace(octets, '__ROW__', 'r'));
+END
+$do$;
+""".strip(),
             ),
             SQLStatement(
-                title="Remove group memberships (radusergroup)",
-                sql=f"DELETE FROM {self.schema.radusergroup_table} WHERE username = %s;",
-                params=(username,),
+                title="Create radacct open sessions and user/day indexes (small tables only)",
+                sql=f"""
+DO $do$
+DECLARE
+  rel REGCLASS := to_regclass('{radacct}');
+BEGIN
+  IF rel IS NULL THEN
+    RETURN;
+  END IF;
+  IF (
+    SELECT COALESCE(SUM(GREATEST(c.reltuples, 0)), 0)
+      FROM pg_class c
+     WHERE c.oid = rel OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = rel)
+  ) < {_USAGE_INDEX_MAX_ROWS} THEN
+    EXECUTE 'CREATE INDEX IF NOT EXISTS {_ident_tail(open_index)} ON {radacct} (username, nasipaddress) WHERE acctstoptime IS NULL';
+    EXECUTE 'CREATE INDEX IF NOT EXISTS {_ident_tail(user_day_index)} ON {radacct} (username, acctstarttime)';
+  ELSIF to_regclass('{open_index}') IS NULL OR to_regclass('{user_day_index}') IS NULL THEN
+    RAISE NOTICE 'user counters: {radacct} lacks the open sessions / user-day indexes; build them off-peak with: tuxedo doctor indexes --apply';
+  END IF;
+END
+$do$;
+""".strip(),
             ),
             SQLStatement(
-                title="Remove user credentials (radcheck)",
-                sql=f"DELETE FROM {self.schema.radcheck_table} WHERE username = %s;",
-                params=(username,),
+                title="Create radacct counters trigger and seed the counters",
+                sql=f"""
+DO $do$
+BEGIN
+  IF to_regclass('{radacct}') IS NULL THEN
+    RAISE NOTICE 'user counters: {radacct} does not exist; run tuxedo migrate again once it does';
+    RETURN;
+  END IF;
+  DROP TRIGGER IF EXISTS {_COUNTERS_TRIGGER} ON {radacct};
+  CREATE TRIGGER {_COUNTERS_TRIGGER}
+    AFTER INSERT OR UPDATE OR DELETE ON {radacct}
+    FOR EACH ROW EXECUTE FUNCTION {_COUNTERS_TRACK_FUNCTION}();
+  -- Recount under the trigger's lock: nothing written to radacct before this point is missed.
+  TRUNCATE {counters};
+  INSERT INTO {counters} (username, active_sessions, usage_day, day_octets)
+  SELECT username, active_sessions, (NOW() AT TIME ZONE 'UTC')::date, day_octets
+    FROM {_COUNTERS_RECOUNT_FUNCTION}();
+END
+$do$;
+""".strip(),
             ),
         ]
 
+    def preflight_users_directory(self) -> list[SQLStatement]:
+        return [self._catalog["preflight_users_directory"].bind(table=self.schema.users_table)]
+
+    def _users_source(self, *, use_directory: bool, indent: str) -> str:
+        if use_directory:
+            return self.schema.users_table
+        pad = " " * len(indent)
+        return f"""(
+{pad}  SELECT DISTINCT username FROM {self.schema.radcheck_table}
+{pad}  UNION
+{pad}  SELECT DISTINCT username FROM {self.schema.radusergroup_table}
+{pad}  UNION
+{pad}  SELECT DISTINCT username FROM {self.schema.blocklist_table}
+{pad})"""
+
+    def preflight_user_has_password(self, username: str) -> list[SQLStatement]:
+        return [self._catalog["preflight_user_has_password"].bind(username=username)]
+
+    def ensure_user_has_any_group(self, username: str, *, groupname: str, priority: int) -> list[SQLStatement]:
+        return [
+            self._catalog["ensure_user_has_any_group"].bind(username=username, groupname=groupname, priority=int(priority))
+        ]
+
+    def create_user(self, username: str, password: str) -> list[SQLStatement]:
+        return [self._catalog["create_user"].bind(username=username, password=password)]
+
+    def delete_user(self, username: str) -> list[SQLStatement]:
+        return [
+            self._catalog["delete_user_blocks"].bind(username=username),
+            self._catalog["delete_user_memberships"].bind(username=username),
+            self._catalog["delete_user_credentials"].bind(username=username),
+        ]
+
     def change_user(self, username: str, *, password: str | None) -> list[SQLStatement]:
         if password is None:
             raise ValueError("change user: --password is required for now")
         return self.create_user(username=username, password=password)
 
     def create_group(self, groupname: str, *, description: str | None) -> list[SQLStatement]:
-        return [
-            SQLStatement(
-                title="Create group (vpn_groups)",
-                sql=f"""
-INSERT INTO {self.schema.groups_table} (name, description)
-VALUES (%s, %s)
-ON CONFLICT (name) DO UPDATE
-  SET description = EXCLUDED.description;
-""".strip(),
-                params=(groupname, description),
-            )
-        ]
+        return [self._catalog["create_group"].bind(groupname=groupname, description=description)]
 
     def delete_group(
         self,
@@ -200,50 +971,10 @@ ON CONFLICT (name) DO UPDATE
             raise ValueError("delete group: reassign_orphans_to must differ from the deleted group")
         target_priority = int(self.schema.default_group_priority if reassign_priority is None else reassign_priority)
         return [
-            SQLStatement(
-                title="Delete group memberships and reassign orphans (radusergroup)",
-                sql=f"""
-WITH removed AS (
-  DELETE FROM {self.schema.radusergroup_table}
-   WHERE groupname = %s::text
-  RETURNING username
-),
-affected AS (
-  SELECT DISTINCT username FROM removed
-),
-orphans AS (
-  SELECT a.username
-    FROM affected a
-   WHERE NOT EXISTS (
-     SELECT 1
-       FROM {self.schema.radusergroup_table} ug
-      WHERE ug.username = a.username
-   )
-),
-inserted AS (
-  INSERT INTO {self.schema.radusergroup_table} (username, groupname, priority)
-  SELECT o.username, %s::text, %s::int
-    FROM orphans o
-   WHERE NOT EXISTS (
-     SELECT 1
-       FROM {self.schema.radusergroup_table} ug
-      WHERE ug.username = o.username
-        AND ug.groupname = %s::text
-   )
-  RETURNING 1
-)
-SELECT
-  (SELECT COUNT(*) FROM removed) AS removed_rows,
-  (SELECT COUNT(*) FROM affected) AS affected_users,
-  (SELECT COUNT(*) FROM inserted) AS reassigned_users;
-""".strip(),
-                params=(groupname, target_group, target_priority, target_group),
-            ),
-            SQLStatement(
-                title="Delete group (vpn_groups)",
-                sql=f"DELETE FROM {self.schema.groups_table} WHERE name = %s;",
-                params=(groupname,),
+            self._catalog["delete_group_memberships"].bind(
+                groupname=groupname, target_group=target_group, target_priority=target_priority
             ),
+            self._catalog["delete_group"].bind(groupname=groupname),
         ]
 
     def change_group(
@@ -260,66 +991,22 @@ SELECT
         if rename_to is not None:
             statements.extend(
                 [
-                    SQLStatement(
-                        title="Rename group memberships (radusergroup)",
-                        sql=f"UPDATE {self.schema.radusergroup_table} SET groupname = %s WHERE groupname = %s;",
-                        params=(rename_to, groupname),
-                    ),
-                    SQLStatement(
-                        title="Rename group (vpn_groups)",
-                        sql=f"UPDATE {self.schema.groups_table} SET name = %s WHERE name = %s;",
-                        params=(rename_to, groupname),
-                    ),
+                    self._catalog["rename_group_memberships"].bind(rename_to=rename_to, groupname=groupname),
+                    self._catalog["rename_group"].bind(rename_to=rename_to, groupname=groupname),
                 ]
             )
 
         if description is not None:
             target_name = rename_to or groupname
             statements.append(
-                SQLStatement(
-                    title="Update group description (vpn_groups)",
-                    sql=f"UPDATE {self.schema.groups_table} SET description = %s WHERE name = %s;",
-                    params=(description, target_name),
-                )
+                self._catalog["update_group_description"].bind(description=description, groupname=target_name)
             )
 
         return statements
 
     def add_user_to_group(self, username: str, groupname: str, *, priority: int) -> list[SQLStatement]:
         return [
-            SQLStatement(
-                title="Upsert group membership (radusergroup)",
-                sql=f"""
-WITH desired AS (
-  SELECT %s::text AS username, %s::text AS groupname, %s::int AS priority
-),
-updated AS (
-  UPDATE {self.schema.radusergroup_table}
-     SET priority = (SELECT priority FROM desired)
-   WHERE username = (SELECT username FROM desired)
-     AND groupname = (SELECT groupname FROM desired)
-     AND priority IS DISTINCT FROM (SELECT priority FROM desired)
-  RETURNING 1
-),
-inserted AS (
-  INSERT INTO {self.schema.radusergroup_table} (username, groupname, priority)
-  SELECT (SELECT username FROM desired), (SELECT groupname FROM desired), (SELECT priority FROM desired)
-   WHERE NOT EXISTS (
-     SELECT 1
-       FROM {self.schema.radusergroup_table}
-      WHERE username = (SELECT username FROM desired)
-        AND groupname = (SELECT groupname FROM desired)
-   )
-  RETURNING 1
-)
-SELECT
-  CASE
-    WHEN EXISTS (SELECT 1 FROM updated) OR EXISTS (SELECT 1 FROM inserted) THEN 1
-    ELSE 0
-  END AS changed;
-""".strip(),
-                params=(username, groupname, int(priority)),
-            ),
+            self._catalog["add_user_to_group"].bind(username=username, groupname=groupname, priority=int(priority))
         ]
 
     def remove_user_from_group(
@@ -335,118 +1022,1671 @@ SELECT
             raise ValueError("remove: ensure_groupname is empty")
         target_priority = int(self.schema.default_group_priority if ensure_priority is None else ensure_priority)
         return [
-            SQLStatement(
-                title="Remove group membership and prevent orphans (radusergroup)",
-                sql=f"""
-WITH removed AS (
-  DELETE FROM {self.schema.radusergroup_table}
-   WHERE username = %s::text
-     AND groupname = %s::text
-  RETURNING username
-),
-orphans AS (
-  SELECT DISTINCT r.username
-    FROM removed r
-   WHERE NOT EXISTS (
-     SELECT 1
-       FROM {self.schema.radusergroup_table} ug
-      WHERE ug.username = r.username
-   )
-),
-inserted AS (
-  INSERT INTO {self.schema.radusergroup_table} (username, groupname, priority)
-  SELECT o.username, %s::text, %s::int
-    FROM orphans o
-   WHERE NOT EXISTS (
-     SELECT 1
-       FROM {self.schema.radusergroup_table} ug
-      WHERE ug.username = o.username
-        AND ug.groupname = %s::text
-   )
-  RETURNING 1
-)
-SELECT
-  (SELECT COUNT(*) FROM removed) AS removed_rows,
-  (SELECT COUNT(*) FROM inserted) AS inserted_fallback;
-""".strip(),
-                params=(
-                    username,
-                    groupname,
-                    target_group,
-                    target_priority,
-                    target_group,
-                ),
+            self._catalog["remove_user_from_group"].bind(
+                username=username,
+                groupname=groupname,
+                target_group=target_group,
+                target_priority=target_priority,
             )
         ]
 
-    def preview_delete_group(self, groupname: str) -> list[SQLStatement]:
-        return [
-            SQLStatement(
-                title="Delete group impact (members/orphans)",
-                sql=f"""
-WITH members AS (
-  SELECT DISTINCT username
-    FROM {self.schema.radusergroup_table}
-   WHERE groupname = %s::text
-),
-counts AS (
-  SELECT m.username, COUNT(DISTINCT ug.groupname) AS groups_total
-    FROM members m
-    JOIN {self.schema.radusergroup_table} ug
-      ON ug.username = m.username
-   GROUP BY m.username
+    def import_users(
+        self,
+        copy_source: Any,
+        *,
+        ensure_groupname: str | None = None,
+        ensure_priority: int | None = None,
+    ) -> list[SQLStatement]:
+        """
+        Bulk import: stream rows into a temp staging table via COPY, then merge set-based.
+
+        `copy_source` yields rows in `bulk.IMPORT_COLUMNS` order (COPY text format).
+        Each merge statement returns one row: (table_name, inserted, updated, unchanged).
+        Rows may omit the password only for users that already have one: the import fails otherwise.
+        Re-importing the same input changes nothing (timed blocks included).
+        """
+        target_group = (ensure_groupname or self.schema.default_group_name or "").strip()
+        if not target_group:
+            raise ValueError("import: ensure_groupname is empty")
+        target_priority = int(self.schema.default_group_priority if ensure_priority is None else ensure_priority)
+        stage = _IMPORT_STAGE_TABLE
+        # DO blocks take no parameters; the attribute names are constants.
+        password_attributes = ", ".join(f"'{a}'" for a in PASSWORD_ATTRIBUTES)
+        return [
+            SQLStatement(
+                title="Create import staging table",
+                sql=f"""
+CREATE TEMP TABLE {stage} (
+  seq BIGSERIAL,
+  username TEXT NOT NULL,
+  password TEXT,
+  groupname TEXT,
+  priority INT,
+  blocked BOOLEAN NOT NULL DEFAULT FALSE,
+  block_reason TEXT,
+  block_seconds BIGINT
+) ON COMMIT DROP;
+""".strip(),
+            ),
+            SQLStatement(
+                title="Stream input into staging table (COPY)",
+                sql=(
+                    f"COPY {stage} (username, password, groupname, priority, blocked, block_reason, block_seconds) "
+                    "FROM STDIN;"
+                ),
+                copy_source=copy_source,
+            ),
+            SQLStatement(
+                title="Analyze staging table",
+                sql=f"ANALYZE {stage};",
+            ),
+            SQLStatement(
+                title="Check every imported user has a password",
+                sql=f"""
+DO $do$
+DECLARE
+  missing TEXT;
+BEGIN
+  SELECT string_agg(quote_literal(username), ', ' ORDER BY username)
+    INTO missing
+    FROM (
+      SELECT DISTINCT s.username
+        FROM {stage} s
+       WHERE NOT EXISTS (
+         SELECT 1 FROM {stage} p WHERE p.username = s.username AND p.password IS NOT NULL
+       )
+         AND NOT EXISTS (
+         SELECT 1
+           FROM {self.schema.radcheck_table} rc
+          WHERE rc.username = s.username
+            AND rc.op = ':='
+            AND rc.attribute IN ({password_attributes})
+       )
+       ORDER BY s.username
+       LIMIT 10
+    ) m;
+  IF missing IS NOT NULL THEN
+    RAISE EXCEPTION 'import: no password for new user(s) %', missing
+      USING HINT = 'give a password for users that do not exist yet';
+  END IF;
+END
+$do$;
+""".strip(),
+            ),
+            SQLStatement(
+                title="Merge user passwords (radcheck)",
+                sql=f"""
+WITH desired AS (
+  SELECT DISTINCT ON (username) username, password
+    FROM {stage}
+   WHERE password IS NOT NULL
+   ORDER BY username, seq DESC
+),
+updated AS (
+  UPDATE {self.schema.radcheck_table} rc
+     SET value = d.password
+    FROM desired d
+   WHERE rc.username = d.username
+     AND rc.attribute = 'Cleartext-Password'
+     AND rc.op = ':='
+     AND rc.value IS DISTINCT FROM d.password
+  RETURNING rc.username
+),
+inserted AS (
+  INSERT INTO {self.schema.radcheck_table} (username, attribute, op, value)
+  SELECT d.username, 'Cleartext-Password', ':=', d.password
+    FROM desired d
+   WHERE NOT EXISTS (
+     SELECT 1
+       FROM {self.schema.radcheck_table} rc
+      WHERE rc.username = d.username
+        AND rc.attribute = 'Cleartext-Password'
+        AND rc.op = ':='
+   )
+  RETURNING username
 )
 SELECT
-  (SELECT COUNT(*) FROM members) AS members_total,
-  (SELECT COUNT(*) FROM counts WHERE groups_total <= 1) AS would_be_orphans;
+  'radcheck'::text AS table_name,
+  (SELECT COUNT(*) FROM inserted) AS inserted,
+  (SELECT COUNT(DISTINCT username) FROM updated) AS updated,
+  (SELECT COUNT(*) FROM desired)
+    - (SELECT COUNT(*) FROM inserted)
+    - (SELECT COUNT(DISTINCT username) FROM updated) AS unchanged;
 """.strip(),
-                params=(groupname,),
-            )
+            ),
+            SQLStatement(
+                title="Merge groups (vpn_groups)",
+                sql=f"""
+WITH desired AS (
+  SELECT groupname
+    FROM {stage}
+   WHERE groupname IS NOT NULL
+  UNION
+  -- The default group, for users imported without groups (like `create group` would add it).
+  SELECT %s::text
+   WHERE EXISTS (SELECT 1 FROM {stage} WHERE groupname IS NULL)
+),
+inserted AS (
+  INSERT INTO {self.schema.groups_table} (name)
+  SELECT groupname FROM desired
+  ON CONFLICT (name) DO NOTHING
+  RETURNING 1
+)
+SELECT
+  'vpn_groups'::text AS table_name,
+  (SELECT COUNT(*) FROM inserted) AS inserted,
+  0::bigint AS updated,
+  (SELECT COUNT(*) FROM desired) - (SELECT COUNT(*) FROM inserted) AS unchanged;
+""".strip(),
+                params=(target_group,),
+            ),
+            SQLStatement(
+                title="Merge group memberships and prevent orphans (radusergroup)",
+                sql=f"""
+WITH staged AS (
+  SELECT DISTINCT ON (username, groupname) username, groupname, priority
+    FROM {stage}
+   WHERE groupname IS NOT NULL
+   ORDER BY username, groupname, seq DESC
+),
+fallback AS (
+  SELECT DISTINCT s.username, %s::text AS groupname, %s::int AS priority
+    FROM {stage} s
+   WHERE NOT EXISTS (
+     SELECT 1
+       FROM {stage} g
+      WHERE g.username = s.username
+        AND g.groupname IS NOT NULL
+   )
+     AND NOT EXISTS (
+     SELECT 1
+       FROM {self.schema.radusergroup_table} ug
+      WHERE ug.username = s.username
+   )
+),
+desired AS (
+  SELECT username, groupname, priority FROM staged
+  UNION ALL
+  SELECT username, groupname, priority FROM fallback
+),
+updated AS (
+  UPDATE {self.schema.radusergroup_table} ug
+     SET priority = d.priority
+    FROM desired d
+   WHERE ug.username = d.username
+     AND ug.groupname = d.groupname
+     AND ug.priority IS DISTINCT FROM d.priority
+  RETURNING ug.username, ug.groupname
+),
+inserted AS (
+  INSERT INTO {self.schema.radusergroup_table} (username, groupname, priority)
+  SELECT d.username, d.groupname, d.priority
+    FROM desired d
+   WHERE NOT EXISTS (
+     SELECT 1
+       FROM {self.schema.radusergroup_table} ug
+      WHERE ug.username = d.username
+        AND ug.groupname = d.groupname
+   )
+  RETURNING 1
+),
+updated_pairs AS (
+  SELECT DISTINCT username, groupname FROM updated
+)
+SELECT
+  'radusergroup'::text AS table_name,
+  (SELECT COUNT(*) FROM inserted) AS inserted,
+  (SELECT COUNT(*) FROM updated_pairs) AS updated,
+  (SELECT COUNT(*) FROM desired)
+    - (SELECT COUNT(*) FROM inserted)
+    - (SELECT COUNT(*) FROM updated_pairs) AS unchanged;
+""".strip(),
+                params=(target_group, target_priority),
+            ),
+            SQLStatement(
+                title="Merge user blocks (vpn_user_blocklist)",
+                sql=f"""
+WITH desired AS (
+  SELECT DISTINCT ON (username)
+         username,
+         block_reason AS reason,
+         CASE
+           WHEN block_seconds IS NULL THEN NULL
+           ELSE NOW() + (block_seconds || ' seconds')::interval
+         END AS expires_at
+    FROM {stage}
+   WHERE blocked
+   ORDER BY username, seq DESC
+),
+upserted AS (
+  INSERT INTO {self.schema.blocklist_table} AS b (username, reason, created_at, expires_at)
+  SELECT username, reason, NOW(), expires_at FROM desired
+  ON CONFLICT (username) DO UPDATE
+    SET reason = EXCLUDED.reason,
+        created_at = EXCLUDED.created_at,
+        expires_at = EXCLUDED.expires_at
+  WHERE b.reason IS DISTINCT FROM EXCLUDED.reason
+     OR (b.expires_at IS NULL) <> (EXCLUDED.expires_at IS NULL)
+     OR b.expires_at <= NOW()
+     -- Same rule as apply: an unchanged duration leaves a live block alone, so re-importing is a no-op.
+     OR b.expires_at - b.created_at <> EXCLUDED.expires_at - EXCLUDED.created_at
+  RETURNING (xmax = 0) AS is_insert
+)
+SELECT
+  'vpn_user_blocklist'::text AS table_name,
+  (SELECT COUNT(*) FROM upserted WHERE is_insert) AS inserted,
+  (SELECT COUNT(*) FROM upserted WHERE NOT is_insert) AS updated,
+  (SELECT COUNT(*) FROM desired) - (SELECT COUNT(*) FROM upserted) AS unchanged;
+""".strip(),
+            ),
+        ]
+
+    def apply_state(
+        self,
+        copy_source: Any,
+        *,
+        ensure_groupname: str | None = None,
+        ensure_priority: int | None = None,
+        prune_users: bool = False,
+        prune_groups: bool = False,
+    ) -> list[SQLStatement]:
+        """
+        Declarative reconcile: COPY the desired state into temp tables, then diff and apply set-based.
+
+        `copy_source` yields rows in `state.STATE_COLUMNS` order. Only rows that differ are written.
+        Users not in the state are left alone unless `prune_users`; groups not in the state (and their
+        memberships) are left alone unless `prune_groups`. Users that lose their last membership are
+        reassigned to `ensure_groupname`, like `delete_group` / `remove_user_from_group` do.
+        Each diff statement returns rows of (table_name, inserted, updated, deleted).
+        """
+        target_group = (ensure_groupname or self.schema.default_group_name or "").strip()
+        if not target_group:
+            raise ValueError("apply: ensure_groupname is empty")
+        target_priority = int(self.schema.default_group_priority if ensure_priority is None else ensure_priority)
+        stage = _APPLY_STAGE_TABLE
+        users = _APPLY_USERS_TABLE
+        members = _APPLY_MEMBERS_TABLE
+        groups = _APPLY_GROUPS_TABLE
+        touched = _APPLY_TOUCHED_TABLE
+        rc = self.schema.radcheck_table
+        ug = self.schema.radusergroup_table
+        statements = [
+            SQLStatement(
+                title="Create apply staging table",
+                sql=f"""
+CREATE TEMP TABLE {stage} (
+  kind TEXT NOT NULL,
+  username TEXT,
+  groupname TEXT,
+  priority INT,
+  attribute TEXT,
+  value TEXT,
+  description TEXT,
+  manage_description BOOLEAN,
+  manage_groups BOOLEAN,
+  manage_block BOOLEAN,
+  blocked BOOLEAN,
+  block_reason TEXT,
+  block_seconds BIGINT
+) ON COMMIT DROP;
+""".strip(),
+            ),
+            SQLStatement(
+                title="Stream desired state into staging table (COPY)",
+                sql=(
+                    f"COPY {stage} (kind, username, groupname, priority, attribute, value, description, "
+                    "manage_description, manage_groups, manage_block, blocked, block_reason, block_seconds) "
+                    "FROM STDIN;"
+                ),
+                copy_source=copy_source,
+            ),
+            SQLStatement(
+                title="Build desired users",
+                sql=f"""
+CREATE TEMP TABLE {users} ON COMMIT DROP AS
+SELECT username, attribute, value, manage_groups, manage_block, blocked, block_reason, block_seconds
+  FROM {stage}
+ WHERE kind = 'user';
+""".strip(),
+            ),
+            SQLStatement(title="Index desired users", sql=f"ALTER TABLE {users} ADD PRIMARY KEY (username);"),
+            SQLStatement(
+                title="Build desired memberships",
+                sql=f"""
+CREATE TEMP TABLE {members} ON COMMIT DROP AS
+SELECT username, groupname, priority
+  FROM {stage}
+ WHERE kind = 'member';
+""".strip(),
+            ),
+            SQLStatement(
+                title="Index desired memberships",
+                sql=f"ALTER TABLE {members} ADD PRIMARY KEY (username, groupname);",
+            ),
+            SQLStatement(
+                title="Build desired groups",
+                sql=f"""
+CREATE TEMP TABLE {groups} ON COMMIT DROP AS
+SELECT groupname AS name, description, manage_description
+  FROM {stage}
+ WHERE kind = 'group';
+""".strip(),
+            ),
+            SQLStatement(title="Index desired groups", sql=f"ALTER TABLE {groups} ADD PRIMARY KEY (name);"),
+            SQLStatement(
+                title="Create touched users table",
+                sql=f"CREATE TEMP TABLE {touched} (username TEXT PRIMARY KEY) ON COMMIT DROP;",
+            ),
+            SQLStatement(title="Analyze desired state", sql=f"ANALYZE {users}, {members}, {groups};"),
+            SQLStatement(
+                title="Reconcile passwords (radcheck)",
+                sql=f"""
+WITH desired AS (
+  SELECT username, attribute, value
+    FROM {users}
+   WHERE attribute IS NOT NULL
+),
+deleted AS (
+  DELETE FROM {rc} rc
+   USING desired d
+   WHERE rc.username = d.username
+     AND rc.op = ':='
+     AND rc.attribute = ANY(%s::text[])
+     AND rc.attribute <> d.attribute
+  RETURNING rc.username
+),
+updated AS (
+  UPDATE {rc} rc
+     SET value = d.value
+    FROM desired d
+   WHERE rc.username = d.username
+     AND rc.attribute = d.attribute
+     AND rc.op = ':='
+     AND rc.value IS DISTINCT FROM d.value
+  RETURNING rc.username
+),
+inserted AS (
+  INSERT INTO {rc} (username, attribute, op, value)
+  SELECT d.username, d.attribute, ':=', d.value
+    FROM desired d
+   WHERE NOT EXISTS (
+     SELECT 1
+       FROM {rc} rc
+      WHERE rc.username = d.username
+        AND rc.attribute = d.attribute
+        AND rc.op = ':='
+   )
+  RETURNING username
+)
+SELECT
+  'radcheck'::text AS table_name,
+  (SELECT COUNT(*) FROM inserted) AS inserted,
+  (SELECT COUNT(DISTINCT username) FROM updated) AS updated,
+  (SELECT COUNT(*) FROM deleted) AS deleted;
+""".strip(),
+                params=(list(PASSWORD_ATTRIBUTES),),
+            ),
         ]
 
+        if prune_users:
+            statements.append(
+                SQLStatement(
+                    title="Prune users not in the desired state (vpn_user_blocklist, radusergroup, radcheck)",
+                    sql=f"""
+WITH blocks AS (
+  DELETE FROM {self.schema.blocklist_table} b
+   WHERE NOT EXISTS (SELECT 1 FROM {users} d WHERE d.username = b.username)
+  RETURNING 1
+),
+memberships AS (
+  DELETE FROM {ug} ug
+   WHERE NOT EXISTS (SELECT 1 FROM {users} d WHERE d.username = ug.username)
+  RETURNING 1
+),
+credentials AS (
+  DELETE FROM {rc} rc
+   WHERE NOT EXISTS (SELECT 1 FROM {users} d WHERE d.username = rc.username)
+  RETURNING 1
+)
+SELECT 'vpn_user_blocklist'::text AS table_name, 0::bigint AS inserted, 0::bigint AS updated,
+       (SELECT COUNT(*) FROM blocks) AS deleted
+UNION ALL
+SELECT 'radusergroup'::text, 0::bigint, 0::bigint, (SELECT COUNT(*) FROM memberships)
+UNION ALL
+SELECT 'radcheck'::text, 0::bigint, 0::bigint, (SELECT COUNT(*) FROM credentials);
+""".strip(),
+                )
+            )
+
+        # The default group always counts as declared: pruning it would only strip memberships
+        # that the orphan reassignment below puts straight back.
+        prune_groups_sql = (
+            f"""
+      OR (ug.groupname <> %s AND NOT EXISTS (SELECT 1 FROM {groups} g WHERE g.name = ug.groupname))"""
+            if prune_groups
+            else ""
+        )
+        statements.extend(
+            [
+                SQLStatement(
+                    title="Reconcile groups (vpn_groups)",
+                    sql=f"""
+WITH inserted AS (
+  INSERT INTO {self.schema.groups_table} (name, description)
+  SELECT name, description FROM {groups}
+  ON CONFLICT (name) DO NOTHING
+  RETURNING 1
+),
+updated AS (
+  UPDATE {self.schema.groups_table} g
+     SET description = d.description
+    FROM {groups} d
+   WHERE g.name = d.name
+     AND d.manage_description
+     AND g.description IS DISTINCT FROM d.description
+  RETURNING 1
+)
+SELECT
+  'vpn_groups'::text AS table_name,
+  (SELECT COUNT(*) FROM inserted) AS inserted,
+  (SELECT COUNT(*) FROM updated) AS updated,
+  0::bigint AS deleted;
+""".strip(),
+                ),
+                SQLStatement(
+                    title="Reconcile group memberships (radusergroup)",
+                    sql=f"""
+WITH removed AS (
+  DELETE FROM {ug} ug
+   WHERE (
+         EXISTS (SELECT 1 FROM {users} u WHERE u.username = ug.username AND u.manage_groups)
+     AND NOT EXISTS (SELECT 1 FROM {members} m WHERE m.username = ug.username AND m.groupname = ug.groupname)
+   ){prune_groups_sql}
+  RETURNING ug.username
+),
+touched AS (
+  INSERT INTO {touched} (username)
+  SELECT DISTINCT username FROM removed
+  ON CONFLICT DO NOTHING
+),
+updated AS (
+  UPDATE {ug} ug
+     SET priority = m.priority
+    FROM {members} m
+   WHERE ug.username = m.username
+     AND ug.groupname = m.groupname
+     AND ug.priority IS DISTINCT FROM m.priority
+  RETURNING ug.username, ug.groupname
+),
+inserted AS (
+  INSERT INTO {ug} (username, groupname, priority)
+  SELECT m.username, m.groupname, m.priority
+    FROM {members} m
+   WHERE NOT EXISTS (
+     SELECT 1
+       FROM {ug} ug
+      WHERE ug.username = m.username
+        AND ug.groupname = m.groupname
+   )
+  RETURNING 1
+),
+updated_pairs AS (
+  SELECT DISTINCT username, groupname FROM updated
+)
+SELECT
+  'radusergroup'::text AS table_name,
+  (SELECT COUNT(*) FROM inserted) AS inserted,
+  (SELECT COUNT(*) FROM updated_pairs) AS updated,
+  (SELECT COUNT(*) FROM removed) AS deleted;
+""".strip(),
+                    params=(target_group,) if prune_groups else (),
+                ),
+                # A separate statement: sub-statements of one WITH share a snapshot, so the membership
+                # statement above cannot see which users its own DELETE left without a group.
+                SQLStatement(
+                    title="Reassign orphaned users to the default group (radusergroup)",
+                    sql=f"""
+WITH inserted AS (
+  INSERT INTO {ug} (username, groupname, priority)
+  SELECT t.username, %s::text, %s::int
+    FROM {touched} t
+   WHERE NOT EXISTS (
+     SELECT 1
+       FROM {ug} ug
+      WHERE ug.username = t.username
+   )
+  RETURNING 1
+)
+SELECT
+  'radusergroup'::text AS table_name,
+  (SELECT COUNT(*) FROM inserted) AS inserted,
+  0::bigint AS updated,
+  0::bigint AS deleted;
+""".strip(),
+                    params=(target_group, target_priority),
+                ),
+            ]
+        )
+
+        if prune_groups:
+            statements.append(
+                SQLStatement(
+                    title="Prune groups not in the desired state (vpn_groups)",
+                    sql=f"""
+WITH deleted AS (
+  DELETE FROM {self.schema.groups_table} g
+   WHERE g.name <> %s
+     AND NOT EXISTS (SELECT 1 FROM {groups} d WHERE d.name = g.name)
+  RETURNING 1
+)
+SELECT
+  'vpn_groups'::text AS table_name,
+  0::bigint AS inserted,
+  0::bigint AS updated,
+  (SELECT COUNT(*) FROM deleted) AS deleted;
+""".strip(),
+                    params=(target_group,),
+                )
+            )
+
+        statements.append(
+            SQLStatement(
+                title="Reconcile user blocks (vpn_user_blocklist)",
+                sql=f"""
+WITH desired AS (
+  SELECT username,
+         block_reason AS reason,
+         CASE
+           WHEN block_seconds IS NULL THEN NULL
+           ELSE NOW() + (block_seconds || ' seconds')::interval
+         END AS expires_at
+    FROM {users}
+   WHERE manage_block
+     AND blocked
+),
+unblocked AS (
+  DELETE FROM {self.schema.blocklist_table} b
+   USING {users} u
+   WHERE b.username = u.username
+     AND u.manage_block
+     AND NOT u.blocked
+  RETURNING 1
+),
+upserted AS (
+  INSERT INTO {self.schema.blocklist_table} AS b (username, reason, created_at, expires_at)
+  SELECT username, reason, NOW(), expires_at FROM desired
+  ON CONFLICT (username) DO UPDATE
+    SET reason = EXCLUDED.reason,
+        created_at = EXCLUDED.created_at,
+        expires_at = EXCLUDED.expires_at
+  WHERE b.reason IS DISTINCT FROM EXCLUDED.reason
+     OR (b.expires_at IS NULL) <> (EXCLUDED.expires_at IS NULL)
+     OR b.expires_at <= NOW()
+     -- A different duration restarts the block from now; the same one leaves a live block as it is,
+     -- so applying an unchanged file does not keep pushing the expiry out.
+     OR b.expires_at - b.created_at <> EXCLUDED.expires_at - EXCLUDED.created_at
+  RETURNING (xmax = 0) AS is_insert
+)
+SELECT
+  'vpn_user_blocklist'::text AS table_name,
+  (SELECT COUNT(*) FROM upserted WHERE is_insert) AS inserted,
+  (SELECT COUNT(*) FROM upserted WHERE NOT is_insert) AS updated,
+  (SELECT COUNT(*) FROM unblocked) AS deleted;
+""".strip(),
+            )
+        )
+        return statements
+
+    def preview_delete_group(self, groupname: str) -> list[SQLStatement]:
+        return [self._catalog["preview_delete_group"].bind(groupname=groupname)]
+
     def block_user(self, username: str, *, reason: str | None, duration: str | None) -> list[SQLStatement]:
+        seconds = _parse_duration_seconds(duration)
+        return [self._catalog["block_user"].bind(username=username, reason=reason, seconds=seconds)]
+
+    def unblock_user(self, username: str) -> list[SQLStatement]:
+        return [self._catalog["unblock_user"].bind(username=username)]
+
+    def block_users(
+        self,
+        *,
+        pattern: str | None = None,
+        usernames: list[str] | None = None,
+        reason: str | None,
+        duration: str | None,
+        use_directory: bool = False,
+    ) -> list[SQLStatement]:
+        """
+        Block many users in one set-based upsert: every known user matching `pattern` (ILIKE),
+        or every name in `usernames` (known or not, like `block_user`).
+        Returns one row: (inserted, updated).
+        """
         seconds = _parse_duration_seconds(duration)
         expires_at_expr = "NULL" if seconds is None else f"NOW() + ({seconds} || ' seconds')::interval"
+        if (pattern is None) == (usernames is None):
+            raise ValueError("block: give exactly one of pattern / usernames")
+        if pattern is not None:
+            if not pattern.strip("%_"):
+                raise ValueError(f"block: pattern {pattern!r} matches every user; refusing")
+            source = f"""SELECT username
+    FROM {self._users_source(use_directory=use_directory, indent="    ")} u
+   WHERE username ILIKE %s AND username <> ''"""
+            params: tuple[object, ...] = (pattern, reason)
+        else:
+            source = "SELECT DISTINCT username FROM unnest(%s::text[]) AS t(username) WHERE username <> ''"
+            params = (list(usernames or []), reason)
         return [
             SQLStatement(
-                title="Upsert user block (vpn_user_blocklist)",
+                title="Bulk upsert user blocks (vpn_user_blocklist)",
                 sql=f"""
-INSERT INTO {self.schema.blocklist_table} (username, reason, created_at, expires_at)
-VALUES (%s, %s, NOW(), {expires_at_expr})
-ON CONFLICT (username) DO UPDATE
-  SET reason = EXCLUDED.reason,
-      created_at = EXCLUDED.created_at,
-      expires_at = EXCLUDED.expires_at;
+WITH targets AS (
+  {source}
+),
+upserted AS (
+  INSERT INTO {self.schema.blocklist_table} (username, reason, created_at, expires_at)
+  SELECT username, %s, NOW(), {expires_at_expr}
+    FROM targets
+  ON CONFLICT (username) DO UPDATE
+    SET reason = EXCLUDED.reason,
+        created_at = EXCLUDED.created_at,
+        expires_at = EXCLUDED.expires_at
+  RETURNING (xmax = 0) AS inserted
+)
+SELECT COUNT(*) FILTER (WHERE inserted) AS inserted,
+       COUNT(*) FILTER (WHERE NOT inserted) AS updated
+  FROM upserted;
 """.strip(),
-                params=(username, reason),
+                params=params,
             )
         ]
 
-    def unblock_user(self, username: str) -> list[SQLStatement]:
+    def unblock_users(self, *, pattern: str | None = None, usernames: list[str] | None = None) -> list[SQLStatement]:
+        """Remove every block whose username matches `pattern` (ILIKE) or is listed in `usernames`."""
+        if (pattern is None) == (usernames is None):
+            raise ValueError("unblock: give exactly one of pattern / usernames")
+        if pattern is not None:
+            condition, params = "username ILIKE %s", (pattern,)
+        else:
+            condition, params = "username = ANY(%s::text[])", (list(usernames or []),)
         return [
             SQLStatement(
-                title="Delete user block (vpn_user_blocklist)",
-                sql=f"DELETE FROM {self.schema.blocklist_table} WHERE username = %s;",
-                params=(username,),
+                title="Bulk delete user blocks (vpn_user_blocklist)",
+                sql=f"DELETE FROM {self.schema.blocklist_table} WHERE {condition};",
+                params=params,
             )
         ]
 
-    def show_users(self) -> list[SQLStatement]:
+    def sweep_blocks(self, *, batch_size: int, older_than_seconds: int = 0, archive: bool = False) -> list[SQLStatement]:
+        """
+        One bounded sweep batch: remove (or move to the archive table) up to `batch_size` blocks that expired
+        more than `older_than_seconds` ago, oldest first.
+
+        `FOR UPDATE SKIP LOCKED` skips rows that a concurrent upsert (DPI blocker, `tuxedo block`) holds, so sweeping
+        never waits on, or blocks, the hot path. Run it repeatedly until it returns fewer than `batch_size` rows.
+        Returns one row: (deleted, archived).
+        """
+        if int(batch_size) < 1:
+            raise ValueError(f"Invalid batch size: {batch_size!r} (must be >= 1)")
+        if int(older_than_seconds) < 0:
+            raise ValueError(f"Invalid age: {older_than_seconds!r} (must be >= 0)")
+        blocklist = self.schema.blocklist_table
+        archive_cte = ""
+        archived_sql = "0"
+        if archive:
+            archive_cte = f""",
+archived AS (
+  INSERT INTO {self.schema.blocklist_archive_table} (username, reason, created_at, expires_at)
+  SELECT username, reason, created_at, expires_at FROM deleted
+  RETURNING 1
+)"""
+            archived_sql = "(SELECT COUNT(*) FROM archived)"
+        return [
+            SQLStatement(
+                title=f"Sweep expired blocks ({'archive' if archive else 'delete'}, batch)",
+                sql=f"""
+WITH expired AS (
+  SELECT username
+    FROM {blocklist}
+   WHERE expires_at IS NOT NULL
+     AND expires_at <= NOW() - (%s * INTERVAL '1 second')
+   ORDER BY expires_at
+   LIMIT %s
+   FOR UPDATE SKIP LOCKED
+),
+deleted AS (
+  DELETE FROM {blocklist} b
+   USING expired e
+   WHERE b.username = e.username
+  RETURNING b.username, b.reason, b.created_at, b.expires_at
+){archive_cte}
+SELECT (SELECT COUNT(*) FROM deleted) AS deleted,
+       {archived_sql} AS archived;
+""".strip(),
+                params=(int(older_than_seconds), int(batch_size)),
+            )
+        ]
+
+    def radacct_relkind(self) -> list[SQLStatement]:
+        """One row: `p` once radacct is partitioned, `r` while it is a plain table, NULL if it does not exist."""
+        return [self._catalog["radacct_relkind"].bind(table=self.schema.radacct_table)]
+
+    def radacct_status(self) -> list[SQLStatement]:
+        return [self._catalog["radacct_status"].bind(table=self.schema.radacct_table)]
+
+    def radacct_partition_prepare(
+        self, *, legacy_start: datetime.date, boundary: datetime.date, lock_timeout_ms: int
+    ) -> list[SQLStatement]:
+        """
+        Steps before `radacct_partition_switch`, each run in its own transaction (`run_autocommit`); none of them
+        blocks accounting writes for longer than `lock_timeout_ms`.
+
+        - Rows without `acctstarttime` get one derived from the stop or update time: range partitions cannot hold NULL keys.
+        - Unique indexes that include the partition key are built `CONCURRENTLY`. The switch attaches them instead of building them under lock.
+        - A partial index over open sessions keeps "active sessions" lookups cheap across partitions.
+        - Rows from before `legacy_start` move, one month per transaction, into standalone `<radacct>_pYYYYMM`
+          tables with the same indexes and a range constraint; the switch attaches them without a scan.
+          They are out of radacct until then.
+        - `CHECK (legacy_start <= acctstarttime < boundary)` is added `NOT VALID` and then validated without
+          blocking writes. ATTACH PARTITION then trusts it instead of scanning the table under an exclusive lock.
+        """
+        radacct = self.schema.radacct_table
+        tail = _ident_tail(radacct)
+        start = _month_boundary_literal(legacy_start)
+        bound = _month_boundary_literal(boundary)
+        part_prefix = _qualified_like(radacct, f"{tail}_p")
+        counters = self.schema.counters_table
+        return [
+            SQLStatement(
+                title="Backfill missing acctstarttime (radacct)",
+                sql=f"""
+UPDATE {radacct}
+   SET acctstarttime = COALESCE(acctstoptime - COALESCE(acctsessiontime, 0) * INTERVAL '1 second', acctupdatetime, NOW())
+ WHERE acctstarttime IS NULL;
+""".strip(),
+            ),
+            SQLStatement(
+                title="Build unique (radacctid, acctstarttime) index concurrently",
+                sql=f"CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {tail}_id_start_key ON {radacct} (radacctid, acctstarttime);",
+            ),
+            SQLStatement(
+                title="Build unique (acctuniqueid, acctstarttime) index concurrently",
+                sql=(
+                    f"CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {tail}_uniqueid_start_key "
+                    f"ON {radacct} (acctuniqueid, acctstarttime);"
+                ),
+            ),
+            SQLStatement(
+                title="Build open sessions index concurrently",
+                sql=f"""
+CREATE INDEX CONCURRENTLY IF NOT EXISTS {tail}_open_sessions_idx
+  ON {radacct} (username, nasipaddress)
+  WHERE acctstoptime IS NULL;
+""".strip(),
+            ),
+            SQLStatement(
+                title=f"Move rows from before {legacy_start.isoformat()} into monthly tables",
+                sql=f"""
+DO $do$
+DECLARE
+  m date;
+  part text;
+  lo timestamptz;
+  hi timestamptz;
+  r record;
+BEGIN
+  IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('{radacct}')) IS DISTINCT FROM 'r' THEN
+    RETURN;
+  END IF;
+  LOOP
+    PERFORM set_config('lock_timeout', '{int(lock_timeout_ms)}', true);
+    SELECT date_trunc('month', MIN(acctstarttime) AT TIME ZONE 'UTC')::date INTO m
+      FROM {radacct}
+     WHERE acctstarttime < '{start}';
+    EXIT WHEN m IS NULL;
+    part := '{part_prefix}' || to_char(m, 'YYYYMM');
+    lo := m::timestamp AT TIME ZONE 'UTC';
+    hi := (m + INTERVAL '1 month') AT TIME ZONE 'UTC';
+    IF to_regclass(part) IS NULL THEN
+      EXECUTE 'CREATE TABLE ' || part || ' (LIKE {radacct} INCLUDING DEFAULTS INCLUDING STORAGE)';
+      -- The range the switch attaches it for, so ATTACH PARTITION needs no scan.
+      EXECUTE 'ALTER TABLE ' || part || ' ADD CONSTRAINT ' || quote_ident('{tail}_p' || to_char(m, 'YYYYMM') || '_range')
+           || ' CHECK (acctstarttime IS NOT NULL AND acctstarttime >= ' || quote_literal(lo)
+           || ' AND acctstarttime < ' || quote_literal(hi) || ')';
+      -- The indexes the switch gives the parent, so ATTACH PARTITION adopts them instead of building them under lock.
+      FOR r IN
+        SELECT pg_get_indexdef(i.indexrelid) AS def
+          FROM pg_index i
+         WHERE i.indrelid = '{radacct}'::regclass
+           AND i.indisvalid
+           AND (
+             NOT i.indisunique
+             OR (SELECT attnum FROM pg_attribute WHERE attrelid = i.indrelid AND attname = 'acctstarttime') = ANY (i.indkey::int2[])
+           )
+      LOOP
+        EXECUTE regexp_replace(r.def, ' INDEX \\S+ ON \\S+ ', ' INDEX ON ' || part || ' ');
+      END LOOP;
+    END IF;
+    IF to_regclass('{counters}') IS NULL THEN
+      EXECUTE 'WITH moved AS (DELETE FROM {radacct} WHERE acctstarttime >= $1 AND acctstarttime < $2 RETURNING *) '
+           || 'INSERT INTO ' || part || ' SELECT * FROM moved'
+        USING lo, hi;
+    ELSE
+      -- The delete trigger releases the sessions still open in the moved rows; they stay open in the new table.
+      EXECUTE 'WITH moved AS (DELETE FROM {radacct} WHERE acctstarttime >= $1 AND acctstarttime < $2 RETURNING *), '
+           || 'copied AS (INSERT INTO ' || part || ' SELECT * FROM moved) '
+           || 'UPDATE {counters} c SET active_sessions = c.active_sessions + o.open_sessions, updated_at = NOW() '
+           || 'FROM (SELECT username, COUNT(*) AS open_sessions FROM moved '
+           || 'WHERE acctstoptime IS NULL AND username <> '''' GROUP BY username) o '
+           || 'WHERE c.username = o.username'
+        USING lo, hi;
+    END IF;
+    COMMIT;
+  END LOOP;
+END
+$do$;
+""".strip(),
+            ),
+            SQLStatement(
+                title=(
+                    f"Add partition range constraint ({legacy_start.isoformat()} <= acctstarttime < "
+                    f"{boundary.isoformat()}, not validated)"
+                ),
+                sql=f"""
+DO $do$
+BEGIN
+  PERFORM set_config('lock_timeout', '{int(lock_timeout_ms)}', true);
+  ALTER TABLE {radacct} DROP CONSTRAINT IF EXISTS {tail}_partition_range;
+  ALTER TABLE {radacct} ADD CONSTRAINT {tail}_partition_range
+    CHECK (acctstarttime IS NOT NULL AND acctstarttime >= '{start}' AND acctstarttime < '{bound}') NOT VALID;
+END
+$do$;
+""".strip(),
+            ),
+            SQLStatement(
+                title="Validate partition range constraint (does not block writes)",
+                sql=f"ALTER TABLE {radacct} VALIDATE CONSTRAINT {tail}_partition_range;",
+            ),
+        ]
+
+    def radacct_partition_switch(
+        self, *, legacy_start: datetime.date, boundary: datetime.date, lock_timeout_ms: int
+    ) -> list[SQLStatement]:
+        """
+        Swap radacct for a table partitioned by month on `acctstarttime`, in one short transaction.
+
+        The old table is renamed to `<radacct>_legacy` and attached as the partition from `legacy_start` to
+        `boundary`; the monthly tables `radacct_partition_prepare` moved the older rows into are attached
+        next to it. Nothing is copied, and the validated range constraints mean no scan either. Indexes
+        already built are reused. Serial sequences, views, triggers and grants move to the new
+        parent. A DEFAULT partition catches rows no monthly partition covers.
+
+        Uniqueness needs the partition key: the parent gets `(radacctid, acctstarttime)` and
+        `(acctuniqueid, acctstarttime)` unique indexes in place of the old single-column keys.
+        """
+        radacct = self.schema.radacct_table
+        tail = _ident_tail(radacct)
+        legacy = _qualified_like(radacct, f"{tail}_legacy")
+        default = _qualified_like(radacct, f"{tail}_default")
+        start = _month_boundary_literal(legacy_start)
+        bound = _month_boundary_literal(boundary)
+        return [
+            SQLStatement(
+                title=(
+                    f"Switch radacct to monthly partitions "
+                    f"(legacy data from {legacy_start.isoformat()} to {boundary.isoformat()})"
+                ),
+                sql=f"""
+DO $do$
+DECLARE
+  r record;
+BEGIN
+  IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('{radacct}')) = 'p' THEN
+    RAISE NOTICE '{radacct} is already partitioned';
+    RETURN;
+  END IF;
+  IF NOT EXISTS (
+    SELECT 1
+      FROM pg_constraint
+     WHERE conrelid = to_regclass('{radacct}')
+       AND conname = '{tail}_partition_range'
+       AND convalidated
+  ) THEN
+    RAISE EXCEPTION '{radacct}: validated constraint {tail}_partition_range is missing (run the preparation steps first)';
+  END IF;
+
+  PERFORM set_config('lock_timeout', '{int(lock_timeout_ms)}', true);
+  LOCK TABLE {radacct} IN ACCESS EXCLUSIVE MODE;
+  ALTER TABLE {radacct} RENAME TO {tail}_legacy;
+  CREATE TABLE {radacct} (LIKE {legacy} INCLUDING DEFAULTS INCLUDING STORAGE INCLUDING COMMENTS)
+    PARTITION BY RANGE (acctstarttime);
+  EXECUTE 'ALTER TABLE {radacct} OWNER TO '
+    || quote_ident((SELECT pg_get_userbyid(relowner) FROM pg_class WHERE oid = '{legacy}'::regclass));
+
+  -- Serial sequences follow their column, so dropping the legacy partition later never drops them.
+  FOR r IN
+    SELECT d.objid::regclass::text AS seq, a.attname
+      FROM pg_depend d
+      JOIN pg_class s ON s.oid = d.objid AND s.relkind = 'S'
+      JOIN pg_attribute a ON a.attrelid = d.refobjid AND a.attnum = d.refobjsubid
+     WHERE d.classid = 'pg_class'::regclass
+       AND d.refobjid = '{legacy}'::regclass
+       AND d.deptype = 'a'
+  LOOP
+    EXECUTE 'ALTER SEQUENCE ' || r.seq || ' OWNED BY {radacct}.' || quote_ident(r.attname);
+  END LOOP;
+
+  -- Same indexes on the parent; ATTACH below adopts the matching ones that already exist on the legacy table.
+  FOR r IN
+    SELECT c.relname, pg_get_indexdef(i.indexrelid) AS def
+      FROM pg_index i
+      JOIN pg_class c ON c.oid = i.indexrelid
+     WHERE i.indrelid = '{legacy}'::regclass
+       AND i.indisvalid
+       AND (
+         NOT i.indisunique
+         OR (SELECT attnum FROM pg_attribute WHERE attrelid = i.indrelid AND attname = 'acctstarttime') = ANY (i.indkey::int2[])
+       )
+  LOOP
+    EXECUTE regexp_replace(r.def, ' INDEX \\S+ ON \\S+ ', ' INDEX ' || quote_ident(r.relname || '_p') || ' ON {radacct} ');
+  END LOOP;
+
+  ALTER TABLE {radacct} ATTACH PARTITION {legacy} FOR VALUES FROM ('{start}') TO ('{bound}');
+  ALTER TABLE {legacy} DROP CONSTRAINT {tail}_partition_range;
+
+  -- The months moved out during the preparation; their range constraints make ATTACH scan-free.
+  FOR r IN
+    SELECT c.oid::regclass::text AS part, con.conname, to_date(substr(c.relname, length('{tail}_p') + 1), 'YYYYMM') AS m
+      FROM pg_class c
+      JOIN pg_constraint con ON con.conrelid = c.oid AND con.conname = c.relname || '_range' AND con.convalidated
+     WHERE c.relnamespace = (SELECT relnamespace FROM pg_class WHERE oid = '{radacct}'::regclass)
+       AND c.relkind = 'r'
+       AND NOT c.relispartition
+       AND c.relname ~ '^{tail}_p[0-9]{{6}}$'
+     ORDER BY c.relname
+  LOOP
+    EXECUTE 'ALTER TABLE {radacct} ATTACH PARTITION ' || r.part
+         || ' FOR VALUES FROM (' || quote_literal(r.m::timestamp AT TIME ZONE 'UTC')
+         || ') TO (' || quote_literal((r.m + INTERVAL '1 month') AT TIME ZONE 'UTC') || ')';
+    EXECUTE 'ALTER TABLE ' || r.part || ' DROP CONSTRAINT ' || quote_ident(r.conname);
+  END LOOP;
+  CREATE TABLE {default} PARTITION OF {radacct} DEFAULT;
+
+  -- Views bind to the table, not its name: re-point them at the parent.
+  FOR r IN
+    SELECT DISTINCT v.oid::regclass::text AS view, pg_get_viewdef(v.oid) AS def
+      FROM pg_depend d
+      JOIN pg_rewrite w ON w.oid = d.objid
+      JOIN pg_class v ON v.oid = w.ev_class
+     WHERE d.classid = 'pg_rewrite'::regclass
+       AND d.refobjid = '{legacy}'::regclass
+       AND v.relkind = 'v'
+  LOOP
+    EXECUTE 'CREATE OR REPLACE VIEW ' || r.view || ' AS ' || replace(r.def, '{tail}_legacy', '{tail}');
+  END LOOP;
+
+  -- Triggers on a partitioned table are cloned to every partition (the legacy one included).
+  FOR r IN
+    SELECT t.tgname, pg_get_triggerdef(t.oid) AS def
+      FROM pg_trigger t
+     WHERE t.tgrelid = '{legacy}'::regclass
+       AND NOT t.tgisinternal
+  LOOP
+    EXECUTE 'DROP TRIGGER ' || quote_ident(r.tgname) || ' ON {legacy}';
+    EXECUTE regexp_replace(r.def, ' ON \\S+ ', ' ON {radacct} ');
+  END LOOP;
+
+  FOR r IN
+    SELECT a.grantee, a.privilege_type
+      FROM pg_class c, aclexplode(c.relacl) a
+     WHERE c.oid = '{legacy}'::regclass
+  LOOP
+    EXECUTE 'GRANT ' || r.privilege_type || ' ON {radacct} TO '
+      || CASE WHEN r.grantee = 0 THEN 'PUBLIC' ELSE quote_ident(pg_get_userbyid(r.grantee)) END;
+  END LOOP;
+END
+$do$;
+""".strip(),
+            )
+        ]
+
+    def radacct_ensure_partitions(self, *, months_ahead: int, lock_timeout_ms: int) -> list[SQLStatement]:
+        """
+        Create the monthly partitions (`<radacct>_pYYYYMM`, UTC months) from the current month to `months_ahead`
+        months ahead. Rows that already landed in the DEFAULT partition for such a month move into it.
+        The legacy partition already covers the month of the migration and the next one, so those two are
+        skipped. Idempotent: safe to run from a timer.
+        """
+        if int(months_ahead) < 0:
+            raise ValueError(f"Invalid months ahead: {months_ahead!r} (must be >= 0)")
+        radacct = self.schema.radacct_table
+        part_prefix = _qualified_like(radacct, f"{_ident_tail(radacct)}_p")
+        default = _qualified_like(radacct, f"{_ident_tail(radacct)}_default")
+        return [
+            SQLStatement(
+                title=f"Ensure monthly radacct partitions ({int(months_ahead)} months ahead)",
+                sql=f"""
+DO $do$
+DECLARE
+  m date;
+  part text;
+  lo timestamptz;
+  hi timestamptz;
+BEGIN
+  IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('{radacct}')) IS DISTINCT FROM 'p' THEN
+    RAISE EXCEPTION '{radacct} is not partitioned yet (run: tuxedo radacct partition-migrate)';
+  END IF;
+  PERFORM set_config('lock_timeout', '{int(lock_timeout_ms)}', true);
+  FOR m IN
+    SELECT generate_series(
+             date_trunc('month', NOW() AT TIME ZONE 'UTC'),
+             date_trunc('month', NOW() AT TIME ZONE 'UTC') + {int(months_ahead)} * INTERVAL '1 month',
+             INTERVAL '1 month'
+           )::date
+  LOOP
+    part := '{part_prefix}' || to_char(m, 'YYYYMM');
+    CONTINUE WHEN to_regclass(part) IS NOT NULL;
+    lo := m::timestamp AT TIME ZONE 'UTC';
+    hi := (m + INTERVAL '1 month') AT TIME ZONE 'UTC';
+    BEGIN
+      EXECUTE 'CREATE TABLE ' || part || ' (LIKE {radacct} INCLUDING DEFAULTS INCLUDING STORAGE)';
+      EXECUTE 'WITH moved AS (DELETE FROM {default} WHERE acctstarttime >= $1 AND acctstarttime < $2 RETURNING *) '
+           || 'INSERT INTO ' || part || ' SELECT * FROM moved'
+        USING lo, hi;
+      EXECUTE 'ALTER TABLE {radacct} ATTACH PARTITION ' || part
+           || ' FOR VALUES FROM (' || quote_literal(lo) || ') TO (' || quote_literal(hi) || ')';
+    EXCEPTION WHEN invalid_object_definition THEN
+      -- Overlaps an existing partition (the legacy one, for the two months it covers).
+      NULL;
+    END;
+  END LOOP;
+END
+$do$;
+""".strip(),
+            )
+        ]
+
+    def radacct_archive_candidates(self, *, older_than_seconds: int) -> list[SQLStatement]:
+        """Partitions whose whole range ended more than `older_than_seconds` ago (never DEFAULT or the parent)."""
+        if int(older_than_seconds) < 0:
+            raise ValueError(f"Invalid age: {older_than_seconds!r} (must be >= 0)")
+        return [
+            self._catalog["radacct_archive_candidates"].bind(
+                table=self.schema.radacct_table, seconds=int(older_than_seconds)
+            )
+        ]
+
+    def radacct_export_partition(self, partition: str, *, fmt: str, target: Any) -> list[SQLStatement]:
+        """
+        Count a partition's rows and stream them to `target` with `COPY ... TO STDOUT`, in one snapshot.
+
+        `ndjson` is one `row_to_json` object per line: CSV mode with control-character quote/delimiter passes
+        the JSON text through byte for byte. `csv` is the table as RFC 4180 CSV with a header.
+        """
+        _check_partition_name(partition)
+        if fmt not in RADACCT_ARCHIVE_FORMATS:
+            raise ValueError(f"Unsupported archive format: {fmt!r} (use {'/'.join(RADACCT_ARCHIVE_FORMATS)})")
+        if fmt == "ndjson":
+            copy_sql = (
+                f"COPY (SELECT row_to_json(r)::text FROM {partition} r) TO STDOUT "
+                "WITH (FORMAT csv, QUOTE E'\\x01', DELIMITER E'\\x02');"
+            )
+        else:
+            copy_sql = f"COPY {partition} TO STDOUT WITH (FORMAT csv, HEADER);"
+        return [
+            SQLStatement(
+                title="Snapshot for the export",
+                sql="SET TRANSACTION ISOLATION LEVEL REPEATABLE READ;",
+            ),
+            SQLStatement(title="No statement timeout for the export", sql="SET LOCAL statement_timeout = 0;"),
+            SQLStatement(title=f"Count rows ({partition})", sql=f"SELECT COUNT(*) AS rows FROM {partition};"),
+            SQLStatement(title=f"Export {partition} ({fmt}, COPY)", sql=copy_sql, copy_target=target),
+        ]
+
+    def radacct_detach_partition(self, partition: str, *, drop: bool, lock_timeout_ms: int) -> list[SQLStatement]:
+        _check_partition_name(partition)
+        statements = [
+            SQLStatement(title="Lock timeout", sql=f"SET LOCAL lock_timeout = {int(lock_timeout_ms)};"),
+            SQLStatement(
+                title=f"Detach partition ({partition})",
+                sql=f"ALTER TABLE {self.schema.radacct_table} DETACH PARTITION {partition};",
+            ),
+        ]
+        # Detaching fires no row triggers: sessions left open in the partition stop counting here.
+        counters = self.schema.counters_table
+        statements.append(
+            SQLStatement(
+                title=f"Release open sessions from the user counters ({partition})",
+                sql=f"""
+DO $do$
+BEGIN
+  IF to_regclass('{counters}') IS NULL THEN
+    RETURN;
+  END IF;
+  UPDATE {counters} c
+     SET active_sessions = c.active_sessions - p.open_sessions,
+         updated_at = NOW()
+    FROM (
+      SELECT username, COUNT(*) AS open_sessions
+        FROM {partition}
+       WHERE acctstoptime IS NULL
+         AND username <> ''
+       GROUP BY username
+    ) p
+   WHERE c.username = p.username;
+END
+$do$;
+""".strip(),
+            )
+        )
+        if drop:
+            statements.append(SQLStatement(title=f"Drop partition ({partition})", sql=f"DROP TABLE {partition};"))
+        return statements
+
+    def usage_refresh(self) -> list[SQLStatement]:
+        """Fold radacct changes since the last refresh into the usage rollup (see `_migrate_usage_rollup`)."""
+        return [
+            # The first refresh reads the whole accounting history.
+            SQLStatement(title="No statement timeout for the refresh", sql="SET LOCAL statement_timeout = 0;"),
+            SQLStatement(
+                title="Refresh usage rollup", sql=f"SELECT * FROM {self.schema.usage_refresh_function}();"
+            ),
+        ]
+
+    def usage_report(
+        self,
+        *,
+        username: str | None = None,
+        since: datetime.date | None = None,
+        by: str | None = None,
+    ) -> list[SQLStatement]:
+        """
+        Traffic per user from the usage rollup, optionally split `by` NAS or day.
+
+        All-time totals come from `<prefix>_totals` (one row per user and NAS); `since` (a UTC day, inclusive)
+        or `by="day"` sum `<prefix>_daily` instead.
+        """
+        if by is not None and by not in USAGE_GROUPINGS:
+            raise ValueError(f"Unsupported usage breakdown: {by!r} (use {'/'.join(USAGE_GROUPINGS)})")
+        use_daily = since is not None or by == "day"
+        table = self.schema.usage_table("daily" if use_daily else "totals")
+        keys = ["username"]
+        if by == "nas":
+            keys.append("nasipaddress")
+        elif by == "day":
+            keys.append("usage_day")
+        conditions: list[str] = []
+        params: list[object] = []
+        if username is not None:
+            conditions.append("username = %s")
+            params.append(username)
+        if since is not None:
+            conditions.append("usage_day >= %s::date")
+            params.append(since)
+        where = ("\nWHERE " + "\n  AND ".join(conditions)) if conditions else ""
+        key_sql = ", ".join(keys)
+        return [
+            SQLStatement(
+                title="Usage",
+                sql=f"""
+SELECT
+  {key_sql},
+  SUM(input_octets)::bigint AS input_octets,
+  SUM(output_octets)::bigint AS output_octets,
+  SUM(input_octets + output_octets)::bigint AS total_octets,
+  SUM(session_seconds)::bigint AS session_seconds,
+  SUM(sessions)::bigint AS sessions,
+  MAX(last_seen_at) AS last_seen_at
+FROM {table}{where}
+GROUP BY {key_sql}
+ORDER BY {key_sql};
+""".strip(),
+                params=tuple(params),
+            )
+        ]
+
+    def counters_verify(self, *, username: str | None = None, fix: bool = False) -> list[SQLStatement]:
+        """
+        Users whose per-user counters differ from a full recount over radacct (stored vs. recounted values).
+
+        Both sides are read in one snapshot, so a mismatch is real drift, not a write in flight. With `fix`,
+        the counters table is locked against the trigger's upserts first and the drifting rows are rewritten
+        with the recounted values; radacct writes wait for that transaction.
+        """
+        counters = self.schema.counters_table
+        params: tuple[object, ...] = ()
+        stored_where = ""
+        recount_arg = ""
+        if username is not None:
+            stored_where = "\n       WHERE username = %s"
+            recount_arg = "%s"
+            params = (username, username)
+        drift = f"""
+drift AS (
+  SELECT COALESCE(s.username, r.username) AS username,
+         COALESCE(s.active_sessions, 0) AS active_sessions,
+         COALESCE(r.active_sessions, 0) AS active_sessions_recount,
+         COALESCE(s.day_octets, 0) AS day_octets,
+         COALESCE(r.day_octets, 0) AS day_octets_recount
+    FROM (
+      SELECT username,
+             active_sessions::bigint AS active_sessions,
+             CASE WHEN usage_day = (NOW() AT TIME ZONE 'UTC')::date THEN day_octets ELSE 0 END AS day_octets
+        FROM {counters}{stored_where}
+    ) s
+    FULL JOIN {_COUNTERS_RECOUNT_FUNCTION}({recount_arg}) r USING (username)
+   WHERE COALESCE(s.active_sessions, 0) <> COALESCE(r.active_sessions, 0)
+      OR COALESCE(s.day_octets, 0) <> COALESCE(r.day_octets, 0)
+)""".strip()
+        if not fix:
+            return [
+                SQLStatement(
+                    title="Counters drift",
+                    sql=f"WITH {drift}\nSELECT * FROM drift ORDER BY username;",
+                    params=params,
+                )
+            ]
+        return [
+            # The recount runs over every open session and today's rows.
+            SQLStatement(title="No statement timeout for the recount", sql="SET LOCAL statement_timeout = 0;"),
+            SQLStatement(
+                title="Lock counters against concurrent accounting updates",
+                sql=f"LOCK TABLE {counters} IN SHARE ROW EXCLUSIVE MODE;",
+            ),
+            SQLStatement(
+                title="Fix counters drift",
+                sql=f"""
+WITH {drift},
+fixed AS (
+  INSERT INTO {counters} AS c (username, active_sessions, usage_day, day_octets, updated_at)
+  SELECT username, active_sessions_recount, (NOW() AT TIME ZONE 'UTC')::date, day_octets_recount, NOW()
+    FROM drift
+  ON CONFLICT (username) DO UPDATE
+     SET active_sessions = EXCLUDED.active_sessions,
+         usage_day = EXCLUDED.usage_day,
+         day_octets = EXCLUDED.day_octets,
+         updated_at = EXCLUDED.updated_at
+)
+SELECT * FROM drift ORDER BY username;
+""".strip(),
+                params=params,
+            ),
+        ]
+
+    def recommended_indexes(self) -> list[IndexAdvice]:
+        """Indexes behind the per-request lookups of FreeRADIUS, the policy, the DPI blocker, pihole sync and the exporters."""
+        s = self.schema
+        return [
+            IndexAdvice(
+                s.radcheck_table,
+                "username_attribute_op_idx",
+                ("username", "attribute", "op"),
+                # The stock FreeRADIUS (username, attribute) index is enough: op only filters one user's rows.
+                match_columns=2,
+                used_by="FreeRADIUS authorize, password checks",
+            ),
+            IndexAdvice(
+                s.radusergroup_table,
+                "username_idx",
+                ("username",),
+                used_by="FreeRADIUS group membership, pihole sync",
+            ),
+            IndexAdvice(s.radusergroup_table, "groupname_idx", ("groupname",), used_by="find group, delete group"),
+            IndexAdvice(
+                s.radacct_table,
+                "open_sessions_idx",
+                ("username", "nasipaddress"),
+                where="acctstoptime IS NULL",
+                match_columns=1,
+                used_by="Simultaneous-Use (policy, sqlcounter), counters recount",
+            ),
+            IndexAdvice(
+                s.radacct_table,
+                "framedip_open_idx",
+                ("framedipaddress",),
+                where="acctstoptime IS NULL",
+                used_by="DPI blocker (VPN IP -> user), pihole sync",
+            ),
+            IndexAdvice(
+                s.radacct_table,
+                "user_start_idx",
+                ("username", "acctstarttime"),
+                used_by="daily quota (sqlcounter)",
+            ),
+            IndexAdvice(
+                s.radacct_table,
+                "acctupdatetime_idx",
+                ("acctupdatetime",),
+                used_by="usage refresh watermark (accounting exporter, timer)",
+            ),
+        ]
+
+    def doctor_table_sizes(self) -> list[SQLStatement]:
+        """Rows, table and index sizes and scan counts of the FreeRADIUS and tuxedo tables (partitions summed up)."""
+        s = self.schema
+        tables = (
+            s.radcheck_table,
+            s.radusergroup_table,
+            s.radacct_table,
+            s.blocklist_table,
+            s.groups_table,
+            s.users_table,
+            s.counters_table,
+        )
+        values = ",\n         ".join(f"('{table}')" for table in dict.fromkeys(tables))
+        return [
+            SQLStatement(
+                title="Table sizes",
+                sql=f"""
+SELECT t.name AS "table",
+       c.relkind = 'p' AS partitioned,
+       s.rows::bigint AS rows,
+       pg_size_pretty(s.table_bytes) AS table_size,
+       pg_size_pretty(s.index_bytes) AS index_size,
+       s.seq_scan::bigint AS seq_scan,
+       s.idx_scan::bigint AS idx_scan
+  FROM (
+  VALUES {values}
+  ) AS t (name)
+  JOIN pg_class c ON c.oid = to_regclass(t.name)
+ CROSS JOIN LATERAL (
+   SELECT SUM(GREATEST(p.reltuples, 0)) AS rows,
+          SUM(pg_table_size(p.oid)) AS table_bytes,
+          SUM(pg_indexes_size(p.oid)) AS index_bytes,
+          SUM(st.seq_scan) AS seq_scan,
+          SUM(st.idx_scan) AS idx_scan
+     FROM pg_class p
+     LEFT JOIN pg_stat_user_tables st ON st.relid = p.oid
+    WHERE p.oid = c.oid OR p.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = c.oid)
+ ) s
+ ORDER BY s.table_bytes DESC, t.name;
+""".strip(),
+            ),
+            SQLStatement(
+                title="Relation row estimates",
+                sql=f"""
+SELECT p.relname::text AS relation, GREATEST(p.reltuples, 0)::bigint AS rows
+  FROM (
+  VALUES {values}
+  ) AS t (name)
+  JOIN pg_class c ON c.oid = to_regclass(t.name)
+  JOIN pg_class p ON p.oid = c.oid OR p.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = c.oid);
+""".strip(),
+            ),
+        ]
+
+    def doctor_index_status(self) -> list[SQLStatement]:
+        """
+        One row per `recommended_indexes()` entry: `ok` (a valid covering index exists), `missing`, `invalid`
+        (only a failed `CREATE INDEX CONCURRENTLY` or a partitioned index not attached everywhere) or `no table`.
+        """
+        rows = []
+        for idx, advice in enumerate(self.recommended_indexes()):
+            match = ", ".join(f"'{col}'" for col in advice.columns[: advice.match_columns or None])
+            rows.append(
+                f"({idx}, '{advice.table}', '{advice.name}', '{advice.definition}', ARRAY[{match}]::text[], "
+                f"'{advice.where}', '{advice.used_by}')"
+            )
+        values = ",\n         ".join(rows)
+        return [
+            SQLStatement(
+                title="Recommended indexes",
+                sql=f"""
+SELECT w.name AS "index",
+       w.tbl AS "table",
+       w.definition,
+       CASE
+         WHEN to_regclass(w.tbl) IS NULL THEN 'no table'
+         WHEN x.indexrelid IS NULL THEN 'missing'
+         WHEN NOT x.indisvalid THEN 'invalid'
+         ELSE 'ok'
+       END AS status,
+       x.indexrelid::regclass::text AS existing_index,
+       (SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(w.tbl)) AS partitioned,
+       pg_size_pretty((
+         SELECT SUM(pg_relation_size(c.oid))
+           FROM pg_class c
+          WHERE c.oid = x.indexrelid OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = x.indexrelid)
+       )) AS index_size,
+       w.used_by
+  FROM (
+  VALUES {values}
+  ) AS w (ord, tbl, name, definition, cols, pred, used_by)
+  LEFT JOIN LATERAL (
+    SELECT i.indexrelid, i.indisvalid
+      FROM pg_index i
+     WHERE i.indrelid = to_regclass(w.tbl)
+       AND (i.indpred IS NULL OR pg_get_expr(i.indpred, i.indrelid) = '(' || w.pred || ')')
+       AND w.cols = ARRAY(
+             SELECT a.attname::text
+               FROM unnest(i.indkey::int2[]) WITH ORDINALITY AS k (attnum, ord)
+               JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+              WHERE k.ord <= LEAST(i.indnkeyatts, cardinality(w.cols))
+              ORDER BY k.ord
+           )
+     ORDER BY i.indisvalid DESC, i.indpred IS NOT NULL DESC, i.indexrelid
+     LIMIT 1
+  ) x ON TRUE
+ ORDER BY w.ord;
+""".strip(),
+            )
+        ]
+
+    def doctor_hot_queries(self, *, tables: Collection[str] | None = None) -> list[SQLStatement]:
+        """
+        The per-request lookups of FreeRADIUS (`sql` module queries, `policy.d/vpn`, sqlcounters), the DPI blocker,
+        pihole sync and the accounting exporter, plus the backend's own lookups, for `EXPLAIN`.
+
+        With `tables`, queries that read a table not in it are left out (EXPLAIN fails on a missing table).
+        """
+        s = self.schema
+        user = _DOCTOR_SAMPLE_USER
+        radacct = s.radacct_table
+        queries = [
+            (
+                (s.radcheck_table,),
+                SQLStatement(
+                    title="FreeRADIUS authorize check (radcheck by username)",
+                    sql=f"SELECT id, username, attribute, value, op FROM {s.radcheck_table} WHERE username = %s ORDER BY id;",
+                    params=(user,),
+                ),
+            ),
+            ((s.radcheck_table,), self.preflight_user_has_password(user)[0]),
+            (
+                (s.radusergroup_table,),
+                SQLStatement(
+                    title="FreeRADIUS group membership (radusergroup by username)",
+                    sql=f"SELECT groupname FROM {s.radusergroup_table} WHERE username = %s ORDER BY priority;",
+                    params=(user,),
+                ),
+            ),
+            ((s.radusergroup_table, s.groups_table), self.find_group(_DOCTOR_SAMPLE_GROUP)[0]),
+            ((s.radusergroup_table,), self.find_group(_DOCTOR_SAMPLE_GROUP)[1]),
+            (
+                (s.blocklist_table,),
+                SQLStatement(
+                    title="Blocklist check (policy)",
+                    sql=f"""
+SELECT reason, expires_at
+  FROM {s.blocklist_table}
+ WHERE username = %s
+   AND (expires_at IS NULL OR expires_at > NOW())
+ LIMIT 1;
+""".strip(),
+                    params=(user,),
+                ),
+            ),
+            (
+                (radacct,),
+                SQLStatement(
+                    title="Simultaneous-Use (policy, sqlcounter_max_sessions)",
+                    sql=f"SELECT COUNT(*) FROM {radacct} WHERE username = %s AND acctstoptime IS NULL;",
+                    params=(user,),
+                ),
+            ),
+            (
+                (radacct,),
+                SQLStatement(
+                    title="Daily quota (sqlcounter_daily_data)",
+                    sql=f"""
+SELECT COALESCE(SUM(acctinputoctets::bigint + acctoutputoctets::bigint), 0)::bigint
+  FROM {radacct}
+ WHERE username = %s
+   AND acctstarttime >= DATE_TRUNC('day', NOW());
+""".strip(),
+                    params=(user,),
+                ),
+            ),
+            (
+                (s.counters_table,),
+                SQLStatement(
+                    title="Per-user counters (policy, sqlcounters with counters enabled)",
+                    sql=f"SELECT active_sessions, day_octets FROM {s.counters_table} WHERE username = %s;",
+                    params=(user,),
+                ),
+            ),
+            (
+                (radacct,),
+                SQLStatement(
+                    title="Session by VPN IP (DPI blocker)",
+                    sql=f"""
+SELECT username
+  FROM {radacct}
+ WHERE acctstoptime IS NULL
+   AND framedipaddress = %s::inet
+ ORDER BY acctstarttime DESC
+ LIMIT 1;
+""".strip(),
+                    params=(_DOCTOR_SAMPLE_IP,),
+                ),
+            ),
+            (
+                (radacct,),
+                SQLStatement(
+                    title="Open sessions with a VPN IP (pihole sync)",
+                    sql=f"""
+SELECT username, framedipaddress
+  FROM {radacct}
+ WHERE acctstoptime IS NULL
+   AND username IS NOT NULL
+   AND framedipaddress IS NOT NULL;
+""".strip(),
+                ),
+            ),
+            (
+                (radacct,),
+                SQLStatement(
+                    title="Usage refresh watermark (accounting exporter)",
+                    sql=f"""
+SELECT radacctid
+  FROM {radacct}
+ WHERE acctupdatetime >= NOW() - INTERVAL '{_USAGE_REFRESH_OVERLAP}';
+""".strip(),
+                ),
+            ),
+        ]
+        return [stmt for needs, stmt in queries if tables is None or all(table in tables for table in needs)]
+
+    def doctor_partitions(self, table: str) -> list[SQLStatement]:
+        return [
+            SQLStatement(
+                title=f"Partitions ({table})",
+                sql="SELECT inhrelid::regclass::text AS partition FROM pg_inherits WHERE inhparent = to_regclass(%s) ORDER BY 1;",
+                params=(table,),
+            )
+        ]
+
+    def doctor_create_index(
+        self,
+        advice: IndexAdvice,
+        *,
+        partitions: Sequence[str] = (),
+        drop_invalid: str | None = None,
+        lock_timeout_ms: int,
+    ) -> list[SQLStatement]:
+        """
+        Build `advice` without blocking writes, one statement per transaction (`run_autocommit`).
+
+        A plain table gets `CREATE INDEX CONCURRENTLY`, after dropping the invalid leftover of an earlier
+        attempt (`drop_invalid`). A partitioned table cannot: its index is created `ON ONLY` the parent
+        (empty, invalid), then built concurrently on each partition and attached; the parent becomes valid
+        once every partition has one. Repeating the run finishes an interrupted build.
+        """
+        if drop_invalid is not None and not _is_safe_identifier(drop_invalid):
+            raise ValueError(f"Invalid index name: {drop_invalid!r}")
+        statements: list[SQLStatement] = []
+        where = f" WHERE {advice.where}" if advice.where else ""
+        columns = ", ".join(advice.columns)
+        if not partitions:
+            if drop_invalid is not None:
+                statements.append(
+                    SQLStatement(
+                        title=f"Drop invalid index {drop_invalid}",
+                        sql=f"DROP INDEX CONCURRENTLY IF EXISTS {drop_invalid};",
+                    )
+                )
+            statements.append(
+                SQLStatement(
+                    title=f"Build {advice.name} concurrently",
+                    sql=f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {advice.name} ON {advice.table} ({columns}){where};",
+                )
+            )
+            return statements
+        parent_index = _qualified_like(advice.table, advice.name)
+        statements.append(
+            SQLStatement(
+                title=f"Create {advice.name} on the parent only",
+                sql=f"""
+DO $do$
+BEGIN
+  PERFORM set_config('lock_timeout', '{int(lock_timeout_ms)}', true);
+  CREATE INDEX IF NOT EXISTS {advice.name} ON ONLY {advice.table} ({columns}){where};
+END
+$do$;
+""".strip(),
+            )
+        )
+        for partition in partitions:
+            _check_partition_name(partition)
+            child = f"{_ident_tail(partition)}_{advice.suffix}"
+            statements.append(
+                SQLStatement(
+                    title=f"Build {child} concurrently",
+                    sql=f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {child} ON {partition} ({columns}){where};",
+                )
+            )
+            statements.append(
+                SQLStatement(
+                    title=f"Attach {child} to {advice.name}",
+                    sql=f"""
+DO $do$
+BEGIN
+  PERFORM set_config('lock_timeout', '{int(lock_timeout_ms)}', true);
+  ALTER INDEX {parent_index} ATTACH PARTITION {_qualified_like(partition, child)};
+END
+$do$;
+""".strip(),
+                )
+            )
+        return statements
+
+    def show_users(
+        self,
+        *,
+        limit: int | None = None,
+        after: str | None = None,
+        use_directory: bool = False,
+    ) -> list[SQLStatement]:
+        page_sql, page_params = _keyset_page("username", limit=limit, after=after)
         return [
             SQLStatement(
                 title="List users",
                 sql=f"""
 SELECT username
-  FROM (
-    SELECT DISTINCT username FROM {self.schema.radcheck_table}
-    UNION
-    SELECT DISTINCT username FROM {self.schema.radusergroup_table}
-    UNION
-    SELECT DISTINCT username FROM {self.schema.blocklist_table}
-  ) u
- WHERE username IS NOT NULL AND username <> ''
- ORDER BY username;
+  FROM {self._users_source(use_directory=use_directory, indent="  ")} u
+ WHERE username IS NOT NULL AND username <> ''{page_sql.where}
+ ORDER BY username{page_sql.limit};
 """.strip(),
+                params=page_params,
             )
         ]
 
@@ -467,8 +2707,34 @@ SELECT groupname
             )
         ]
 
-    def show_blocks(self, *, all_blocks: bool) -> list[SQLStatement]:
-        where = "" if all_blocks else "WHERE expires_at IS NULL OR expires_at > NOW()"
+    def show_blocks(
+        self,
+        *,
+        all_blocks: bool,
+        limit: int | None = None,
+        after: str | None = None,
+    ) -> list[SQLStatement]:
+        _check_limit(limit)
+        conditions: list[str] = []
+        params: list[object] = []
+        if not all_blocks:
+            conditions.append("(expires_at IS NULL OR expires_at > NOW())")
+        if after is not None:
+            # Keyset over (created_at DESC, username): continue right after the given user's row.
+            conditions.append(
+                f"""EXISTS (
+    SELECT 1
+      FROM {self.schema.blocklist_table} ref
+     WHERE ref.username = %s
+       AND (b.created_at < ref.created_at OR (b.created_at = ref.created_at AND b.username > ref.username))
+  )"""
+            )
+            params.append(after)
+        where = ("WHERE " + "\n  AND ".join(conditions)) if conditions else ""
+        limit_sql = ""
+        if limit is not None:
+            limit_sql = "\nLIMIT %s"
+            params.append(int(limit))
         return [
             SQLStatement(
                 title="List blocks",
@@ -482,30 +2748,33 @@ SELECT
     WHEN expires_at IS NULL THEN NULL
     ELSE GREATEST(0, EXTRACT(EPOCH FROM (expires_at - NOW())))::bigint
   END AS expires_in_seconds
-FROM {self.schema.blocklist_table}
+FROM {self.schema.blocklist_table} b
 {where}
-ORDER BY created_at DESC, username;
+ORDER BY created_at DESC, username{limit_sql};
 """.strip(),
+                params=tuple(params),
             )
         ]
 
-    def find_user(self, username: str) -> list[SQLStatement]:
+    def find_user(
+        self,
+        username: str,
+        *,
+        limit: int | None = None,
+        after: str | None = None,
+        use_directory: bool = False,
+    ) -> list[SQLStatement]:
+        page_sql, page_params = _keyset_page("username", limit=limit, after=after, indent="  ")
         return [
             SQLStatement(
                 title="Users",
                 sql=f"""
 WITH matched AS (
   SELECT username
-    FROM (
-      SELECT DISTINCT username FROM {self.schema.radcheck_table}
-      UNION
-      SELECT DISTINCT username FROM {self.schema.radusergroup_table}
-      UNION
-      SELECT DISTINCT username FROM {self.schema.blocklist_table}
-    ) u
+    FROM {self._users_source(use_directory=use_directory, indent="    ")} u
    WHERE username IS NOT NULL
      AND username <> ''
-     AND username ILIKE %s
+     AND username ILIKE %s{page_sql.where}{page_sql.order_limit}
 )
 SELECT
   m.username,
@@ -536,31 +2805,12 @@ LEFT JOIN {self.schema.blocklist_table} b
 GROUP BY m.username, b.reason, b.created_at, b.expires_at
 ORDER BY m.username;
 """.strip(),
-                params=(username,),
+                params=(username, *page_params),
             ),
         ]
 
     def find_group(self, groupname: str) -> list[SQLStatement]:
         return [
-            SQLStatement(
-                title="Group summary",
-                sql=f"""
-SELECT
-  %s::text AS groupname,
-  (SELECT COUNT(*) FROM {self.schema.groups_table} WHERE name = %s) AS defined_in_vpn_groups,
-  (SELECT description FROM {self.schema.groups_table} WHERE name = %s) AS description,
-  (SELECT COUNT(*) FROM {self.schema.radusergroup_table} WHERE groupname = %s) AS members;
-""".strip(),
-                params=(groupname, groupname, groupname, groupname),
-            ),
-            SQLStatement(
-                title="Group members",
-                sql=f"""
-SELECT username, priority
-  FROM {self.schema.radusergroup_table}
- WHERE groupname = %s
- ORDER BY priority, username;
-""".strip(),
-                params=(groupname,),
-            ),
+            self._catalog["find_group_summary"].bind(groupname=groupname),
+            self._catalog["find_group_members"].bind(groupname=groupname),
         ]
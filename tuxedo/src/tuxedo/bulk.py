@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import contextlib
+import csv
+import json
+import sys
+from typing import Any, Iterable, Iterator, Mapping, Sequence, TextIO
+
+from .backends.freeradius import _parse_duration_seconds
+
+# Column order of the import staging table (see `FreeradiusBackend.import_users`).
+IMPORT_COLUMNS = ("username", "password", "groupname", "priority", "blocked", "block_reason", "block_seconds")
+
+INPUT_FORMATS = ("csv", "jsonl")
+
+
+def detect_format(path: str) -> str:
+    lowered = (path or "").lower()
+    if lowered.endswith((".jsonl", ".ndjson", ".json")):
+        return "jsonl"
+    return "csv"
+
+
+def _copy_text_value(value: Any) -> str:
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    text = str(value)
+    if "\\" in text:
+        text = text.replace("\\", "\\\\")
+    if "\t" in text or "\n" in text or "\r" in text:
+        text = text.replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+    return text
+
+
+class CopyTextStream:
+    """
+    File-like adapter that encodes rows into PostgreSQL `COPY ... FROM STDIN` text format on demand.
+
+    The driver calls `read(size)` in fixed-size chunks, so only one chunk of encoded rows is held in
+    memory at a time regardless of how many rows the underlying iterator produces.
+    """
+
+    def __init__(self, rows: Iterable[Sequence[Any]]):
+        self._rows = iter(rows)
+        self._buf = ""
+        self.rows_read = 0
+
+    def read(self, size: int = -1) -> str:
+        chunks = [self._buf]
+        length = len(self._buf)
+        while size < 0 or length < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            line = "\t".join(_copy_text_value(v) for v in row) + "\n"
+            chunks.append(line)
+            length += len(line)
+            self.rows_read += 1
+
+        data = "".join(chunks)
+        if size < 0 or len(data) <= size:
+            self._buf = ""
+            return data
+        self._buf = data[size:]
+        return data[:size]
+
+
+@contextlib.contextmanager
+def open_input(path: str, *, newline: str | None = None) -> Iterator[TextIO]:
+    if path in ("", "-"):
+        yield sys.stdin
+        return
+    with open(path, "r", encoding="utf-8", newline=newline) as fh:
+        yield fh
+
+
+def _parse_priority(value: Any, *, lineno: int) -> int | None:
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f"line {lineno}: invalid priority: {value!r}")
+    if isinstance(value, int):
+        return value
+    raw = str(value).strip()
+    if not raw:
+        return None
+    try:
+        return int(raw)
+    except ValueError as exc:
+        raise ValueError(f"line {lineno}: invalid priority: {value!r}") from exc
+
+
+def _parse_group_token(token: str, *, lineno: int) -> tuple[str, int | None]:
+    name, sep, prio = token.strip().partition(":")
+    name = name.strip()
+    if not name:
+        raise ValueError(f"line {lineno}: empty group name in {token!r}")
+    return name, (_parse_priority(prio, lineno=lineno) if sep else None)
+
+
+def _parse_groups(value: Any, *, lineno: int) -> list[tuple[str, int | None]]:
+    """
+    Accepted shapes:
+    - "admins:10;users" (CSV cell; `;`, `,` or whitespace separated, optional `:priority`);
+    - ["admins", "users:5", {"name": "ops", "priority": 1}] (JSON list);
+    - {"admins": 10, "users": null} (JSON object).
+    """
+    if value is None:
+        return []
+    if isinstance(value, str):
+        tokens = value.replace(",", ";").replace(" ", ";").split(";")
+        return [_parse_group_token(t, lineno=lineno) for t in tokens if t.strip()]
+    if isinstance(value, Mapping):
+        return [
+            (_parse_group_token(str(name), lineno=lineno)[0], _parse_priority(prio, lineno=lineno))
+            for name, prio in value.items()
+        ]
+    if isinstance(value, list):
+        groups: list[tuple[str, int | None]] = []
+        for item in value:
+            if isinstance(item, Mapping):
+                name = str(item.get("name") or "").strip()
+                if not name:
+                    raise ValueError(f"line {lineno}: group object without name: {item!r}")
+                groups.append((name, _parse_priority(item.get("priority"), lineno=lineno)))
+            else:
+                groups.append(_parse_group_token(str(item), lineno=lineno))
+        return groups
+    raise ValueError(f"line {lineno}: invalid groups value: {value!r}")
+
+
+def _parse_block(value: Any, duration: Any, *, lineno: int) -> tuple[bool, str | None, int | None]:
+    if isinstance(value, Mapping):
+        duration = value.get("for", duration)
+        value = value.get("reason") or "MANUAL"
+    if value is None or value is False or (isinstance(value, str) and not value.strip()):
+        if duration not in (None, ""):
+            raise ValueError(f"line {lineno}: block_for given without block")
+        return False, None, None
+    reason = "MANUAL" if value is True else str(value).strip()
+    try:
+        seconds = _parse_duration_seconds(None if duration is None else str(duration))
+    except ValueError as exc:
+        raise ValueError(f"line {lineno}: {exc}") from exc
+    return True, reason, seconds
+
+
+def _iter_csv_records(fh: TextIO) -> Iterator[tuple[int, Mapping[str, Any]]]:
+    reader = csv.DictReader(fh)
+    if reader.fieldnames is None:
+        return
+    fields = {f.strip().lower() for f in reader.fieldnames if f}
+    if "username" not in fields:
+        raise ValueError("CSV input must have a header row with at least a 'username' column")
+    for rec in reader:
+        normalized = {(k or "").strip().lower(): v for k, v in rec.items()}
+        yield reader.line_num, normalized
+
+
+def _iter_jsonl_records(fh: TextIO) -> Iterator[tuple[int, Mapping[str, Any]]]:
+    for lineno, line in enumerate(fh, start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            rec = json.loads(line)
+        except json.JSONDecodeError as exc:
+            raise ValueError(f"line {lineno}: invalid JSON: {exc.msg}") from exc
+        if not isinstance(rec, dict):
+            raise ValueError(f"line {lineno}: expected a JSON object")
+        yield lineno, rec
+
+
+def _stage_rows(rec: Mapping[str, Any], *, lineno: int) -> Iterator[tuple[Any, ...]]:
+    username = str(rec.get("username") or "").strip()
+    if not username:
+        raise ValueError(f"line {lineno}: username is empty")
+
+    password = rec.get("password")
+    if password is not None:
+        password = str(password)
+        if not password:
+            password = None
+
+    default_priority = _parse_priority(rec.get("priority"), lineno=lineno)
+    groups = _parse_groups(rec.get("groups"), lineno=lineno)
+    blocked, reason, seconds = _parse_block(
+        rec.get("block", rec.get("block_reason")),
+        rec.get("block_for"),
+        lineno=lineno,
+    )
+
+    if not groups:
+        yield (username, password, None, None, blocked, reason, seconds)
+        return
+    for groupname, priority in groups:
+        if priority is None:
+            priority = default_priority if default_priority is not None else 0
+        yield (username, password, groupname, priority, blocked, reason, seconds)
+
+
+def iter_import_rows(path: str, fmt: str) -> Iterator[tuple[Any, ...]]:
+    """
+    Lazily read users from CSV/JSONL and yield staging rows in `IMPORT_COLUMNS` order.
+
+    One input record becomes one row per group (or a single row with `groupname = NULL`).
+    The input file is opened on first read, so building the import program (`--sql`) never touches it.
+    """
+    if fmt not in INPUT_FORMATS:
+        raise ValueError(f"Unsupported input format: {fmt!r} (use {'/'.join(INPUT_FORMATS)})")
+
+    with open_input(path, newline="" if fmt == "csv" else None) as fh:
+        records = _iter_csv_records(fh) if fmt == "csv" else _iter_jsonl_records(fh)
+        for lineno, rec in records:
+            yield from _stage_rows(rec, lineno=lineno)
+
+
+def read_usernames(path: str) -> list[str]:
+    """One username per line (`-` = stdin); blank lines and `#` comments are skipped, duplicates dropped."""
+    seen: dict[str, None] = {}
+    with open_input(path) as fh:
+        for line in fh:
+            name = line.split("#", 1)[0].strip()
+            if name:
+                seen.setdefault(name, None)
+    return list(seen)
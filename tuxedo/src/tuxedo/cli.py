@@ -1,14 +1,22 @@
 from __future__ import annotations
 
 import argparse
-import getpass
-import json
+import os
 import sys
 
-from .backends import FreeradiusBackend
-from .config import load_config
-from .db import PostgresExecutor
-from .sql import render_program
+# Everything else is imported where it is used: a `tuxedo` run only loads the modules its subcommand needs
+# (`--sql` never imports the database driver, `--help` does not even read the config).
+# `tuxedo --startup-profile ...` shows the import-time breakdown (see `startup.py`).
+
+# Read commands whose (possibly huge) result is streamed through a server-side cursor.
+_STREAMING_ACTIONS = frozenset({"show_users", "show_blocks", "find_user", "usage_report"})
+# Read-only actions whose statements are independent of each other: with more than one statement
+# they run concurrently on separate pooled connections (see `AsyncPostgresExecutor`).
+_CONCURRENT_READ_ACTIONS = frozenset({"find_user", "find_group"})
+_STREAM_CHUNK_ROWS = 1000
+
+# users_table -> whether the `vpn_users` directory exists (checked once per process).
+_USERS_DIRECTORY_PRESENT: dict[str, bool] = {}
 
 
 def _to_ilike_pattern(query: str) -> str:
@@ -25,16 +33,8 @@ def _to_ilike_pattern(query: str) -> str:
     return raw + "%"
 
 
-def _print_find_users_text(results) -> None:
-    if not results:
-        sys.stdout.write("No users found.\n")
-        return
-
-    rows = results[0].rows or []
-    if not rows:
-        sys.stdout.write("No users found.\n")
-        return
-
+def _print_find_users_text(rows) -> None:
+    idx = -1
     for idx, row in enumerate(rows):
         username, password_set, groups, reason, created_at, expires_at, expires_in = row
         if idx:
@@ -49,6 +49,104 @@ def _print_find_users_text(results) -> None:
         expires_at_str = "permanent" if expires_at is None else str(expires_at)
         expires_in_str = "-" if expires_in is None else f"{int(expires_in)}s"
         sys.stdout.write(f"  block: reason={reason} expires_at={expires_at_str} expires_in={expires_in_str}\n")
+    if idx < 0:
+        sys.stdout.write("No users found.\n")
+
+
+def _import_summary(results) -> dict[str, dict[str, int]]:
+    summary: dict[str, dict[str, int]] = {}
+    for r in results:
+        if not r.rows or len(r.rows[0]) != 4:
+            continue
+        table_name, inserted, updated, unchanged = r.rows[0]
+        summary[str(table_name)] = {
+            "inserted": int(inserted or 0),
+            "updated": int(updated or 0),
+            "unchanged": int(unchanged or 0),
+        }
+    return summary
+
+
+def _print_import_summary_text(results) -> None:
+    staged = next((r.rowcount for r in results if r.title.endswith("(COPY)")), 0)
+    sys.stdout.write(f"staged rows: {staged}\n")
+    for table_name, counts in _import_summary(results).items():
+        sys.stdout.write(
+            f"{table_name}: inserted={counts['inserted']} updated={counts['updated']} unchanged={counts['unchanged']}\n"
+        )
+
+
+def _apply_summary(results) -> dict[str, dict[str, int]]:
+    """Per-table counts of an apply program (diff statements return (table_name, inserted, updated, deleted) rows)."""
+    summary: dict[str, dict[str, int]] = {}
+    for r in results:
+        for row in r.rows or []:
+            if len(row) != 4 or not isinstance(row[0], str):
+                continue
+            counts = summary.setdefault(row[0], {"inserted": 0, "updated": 0, "deleted": 0})
+            counts["inserted"] += int(row[1] or 0)
+            counts["updated"] += int(row[2] or 0)
+            counts["deleted"] += int(row[3] or 0)
+    return summary
+
+
+def _print_apply_summary_text(results, *, plan: bool) -> None:
+    staged = next((r.rowcount for r in results if r.title.endswith("(COPY)")), 0)
+    if plan:
+        sys.stdout.write("plan only: changes below were rolled back\n")
+    sys.stdout.write(f"staged rows: {staged}\n")
+    for table_name, counts in _apply_summary(results).items():
+        sys.stdout.write(
+            f"{table_name}: inserted={counts['inserted']} updated={counts['updated']} deleted={counts['deleted']}\n"
+        )
+
+
+def _print_usage_refresh_text(results) -> None:
+    r = results[-1]
+    refresh = dict(zip(r.columns or [], (r.rows or [()])[0]))
+    if refresh.get("skipped"):
+        sys.stdout.write("skipped: another usage refresh is running\n")
+        return
+    sys.stdout.write(f"rows read: {refresh['rows_read']}\n")
+    sys.stdout.write(f"sessions: changed={refresh['sessions_changed']} new={refresh['sessions_new']}\n")
+    sys.stdout.write(f"octets added: input={refresh['input_octets']} output={refresh['output_octets']}\n")
+    last_update = refresh["last_update"].isoformat() if refresh["last_update"] is not None else "-"
+    sys.stdout.write(f"watermark: radacctid={refresh['last_radacctid']} last_update={last_update}\n")
+
+
+def _find_user_patterns(args) -> list[str]:
+    patterns = list(args.name)
+    if args.from_file is not None:
+        from .bulk import read_usernames
+
+        if args.from_file != "-" and not os.path.exists(args.from_file):
+            raise FileNotFoundError(f"Input file not found: {args.from_file}")
+        patterns.extend(read_usernames(args.from_file))
+    if not patterns:
+        raise ValueError("find user: give at least one pattern (or --from-file)")
+    return list(dict.fromkeys(patterns))
+
+
+def _merge_find_user_results(results):
+    """One `Users` result from per-pattern results: pattern order, each user once (at its first match)."""
+    import dataclasses
+
+    seen: set = set()
+    rows = []
+    for r in results:
+        for row in r.rows or []:
+            if row[0] not in seen:
+                seen.add(row[0])
+                rows.append(row)
+    timed = [r.elapsed_ms for r in results if r.elapsed_ms is not None]
+    return dataclasses.replace(
+        results[0],
+        title="Users",
+        rowcount=len(rows),
+        rows=rows,
+        elapsed_ms=max(timed) if timed else None,
+        bytes_fetched=sum(r.bytes_fetched or 0 for r in results) if timed else None,
+    )
 
 
 def _first_row(results):
@@ -67,50 +165,157 @@ def _is_tty() -> bool:
         return False
 
 
-def _build_parser() -> argparse.ArgumentParser:
-    global_args = argparse.ArgumentParser(add_help=False)
-    global_args.add_argument("--config", help="Path to tuxedo.ini (optional).")
-    global_args.add_argument("--sql", action="store_true", help="Print SQL only (do not execute).")
-    global_args.add_argument(
+class _NonExitingArgumentParser(argparse.ArgumentParser):
+    """Parser for `tuxedo batch` lines and `tuxedo serve` requests: report errors as ValueError instead of exiting."""
+
+    def error(self, message: str):  # type: ignore[override]
+        raise ValueError(message)
+
+
+# Commands that always run in-process: they read stdin/files themselves, are the server, or are long
+# maintenance runs that would outlast the forwarding client's timeout.
+_LOCAL_ONLY_COMMANDS = frozenset(
+    {"serve", "batch", "import", "apply", "radacct", "doctor", "migrate", "counters", "blocks"}
+)
+_LOCAL_ONLY_SUBCOMMANDS = frozenset({("usage", "refresh")})
+# The server answers with one buffered JSON document; these formats stream rows as they arrive.
+_STREAMING_OUTPUTS = frozenset({"ndjson", "csv"})
+
+
+def _output_format(argv: list[str]) -> str | None:
+    for i, arg in enumerate(argv):
+        if arg == "--output" and i + 1 < len(argv):
+            return argv[i + 1]
+        if arg.startswith("--output="):
+            return arg.split("=", 1)[1]
+    return None
+
+
+def _config_from_env() -> bool:
+    # Any TUXEDO_* setting other than the socket itself (TUXEDO_CONFIG, TUXEDO_PG_DSN, ...) changes what the
+    # command would run against; the server only knows its own configuration.
+    return any(
+        name.startswith("TUXEDO_") and name != "TUXEDO_SOCKET" and value.strip() for name, value in os.environ.items()
+    )
+
+
+def _maybe_forward(argv: list[str]) -> int | None:
+    """
+    Thin-client mode: hand the command to a running `tuxedo serve` when its socket exists.
+
+    Returns the exit code, or None to run locally (no server, `--no-server`/`--config` or a `TUXEDO_*`
+    override given, a long or streaming command, the command needs an interactive prompt,
+    or the server could not be reached).
+    """
+    if "--no-server" in argv or any(a == "--config" or a.startswith("--config=") for a in argv):
+        return None
+    command = _command_name(argv)
+    if command is None or command in _LOCAL_ONLY_COMMANDS or "-h" in argv or "--help" in argv:
+        return None
+    if _output_format(argv) in _STREAMING_OUTPUTS or _config_from_env():
+        return None
+    from .client import default_socket_path, forward
+
+    socket_path = default_socket_path()
+    if not socket_path or not os.path.exists(socket_path):
+        return None
+    words = [a for a in argv[argv.index(command) :] if not a.startswith("-")]
+    if tuple(words[:2]) in _LOCAL_ONLY_SUBCOMMANDS:
+        return None
+    if words[:2] in (["create", "user"], ["change", "user"]) and not any(
+        a == "--password" or a.startswith("--password=") for a in argv
+    ):
+        return None
+    if words[:2] == ["delete", "group"] and _is_tty() and "--reassign-orphans-to" not in argv:
+        return None
+    if any(a == "--from-file" or a.startswith("--from-file=") for a in argv):
+        return None  # the file (or stdin) is only readable here
+
+    return forward(socket_path, argv)
+
+
+def _add_global_args(p: argparse.ArgumentParser, *, subcommand: bool) -> None:
+    """
+    Flags accepted both before and after the subcommand (`tuxedo --sql show users` == `tuxedo show users --sql`).
+
+    Subcommand copies use `argparse.SUPPRESS` defaults: argparse copies every attribute of the subcommand's
+    namespace over the top-level one, so real defaults there would silently reset flags given before the subcommand.
+    """
+
+    def default(value):
+        return argparse.SUPPRESS if subcommand else value
+
+    p.add_argument("--config", default=default(None), help="Path to tuxedo.ini (optional).")
+    p.add_argument("--sql", action="store_true", default=default(False), help="Print SQL only (do not execute).")
+    p.add_argument(
+        "--no-server",
+        action="store_true",
+        default=default(False),
+        help="Run in this process even if a `tuxedo serve` socket is available.",
+    )
+    p.add_argument(
         "--show-secrets",
         action="store_true",
+        default=default(False),
         help="Do not redact sensitive params (e.g., passwords) when printing SQL (--sql).",
     )
-    global_args.add_argument(
+    p.add_argument(
         "--output",
-        choices=["text", "json"],
-        default="text",
-        help="Output format for generated SQL / execution results.",
+        choices=["text", "json", "ndjson", "csv"],
+        default=default("text"),
+        help="Output format for generated SQL / execution results (ndjson/csv stream rows as they arrive).",
     )
+    p.add_argument(
+        "--timings",
+        action="store_true",
+        default=default(False),
+        help="Report server round-trip time, rows and bytes fetched per statement (text: on stderr).",
+    )
+    p.add_argument(
+        "--explain",
+        action="store_true",
+        default=default(False),
+        help="Run every statement under EXPLAIN (ANALYZE, BUFFERS) in a rolled-back transaction and print the plans.",
+    )
+
 
-    p = argparse.ArgumentParser(
-        prog="tuxedo",
-        description="Manage VPN users/groups via SQL (FreeRADIUS/PostgreSQL).",
-        parents=[global_args],
+def _add_page_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--limit", type=int, help="Return at most N rows.")
+    p.add_argument(
+        "--after",
+        metavar="USERNAME",
+        help="Keyset pagination: continue after this username (the last one of the previous page).",
     )
 
-    sub = p.add_subparsers(dest="cmd", required=True)
 
-    migrate = sub.add_parser("migrate", help="Create/upgrade required helper tables (idempotent).", parents=[global_args])
-    migrate.set_defaults(action="migrate")
+def _add_subparser(sub, name: str, **kwargs) -> argparse.ArgumentParser:
+    p = sub.add_parser(name, **kwargs)
+    _add_global_args(p, subcommand=True)
+    return p
+
+
+def _define_migrate(p: argparse.ArgumentParser) -> None:
+    p.set_defaults(action="migrate")
+
 
-    create = sub.add_parser("create", help="Create a user or a group.", parents=[global_args])
-    create_sub = create.add_subparsers(dest="entity", required=True)
-    create_user = create_sub.add_parser("user", help="Create user (radcheck).", parents=[global_args])
+def _define_create(p: argparse.ArgumentParser) -> None:
+    create_sub = p.add_subparsers(dest="entity", required=True)
+    create_user = _add_subparser(create_sub, "user", help="Create user (radcheck).")
     create_user.add_argument("name")
     create_user.add_argument("--password", help="User password (Cleartext-Password). If omitted, prompt.")
     create_user.set_defaults(action="create_user")
-    create_group = create_sub.add_parser("group", help="Create group (vpn_groups).", parents=[global_args])
+    create_group = _add_subparser(create_sub, "group", help="Create group (vpn_groups).")
     create_group.add_argument("name")
     create_group.add_argument("--description")
     create_group.set_defaults(action="create_group")
 
-    delete = sub.add_parser("delete", help="Delete a user or a group.", parents=[global_args])
-    delete_sub = delete.add_subparsers(dest="entity", required=True)
-    delete_user = delete_sub.add_parser("user", help="Delete user (radcheck, radusergroup, blocklist).", parents=[global_args])
+
+def _define_delete(p: argparse.ArgumentParser) -> None:
+    delete_sub = p.add_subparsers(dest="entity", required=True)
+    delete_user = _add_subparser(delete_sub, "user", help="Delete user (radcheck, radusergroup, blocklist).")
     delete_user.add_argument("name")
     delete_user.set_defaults(action="delete_user")
-    delete_group = delete_sub.add_parser("group", help="Delete group (vpn_groups) and remove memberships.", parents=[global_args])
+    delete_group = _add_subparser(delete_sub, "group", help="Delete group (vpn_groups) and remove memberships.")
     delete_group.add_argument("name")
     delete_group.add_argument(
         "--reassign-orphans-to",
@@ -119,62 +324,379 @@ def _build_parser() -> argparse.ArgumentParser:
     )
     delete_group.set_defaults(action="delete_group")
 
-    change = sub.add_parser("change", help="Change a user or a group.", parents=[global_args])
-    change_sub = change.add_subparsers(dest="entity", required=True)
-    change_user = change_sub.add_parser("user", help="Change user (currently: password only).", parents=[global_args])
+
+def _define_change(p: argparse.ArgumentParser) -> None:
+    change_sub = p.add_subparsers(dest="entity", required=True)
+    change_user = _add_subparser(change_sub, "user", help="Change user (currently: password only).")
     change_user.add_argument("name")
     change_user.add_argument("--password", help="New password. If omitted, prompt.")
     change_user.set_defaults(action="change_user")
-    change_group = change_sub.add_parser("group", help="Change group (rename/description).", parents=[global_args])
+    change_group = _add_subparser(change_sub, "group", help="Change group (rename/description).")
     change_group.add_argument("name")
     change_group.add_argument("--rename")
     change_group.add_argument("--description")
     change_group.set_defaults(action="change_group")
 
-    add = sub.add_parser("add", help="Add user to group (radusergroup).", parents=[global_args])
-    add.add_argument("user")
-    add.add_argument("group")
-    add.add_argument("--priority", type=int, default=0)
-    add.set_defaults(action="add")
-
-    remove = sub.add_parser("remove", help="Remove user from group (radusergroup).", parents=[global_args])
-    remove.add_argument("user")
-    remove.add_argument("group")
-    remove.set_defaults(action="remove")
-
-    block = sub.add_parser("block", help="Block user (vpn_user_blocklist).", parents=[global_args])
-    block.add_argument("user")
-    block.add_argument("--reason", default="MANUAL")
-    block.add_argument("--for", dest="duration", help="Duration like 15m/2h/1d. Omit for permanent block.")
-    block.set_defaults(action="block")
-
-    unblock = sub.add_parser("unblock", help="Unblock user (vpn_user_blocklist).", parents=[global_args])
-    unblock.add_argument("user")
-    unblock.set_defaults(action="unblock")
-
-    show = sub.add_parser("show", help="Show users/groups/blocks (read-only).", parents=[global_args])
-    show_sub = show.add_subparsers(dest="entity", required=True)
-    show_users = show_sub.add_parser("users", help="List users.", parents=[global_args])
+
+def _define_add(p: argparse.ArgumentParser) -> None:
+    p.add_argument("user")
+    p.add_argument("group")
+    p.add_argument("--priority", type=int, default=0)
+    p.set_defaults(action="add")
+
+
+def _define_remove(p: argparse.ArgumentParser) -> None:
+    p.add_argument("user")
+    p.add_argument("group")
+    p.set_defaults(action="remove")
+
+
+def _add_bulk_target_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument("user", nargs="?", help="Single username (or use --pattern / --from-file).")
+    p.add_argument("--pattern", help="All users matching this pattern ('*' wildcards, like `find user`).")
+    p.add_argument("--from-file", metavar="FILE", help="Usernames, one per line ('-': stdin).")
+
+
+def _define_block(p: argparse.ArgumentParser) -> None:
+    _add_bulk_target_args(p)
+    p.add_argument("--reason", default="MANUAL")
+    p.add_argument("--for", dest="duration", help="Duration like 15m/2h/1d. Omit for permanent block.")
+    p.set_defaults(action="block")
+
+
+def _define_unblock(p: argparse.ArgumentParser) -> None:
+    _add_bulk_target_args(p)
+    p.set_defaults(action="unblock")
+
+
+def _define_blocks(p: argparse.ArgumentParser) -> None:
+    blocks_sub = p.add_subparsers(dest="entity", required=True)
+    sweep = _add_subparser(
+        blocks_sub,
+        "sweep",
+        help="Delete (or archive) expired blocks in bounded batches; safe to run from a timer.",
+    )
+    sweep.add_argument("--batch-size", type=int, default=1000, help="Rows per batch/transaction (default: 1000).")
+    sweep.add_argument(
+        "--max-batches",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Stop after N batches (default: 0, until no expired rows are left).",
+    )
+    sweep.add_argument(
+        "--older-than",
+        metavar="DURATION",
+        help="Keep blocks that expired less than this long ago (15m/2h/1d; default: sweep all expired).",
+    )
+    sweep.add_argument(
+        "--archive",
+        action="store_true",
+        help="Move swept rows to freeradius.blocklist_archive_table instead of deleting them.",
+    )
+    sweep.set_defaults(action="blocks_sweep")
+
+
+def _add_lock_timeout_arg(p: argparse.ArgumentParser) -> None:
+    p.add_argument(
+        "--lock-timeout",
+        default="5s",
+        metavar="DURATION",
+        help="Give up (and fail) instead of queueing accounting writes behind a lock for longer (default: 5s).",
+    )
+
+
+def _define_radacct(p: argparse.ArgumentParser) -> None:
+    from .backends.freeradius import RADACCT_ARCHIVE_FORMATS
+
+    radacct_sub = p.add_subparsers(dest="entity", required=True)
+    status = _add_subparser(radacct_sub, "status", help="Show radacct partitions with their ranges and sizes.")
+    status.set_defaults(action="radacct_status")
+
+    migrate = _add_subparser(
+        radacct_sub,
+        "partition-migrate",
+        help="Convert radacct to monthly range partitions on acctstarttime (idempotent; also creates upcoming months).",
+    )
+    migrate.add_argument(
+        "--months-ahead",
+        type=int,
+        default=3,
+        metavar="N",
+        help="Keep partitions for the next N months (default: 3).",
+    )
+    migrate.add_argument(
+        "--ensure-only",
+        action="store_true",
+        help="Only create upcoming partitions; fail if radacct is not partitioned yet (for timers).",
+    )
+    _add_lock_timeout_arg(migrate)
+    migrate.set_defaults(action="radacct_partition_migrate")
+
+    archive = _add_subparser(
+        radacct_sub,
+        "archive",
+        help="Export closed partitions to compressed files (COPY TO), then detach or drop them.",
+    )
+    archive.add_argument(
+        "--older-than",
+        required=True,
+        metavar="DURATION",
+        help="Archive partitions whose whole range ended longer ago than this (e.g. 180d).",
+    )
+    archive.add_argument("--dir", required=True, help="Directory for the <partition>.<format>.gz files.")
+    archive.add_argument(
+        "--format",
+        dest="archive_format",
+        choices=list(RADACCT_ARCHIVE_FORMATS),
+        default="ndjson",
+        help="File format (default: ndjson, one JSON object per row).",
+    )
+    archive.add_argument("--drop", action="store_true", help="Drop archived partitions (default: detach only).")
+    archive.add_argument("--dry-run", action="store_true", help="List the partitions that would be archived.")
+    _add_lock_timeout_arg(archive)
+    archive.set_defaults(action="radacct_archive")
+
+
+def _define_usage(p: argparse.ArgumentParser) -> None:
+    from .backends.freeradius import USAGE_GROUPINGS
+
+    p.add_argument("--user", help="Only this user (exact name).")
+    p.add_argument(
+        "--since",
+        metavar="DATE|DURATION",
+        help="Only traffic from this UTC day on: YYYY-MM-DD, or a duration back from now (7d, 12h).",
+    )
+    p.add_argument("--by", choices=list(USAGE_GROUPINGS), help="Split each user's usage per NAS or per day.")
+    p.set_defaults(action="usage_report")
+    usage_sub = p.add_subparsers(dest="entity", required=False)
+    refresh = _add_subparser(
+        usage_sub,
+        "refresh",
+        help="Fold radacct changes since the last refresh into the usage rollup (the first run reads all history).",
+    )
+    refresh.set_defaults(action="usage_refresh")
+
+
+def _define_counters(p: argparse.ArgumentParser) -> None:
+    counters_sub = p.add_subparsers(dest="entity", required=True)
+    verify = _add_subparser(
+        counters_sub,
+        "verify",
+        help="Compare the per-user counters (open sessions, today's octets) with a full radacct recount.",
+    )
+    verify.add_argument("--user", help="Only this user (exact name).")
+    verify.add_argument("--fix", action="store_true", help="Rewrite drifting counters with the recounted values.")
+    verify.set_defaults(action="counters_verify")
+
+
+def _define_doctor(p: argparse.ArgumentParser) -> None:
+    doctor_sub = p.add_subparsers(dest="entity", required=True)
+    indexes = _add_subparser(
+        doctor_sub,
+        "indexes",
+        help="Check the indexes behind the hot lookups (EXPLAIN, sequential scans, sizes); --apply builds missing ones.",
+    )
+    indexes.add_argument(
+        "--apply",
+        action="store_true",
+        help="Build missing or invalid recommended indexes with CREATE INDEX CONCURRENTLY (per partition when partitioned).",
+    )
+    indexes.add_argument(
+        "--min-rows",
+        type=int,
+        default=10000,
+        metavar="N",
+        help="Report sequential scans over relations of at least N estimated rows (default: 10000).",
+    )
+    _add_lock_timeout_arg(indexes)
+    indexes.set_defaults(action="doctor_indexes")
+
+
+def _define_import(p: argparse.ArgumentParser) -> None:
+    from .bulk import INPUT_FORMATS
+
+    p.add_argument("file", nargs="?", default="-", help="Input file ('-' or omitted: stdin).")
+    p.add_argument(
+        "--format",
+        dest="input_format",
+        choices=list(INPUT_FORMATS),
+        help="Input format (default: jsonl for .jsonl/.ndjson/.json files, otherwise csv).",
+    )
+    p.set_defaults(action="import_users")
+
+
+def _define_apply(p: argparse.ArgumentParser) -> None:
+    from .state import STATE_FORMATS
+
+    p.add_argument("file", nargs="?", default="-", help="Desired-state file ('-' or omitted: stdin).")
+    p.add_argument(
+        "--format",
+        dest="state_format",
+        choices=list(STATE_FORMATS),
+        help="State file format (default: json for .json files, otherwise yaml).",
+    )
+    p.add_argument(
+        "--plan",
+        action="store_true",
+        help="Compute the diff and report per-table counts, then roll back (nothing is changed).",
+    )
+    p.add_argument(
+        "--prune-users",
+        action="store_true",
+        help="Delete users that are not in the state (credentials, memberships and blocks).",
+    )
+    p.add_argument(
+        "--prune-groups",
+        action="store_true",
+        help="Delete groups that are not in the state; members left without a group get the default group.",
+    )
+    p.set_defaults(action="apply_state")
+
+
+def _define_batch(p: argparse.ArgumentParser) -> None:
+    p.add_argument("file", nargs="?", default="-", help="Command file ('-' or omitted: stdin).")
+    p.add_argument(
+        "--commit-every",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Commit after every N commands (0: one transaction for the whole batch, 1: one per command).",
+    )
+    p.add_argument(
+        "--continue-on-error",
+        action="store_true",
+        help="Undo only the failed command (savepoint) and keep going instead of rolling back and stopping.",
+    )
+    p.set_defaults(action="batch")
+
+
+def _define_serve(p: argparse.ArgumentParser) -> None:
+    p.add_argument(
+        "--listen",
+        help="unix:/path/to.sock (default: $TUXEDO_SOCKET or /run/tuxedo/tuxedo.sock) or http://127.0.0.1:PORT.",
+    )
+    p.add_argument("--workers", type=int, default=4, help="Max commands executed in parallel (default: 4).")
+    p.add_argument(
+        "--socket-mode",
+        default="0660",
+        help="Permissions of the unix socket (octal, default: 0660).",
+    )
+    p.set_defaults(action="serve")
+
+
+def _define_show(p: argparse.ArgumentParser) -> None:
+    show_sub = p.add_subparsers(dest="entity", required=True)
+    show_users = _add_subparser(show_sub, "users", help="List users.")
+    _add_page_args(show_users)
     show_users.set_defaults(action="show_users")
-    show_groups = show_sub.add_parser("groups", help="List groups.", parents=[global_args])
+    show_groups = _add_subparser(show_sub, "groups", help="List groups.")
     show_groups.set_defaults(action="show_groups")
-    show_blocks = show_sub.add_parser("blocks", help="List blocks.", parents=[global_args])
+    show_blocks = _add_subparser(show_sub, "blocks", help="List blocks.")
+    _add_page_args(show_blocks)
     show_blocks.add_argument("--all", action="store_true", help="Include expired blocks.")
     show_blocks.set_defaults(action="show_blocks")
 
-    find = sub.add_parser("find", help="Find a user (LIKE search) or show a group (exact name).", parents=[global_args])
-    find_sub = find.add_subparsers(dest="entity", required=True)
-    find_user = find_sub.add_parser(
+
+def _define_find(p: argparse.ArgumentParser) -> None:
+    find_sub = p.add_subparsers(dest="entity", required=True)
+    find_user = _add_subparser(
+        find_sub,
         "user",
         help="Find users and show groups + block status (supports '*' wildcards).",
-        parents=[global_args],
     )
-    find_user.add_argument("name")
+    _add_page_args(find_user)
+    find_user.add_argument("name", nargs="*", help="One or more patterns (looked up concurrently, merged in order).")
+    find_user.add_argument("--from-file", metavar="FILE", help="More patterns, one per line ('-': stdin).")
     find_user.set_defaults(action="find_user")
-    find_group = find_sub.add_parser("group", help="Show group details (members).", parents=[global_args])
+    find_group = _add_subparser(find_sub, "group", help="Show group details (members).")
     find_group.add_argument("name")
     find_group.set_defaults(action="find_group")
 
+
+# Top-level subcommands in `--help` order: name -> (help, function that adds its arguments/sub-subcommands).
+_COMMANDS = {
+    "migrate": ("Create/upgrade required helper tables (idempotent).", _define_migrate),
+    "create": ("Create a user or a group.", _define_create),
+    "delete": ("Delete a user or a group.", _define_delete),
+    "change": ("Change a user or a group.", _define_change),
+    "add": ("Add user to group (radusergroup).", _define_add),
+    "remove": ("Remove user from group (radusergroup).", _define_remove),
+    "block": ("Block user (vpn_user_blocklist).", _define_block),
+    "unblock": ("Unblock user (vpn_user_blocklist).", _define_unblock),
+    "blocks": ("Blocklist maintenance (sweep expired blocks).", _define_blocks),
+    "radacct": ("Accounting table maintenance (monthly partitions, archive, sizes).", _define_radacct),
+    "usage": ("Traffic per user from the usage rollup (per NAS / per day); `usage refresh` updates it.", _define_usage),
+    "counters": ("Per-user counters used by FreeRADIUS authorization (verify against radacct).", _define_counters),
+    "doctor": ("Schema health checks (indexes behind the hot lookups).", _define_doctor),
+    "import": (
+        "Bulk import users/passwords/groups/blocks from CSV or JSONL (COPY + set-based merge).",
+        _define_import,
+    ),
+    "apply": (
+        "Reconcile users/groups/memberships/blocks with a YAML or JSON desired-state file (one transaction).",
+        _define_apply,
+    ),
+    "batch": (
+        "Run many commands (CLI grammar or JSON lines) over one connection; results as JSON lines.",
+        _define_batch,
+    ),
+    "serve": (
+        "Run a long-lived local API (warm DB connections); other tuxedo invocations forward to it.",
+        _define_serve,
+    ),
+    "show": ("Show users/groups/blocks (read-only).", _define_show),
+    "find": ("Find a user (LIKE search) or show a group (exact name).", _define_find),
+}
+
+# Top-level flags that take a value (their value is never the subcommand name).
+_GLOBAL_VALUE_FLAGS = frozenset({"--config", "--output"})
+
+
+def _command_name(argv: list[str]) -> str | None:
+    """The subcommand named in `argv` (skipping top-level flags and their values), or None."""
+    skip = False
+    for arg in argv:
+        if skip:
+            skip = False
+        elif arg == "--":
+            return None
+        elif arg.startswith("-"):
+            skip = arg in _GLOBAL_VALUE_FLAGS
+        else:
+            return arg if arg in _COMMANDS else None
+    return None
+
+
+def _build_parser(
+    parser_class: type[argparse.ArgumentParser] = argparse.ArgumentParser,
+    *,
+    argv: list[str] | None = None,
+) -> argparse.ArgumentParser:
+    """
+    Build the argument parser.
+
+    Without `argv` every subcommand is defined (`tuxedo batch` / `tuxedo serve` parse many command lines
+    with one parser). With `argv` only the subcommand it names is defined; when it names none (`tuxedo --help`,
+    a typo) the subcommands are registered as help-only placeholders so usage and "invalid choice" errors still list them.
+    """
+    p = parser_class(prog="tuxedo", description="Manage VPN users/groups via SQL (FreeRADIUS/PostgreSQL).")
+    _add_global_args(p, subcommand=False)
+    p.add_argument(
+        "--startup-profile",
+        action="store_true",
+        help="Run the command under `python -X importtime` and report where startup time goes.",
+    )
+
+    sub = p.add_subparsers(dest="cmd", required=True)
+    selected = None if argv is None else _command_name(argv)
+    for name, (help_text, define) in _COMMANDS.items():
+        if argv is not None and selected is not None and name != selected:
+            continue
+        if argv is not None and selected is None:
+            sub.add_parser(name, help=help_text, add_help=False)
+            continue
+        define(_add_subparser(sub, name, help=help_text))
     return p
 
 
@@ -194,19 +716,168 @@ def _print_results_text(results):
                 sys.stdout.write("\t".join("" if v is None else str(v) for v in row) + "\n")
 
 
-def _main(argv: list[str] | None = None) -> int:
-    args = _build_parser().parse_args(argv)
-    if bool(getattr(args, "show_secrets", False)) and not bool(getattr(args, "sql", False)):
-        sys.stderr.write("warning: --show-secrets has effect only with --sql; ignoring.\n")
-    cfg = load_config(args.config)
-    backend = FreeradiusBackend(cfg.freeradius)
+def _result_dict(r) -> dict:
+    d = {"title": r.title, "rowcount": r.rowcount, "rows": r.rows if r.rows is not None else None}
+    if r.elapsed_ms is not None:
+        d["timings"] = {
+            "elapsed_ms": round(r.elapsed_ms, 3),
+            "rows": len(r.rows) if r.rows is not None else 0,
+            "bytes": r.bytes_fetched or 0,
+        }
+    if r.plan is not None:
+        d["plan"] = r.plan
+    return d
+
+
+def _print_timings(results, out) -> None:
+    """Per-statement timings table (`--timings`, `--explain`)."""
+    total = 0.0
+    out.write("timings:\n")
+    for idx, r in enumerate(results, start=1):
+        elapsed = r.elapsed_ms or 0.0
+        total += elapsed
+        rows = len(r.rows) if r.rows is not None else r.rowcount
+        out.write(f"  {idx:>3}  {elapsed:10.3f} ms  rows={rows:<8} bytes={r.bytes_fetched or 0:<10} {r.title}\n")
+    out.write(f"  total {total:.3f} ms in {len(results)} statement(s)\n")
+    out.flush()
+
+
+def _print_plans_text(results) -> None:
+    from .output import write_plan_text
+
+    for idx, r in enumerate(results, start=1):
+        sys.stdout.write(f"== {idx}/{len(results)} {r.title}\n")
+        if r.plan is None:
+            sys.stdout.write("   (not explainable: executed without a plan)\n")
+            continue
+        write_plan_text(r.plan, sys.stdout)
+    _print_timings(results, sys.stdout)
+    sys.stdout.write("(rolled back: nothing was committed)\n")
+
+
+def _users_directory_present(cfg, backend, preflight) -> bool:
+    """True when `tuxedo migrate` installed the users directory; without a DB (`--sql`) assume it is absent."""
+    if preflight is None:
+        return False
+    table = cfg.freeradius.users_table
+    if table not in _USERS_DIRECTORY_PRESENT:
+        row = _first_row(preflight(backend.preflight_users_directory()))
+        _USERS_DIRECTORY_PRESENT[table] = bool(row and row[0])
+    return _USERS_DIRECTORY_PRESENT[table]
+
+
+def _prompt_password(args, prompt: str, *, interactive: bool) -> str:
+    password = args.password
+    if password:
+        return password
+    if not interactive:
+        raise ValueError(f"{args.cmd} {args.entity}: --password is required in non-interactive mode")
+    import getpass
+
+    return getpass.getpass(prompt)
+
+
+def _bulk_targets(args) -> dict:
+    """`block` / `unblock` targets: exactly one of a username, --pattern or --from-file."""
+    given = [v for v in (args.user, args.pattern, args.from_file) if v is not None]
+    if len(given) != 1:
+        raise ValueError(f"{args.cmd}: give exactly one of USER, --pattern or --from-file")
+    if args.pattern is not None:
+        return {"pattern": _to_ilike_pattern(args.pattern)}
+    from .bulk import read_usernames
+
+    if args.from_file != "-" and not os.path.exists(args.from_file):
+        raise FileNotFoundError(f"Input file not found: {args.from_file}")
+    return {"usernames": read_usernames(args.from_file)}
+
+
+def _sweep_options(args) -> dict:
+    from .backends.freeradius import _parse_duration_seconds
+
+    return {
+        "batch_size": args.batch_size,
+        "older_than_seconds": _parse_duration_seconds(args.older_than) or 0,
+        "archive": bool(args.archive),
+    }
+
+
+def _lock_timeout_ms(args) -> int:
+    from .backends.freeradius import _parse_duration_seconds
 
-    if getattr(args, "action", None) == "migrate":
+    seconds = _parse_duration_seconds(args.lock_timeout)
+    if not seconds:
+        raise ValueError(f"{args.cmd} {args.entity}: --lock-timeout must be at least 1s")
+    return seconds * 1000
+
+
+def _usage_since(args):
+    """`usage --since`: a UTC day, given as YYYY-MM-DD or as a duration back from now."""
+    import datetime
+
+    from .backends.freeradius import _parse_duration_seconds
+
+    raw = (args.since or "").strip()
+    if not raw:
+        return None
+    try:
+        return datetime.date.fromisoformat(raw)
+    except ValueError:
+        pass
+    try:
+        seconds = _parse_duration_seconds(raw) or 0
+    except ValueError:
+        raise ValueError(f"usage: invalid --since {raw!r} (use YYYY-MM-DD or a duration such as 7d)") from None
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return (now - datetime.timedelta(seconds=seconds)).date()
+
+
+def _radacct_partition_statements(args, backend, *, preflight):
+    """
+    The `radacct partition-migrate` program: preparation, switch and upcoming partitions (each step its own transaction).
+    Once radacct is partitioned only the last step is left; without a DB (`--sql`) the whole program is printed.
+    """
+    import datetime
+
+    from .radacct import legacy_start, migration_boundary
+
+    lock_timeout_ms = _lock_timeout_ms(args)
+    ensure = backend.radacct_ensure_partitions(months_ahead=args.months_ahead, lock_timeout_ms=lock_timeout_ms)
+    relkind = None
+    if preflight is not None:
+        row = _first_row(preflight(backend.radacct_relkind()))
+        relkind = row[0] if row else None
+        if relkind is None:
+            raise ValueError(f"radacct partition-migrate: table {backend.schema.radacct_table!r} does not exist")
+    if relkind == "p":
+        return ensure
+    if args.ensure_only:
+        if preflight is None:
+            return ensure
+        raise ValueError(
+            f"radacct partition-migrate: {backend.schema.radacct_table!r} is not partitioned yet "
+            "(run it once without --ensure-only)"
+        )
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    bounds = {"legacy_start": legacy_start(today), "boundary": migration_boundary(today)}
+    return [
+        *backend.radacct_partition_prepare(**bounds, lock_timeout_ms=lock_timeout_ms),
+        *backend.radacct_partition_switch(**bounds, lock_timeout_ms=lock_timeout_ms),
+        *ensure,
+    ]
+
+
+def _build_statements(args, cfg, backend, *, preflight, interactive: bool):
+    """
+    Map parsed CLI arguments to a list of SQLStatements.
+
+    `preflight` runs read-only checks on the same connection that will execute the command
+    (None with `--sql`: checks are skipped). `interactive` allows password/orphan prompts.
+    """
+    if args.action == "migrate":
         statements = backend.migrate()
+        _USERS_DIRECTORY_PRESENT.pop(cfg.freeradius.users_table, None)
     elif args.action == "create_user":
-        password = args.password
-        if not password:
-            password = getpass.getpass(f"Password for {args.name}: ")
+        password = _prompt_password(args, f"Password for {args.name}: ", interactive=interactive)
         statements = backend.create_user(username=args.name, password=password)
         statements.extend(
             backend.ensure_user_has_any_group(
@@ -224,9 +895,8 @@ def _main(argv: list[str] | None = None) -> int:
         if reassign_group == args.name:
             raise ValueError("delete group: --reassign-orphans-to must differ from the deleted group")
 
-        if not bool(args.sql):
-            executor = PostgresExecutor(cfg.postgres)
-            preview = executor.run(backend.preview_delete_group(groupname=args.name))
+        if preflight is not None:
+            preview = preflight(backend.preview_delete_group(groupname=args.name))
             row = _first_row(preview)
             if row is not None:
                 members_total = int(row[0] or 0)
@@ -240,7 +910,7 @@ def _main(argv: list[str] | None = None) -> int:
                     f"warning: deleting group {args.name!r} affects {members_total} users; "
                     f"{would_orphan} would have no groups.\n"
                 )
-                if args.reassign_orphans_to is None and _is_tty():
+                if args.reassign_orphans_to is None and interactive and _is_tty():
                     answer = input(f"Reassign orphaned users to which group? [{reassign_group}]: ").strip()
                     if answer:
                         reassign_group = answer
@@ -251,9 +921,7 @@ def _main(argv: list[str] | None = None) -> int:
 
         statements = backend.delete_group(groupname=args.name, reassign_orphans_to=reassign_group)
     elif args.action == "change_user":
-        password = args.password
-        if not password:
-            password = getpass.getpass(f"New password for {args.name}: ")
+        password = _prompt_password(args, f"New password for {args.name}: ", interactive=interactive)
         statements = backend.change_user(username=args.name, password=password)
         statements.extend(
             backend.ensure_user_has_any_group(
@@ -263,10 +931,9 @@ def _main(argv: list[str] | None = None) -> int:
     elif args.action == "change_group":
         statements = backend.change_group(groupname=args.name, rename_to=args.rename, description=args.description)
     elif args.action == "add":
-        if not bool(args.sql):
-            executor = PostgresExecutor(cfg.postgres)
-            preflight = executor.run(backend.preflight_user_has_password(username=args.user))
-            if _first_row(preflight) is None:
+        if preflight is not None:
+            checked = preflight(backend.preflight_user_has_password(username=args.user))
+            if _first_row(checked) is None:
                 raise ValueError(
                     f"User {args.user!r} does not exist (no Cleartext-Password in radcheck). "
                     f"Create it first: tuxedo create user {args.user} --password '...'"
@@ -280,55 +947,586 @@ def _main(argv: list[str] | None = None) -> int:
             ensure_priority=cfg.freeradius.default_group_priority,
         )
     elif args.action == "block":
-        statements = backend.block_user(username=args.user, reason=args.reason, duration=args.duration)
+        if args.user is not None and args.pattern is None and args.from_file is None:
+            statements = backend.block_user(username=args.user, reason=args.reason, duration=args.duration)
+        else:
+            statements = backend.block_users(
+                **_bulk_targets(args),
+                reason=args.reason,
+                duration=args.duration,
+                use_directory=_users_directory_present(cfg, backend, preflight),
+            )
     elif args.action == "unblock":
-        statements = backend.unblock_user(username=args.user)
+        if args.user is not None and args.pattern is None and args.from_file is None:
+            statements = backend.unblock_user(username=args.user)
+        else:
+            statements = backend.unblock_users(**_bulk_targets(args))
+    elif args.action == "blocks_sweep":
+        statements = backend.sweep_blocks(**_sweep_options(args))
+    elif args.action == "radacct_status":
+        statements = backend.radacct_status()
+    elif args.action == "radacct_partition_migrate":
+        statements = _radacct_partition_statements(args, backend, preflight=preflight)
+    elif args.action == "radacct_archive":
+        from .backends.freeradius import _parse_duration_seconds
+
+        statements = backend.radacct_archive_candidates(older_than_seconds=_parse_duration_seconds(args.older_than) or 0)
+    elif args.action == "usage_report":
+        statements = backend.usage_report(username=args.user, since=_usage_since(args), by=args.by)
+    elif args.action == "usage_refresh":
+        statements = backend.usage_refresh()
+    elif args.action == "counters_verify":
+        statements = backend.counters_verify(username=args.user, fix=bool(args.fix))
+    elif args.action == "doctor_indexes":
+        # `--sql` shows the report and, with --apply, the plain-table form of every build.
+        statements = [*backend.doctor_table_sizes(), *backend.doctor_index_status(), *backend.doctor_hot_queries()]
+        if args.apply:
+            for advice in backend.recommended_indexes():
+                statements.extend(backend.doctor_create_index(advice, lock_timeout_ms=_lock_timeout_ms(args)))
+    elif args.action == "import_users":
+        if args.file != "-" and not os.path.exists(args.file):
+            raise FileNotFoundError(f"Input file not found: {args.file}")
+        from .bulk import CopyTextStream, detect_format, iter_import_rows
+
+        input_format = args.input_format or detect_format(args.file)
+        statements = backend.import_users(
+            CopyTextStream(iter_import_rows(args.file, input_format)),
+            ensure_groupname=cfg.freeradius.default_group_name,
+            ensure_priority=cfg.freeradius.default_group_priority,
+        )
+    elif args.action == "apply_state":
+        if args.file != "-" and not os.path.exists(args.file):
+            raise FileNotFoundError(f"State file not found: {args.file}")
+        from .bulk import CopyTextStream
+        from .state import detect_state_format, iter_state_rows
+
+        statements = backend.apply_state(
+            CopyTextStream(
+                iter_state_rows(
+                    args.file,
+                    args.state_format or detect_state_format(args.file),
+                    default_group=cfg.freeradius.default_group_name,
+                    default_priority=cfg.freeradius.default_group_priority,
+                )
+            ),
+            ensure_groupname=cfg.freeradius.default_group_name,
+            ensure_priority=cfg.freeradius.default_group_priority,
+            prune_users=bool(args.prune_users),
+            prune_groups=bool(args.prune_groups),
+        )
     elif args.action == "show_users":
-        statements = backend.show_users()
+        statements = backend.show_users(
+            limit=args.limit,
+            after=args.after,
+            use_directory=_users_directory_present(cfg, backend, preflight),
+        )
     elif args.action == "show_groups":
         statements = backend.show_groups()
     elif args.action == "show_blocks":
-        statements = backend.show_blocks(all_blocks=bool(args.all))
+        statements = backend.show_blocks(all_blocks=bool(args.all), limit=args.limit, after=args.after)
     elif args.action == "find_user":
-        statements = backend.find_user(username=_to_ilike_pattern(args.name))
+        import dataclasses
+
+        patterns = _find_user_patterns(args)
+        use_directory = _users_directory_present(cfg, backend, preflight)
+        statements = []
+        for pattern in patterns:
+            for stmt in backend.find_user(
+                username=_to_ilike_pattern(pattern),
+                limit=args.limit,
+                after=args.after,
+                use_directory=use_directory,
+            ):
+                statements.append(stmt if len(patterns) == 1 else dataclasses.replace(stmt, title=f"Users: {pattern}"))
     elif args.action == "find_group":
         statements = backend.find_group(groupname=args.name)
     else:
         raise RuntimeError(f"Unhandled action: {args.action!r}")
+    return statements
 
-    should_execute = not bool(args.sql)
 
-    if not should_execute:
-        if args.output == "json":
-            payload = {"statements": [s.as_dict(show_secrets=bool(args.show_secrets)) for s in statements]}
-            sys.stdout.write(json.dumps(payload, indent=2, ensure_ascii=False) + "\n")
-        else:
-            sys.stdout.write(render_program(statements, show_secrets=bool(args.show_secrets)))
+# Commands that cannot run inside `tuxedo batch` (they read stdin themselves, nest batches, commit on their own
+# or lift the statement timeout for the rest of the transaction).
+_BATCH_EXCLUDED_ACTIONS = frozenset(
+    {
+        "batch",
+        "import_users",
+        "apply_state",
+        "serve",
+        "blocks_sweep",
+        "radacct_partition_migrate",
+        "radacct_archive",
+        "usage_refresh",
+        "counters_verify",
+        "doctor_indexes",
+    }
+)
+
+
+def _iter_batch_commands(path: str):
+    """
+    Yield `(lineno, argv, command_id)` for each command line.
+
+    Accepted line shapes:
+    - CLI grammar: `add alice admins --priority 10` (a leading `tuxedo` is optional);
+    - JSON array: `["add", "alice", "admins"]`;
+    - JSON object: `{"argv": [...]}` or `{"command": "add alice admins"}`, with an optional `"id"` echoed back.
+    """
+    import json
+    import shlex
+
+    from .bulk import open_input
+
+    with open_input(path) as fh:
+        for lineno, line in enumerate(fh, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            command_id = None
+            if line[0] in "[{":
+                try:
+                    payload = json.loads(line)
+                except json.JSONDecodeError as exc:
+                    raise ValueError(f"batch line {lineno}: invalid JSON: {exc.msg}") from exc
+                if isinstance(payload, dict):
+                    command_id = payload.get("id")
+                    if isinstance(payload.get("argv"), list):
+                        argv = [str(v) for v in payload["argv"]]
+                    elif isinstance(payload.get("command"), str):
+                        argv = shlex.split(payload["command"])
+                    else:
+                        raise ValueError(f"batch line {lineno}: JSON object needs 'argv' (list) or 'command' (string)")
+                elif isinstance(payload, list):
+                    argv = [str(v) for v in payload]
+                else:
+                    raise ValueError(f"batch line {lineno}: expected a JSON array or object")
+            else:
+                try:
+                    argv = shlex.split(line, comments=True)
+                except ValueError as exc:
+                    raise ValueError(f"batch line {lineno}: {exc}") from exc
+            if argv and argv[0] == "tuxedo":
+                argv = argv[1:]
+            if argv:
+                yield lineno, argv, command_id
+
+
+def _parse_batch_command(parser, argv: list[str]):
+    sub_args = parser.parse_args(argv)
+    if sub_args.action in _BATCH_EXCLUDED_ACTIONS:
+        raise ValueError(f"{sub_args.cmd!r} is not allowed inside batch")
+    if sub_args.sql or sub_args.config:
+        raise ValueError("--sql/--config apply to the whole batch, not to single commands")
+    return sub_args
+
+
+def _print_statements(statements, args) -> None:
+    if args.output in ("json", "ndjson"):
+        import json
+    else:
+        from .sql import render_program
+
+    if args.output == "ndjson":
+        for stmt in statements:
+            sys.stdout.write(json.dumps(stmt.as_dict(show_secrets=bool(args.show_secrets)), ensure_ascii=False) + "\n")
+    elif args.output == "json":
+        payload = {"statements": [s.as_dict(show_secrets=bool(args.show_secrets)) for s in statements]}
+        sys.stdout.write(json.dumps(payload, indent=2, ensure_ascii=False) + "\n")
+    else:
+        sys.stdout.write(render_program(statements, show_secrets=bool(args.show_secrets)))
+
+
+def _write_json_line(record: dict) -> None:
+    import json
+
+    from .output import json_default
+
+    sys.stdout.write(json.dumps(record, ensure_ascii=False, default=json_default) + "\n")
+    sys.stdout.flush()
+
+
+def _run_batch(args, cfg, backend) -> int:
+    if args.commit_every < 0:
+        raise ValueError("batch: --commit-every must be >= 0")
+    if bool(args.explain):
+        raise ValueError("batch: --explain is not supported (explain the individual commands instead)")
+    from .sql import merge_statements
+
+    parser = _build_parser(parser_class=_NonExitingArgumentParser)
+
+    if bool(args.sql):
+        chunks = []
+        for lineno, argv, _ in _iter_batch_commands(args.file):
+            try:
+                sub_args = _parse_batch_command(parser, argv)
+                chunks.append(_build_statements(sub_args, cfg, backend, preflight=None, interactive=False))
+            except ValueError as exc:
+                raise ValueError(f"batch line {lineno}: {exc}") from exc
+        _print_statements(merge_statements(chunks), args)
         return 0
 
+    from .db import PostgresExecutor
+
+    executor = PostgresExecutor(cfg.postgres)
+    failed = 0
+    pending = 0
+    with executor.session() as session:
+        for lineno, argv, command_id in _iter_batch_commands(args.file):
+            record = {"line": lineno, "argv": argv}
+            if command_id is not None:
+                record["id"] = command_id
+
+            in_savepoint = False
+            try:
+                sub_args = _parse_batch_command(parser, argv)
+                if args.continue_on_error:
+                    session.savepoint()
+                    in_savepoint = True
+                statements = _build_statements(sub_args, cfg, backend, preflight=session.execute, interactive=False)
+                results = session.execute(statements, timed=bool(args.timings))
+                if in_savepoint:
+                    session.release_savepoint()
+            except Exception as exc:
+                failed += 1
+                record.update({"ok": False, "error": str(exc).strip()})
+                _write_json_line(record)
+                if args.continue_on_error:
+                    if in_savepoint:
+                        session.rollback_to_savepoint()
+                    continue
+                session.rollback()
+                _write_json_line({"transaction": "rollback", "commands": pending})
+                return 1
+
+            record.update({"ok": True, "results": [_result_dict(r) for r in results]})
+            _write_json_line(record)
+            pending += 1
+            if args.commit_every and pending >= args.commit_every:
+                session.commit()
+                _write_json_line({"transaction": "commit", "commands": pending})
+                pending = 0
+
+        session.commit()
+        if pending:
+            _write_json_line({"transaction": "commit", "commands": pending})
+    return 1 if failed else 0
+
+
+def _run_blocks_sweep(args, cfg, backend) -> int:
+    """Repeat bounded sweep batches, one short transaction each, until a batch comes back short."""
+    if args.max_batches < 0:
+        raise ValueError("blocks sweep: --max-batches must be >= 0")
+    statements = backend.sweep_blocks(**_sweep_options(args))
+
+    from .db import PostgresExecutor
+
+    deleted = archived = batches = 0
+    with PostgresExecutor(cfg.postgres).session() as session:
+        while True:
+            row = _first_row(session.execute(statements)) or (0, 0)
+            session.commit()
+            batches += 1
+            deleted += int(row[0] or 0)
+            archived += int(row[1] or 0)
+            if int(row[0] or 0) < args.batch_size or (args.max_batches and batches >= args.max_batches):
+                break
+
+    if args.output == "text":
+        sys.stdout.write(f"swept expired blocks: deleted={deleted} archived={archived} batches={batches}\n")
+    elif args.output == "json":
+        import json
+
+        sys.stdout.write(json.dumps({"deleted": deleted, "archived": archived, "batches": batches}, indent=2) + "\n")
+    else:
+        _write_rows(args, ["deleted", "archived", "batches"], [(deleted, archived, batches)])
+    return 0
+
+
+_RADACCT_ARCHIVE_COLUMNS = ["partition", "range_from", "range_to", "rows", "file", "bytes", "action"]
+
+
+def _run_radacct_archive(args, cfg, backend) -> int:
+    """
+    Archive closed partitions one at a time: export (one snapshot), finish the file, then detach/drop and commit.
+
+    A file only gets its final name once the export is complete and its row count matches; the partition
+    is only detached after that, so an interrupted run loses nothing and can simply be repeated.
+    """
+    from .backends.freeradius import _parse_duration_seconds
+    from .db import PostgresExecutor
+    from .radacct import ArchiveFile, archive_path
+
+    lock_timeout_ms = _lock_timeout_ms(args)
     executor = PostgresExecutor(cfg.postgres)
-    results = executor.run(statements)
+    candidates = executor.run(
+        backend.radacct_archive_candidates(older_than_seconds=_parse_duration_seconds(args.older_than) or 0)
+    )[0]
+    if not args.dry_run:
+        os.makedirs(args.dir, exist_ok=True)
+
+    records = []
+    for partition, range_from, range_to, rows_estimate, _ in candidates.rows or []:
+        if args.dry_run:
+            records.append((partition, range_from, range_to, rows_estimate, None, None, "would archive"))
+            continue
+        path = archive_path(args.dir, partition, args.archive_format)
+        archive = ArchiveFile(path)
+        with executor.session() as session:
+            try:
+                results = session.execute(
+                    backend.radacct_export_partition(partition, fmt=args.archive_format, target=archive)
+                )
+                expected = int(results[-2].rows[0][0])
+                copied = results[-1].rowcount
+                if copied >= 0 and copied != expected:
+                    raise RuntimeError(f"radacct archive: {partition}: exported {copied} rows, expected {expected}")
+                size = archive.commit()
+            except BaseException:
+                archive.discard()
+                raise
+            session.execute(
+                backend.radacct_detach_partition(partition, drop=bool(args.drop), lock_timeout_ms=lock_timeout_ms)
+            )
+            session.commit()
+        records.append((partition, range_from, range_to, expected, path, size, "dropped" if args.drop else "detached"))
+
+    if args.output == "text":
+        if not records:
+            sys.stdout.write("radacct archive: nothing to archive\n")
+        for partition, _, range_to, rows, path, size, action in records:
+            where = f" -> {path} ({size} bytes)" if path else ""
+            sys.stdout.write(f"{partition}: rows={rows} until={range_to} {action}{where}\n")
+    elif args.output == "json":
+        import json
+
+        from .output import json_default
+
+        payload = {"partitions": [dict(zip(_RADACCT_ARCHIVE_COLUMNS, r)) for r in records]}
+        sys.stdout.write(json.dumps(payload, indent=2, ensure_ascii=False, default=json_default) + "\n")
+    else:
+        _write_rows(args, _RADACCT_ARCHIVE_COLUMNS, records)
+    return 0
+
+
+_DOCTOR_QUERY_COLUMNS = ["query", "scans", "cost", "verdict"]
+
+
+def _run_doctor_indexes(args, cfg, backend) -> int:
+    """
+    `doctor indexes`: recommended indexes, the plans of the hot lookups, and table sizes.
+
+    Plans come from plain EXPLAIN (nothing is executed). A hot lookup that reads a relation of at least
+    `--min-rows` estimated rows with a sequential scan is reported. `--apply` builds missing or invalid
+    indexes concurrently, one transaction per step, then reports again. Exit status 1 while anything is left.
+    """
+    from .db import ExecResult, PostgresExecutor
+    from .doctor import describe_scans, large_seq_scans, scan_nodes
+
+    if args.min_rows < 0:
+        raise ValueError(f"doctor indexes: invalid --min-rows {args.min_rows!r} (must be >= 0)")
+    executor = PostgresExecutor(cfg.postgres)
+    report = backend.doctor_table_sizes() + backend.doctor_index_status()
+    sizes, relation_rows, indexes = executor.run(report)
+    if args.apply:
+        lock_timeout_ms = _lock_timeout_ms(args)
+        advice = {a.name: a for a in backend.recommended_indexes()}
+        for name, table, _, status, existing, partitioned, *_ in indexes.rows or []:
+            if status not in ("missing", "invalid"):
+                continue
+            partitions = []
+            if partitioned:
+                partitions = [row[0] for row in executor.run(backend.doctor_partitions(table))[0].rows or []]
+            statements = backend.doctor_create_index(
+                advice[name],
+                partitions=partitions,
+                drop_invalid=existing if status == "invalid" and not partitioned else None,
+                lock_timeout_ms=lock_timeout_ms,
+            )
+            executor.run_autocommit(statements, timings=bool(args.timings), statement_timeout_ms=0)
+        sizes, relation_rows, indexes = executor.run(report)
+
+    rows_by_relation = dict(relation_rows.rows or [])
+    plans = executor.explain(backend.doctor_hot_queries(tables={row[0] for row in sizes.rows or []}), analyze=False)
+    query_rows = []
+    for r in plans:
+        scans = scan_nodes(r.plan)
+        seq = large_seq_scans(scans, rows_by_relation, min_rows=args.min_rows)
+        cost = ((r.plan or {}).get("Plan") or {}).get("Total Cost")
+        verdict = f"seq scan: {', '.join(seq)}" if seq else "ok"
+        query_rows.append((r.title, describe_scans(scans), cost, verdict))
+    results = [
+        indexes,
+        ExecResult(title="Hot queries", rowcount=len(query_rows), rows=query_rows, columns=_DOCTOR_QUERY_COLUMNS),
+        sizes,
+    ]
+    pending = [row[0] for row in indexes.rows or [] if row[3] in ("missing", "invalid")]
+    flagged = [row[0] for row in query_rows if row[3] != "ok"]
+
     if args.output == "json":
-        payload = {
-            "results": [
-                {"title": r.title, "rowcount": r.rowcount, "rows": r.rows if r.rows is not None else None}
-                for r in results
-            ]
-        }
-        sys.stdout.write(json.dumps(payload, indent=2, ensure_ascii=False) + "\n")
+        import json
+
+        from .output import json_default
+
+        payload = {"results": [_result_dict(r) for r in results], "pending_indexes": pending, "seq_scans": flagged}
+        sys.stdout.write(json.dumps(payload, indent=2, ensure_ascii=False, default=json_default) + "\n")
+    elif args.output in ("ndjson", "csv"):
+        for r in results:
+            _write_rows(args, r.columns or [], r.rows or [])
     else:
-        if args.action == "find_user":
-            _print_find_users_text(results)
-            return 0
         _print_results_text(results)
+        if pending:
+            sys.stdout.write(
+                f"{len(pending)} recommended index(es) to build: tuxedo doctor indexes --apply (CREATE INDEX CONCURRENTLY)\n"
+            )
+    return 1 if pending or flagged else 0
+
+
+# Text output of these actions has a column header line (the rows are unlabeled numbers otherwise).
+_TEXT_HEADER_ACTIONS = frozenset({"usage_report"})
+
+
+def _write_rows(args, columns, rows, *, header: bool = True, title: str | None = None) -> None:
+    from .output import write_csv, write_ndjson, write_text
+
+    if args.output == "ndjson":
+        write_ndjson(columns, rows, sys.stdout)
+    elif args.output == "csv":
+        write_csv(columns, rows, sys.stdout, header=header)
+    elif args.action == "find_user":
+        _print_find_users_text(rows)
+    else:
+        write_text(rows, sys.stdout, title=title, columns=columns if args.action in _TEXT_HEADER_ACTIONS else None)
+
+
+def _execute(args, cfg, backend, *, interactive: bool) -> int:
+    """Run one parsed (non-batch) command and write its output; shared by the CLI and `tuxedo serve`."""
+    explain = bool(args.explain)
+    timings = bool(args.timings)
+    if explain and bool(args.sql):
+        raise ValueError("--explain needs a database connection; it cannot be combined with --sql")
+    if args.action == "blocks_sweep" and not bool(args.sql) and not explain:
+        return _run_blocks_sweep(args, cfg, backend)
+    if args.action in ("radacct_partition_migrate", "radacct_archive", "doctor_indexes") and explain:
+        raise ValueError(f"{args.cmd} {args.entity}: --explain is not supported (maintenance runs its own transactions)")
+    if args.action == "radacct_archive" and not bool(args.sql):
+        return _run_radacct_archive(args, cfg, backend)
+    if args.action == "doctor_indexes" and not bool(args.sql):
+        return _run_doctor_indexes(args, cfg, backend)
+    executor = None
+    if not bool(args.sql):
+        from .db import PostgresExecutor
+
+        executor = PostgresExecutor(cfg.postgres)
+    statements = _build_statements(
+        args,
+        cfg,
+        backend,
+        preflight=executor.run if executor is not None else None,
+        interactive=interactive,
+    )
+
+    if executor is None:
+        _print_statements(statements, args)
+        return 0
+
+    if explain:
+        results = executor.explain(statements)
+        if args.output == "text":
+            _print_plans_text(results)
+            return 0
+    elif args.action == "apply_state" and bool(args.plan):
+        with executor.session() as session:
+            try:
+                results = session.execute(statements, timed=timings)
+            finally:
+                session.rollback()
+    elif args.action == "radacct_partition_migrate":
+        # lock_timeout keeps every step from stalling accounting writes; scans may take as long as they need.
+        results = executor.run_autocommit(statements, timings=timings, statement_timeout_ms=0)
+    elif args.action in _CONCURRENT_READ_ACTIONS and len(statements) > 1:
+        from .db import AsyncPostgresExecutor
+
+        programs = AsyncPostgresExecutor(cfg.postgres).run([[stmt] for stmt in statements], timings=timings)
+        results = [r for program in programs for r in program]
+        if args.action == "find_user":
+            results = [_merge_find_user_results(results)]
+    elif args.action in _STREAMING_ACTIONS and args.output != "json" and not timings:
+        with executor.stream(statements[0], chunk_size=_STREAM_CHUNK_ROWS) as (columns, rows):
+            _write_rows(args, columns, rows, title=statements[0].title)
+        return 0
+    else:
+        results = executor.run(statements, timings=timings)
+
+    if args.output == "json":
+        import json
+
+        from .output import json_default
+
+        payload = {"results": [_result_dict(r) for r in results]}
+        if args.action == "import_users":
+            payload["summary"] = _import_summary(results)
+        elif args.action == "apply_state":
+            payload["plan"] = bool(args.plan)
+            payload["summary"] = _apply_summary(results)
+        sys.stdout.write(json.dumps(payload, indent=2, ensure_ascii=False, default=json_default) + "\n")
+    elif args.output in ("ndjson", "csv"):
+        for idx, r in enumerate(results):
+            if r.rows is None:
+                _write_rows(args, ["title", "rowcount"], [(r.title, r.rowcount)], header=(idx == 0))
+            else:
+                _write_rows(args, r.columns or [], r.rows)
+        if timings or explain:
+            _print_timings(results, sys.stderr)
+    else:
+        if args.action == "find_user":
+            _print_find_users_text(results[0].rows or [] if results else [])
+        elif args.action == "import_users":
+            _print_import_summary_text(results)
+        elif args.action == "apply_state":
+            _print_apply_summary_text(results, plan=bool(args.plan))
+        elif args.action == "usage_refresh":
+            _print_usage_refresh_text(results)
+        elif args.action in _TEXT_HEADER_ACTIONS:
+            for r in results:
+                _write_rows(args, r.columns or [], r.rows or [], title=r.title)
+        else:
+            _print_results_text(results)
+        if timings:
+            _print_timings(results, sys.stderr)
     return 0
 
 
-def main(argv: list[str] | None = None) -> int:
+def _main(argv: list[str]) -> int:
+    args = _build_parser(argv=argv).parse_args(argv)
+    if bool(getattr(args, "show_secrets", False)) and not bool(getattr(args, "sql", False)):
+        sys.stderr.write("warning: --show-secrets has effect only with --sql; ignoring.\n")
+
+    from .backends import FreeradiusBackend
+    from .config import load_config
+
+    cfg = load_config(args.config)
+    backend = FreeradiusBackend(cfg.freeradius)
+
+    if args.action == "serve":
+        from .server import serve
+
+        return serve(args, cfg, backend)
+    if args.action == "batch":
+        return _run_batch(args, cfg, backend)
+    return _execute(args, cfg, backend, interactive=True)
+
+
+def _guarded(fn) -> int:
+    """Call `fn()` and map exceptions to exit codes (errors are written to stderr)."""
     try:
-        return _main(argv)
+        return fn()
     except KeyboardInterrupt:
         return 130
+    except BrokenPipeError:
+        # Reader went away (e.g. `tuxedo show users --output ndjson | head`): stop quietly.
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        return 141
     except ValueError as exc:
         sys.stderr.write(f"error: {exc}\n")
         return 2
@@ -343,5 +1541,20 @@ def main(argv: list[str] | None = None) -> int:
         return 1
 
 
+def main(argv: list[str] | None = None) -> int:
+    if argv is None:
+        argv = sys.argv[1:]
+    if "--startup-profile" in argv:
+        from .startup import profile_startup
+
+        return _guarded(lambda: profile_startup([a for a in argv if a != "--startup-profile"]))
+    # Forwarding errors (timeout, broken server answer) are reported like any other error; the command
+    # is not retried locally, since the server may already have run it.
+    forwarded = _guarded(lambda: _maybe_forward(argv))
+    if forwarded is not None:
+        return forwarded
+    return _guarded(lambda: _main(argv))
+
+
 if __name__ == "__main__":  # pragma: no cover
     raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import json
+import os
+import socket
+import sys
+
+# Thin-client side of `tuxedo serve`. It speaks just enough HTTP/1.1 over the unix socket for one
+# request/response pair: `http.client` (and the `email` package behind it) would add tens of
+# milliseconds of imports to every forwarded command.
+
+DEFAULT_SOCKET_PATH = "/run/tuxedo/tuxedo.sock"
+
+# How long a forwarding client waits for the server's answer.
+_FORWARD_TIMEOUT_SECONDS = 120.0
+
+
+def default_socket_path() -> str:
+    """Unix socket of `tuxedo serve` (`TUXEDO_SOCKET` overrides; set it empty to disable forwarding)."""
+    raw = os.environ.get("TUXEDO_SOCKET")
+    if raw is None:
+        return DEFAULT_SOCKET_PATH
+    return raw.strip()
+
+
+def _request(socket_path: str, body: bytes, *, timeout: float) -> tuple[int, str, bytes] | None:
+    """POST /v1/run with `Connection: close`; returns (status, reason, body), or None if the socket refuses."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        try:
+            sock.connect(socket_path)
+            sock.sendall(
+                b"POST /v1/run HTTP/1.1\r\n"
+                b"Host: localhost\r\n"
+                b"Content-Type: application/json\r\n"
+                b"Connection: close\r\n"
+                b"Content-Length: " + str(len(body)).encode("ascii") + b"\r\n\r\n" + body
+            )
+        except OSError:
+            return None
+        chunks = []
+        try:
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+        except socket.timeout:
+            raise RuntimeError(
+                f"tuxedo serve: no answer within {timeout:g}s (the command may still be running there)"
+            ) from None
+    finally:
+        sock.close()
+
+    head, _, payload = b"".join(chunks).partition(b"\r\n\r\n")
+    status_line = head.split(b"\r\n", 1)[0].decode("latin-1")
+    parts = status_line.split(" ", 2)
+    if len(parts) < 2 or not parts[1].isdigit():
+        raise RuntimeError(f"tuxedo serve: malformed response: {status_line!r}")
+    return int(parts[1]), (parts[2] if len(parts) > 2 else ""), payload
+
+
+def forward(socket_path: str, argv: list[str], *, timeout: float | None = None) -> int | None:
+    """
+    Send one command to `tuxedo serve` and replay its output locally.
+
+    Returns None when the server cannot be reached, so the caller can fall back to running locally.
+    """
+    if timeout is None:
+        timeout = _FORWARD_TIMEOUT_SECONDS
+    response = _request(socket_path, json.dumps({"argv": argv}).encode("utf-8"), timeout=timeout)
+    if response is None:
+        return None
+    status, reason, body = response
+    try:
+        payload = json.loads(body or b"{}")
+    except ValueError:
+        raise RuntimeError(f"tuxedo serve: malformed response body (HTTP {status})") from None
+    if not isinstance(payload, dict):
+        raise RuntimeError(f"tuxedo serve: malformed response body (HTTP {status})")
+
+    if status != 200:
+        sys.stderr.write(f"error: tuxedo serve: {payload.get('error') or reason}\n")
+        return 1
+    sys.stdout.write(payload.get("stdout") or "")
+    sys.stderr.write(payload.get("stderr") or "")
+    return int(payload.get("exit_code") or 0)
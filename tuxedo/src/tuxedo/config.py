@@ -3,7 +3,12 @@ from __future__ import annotations
 import configparser
 import os
 from dataclasses import dataclass
-from pathlib import Path
+
+
+POSTGRES_DRIVERS = ("auto", "psycopg", "psycopg2")
+
+# Tables of the usage rollup (`tuxedo usage`), named `<freeradius.usage_table_prefix>_<kind>`.
+USAGE_TABLE_KINDS = ("daily", "totals", "sessions", "watermark")
 
 
 def _env_str(name: str) -> str | None:
@@ -21,11 +26,20 @@ def _env_int(name: str) -> int | None:
         return None
 
 
-def _default_config_paths() -> list[Path]:
-    home = Path.home()
+def _env_bool(name: str) -> bool | None:
+    raw = (os.environ.get(name, "") or "").strip().lower()
+    if raw in ("1", "true", "yes", "on"):
+        return True
+    if raw in ("0", "false", "no", "off"):
+        return False
+    return None
+
+
+def _default_config_paths() -> list[str]:
+    # os.path rather than pathlib: pathlib alone costs several milliseconds of import time on every run.
     return [
-        Path("/etc/tuxedovpn/tuxedo.ini"),
-        home / ".config" / "tuxedo" / "config.ini",
+        "/etc/tuxedovpn/tuxedo.ini",
+        os.path.join(os.path.expanduser("~"), ".config", "tuxedo", "config.ini"),
     ]
 
 
@@ -52,6 +66,11 @@ class PostgresConfig:
 
     `dsn` is a libpq-style DSN string (example: `dbname=radius user=radius host=127.0.0.1 port=5432`).
     Timeouts prevent the CLI from hanging on network/DB issues.
+    `driver` selects the client library: `psycopg` (v3, pipelines multi-statement commands into one round trip),
+    `psycopg2`, or `auto` (psycopg when installed, else psycopg2).
+    `pool_size` caps idle connections kept open for reuse within one process.
+    `prepare_statements` lets connections that run a catalog statement repeatedly prepare it server-side
+    (turn it off behind poolers that do not keep session state, e.g. PgBouncer in transaction mode).
 
     This is `@dataclass(frozen=True, slots=True)`: fields are read-only after creation and no new attributes can be added.
     """
@@ -59,6 +78,15 @@ class PostgresConfig:
     dsn: str | None
     connect_timeout_seconds: int = 2
     statement_timeout_seconds: int = 5
+    driver: str = "auto"
+    pool_size: int = 4
+    prepare_statements: bool = True
+
+    def validate(self) -> None:
+        if self.driver not in POSTGRES_DRIVERS:
+            raise ValueError(f"Invalid config: postgres.driver must be one of {', '.join(POSTGRES_DRIVERS)}")
+        if int(self.pool_size) < 1:
+            raise ValueError("Invalid config: postgres.pool_size must be >= 1")
 
 
 @dataclass(frozen=True, slots=True)
@@ -77,6 +105,11 @@ class FreeradiusSchema:
     radusergroup_table: str = "radusergroup"
     blocklist_table: str = "vpn_user_blocklist"
     groups_table: str = "vpn_groups"
+    users_table: str = "vpn_users"
+    blocklist_archive_table: str = "vpn_user_blocklist_archive"
+    radacct_table: str = "radacct"
+    usage_table_prefix: str = "vpn_usage"
+    counters_table: str = "vpn_user_counters"
     default_group_name: str = "default"
     default_group_priority: int = 0
 
@@ -86,6 +119,11 @@ class FreeradiusSchema:
             self.radusergroup_table,
             self.blocklist_table,
             self.groups_table,
+            self.users_table,
+            self.blocklist_archive_table,
+            self.radacct_table,
+            self.usage_table_prefix,
+            self.counters_table,
         ):
             if not _is_safe_identifier(name):
                 raise ValueError(f"Invalid SQL identifier in config: {name!r}")
@@ -96,6 +134,15 @@ class FreeradiusSchema:
         if int(self.default_group_priority) < 0:
             raise ValueError("Invalid config: freeradius.default_group_priority must be >= 0")
 
+    def usage_table(self, kind: str) -> str:
+        # "public.vpn_usage" + "daily" -> "public.vpn_usage_daily"
+        return f"{self.usage_table_prefix}_{kind}"
+
+    @property
+    def usage_refresh_function(self) -> str:
+        # "public.vpn_usage" -> "public.vpn_usage_refresh" (one function per rollup, in the rollup's schema)
+        return f"{self.usage_table_prefix}_refresh"
+
 
 @dataclass(frozen=True, slots=True)
 class TuxedoConfig:
@@ -110,27 +157,27 @@ class TuxedoConfig:
 
 
 def load_config(path: str | None) -> TuxedoConfig:
-    explicit_path = Path(path).expanduser() if path else None
+    explicit_path = os.path.expanduser(path) if path else None
     if explicit_path is None:
         cfg_path = _env_str("TUXEDO_CONFIG")
-        explicit_path = Path(cfg_path).expanduser() if cfg_path else None
+        explicit_path = os.path.expanduser(cfg_path) if cfg_path else None
 
     parser = configparser.ConfigParser()
     if explicit_path is not None:
-        if not explicit_path.exists():
+        if not os.path.exists(explicit_path):
             raise FileNotFoundError(f"Config file not found: {explicit_path}")
         if not os.access(explicit_path, os.R_OK):
             raise PermissionError(f"Config file is not readable: {explicit_path}")
-        with explicit_path.open("r", encoding="utf-8") as fh:
-            parser.read_file(fh, source=str(explicit_path))
+        with open(explicit_path, "r", encoding="utf-8") as fh:
+            parser.read_file(fh, source=explicit_path)
     else:
         for candidate in _default_config_paths():
-            if not candidate.exists():
+            if not os.path.exists(candidate):
                 continue
             if not os.access(candidate, os.R_OK):
                 continue
-            with candidate.open("r", encoding="utf-8") as fh:
-                parser.read_file(fh, source=str(candidate))
+            with open(candidate, "r", encoding="utf-8") as fh:
+                parser.read_file(fh, source=candidate)
             break
 
     pg_dsn = _env_str("TUXEDO_PG_DSN")
@@ -145,6 +192,18 @@ def load_config(path: str | None) -> TuxedoConfig:
     if pg_statement_timeout is None:
         pg_statement_timeout = parser.getint("postgres", "statement_timeout_seconds", fallback=5)
 
+    pg_driver = _env_str("TUXEDO_PG_DRIVER")
+    if not pg_driver:
+        pg_driver = parser.get("postgres", "driver", fallback="auto")
+
+    pg_pool_size = _env_int("TUXEDO_PG_POOL_SIZE")
+    if pg_pool_size is None:
+        pg_pool_size = parser.getint("postgres", "pool_size", fallback=4)
+
+    pg_prepare_statements = _env_bool("TUXEDO_PG_PREPARE_STATEMENTS")
+    if pg_prepare_statements is None:
+        pg_prepare_statements = parser.getboolean("postgres", "prepare_statements", fallback=True)
+
     default_group_name = _env_str("TUXEDO_DEFAULT_GROUP_NAME")
     if not default_group_name:
         default_group_name = parser.get("freeradius", "default_group_name", fallback="default")
@@ -158,16 +217,29 @@ def load_config(path: str | None) -> TuxedoConfig:
         radusergroup_table=parser.get("freeradius", "radusergroup_table", fallback="radusergroup"),
         blocklist_table=parser.get("freeradius", "blocklist_table", fallback="vpn_user_blocklist"),
         groups_table=parser.get("freeradius", "groups_table", fallback="vpn_groups"),
+        users_table=parser.get("freeradius", "users_table", fallback="vpn_users"),
+        blocklist_archive_table=parser.get(
+            "freeradius", "blocklist_archive_table", fallback="vpn_user_blocklist_archive"
+        ),
+        radacct_table=parser.get("freeradius", "radacct_table", fallback="radacct"),
+        usage_table_prefix=parser.get("freeradius", "usage_table_prefix", fallback="vpn_usage"),
+        counters_table=parser.get("freeradius", "counters_table", fallback="vpn_user_counters"),
         default_group_name=str(default_group_name),
         default_group_priority=int(default_group_priority),
     )
     schema.validate()
 
+    postgres = PostgresConfig(
+        dsn=pg_dsn,
+        connect_timeout_seconds=int(pg_connect_timeout),
+        statement_timeout_seconds=int(pg_statement_timeout),
+        driver=str(pg_driver).strip().lower(),
+        pool_size=int(pg_pool_size),
+        prepare_statements=bool(pg_prepare_statements),
+    )
+    postgres.validate()
+
     return TuxedoConfig(
-        postgres=PostgresConfig(
-            dsn=pg_dsn,
-            connect_timeout_seconds=int(pg_connect_timeout),
-            statement_timeout_seconds=int(pg_statement_timeout),
-        ),
+        postgres=postgres,
         freeradius=schema,
     )
@@ -1,10 +1,18 @@
 from __future__ import annotations
 
+import atexit
+import contextlib
+import json
+import threading
+import time
+import weakref
 from dataclasses import dataclass
-from typing import Any, Sequence
+from typing import Any, Iterator, Sequence
 
 from .config import PostgresConfig
-from .sql import SQLStatement
+from .sql import SQLStatement, to_positional
+
+_COPY_CHUNK_SIZE = 64 * 1024
 
 
 @dataclass(frozen=True, slots=True)
@@ -14,6 +22,10 @@ class ExecResult:
 
     - `rowcount`: number of affected rows (as reported by the driver).
     - `rows`: `fetchall()` data for queries that return rows (SELECT/RETURNING).
+    - `columns`: result column names (None when the statement returns no rows).
+    - `elapsed_ms` / `bytes_fetched`: server round trip including the fetch, and size of the returned
+      values as sent by the server (set when the statement ran with timings, see `PostgresExecutor.run`).
+    - `plan`: `EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)` output for the statement (see `PostgresExecutor.explain`).
 
     This is `@dataclass(frozen=True, slots=True)`: fields are read-only after creation and no new attributes can be added.
     """
@@ -21,42 +33,578 @@ class ExecResult:
     title: str
     rowcount: int
     rows: list[tuple[Any, ...]] | None = None
+    columns: list[str] | None = None
+    elapsed_ms: float | None = None
+    bytes_fetched: int | None = None
+    plan: Any = None
+
+
+def _fetched_bytes(cur: Any, rows: list[tuple[Any, ...]] | None) -> int:
+    if not rows:
+        return 0
+    pgresult = getattr(cur, "pgresult", None)  # psycopg 3: the raw values, so exact wire lengths
+    if pgresult is not None:
+        return sum(
+            len(pgresult.get_value(r, c) or b"") for r in range(pgresult.ntuples) for c in range(pgresult.nfields)
+        )
+    # psycopg2 does not expose the raw result: estimate from the text form of each value.
+    return sum(len(str(v).encode("utf-8")) for row in rows for v in row if v is not None)
+
+
+def _result_from_cursor(cur: Any, stmt: SQLStatement, *, started: float | None = None) -> ExecResult:
+    """Build the result; with `started` (a `perf_counter()` taken before execute) also record timings."""
+    rows = None
+    columns = None
+    # psycopg 3 keeps the COPY TO result's description, but there are no rows to fetch from it.
+    if cur.description is not None and stmt.copy_target is None:
+        rows = cur.fetchall()
+        columns = [d[0] for d in cur.description]
+    if started is None:
+        return ExecResult(title=stmt.title, rowcount=int(cur.rowcount), rows=rows, columns=columns)
+    return ExecResult(
+        title=stmt.title,
+        rowcount=int(cur.rowcount),
+        rows=rows,
+        columns=columns,
+        elapsed_ms=(time.perf_counter() - started) * 1000,
+        bytes_fetched=_fetched_bytes(cur, rows),
+    )
+
+
+_EXPLAINABLE_KEYWORDS = frozenset({"SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "VALUES", "TABLE", "MERGE"})
+
+
+def _explainable(stmt: SQLStatement) -> bool:
+    if stmt.copy_source is not None or stmt.copy_target is not None:
+        return False
+    first = stmt.sql.lstrip().split(None, 1)
+    return bool(first) and first[0].upper() in _EXPLAINABLE_KEYWORDS
+
+
+_STREAM_CURSOR_NAME = "tuxedo_stream"
+
+
+def _stream_rows(conn: Any, stmt: SQLStatement, chunk_size: int) -> tuple[list[str], Iterator[tuple[Any, ...]]]:
+    # Named cursor = server-side `DECLARE ... CURSOR`: rows are fetched in chunks, never all at once.
+    cur = conn.cursor(name=_STREAM_CURSOR_NAME)
+    cur.execute(stmt.sql, stmt.params or None)
+    first = cur.fetchmany(chunk_size)
+    columns = [d[0] for d in cur.description] if cur.description is not None else []
+
+    def rows() -> Iterator[tuple[Any, ...]]:
+        try:
+            chunk = first
+            while chunk:
+                yield from chunk
+                if len(chunk) < chunk_size:
+                    break
+                chunk = cur.fetchmany(chunk_size)
+        finally:
+            cur.close()
+
+    return columns, rows()
+
+
+# A catalog statement is prepared on its Nth execution on a connection: one-shot CLI runs never pay
+# the extra PREPARE, while batch, import and `tuxedo serve` connections parse and plan it once.
+_PREPARE_AFTER_USES = 2
+
+
+class _PreparedStatements:
+    """Per-connection use counts of catalog statements (`SQLStatement.prepare_name`) and which ones are prepared."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._by_conn: weakref.WeakKeyDictionary[Any, tuple[dict[str, int], set[str]]] = weakref.WeakKeyDictionary()
+
+    def _state(self, conn: Any) -> tuple[dict[str, int], set[str]]:
+        with self._lock:
+            state = self._by_conn.get(conn)
+            if state is None:
+                state = self._by_conn[conn] = ({}, set())
+            return state
+
+    def use(self, conn: Any, name: str) -> bool:
+        """Count one execution; True when the statement should run prepared."""
+        uses, _ = self._state(conn)
+        uses[name] = uses.get(name, 0) + 1
+        return uses[name] >= _PREPARE_AFTER_USES
+
+    def is_prepared(self, conn: Any, name: str) -> bool:
+        return name in self._state(conn)[1]
+
+    def mark_prepared(self, conn: Any, name: str) -> None:
+        self._state(conn)[1].add(name)
+
+
+class _Psycopg2Driver:
+    """
+    psycopg2: one round trip per statement; COPY (both directions) via `copy_expert`.
+    Catalog statements are prepared with an explicit `PREPARE name AS ...` and run with `EXECUTE name (...)`.
+    """
+
+    name = "psycopg2"
+
+    def __init__(self, module: Any, *, prepare: bool = True):
+        self._module = module
+        self._prepare = prepare
+        self._prepared = _PreparedStatements()
+
+    def connect(self, pg: PostgresConfig) -> Any:
+        return self._module.connect(pg.dsn or "", connect_timeout=pg.connect_timeout_seconds)
+
+    def execute(self, conn: Any, statements: Sequence[SQLStatement], *, timed: bool = False) -> list[ExecResult]:
+        results: list[ExecResult] = []
+        with conn.cursor() as cur:
+            for stmt in statements:
+                started = time.perf_counter() if timed else None
+                if stmt.copy_source is not None:
+                    cur.copy_expert(stmt.sql, stmt.copy_source, size=_COPY_CHUNK_SIZE)
+                elif stmt.copy_target is not None:
+                    # Not a text file, so psycopg2 hands the target raw bytes.
+                    cur.copy_expert(stmt.sql, stmt.copy_target, size=_COPY_CHUNK_SIZE)
+                elif self._prepare and stmt.prepare_name and self._prepared.use(conn, stmt.prepare_name):
+                    self._execute_prepared(conn, cur, stmt)
+                else:
+                    # None, not (): with an empty tuple psycopg2 still %-formats the SQL, and a literal `%`
+                    # (LIKE patterns, RAISE NOTICE format strings) then fails.
+                    cur.execute(stmt.sql, stmt.params or None)
+                results.append(_result_from_cursor(cur, stmt, started=started))
+        return results
+
+    def _execute_prepared(self, conn: Any, cur: Any, stmt: SQLStatement) -> None:
+        name = stmt.prepare_name
+        if not self._prepared.is_prepared(conn, name):
+            # Prepared statements belong to the session, not the transaction: a later rollback keeps them.
+            cur.execute(f"PREPARE {name} AS {to_positional(stmt.sql)}")
+            self._prepared.mark_prepared(conn, name)
+        if stmt.params:
+            cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(stmt.params))});", stmt.params)
+        else:
+            cur.execute(f"EXECUTE {name};")
+
+    def stream(self, conn: Any, stmt: SQLStatement, chunk_size: int) -> tuple[list[str], Iterator[tuple[Any, ...]]]:
+        return _stream_rows(conn, stmt, chunk_size)
+
+
+class _Psycopg3Driver:
+    """
+    psycopg (v3): multi-statement programs are sent in libpq pipeline mode, so a command like
+    `delete user` (3 statements) costs one network round trip instead of three.
+    Falls back to sequential execution for COPY, for timed runs (per-statement round trips are
+    only measurable one at a time), in autocommit mode (every statement must be its own transaction)
+    or when libpq is too old for pipelines (< 14).
+    Catalog statements use psycopg's own protocol-level prepared statements (`execute(prepare=True)`).
+    """
+
+    name = "psycopg"
+
+    def __init__(self, module: Any, *, prepare: bool = True):
+        self._module = module
+        self._pipeline = bool(module.Pipeline.is_supported())
+        self._prepare = prepare
+        self._prepared = _PreparedStatements()
+
+    def _prepare_flag(self, conn: Any, stmt: SQLStatement) -> bool:
+        # False (not None) for everything else: only catalog statements are worth a prepared slot.
+        return bool(self._prepare and stmt.prepare_name and self._prepared.use(conn, stmt.prepare_name))
+
+    def connect(self, pg: PostgresConfig) -> Any:
+        return self._module.connect(pg.dsn or "", connect_timeout=pg.connect_timeout_seconds)
+
+    def execute(self, conn: Any, statements: Sequence[SQLStatement], *, timed: bool = False) -> list[ExecResult]:
+        has_copy = any(stmt.copy_source is not None or stmt.copy_target is not None for stmt in statements)
+        if self._pipeline and len(statements) > 1 and not has_copy and not timed and not conn.autocommit:
+            cursors = []
+            with conn.pipeline():
+                for stmt in statements:
+                    cur = conn.cursor()
+                    cur.execute(stmt.sql, stmt.params or None, prepare=self._prepare_flag(conn, stmt))
+                    cursors.append(cur)
+            try:
+                return [_result_from_cursor(cur, stmt) for cur, stmt in zip(cursors, statements)]
+            finally:
+                for cur in cursors:
+                    cur.close()
+
+        results: list[ExecResult] = []
+        with conn.cursor() as cur:
+            for stmt in statements:
+                started = time.perf_counter() if timed else None
+                if stmt.copy_source is not None:
+                    with cur.copy(stmt.sql) as copy:
+                        while True:
+                            chunk = stmt.copy_source.read(_COPY_CHUNK_SIZE)
+                            if not chunk:
+                                break
+                            copy.write(chunk)
+                elif stmt.copy_target is not None:
+                    with cur.copy(stmt.sql) as copy:
+                        for data in copy:
+                            stmt.copy_target.write(data)
+                else:
+                    cur.execute(stmt.sql, stmt.params or None, prepare=self._prepare_flag(conn, stmt))
+                results.append(_result_from_cursor(cur, stmt, started=started))
+        return results
+
+    def stream(self, conn: Any, stmt: SQLStatement, chunk_size: int) -> tuple[list[str], Iterator[tuple[Any, ...]]]:
+        return _stream_rows(conn, stmt, chunk_size)
+
+
+def _load_driver(name: str, *, prepare: bool = True) -> Any:
+    if name in ("auto", "psycopg"):
+        try:
+            import psycopg  # type: ignore[import-not-found]
+        except Exception as exc:  # pragma: no cover
+            if name == "psycopg":
+                raise RuntimeError(
+                    "postgres.driver=psycopg requires psycopg 3. Install with: pip install ./tuxedo[psycopg] "
+                    "or apt install python3-psycopg (or run with --sql)."
+                ) from exc
+        else:
+            return _Psycopg3Driver(psycopg, prepare=prepare)
+
+    try:
+        import psycopg2  # type: ignore[import-not-found]
+    except Exception as exc:  # pragma: no cover
+        raise RuntimeError(
+            "psycopg2 is required to execute SQL. Install with: pip install ./tuxedo[postgres] "
+            "or apt install python3-psycopg2 (or run with --sql)."
+        ) from exc
+    return _Psycopg2Driver(psycopg2, prepare=prepare)
+
+
+# An idle connection is checked with a round trip before reuse once it has been idle this long: the server may
+# have closed it meanwhile (restart, failover, `idle_session_timeout`), which the client only notices on next use.
+_IDLE_CHECK_SECONDS = 1.0
+
+# `SET` takes no bind parameters (psycopg 3 sends them server-side as $1), so the value goes through set_config().
+_SET_STATEMENT_TIMEOUT_SQL = "SELECT set_config('statement_timeout', %s, false);"
+
+
+class ConnectionPool:
+    """
+    Process-wide pool of idle PostgreSQL connections for one `PostgresConfig`.
+
+    A connection is opened (and `statement_timeout` set) once, then handed out again on later checkouts:
+    preflight checks, the main command, and every command of a batch share it instead of reconnecting.
+    At most `pg.pool_size` idle connections are kept; extra ones are closed on release.
+    A connection idle for more than `_IDLE_CHECK_SECONDS` is checked with `SELECT 1` before it is handed out;
+    one the server has closed is dropped and the next idle one (or a new connection) is used instead.
+    """
+
+    def __init__(self, pg: PostgresConfig):
+        self._pg = pg
+        self._lock = threading.Lock()
+        self._idle: list[tuple[Any, float]] = []
+        self._driver: Any = None
+
+    @property
+    def driver(self) -> Any:
+        if self._driver is None:
+            self._driver = _load_driver(self._pg.driver, prepare=self._pg.prepare_statements)
+        return self._driver
+
+    def _open(self) -> Any:
+        conn = self.driver.connect(self._pg)
+        try:
+            with conn.cursor() as cur:
+                cur.execute(_SET_STATEMENT_TIMEOUT_SQL, (str(int(self._pg.statement_timeout_seconds * 1000)),))
+            conn.commit()
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    @staticmethod
+    def _alive(conn: Any) -> bool:
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+            conn.rollback()
+        except Exception:
+            with contextlib.suppress(Exception):
+                conn.close()
+            return False
+        return True
+
+    def acquire(self) -> Any:
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                conn, released_at = self._idle.pop()
+            if conn.closed:
+                continue
+            if time.monotonic() - released_at < _IDLE_CHECK_SECONDS or self._alive(conn):
+                return conn
+        return self._open()
+
+    def release(self, conn: Any, *, discard: bool = False) -> None:
+        if not discard and not conn.closed:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+            else:
+                with self._lock:
+                    if len(self._idle) < int(self._pg.pool_size):
+                        self._idle.append((conn, time.monotonic()))
+                        return
+        with contextlib.suppress(Exception):
+            conn.close()
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            with contextlib.suppress(Exception):
+                conn.close()
+
+
+_POOLS: dict[PostgresConfig, ConnectionPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_pool(pg: PostgresConfig) -> ConnectionPool:
+    with _POOLS_LOCK:
+        pool = _POOLS.get(pg)
+        if pool is None:
+            pool = ConnectionPool(pg)
+            _POOLS[pg] = pool
+        return pool
+
+
+@atexit.register
+def close_pools() -> None:
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+        _POOLS.clear()
+    for pool in pools:
+        pool.close()
+
+
+class PostgresSession:
+    """
+    One checked-out PostgreSQL connection shared by many commands.
+
+    Statements run in the current transaction until `commit()` / `rollback()` is called,
+    so the caller decides the transaction boundaries (see `tuxedo batch`).
+    Savepoints let a single failed command be undone without aborting the whole transaction.
+    """
+
+    _SAVEPOINT = "tuxedo_cmd"
+
+    def __init__(self, conn: Any, driver: Any):
+        self._conn = conn
+        self._driver = driver
+
+    def execute(self, statements: Sequence[SQLStatement], *, timed: bool = False) -> list[ExecResult]:
+        return self._driver.execute(self._conn, statements, timed=timed)
+
+    def explain(self, statements: Sequence[SQLStatement], *, analyze: bool = True) -> list[ExecResult]:
+        """
+        Run every statement under `EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)`, in order, in the current transaction.
+
+        ANALYZE really executes the statement (later statements see earlier effects), so the caller must roll back.
+        Statements EXPLAIN cannot wrap (DDL, DO blocks, COPY) are executed as-is, with timings but no plan.
+        With `analyze=False` only the planner's choice is captured (`EXPLAIN (FORMAT JSON)`): nothing runs,
+        and `rowcount` is the estimated row count.
+        """
+        options = "ANALYZE, BUFFERS, FORMAT JSON" if analyze else "FORMAT JSON"
+        results: list[ExecResult] = []
+        for stmt in statements:
+            if not _explainable(stmt):
+                results.extend(self._driver.execute(self._conn, [stmt], timed=True))
+                continue
+            wrapped = SQLStatement(
+                title=stmt.title,
+                sql=f"EXPLAIN ({options})\n{stmt.sql}",
+                params=stmt.params,
+                sensitive_params=stmt.sensitive_params,
+            )
+            res = self._driver.execute(self._conn, [wrapped], timed=True)[0]
+            plan = res.rows[0][0] if res.rows else None
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            if isinstance(plan, list):
+                plan = plan[0] if plan else None
+            top = (plan or {}).get("Plan") or {}
+            results.append(
+                ExecResult(
+                    title=stmt.title,
+                    rowcount=int(top.get("Actual Rows" if analyze else "Plan Rows") or 0),
+                    elapsed_ms=res.elapsed_ms,
+                    plan=plan,
+                )
+            )
+        return results
+
+    def stream(self, stmt: SQLStatement, *, chunk_size: int) -> tuple[list[str], Iterator[tuple[Any, ...]]]:
+        return self._driver.stream(self._conn, stmt, chunk_size)
+
+    @contextlib.contextmanager
+    def autocommit(self) -> Iterator[None]:
+        """
+        Run statements outside a transaction block: each one commits (or fails) on its own.
+
+        Needed by `CREATE INDEX CONCURRENTLY` and by long maintenance steps that must not hold
+        their locks until the end of the whole program. Any open transaction is rolled back first.
+        """
+        self._conn.rollback()
+        self._conn.autocommit = True
+        try:
+            yield
+        finally:
+            self._conn.autocommit = False
+
+    def commit(self) -> None:
+        self._conn.commit()
+
+    def rollback(self) -> None:
+        self._conn.rollback()
+
+    def _simple(self, sql: str) -> None:
+        with self._conn.cursor() as cur:
+            cur.execute(sql)
+
+    def set_statement_timeout(self, ms: int) -> None:
+        with self._conn.cursor() as cur:
+            cur.execute(_SET_STATEMENT_TIMEOUT_SQL, (str(int(ms)),))
+
+    def savepoint(self) -> None:
+        self._simple(f"SAVEPOINT {self._SAVEPOINT};")
+
+    def release_savepoint(self) -> None:
+        self._simple(f"RELEASE SAVEPOINT {self._SAVEPOINT};")
+
+    def rollback_to_savepoint(self) -> None:
+        self._simple(f"ROLLBACK TO SAVEPOINT {self._SAVEPOINT};")
 
 
 class PostgresExecutor:
     """
     Executes SQLStatements in PostgreSQL (one transaction per command).
 
-    This class exists so the CLI layer doesn't have to know psycopg2 details:
-    - how to connect;
+    This class exists so the CLI layer doesn't have to know driver details:
+    - how to connect (pooled per process, see `ConnectionPool`);
     - how to set `statement_timeout`;
-    - when to call `fetchall()`.
+    - when to call `fetchall()`;
+    - how to stream `COPY ... FROM STDIN` / `COPY ... TO STDOUT` data (`SQLStatement.copy_source` / `copy_target`);
+    - when statements can be pipelined into one round trip (psycopg 3);
+    - how to stream large read results through a server-side cursor (`stream()`);
+    - how to time statements and capture their plans (`run(timings=True)`, `explain()`).
     """
 
     def __init__(self, pg: PostgresConfig):
         self._pg = pg
 
-    def run(self, statements: Sequence[SQLStatement]) -> list[ExecResult]:
+    @contextlib.contextmanager
+    def session(self) -> Iterator[PostgresSession]:
+        """Check out one pooled connection for many commands; anything not committed is rolled back on exit."""
+        pool = get_pool(self._pg)
+        conn = pool.acquire()
+        discard = False
         try:
-            import psycopg2  # type: ignore[import-not-found]
-        except Exception as exc:  # pragma: no cover
-            raise RuntimeError(
-                "psycopg2 is required to execute SQL. Install with: pip install ./tuxedo[postgres] "
-                "or apt install python3-psycopg2 (or run with --sql)."
-            ) from exc
+            yield PostgresSession(conn, pool.driver)
+        except BaseException:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+            raise
+        finally:
+            pool.release(conn, discard=discard)
 
-        conn = psycopg2.connect(self._pg.dsn or "", connect_timeout=self._pg.connect_timeout_seconds)
-        try:
-            with conn:
-                with conn.cursor() as cur:
-                    cur.execute("SET statement_timeout TO %s;", (int(self._pg.statement_timeout_seconds * 1000),))
-                    results: list[ExecResult] = []
-                    for stmt in statements:
-                        cur.execute(stmt.sql, stmt.params)
-                        rows = None
-                        if cur.description is not None:
-                            rows = cur.fetchall()
-                        results.append(ExecResult(title=stmt.title, rowcount=int(cur.rowcount), rows=rows))
+    def run(self, statements: Sequence[SQLStatement], *, timings: bool = False) -> list[ExecResult]:
+        """
+        Execute and commit. With `timings`, every result carries `elapsed_ms` / `bytes_fetched`
+        (statements then run one round trip each, without pipelining).
+        """
+        with self.session() as session:
+            results = session.execute(statements, timed=timings)
+            session.commit()
             return results
-        finally:
-            conn.close()
+
+    def run_autocommit(
+        self,
+        statements: Sequence[SQLStatement],
+        *,
+        timings: bool = False,
+        statement_timeout_ms: int | None = None,
+    ) -> list[ExecResult]:
+        """
+        Execute statements one transaction each, in order; stops at the first failure (earlier ones stay committed).
+
+        `statement_timeout_ms` replaces `postgres.statement_timeout_seconds` for this run (0: no limit), for
+        maintenance steps that scan whole tables; the pooled connection gets the configured value back afterwards.
+        """
+        with self.session() as session:
+            with session.autocommit():
+                if statement_timeout_ms is None:
+                    return session.execute(statements, timed=timings)
+                session.set_statement_timeout(int(statement_timeout_ms))
+                try:
+                    return session.execute(statements, timed=timings)
+                finally:
+                    session.set_statement_timeout(int(self._pg.statement_timeout_seconds * 1000))
+
+    def explain(self, statements: Sequence[SQLStatement], *, analyze: bool = True) -> list[ExecResult]:
+        """Capture `EXPLAIN ANALYZE` plans for a whole program in one transaction that is always rolled back."""
+        with self.session() as session:
+            try:
+                return session.explain(statements, analyze=analyze)
+            finally:
+                session.rollback()
+
+    @contextlib.contextmanager
+    def stream(
+        self, statement: SQLStatement, *, chunk_size: int = 1000
+    ) -> Iterator[tuple[list[str], Iterator[tuple[Any, ...]]]]:
+        """
+        Run one read-only statement through a server-side cursor.
+
+        Yields `(columns, rows)`; `rows` fetches `chunk_size` rows per round trip, so memory stays flat
+        however large the result is. The cursor's transaction is rolled back when the block exits.
+        """
+        with self.session() as session:
+            yield session.stream(statement, chunk_size=chunk_size)
+
+
+class AsyncPostgresExecutor:
+    """
+    Runs independent read programs concurrently, each on its own pooled connection.
+
+    The drivers are blocking (psycopg2 has no asyncio API), so every program runs in a worker thread
+    through `asyncio.to_thread`; both drivers release the GIL while they wait on the server, so N programs
+    cost about one round trip instead of N. At most `concurrency` (default: `postgres.pool_size`)
+    connections are checked out at once. Programs do not share a transaction or a snapshot:
+    use this for reads whose results are independent of each other (`find group`, `find user a* b*`).
+    """
+
+    def __init__(self, pg: PostgresConfig, *, concurrency: int | None = None):
+        self._pg = pg
+        self._executor = PostgresExecutor(pg)
+        self._concurrency = max(1, int(pg.pool_size if concurrency is None else concurrency))
+
+    async def gather(
+        self, programs: Sequence[Sequence[SQLStatement]], *, timings: bool = False
+    ) -> list[list[ExecResult]]:
+        """Run every program (one transaction each); results come back in the order of `programs`."""
+        import asyncio
+
+        limit = asyncio.Semaphore(self._concurrency)
+
+        async def run_one(statements: Sequence[SQLStatement]) -> list[ExecResult]:
+            async with limit:
+                return await asyncio.to_thread(self._executor.run, statements, timings=timings)
+
+        return list(await asyncio.gather(*(run_one(p) for p in programs)))
+
+    def run(self, programs: Sequence[Sequence[SQLStatement]], *, timings: bool = False) -> list[list[ExecResult]]:
+        """Blocking entry point for synchronous callers (the CLI, `tuxedo serve` worker threads)."""
+        if len(programs) <= 1:
+            return [self._executor.run(p, timings=timings) for p in programs]
+        import asyncio
+
+        return asyncio.run(self.gather(programs, timings=timings))
@@ -0,0 +1,47 @@
+"""`tuxedo doctor`: reading the scans out of `EXPLAIN (FORMAT JSON)` plans."""
+
+from __future__ import annotations
+
+from typing import Any
+
+# Scan nodes of a plan: how each relation is read.
+_SCAN_NODE_TYPES = frozenset(
+    {"Seq Scan", "Index Scan", "Index Only Scan", "Bitmap Heap Scan", "Bitmap Index Scan", "Tid Scan"}
+)
+
+
+def scan_nodes(plan: dict[str, Any] | None) -> list[tuple[str, str, str]]:
+    """`(node type, relation, index)` of every scan in an `EXPLAIN (FORMAT JSON)` plan, in plan order."""
+    scans = []
+    stack = [(plan or {}).get("Plan") or {}]
+    while stack:
+        node = stack.pop()
+        if node.get("Node Type") in _SCAN_NODE_TYPES:
+            scans.append((node["Node Type"], node.get("Relation Name") or "", node.get("Index Name") or ""))
+        stack.extend(reversed(node.get("Plans") or []))
+    return scans
+
+
+def describe_scans(scans: list[tuple[str, str, str]]) -> str:
+    # "Index Scan using radacct_open_sessions_idx on radacct, Seq Scan on radcheck"
+    parts = []
+    for node_type, relation, index in scans:
+        label = node_type
+        if index:
+            label += f" using {index}"
+        if relation:
+            label += f" on {relation}"
+        parts.append(label)
+    return ", ".join(dict.fromkeys(parts))
+
+
+def large_seq_scans(
+    scans: list[tuple[str, str, str]], rows_by_relation: dict[str, int], *, min_rows: int
+) -> list[str]:
+    """Relations read by a sequential scan that have at least `min_rows` estimated rows ("radacct (~2400000 rows)")."""
+    found = []
+    for node_type, relation, _ in scans:
+        rows = int(rows_by_relation.get(relation) or 0)
+        if node_type == "Seq Scan" and rows >= min_rows:
+            found.append(f"{relation} (~{rows} rows)")
+    return list(dict.fromkeys(found))
@@ -0,0 +1,267 @@
+"""
+Prometheus exposition shared by the TuxedoVPN daemons (exporters, DPI agent, sync services).
+
+Standard library only, with no imports from the rest of the package: the `common` role installs this file
+(with `__init__.py`) on every host, including VPN nodes that have no `tuxedo` CLI.
+
+A daemon fills a `Registry` per collection (or per scrape) and answers `/metrics` with a `MetricsHandler`
+subclass. Label sets are rendered and escaped once per distinct value tuple (`LabelSet`), families are written
+contiguously in either the Prometheus text format or OpenMetrics (negotiated from `Accept`), and the body is
+streamed in chunks, gzip-compressed when the scraper sends `Accept-Encoding: gzip`.
+"""
+
+from __future__ import annotations
+
+import math
+import zlib
+from http.server import BaseHTTPRequestHandler
+from typing import Any, Iterable, Iterator
+
+TEXT_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# Rendered text is encoded, compressed and written in pieces of about this size.
+_CHUNK_BYTES = 64 * 1024
+# Distinct label value tuples remembered per LabelSet; the cache starts over past this (e.g. after user churn).
+_LABEL_CACHE_MAX = 200_000
+_GZIP_LEVEL = 5
+
+
+def escape_label_value(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _escape_help(text: str, *, openmetrics: bool) -> str:
+    text = text.replace("\\", "\\\\").replace("\n", "\\n")
+    return text.replace('"', '\\"') if openmetrics else text
+
+
+def _format_value(value: Any) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return str(value)
+    value = float(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+
+class LabelSet:
+    """
+    Label names of a series family plus constant labels, rendering `{k="v",...}` strings.
+
+    `ls(*values)` returns the escaped label string for those values; each distinct tuple is rendered once and
+    then reused (and the same string object shared by every family using this LabelSet), so a per-user series
+    costs one dict lookup per scrape. Constant labels are escaped once, up front; a constant label whose name
+    is also a per-series label is dropped (the per-series value wins).
+    """
+
+    __slots__ = ("names", "_const", "_cache")
+
+    def __init__(self, names: Iterable[str] = (), const: dict[str, Any] | None = None):
+        self.names = tuple(names)
+        const_parts = [
+            f'{key}="{escape_label_value(value)}"'
+            for key, value in sorted((const or {}).items())
+            if value is not None and key not in self.names
+        ]
+        self._const = ",".join(const_parts)
+        self._cache: dict[tuple[Any, ...], str] = {}
+
+    def __call__(self, *values: Any) -> str:
+        cached = self._cache.get(values)
+        if cached is not None:
+            return cached
+        if len(values) != len(self.names):
+            raise ValueError(f"expected {len(self.names)} label values for {self.names}, got {len(values)}")
+        parts = [self._const] if self._const else []
+        parts.extend(f'{name}="{escape_label_value(value)}"' for name, value in zip(self.names, values))
+        rendered = "{" + ",".join(parts) + "}" if parts else ""
+        if len(self._cache) >= _LABEL_CACHE_MAX:
+            self._cache.clear()
+        self._cache[values] = rendered
+        return rendered
+
+
+_NO_LABELS = LabelSet()
+
+
+class MetricFamily:
+    """One metric name with its HELP/TYPE and samples; created through `Registry.gauge()`/`counter()`."""
+
+    __slots__ = ("name", "kind", "help", "labels", "samples")
+
+    def __init__(self, name: str, kind: str, help: str, labels: LabelSet):
+        self.name = name
+        self.kind = kind
+        self.help = help
+        self.labels = labels
+        self.samples: list[tuple[str, Any]] = []
+
+    def add(self, value: Any, *label_values: Any, labels: LabelSet | None = None) -> None:
+        """Add a sample; `label_values` follow the names of `labels` (default: the family's `LabelSet`)."""
+        self.samples.append(((labels or self.labels)(*label_values), value))
+
+    def _render(self, *, openmetrics: bool) -> Iterator[str]:
+        name = self.name
+        kind = self.kind
+        family = name
+        if openmetrics and kind == "counter":
+            # OpenMetrics names the family without the `_total` suffix its samples carry.
+            if name.endswith("_total"):
+                family = name[: -len("_total")]
+            else:
+                kind = "unknown"
+        if self.help:
+            yield f"# HELP {family} {_escape_help(self.help, openmetrics=openmetrics)}\n"
+        yield f"# TYPE {family} {kind}\n"
+        if self.samples:
+            yield "".join(f"{name}{labels} {_format_value(value)}\n" for labels, value in self.samples)
+
+
+class Registry:
+    """
+    Ordered metric families (and comments) of one exposition.
+
+    `gauge()`/`counter()` return the family registered under that name, creating it on first use, so samples
+    can be added in any order and still come out grouped by family. `comment()` lines (`# ERROR ...`) are
+    written in the text format only: OpenMetrics has no free-form comments.
+    """
+
+    def __init__(self, const_labels: dict[str, Any] | None = None):
+        self._items: list[MetricFamily | str] = []
+        self._families: dict[str, MetricFamily] = {}
+        self._const_labels = LabelSet((), const_labels) if const_labels else _NO_LABELS
+
+    def gauge(self, name: str, help: str = "", labels: LabelSet | None = None) -> MetricFamily:
+        return self._family(name, "gauge", help, labels)
+
+    def counter(self, name: str, help: str = "", labels: LabelSet | None = None) -> MetricFamily:
+        return self._family(name, "counter", help, labels)
+
+    def _family(self, name: str, kind: str, help: str, labels: LabelSet | None) -> MetricFamily:
+        family = self._families.get(name)
+        if family is None:
+            family = MetricFamily(name, kind, help, labels or self._const_labels)
+            self._families[name] = family
+            self._items.append(family)
+        return family
+
+    def comment(self, text: str) -> None:
+        self._items.append("# " + " ".join(str(text).split()) + "\n")
+
+    def render(self, *, openmetrics: bool = False) -> Iterator[str]:
+        for item in self._items:
+            if isinstance(item, str):
+                if not openmetrics:
+                    yield item
+            else:
+                yield from item._render(openmetrics=openmetrics)
+
+
+def render(registries: Iterable[Registry], *, openmetrics: bool = False) -> Iterator[str]:
+    for registry in registries:
+        yield from registry.render(openmetrics=openmetrics)
+    if openmetrics:
+        yield "# EOF\n"
+
+
+def _accepts(header: str, token: str) -> bool:
+    """True if the `Accept`/`Accept-Encoding` header lists `token` with a non-zero quality."""
+    for part in (header or "").split(","):
+        fields = [field.strip() for field in part.split(";")]
+        if fields[0].lower() != token:
+            continue
+        for field in fields[1:]:
+            key, _, value = field.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    return float(value) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+
+def _encoded_chunks(pieces: Iterable[str], *, compress: bool) -> Iterator[bytes]:
+    compressor = zlib.compressobj(_GZIP_LEVEL, zlib.DEFLATED, 31) if compress else None
+    buffered: list[str] = []
+    size = 0
+    for piece in pieces:
+        buffered.append(piece)
+        size += len(piece)
+        if size < _CHUNK_BYTES:
+            continue
+        data = "".join(buffered).encode("utf-8")
+        buffered.clear()
+        size = 0
+        if compressor is not None:
+            data = compressor.compress(data)
+        if data:
+            yield data
+    data = "".join(buffered).encode("utf-8")
+    if compressor is not None:
+        data = compressor.compress(data) + compressor.flush()
+    if data:
+        yield data
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """
+    `GET <metrics_path>` handler; subclasses set `metrics_path` and implement `collect()`.
+
+    `collect()` returns `(status, registries)`. HTTP/1.1 scrapers get a chunked body (no need to hold the whole
+    payload in memory to compute `Content-Length`); HTTP/1.0 clients get it in one piece.
+    """
+
+    protocol_version = "HTTP/1.1"
+    metrics_path = "/metrics"
+
+    def collect(self) -> tuple[int, list[Registry]]:
+        raise NotImplementedError
+
+    def do_GET(self) -> None:
+        request_path = (self.path or "/").split("?", 1)[0]
+        if request_path.rstrip("/") != self.metrics_path.rstrip("/"):
+            self._send_plain(404, b"Not Found\n")
+            return
+        status, registries = self.collect()
+        self.send_metrics(status, registries)
+
+    def send_metrics(self, status: int, registries: Iterable[Registry]) -> None:
+        openmetrics = _accepts(self.headers.get("Accept", ""), "application/openmetrics-text")
+        compress = _accepts(self.headers.get("Accept-Encoding", ""), "gzip")
+        chunks = _encoded_chunks(render(registries, openmetrics=openmetrics), compress=compress)
+        chunked = self.request_version == "HTTP/1.1"
+        if not chunked:
+            chunks = iter([b"".join(chunks)])
+        self.send_response(status)
+        self.send_header("Content-Type", OPENMETRICS_CONTENT_TYPE if openmetrics else TEXT_CONTENT_TYPE)
+        self.send_header("Cache-Control", "no-store")
+        self.send_header("Vary", "Accept, Accept-Encoding")
+        if compress:
+            self.send_header("Content-Encoding", "gzip")
+        if chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for data in chunks:
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            body = next(chunks, b"")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def _send_plain(self, status: int, body: bytes) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt: str, *args: Any) -> None:
+        return
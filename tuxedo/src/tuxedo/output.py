@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import csv
+import itertools
+import json
+from typing import Any, Iterable, Sequence, TextIO
+
+# Rows are flushed to the output every N rows so `tuxedo ... | head` sees data immediately.
+_FLUSH_EVERY_ROWS = 500
+
+
+def json_default(value: Any) -> Any:
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+def write_ndjson(columns: Sequence[str], rows: Iterable[Sequence[Any]], out: TextIO) -> int:
+    """Write one JSON object per row (keys = column names) as rows arrive; returns the row count."""
+    count = 0
+    for row in rows:
+        out.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=json_default) + "\n")
+        count += 1
+        if count % _FLUSH_EVERY_ROWS == 0:
+            out.flush()
+    out.flush()
+    return count
+
+
+def write_csv(columns: Sequence[str], rows: Iterable[Sequence[Any]], out: TextIO, *, header: bool = True) -> int:
+    """Write RFC 4180 CSV (with a header row) as rows arrive; returns the row count."""
+    writer = csv.writer(out, lineterminator="\n")
+    if header:
+        writer.writerow(columns)
+    count = 0
+    for row in rows:
+        writer.writerow([_csv_value(v) for v in row])
+        count += 1
+        if count % _FLUSH_EVERY_ROWS == 0:
+            out.flush()
+    out.flush()
+    return count
+
+
+def _plan_node_line(node: dict[str, Any]) -> str:
+    label = node.get("Node Type", "?")
+    if node.get("Relation Name"):
+        label += f" on {node['Relation Name']}"
+    if node.get("Index Name"):
+        label += f" using {node['Index Name']}"
+    details = [
+        f"rows={node.get('Actual Rows', '?')}",
+        f"loops={node.get('Actual Loops', '?')}",
+        f"time={float(node.get('Actual Total Time') or 0):.3f} ms",
+        f"shared hit={node.get('Shared Hit Blocks', 0)} read={node.get('Shared Read Blocks', 0)}",
+    ]
+    return f"{label}  ({', '.join(details)})"
+
+
+def write_plan_text(plan: dict[str, Any], out: TextIO) -> None:
+    """Indented one-line-per-node summary of an `EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)` plan."""
+    stack = [(plan.get("Plan") or {}, 0)]
+    while stack:
+        node, depth = stack.pop()
+        out.write(f"   {'  ' * depth}-> {_plan_node_line(node)}\n")
+        stack.extend((child, depth + 1) for child in reversed(node.get("Plans") or []))
+    for key in ("Planning Time", "Execution Time"):
+        if key in plan:
+            out.write(f"   {key.lower()}: {float(plan[key]):.3f} ms\n")
+    for trigger in plan.get("Triggers") or []:
+        out.write(f"   trigger {trigger.get('Trigger Name')}: {float(trigger.get('Time') or 0):.3f} ms ({trigger.get('Calls')} calls)\n")
+
+
+def write_text(
+    rows: Iterable[Sequence[Any]],
+    out: TextIO,
+    *,
+    title: str | None = None,
+    columns: Sequence[str] | None = None,
+) -> int:
+    """
+    Tab-separated rows (single-column rows are printed as-is) as they arrive; returns the row count.
+
+    With `title`, the layout is the buffered text output of a single result: the title line first, except
+    for a plain list (one column, more than one row). `columns` adds a tab-separated header line.
+    """
+    rows = iter(rows)
+    head = list(itertools.islice(rows, 2))
+    if title is not None and not (len(head) > 1 and len(head[0]) == 1):
+        out.write(f"{title}\n")
+    if columns:
+        out.write("\t".join(columns) + "\n")
+    count = 0
+    for row in itertools.chain(head, rows):
+        if len(row) == 1:
+            out.write(f"{row[0]}\n")
+        else:
+            out.write("\t".join("" if v is None else str(v) for v in row) + "\n")
+        count += 1
+        if count % _FLUSH_EVERY_ROWS == 0:
+            out.flush()
+    out.flush()
+    return count
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import contextlib
+import datetime
+import gzip
+import os
+from typing import Any
+
+
+def migration_boundary(today: datetime.date) -> datetime.date:
+    """
+    Upper bound of the legacy partition for `radacct partition-migrate`: the first day of the month after next.
+
+    Until the switch, the range constraint rejects rows at or past this bound, so it must stay out of reach
+    of live accounting while the preparation steps run (validation scans the whole table).
+    """
+    month = today.month + 2
+    return datetime.date(today.year + (month - 1) // 12, (month - 1) % 12 + 1, 1)
+
+
+def legacy_start(today: datetime.date) -> datetime.date:
+    """
+    Lower bound of the legacy partition: the first day of the current month. Older months move into their own
+    monthly partitions during `radacct partition-migrate`, so `radacct archive` can drop them one by one.
+    """
+    return today.replace(day=1)
+
+
+def archive_path(directory: str, partition: str, fmt: str) -> str:
+    # "public.radacct_p202501" -> "<dir>/radacct_p202501.ndjson.gz"
+    return os.path.join(directory, f"{partition.rsplit('.', 1)[-1]}.{fmt}.gz")
+
+
+class ArchiveFile:
+    """
+    `write()` target for `COPY ... TO STDOUT` (`SQLStatement.copy_target`) that gzip-compresses into `<path>.partial`.
+
+    `commit()` fsyncs and renames it to `path`, so a final name only ever holds a complete export;
+    `discard()` removes the partial file after a failed export.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._partial = path + ".partial"
+        self._raw = open(self._partial, "wb")
+        self._gz = gzip.GzipFile(
+            filename=os.path.basename(path[: -len(".gz")]), mode="wb", fileobj=self._raw, compresslevel=6
+        )
+        self.bytes_written = 0
+
+    def write(self, data: Any) -> int:
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.bytes_written += len(data)
+        return self._gz.write(data)
+
+    def commit(self) -> int:
+        """Finish the file and return its compressed size."""
+        self._gz.close()
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+        self._raw.close()
+        os.replace(self._partial, self.path)
+        directory = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+        return os.path.getsize(self.path)
+
+    def discard(self) -> None:
+        with contextlib.suppress(Exception):
+            self._gz.close()
+        with contextlib.suppress(Exception):
+            self._raw.close()
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self._partial)
@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+import contextlib
+import io
+import json
+import os
+import shlex
+import signal
+import socket
+import socketserver
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Any
+from urllib.parse import urlsplit
+
+from . import cli
+from .client import default_socket_path
+from .db import get_pool
+
+# Request bodies are tiny (argv lists); anything larger is rejected.
+_MAX_REQUEST_BYTES = 1024 * 1024
+
+_SERVE_EXCLUDED_ACTIONS = frozenset(
+    {"serve", "batch", "import_users", "apply_state", "radacct_archive", "doctor_indexes"}
+)
+
+
+class _ThreadLocalStream(io.TextIOBase):
+    """
+    `sys.stdout` / `sys.stderr` replacement that sends writes to a per-thread buffer while a request is
+    being handled, and to the real stream otherwise. The CLI code keeps writing to `sys.stdout`
+    and concurrent requests do not mix their output.
+    """
+
+    def __init__(self, fallback: Any):
+        self._fallback = fallback
+        self._local = threading.local()
+
+    def _target(self) -> Any:
+        buf = getattr(self._local, "buf", None)
+        return self._fallback if buf is None else buf
+
+    def write(self, text: str) -> int:
+        return self._target().write(text)
+
+    def flush(self) -> None:
+        self._target().flush()
+
+    def isatty(self) -> bool:
+        return False if getattr(self._local, "buf", None) is not None else self._fallback.isatty()
+
+    def fileno(self) -> int:
+        return self._fallback.fileno()
+
+    @contextlib.contextmanager
+    def capture(self):
+        buf = io.StringIO()
+        self._local.buf = buf
+        try:
+            yield buf
+        finally:
+            self._local.buf = None
+
+
+class TuxedoService:
+    """
+    Executes CLI commands (argv lists) in-process with a cached config, one `FreeradiusBackend`,
+    one prebuilt argument parser and the process-wide connection pool.
+
+    Requests are never interactive: passwords must be passed explicitly.
+    """
+
+    def __init__(self, cfg, backend):
+        self._cfg = cfg
+        self._backend = backend
+        self._parser = cli._build_parser(parser_class=cli._NonExitingArgumentParser)
+
+    def _run(self, argv: list[str]) -> int:
+        args = self._parser.parse_args(argv)
+        if args.action in _SERVE_EXCLUDED_ACTIONS:
+            raise ValueError(f"{args.cmd!r} cannot be run through tuxedo serve")
+        if args.config:
+            raise ValueError("--config cannot be used with tuxedo serve (the server uses its own config)")
+        if getattr(args, "from_file", None) is not None:
+            raise ValueError("--from-file cannot be used with tuxedo serve (the file is read by the client)")
+        return cli._execute(args, self._cfg, self._backend, interactive=False)
+
+    def run(self, argv: list[str]) -> dict[str, Any]:
+        with sys.stdout.capture() as out, sys.stderr.capture() as err:
+            try:
+                code = cli._guarded(lambda: self._run(argv))
+            except SystemExit as exc:  # --help / argparse exit()
+                code = exc.code if isinstance(exc.code, int) else 0
+        return {"exit_code": int(code), "stdout": out.getvalue(), "stderr": err.getvalue()}
+
+
+def _request_argv(payload: Any) -> list[str]:
+    if isinstance(payload, list):
+        return [str(v) for v in payload]
+    if isinstance(payload, dict):
+        if isinstance(payload.get("argv"), list):
+            return [str(v) for v in payload["argv"]]
+        if isinstance(payload.get("command"), str):
+            return shlex.split(payload["command"])
+    raise ValueError("request body must be a JSON array or an object with 'argv' (list) or 'command' (string)")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "tuxedo"
+    protocol_version = "HTTP/1.1"
+    # Idle keep-alive connections must not pin a worker forever.
+    timeout = 60
+
+    def address_string(self) -> str:
+        if isinstance(self.client_address, tuple) and self.client_address:
+            return str(self.client_address[0])
+        return "unix"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if getattr(self.server, "verbose", False):
+            sys.__stderr__.write("%s - %s\n" % (self.address_string(), format % args))
+
+    def _send_json(self, status: int, payload: dict[str, Any]) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        if self.path.split("?", 1)[0] == "/healthz":
+            self._send_json(200, {"ok": True})
+            return
+        self._send_json(404, {"error": "not found"})
+
+    def do_POST(self) -> None:
+        if self.path.split("?", 1)[0] != "/v1/run":
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0 or length > _MAX_REQUEST_BYTES:
+            self._send_json(413, {"error": "request body too large or invalid Content-Length"})
+            return
+        try:
+            argv = _request_argv(json.loads(self.rfile.read(length) or b"null"))
+        except (ValueError, UnicodeDecodeError) as exc:
+            self._send_json(400, {"error": str(exc)})
+            return
+        self._send_json(200, self.server.service.run(argv))
+
+
+class _BoundedWorkersMixIn:
+    """Handle each connection on a fixed-size thread pool: at most `workers` commands run at once."""
+
+    workers = 4
+
+    def process_request(self, request, client_address):
+        if getattr(self, "_pool", None) is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="tuxedo-serve")
+        self._pool.submit(self._process_request_worker, request, client_address)
+
+    def _process_request_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        pool = getattr(self, "_pool", None)
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+
+class _UnixHTTPServer(_BoundedWorkersMixIn, socketserver.UnixStreamServer):
+    def get_request(self):
+        conn, _ = self.socket.accept()
+        return conn, ("unix", 0)
+
+
+class _TCPHTTPServer(_BoundedWorkersMixIn, HTTPServer):
+    pass
+
+
+def _make_server(listen: str, *, socket_mode: int):
+    if listen.startswith(("http://", "tcp://")):
+        parts = urlsplit(listen)
+        host = parts.hostname or "127.0.0.1"
+        if host not in ("127.0.0.1", "::1", "localhost"):
+            sys.stderr.write(f"warning: tuxedo serve is listening on non-loopback address {host!r}.\n")
+        return _TCPHTTPServer((host, int(parts.port or 8765)), _Handler), f"http://{host}:{parts.port or 8765}"
+
+    path = listen[len("unix:") :] if listen.startswith("unix:") else listen
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except OSError:
+            os.unlink(path)  # stale socket from a previous run
+        else:
+            raise RuntimeError(f"another tuxedo serve is already listening on {path}")
+        finally:
+            probe.close()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    server = _UnixHTTPServer(path, _Handler)
+    os.chmod(path, socket_mode)
+    return server, f"unix:{path}"
+
+
+def _prewarm(cfg, count: int) -> None:
+    pool = get_pool(cfg.postgres)
+    conns = []
+    try:
+        for _ in range(count):
+            conns.append(pool.acquire())
+    except Exception as exc:
+        sys.stderr.write(f"warning: could not pre-open database connections: {exc}\n")
+    finally:
+        for conn in conns:
+            pool.release(conn)
+
+
+def serve(args, cfg, backend) -> int:
+    workers = int(args.workers)
+    if workers < 1:
+        raise ValueError("serve: --workers must be >= 1")
+    try:
+        socket_mode = int(str(args.socket_mode), 8)
+    except ValueError as exc:
+        raise ValueError(f"serve: invalid --socket-mode: {args.socket_mode!r}") from exc
+    listen = args.listen or default_socket_path() or "http://127.0.0.1:8765"
+
+    if int(cfg.postgres.pool_size) < workers:
+        sys.stderr.write(
+            f"warning: postgres.pool_size={cfg.postgres.pool_size} < --workers={workers}; "
+            "connections beyond the pool size are reopened per request.\n"
+        )
+
+    sys.stdout = _ThreadLocalStream(sys.stdout)
+    sys.stderr = _ThreadLocalStream(sys.stderr)
+
+    server, where = _make_server(listen, socket_mode=socket_mode)
+    server.workers = workers
+    server.service = TuxedoService(cfg, backend)
+    server.verbose = False
+    _prewarm(cfg, min(workers, int(cfg.postgres.pool_size)))
+
+    def _stop(signum, frame):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+    sys.__stderr__.write(f"tuxedo serve: listening on {where} (workers={workers})\n")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if where.startswith("unix:"):
+            with contextlib.suppress(OSError):
+                os.unlink(where[len("unix:") :])
+    return 0
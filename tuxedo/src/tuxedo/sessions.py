@@ -0,0 +1,411 @@
+"""
+ocserv session snapshots shared by the daemons of a VPN node (ocserv exporter, DPI agent).
+
+Standard library only, with no imports from the rest of the package: the `common` role installs this file next to
+`exposition.py` on every host.
+
+`tuxedovpn-sessiond` is the only process that runs `occtl --json show users`: on a fixed interval, and on demand
+when a client asks for a snapshot taken after some moment (concurrent requests share one occtl run). Each run is
+normalized into `Session` records and published as a versioned `Snapshot`; clients fetch it over a unix socket.
+
+Wire format (one request per connection): the client sends `GET <fresh_after>\\n` (UNIX seconds, `0` for "the
+latest"), the server answers with one compact JSON object, `{"version", "taken_at", "error", "occtl_runs",
+"occtl_seconds", "fields", "sessions"}`, where `sessions` holds one positional row per session in `fields` order.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import socket
+import socketserver
+import subprocess
+import threading
+import time
+from dataclasses import dataclass
+from ipaddress import ip_address
+from typing import Any, Callable, Iterable
+
+# occtl keys (lower-cased), in order of preference.
+_USER_KEYS = ("username", "user", "name")
+_GROUP_KEYS = ("groupname", "group", "profile")
+_REMOTE_KEYS = ("remote ip", "remote-host", "remote")
+_IPV4_KEYS = ("ipv4", "ip", "ip4", "assigned_ip", "assigned-ip", "ipv4 address")
+_IPV6_KEYS = ("ipv6", "ipv6 address")
+_ID_KEYS = ("sid", "sessionid", "session id", "session_id", "session-id")
+_CONNECTED_AT_KEYS = ("raw_connected_at", "connected_time", "duration", "uptime")
+_PRIMARY_IP_KEYS = frozenset(_IPV4_KEYS + _IPV6_KEYS)
+
+# How long a client waits for a snapshot (covers one occtl run) before giving up.
+_FETCH_TIMEOUT_SECONDS = 10.0
+_MAX_REQUEST_BYTES = 128
+
+
+@dataclass(frozen=True, slots=True)
+class Session:
+    """
+    One ocserv session, normalized from whatever key spelling the installed occtl uses.
+
+    Addresses are bare IPs (`""` when absent); `other_ips` are addresses found under any other key containing
+    "ip" (for example `P-t-P IPv4`), kept for consumers that match on them. `connected_at` is the UNIX time
+    occtl reports (0 when unknown).
+
+    This is `@dataclass(frozen=True, slots=True)`: fields are read-only after creation and no new attributes can be added.
+    """
+
+    session_id: str
+    username: str
+    group: str
+    remote_ip: str
+    vpn_ip: str
+    vpn_ipv6: str
+    rx_bytes: float
+    tx_bytes: float
+    connected_at: float
+    other_ips: tuple[str, ...] = ()
+
+
+SESSION_FIELDS = tuple(Session.__dataclass_fields__)
+
+
+@dataclass(frozen=True, slots=True)
+class Snapshot:
+    """
+    The sessions of one occtl run.
+
+    `version` grows by one per published run (0: nothing loaded yet); `taken_at` is when that run started.
+    When occtl failed, `error` says why and `sessions` is empty. `occtl_runs`/`occtl_seconds` are the
+    service's cumulative occtl invocations and time spent in them.
+
+    This is `@dataclass(frozen=True, slots=True)`: fields are read-only after creation and no new attributes can be added.
+    """
+
+    version: int
+    taken_at: float
+    sessions: tuple[Session, ...]
+    error: str = ""
+    occtl_runs: int = 0
+    occtl_seconds: float = 0.0
+
+
+def run_occtl(occtl_bin: str, *, timeout: float) -> list[dict[str, Any]]:
+    """Raw `occtl --json show users` entries; RuntimeError when occtl cannot be run or its output parsed."""
+    try:
+        result = subprocess.run(
+            [occtl_bin, "--json", "show", "users"],
+            capture_output=True,
+            text=True,
+            check=False,
+            timeout=timeout,
+        )
+    except (OSError, subprocess.TimeoutExpired) as exc:
+        raise RuntimeError(f"failed to execute occtl: {exc}") from exc
+
+    if result.returncode != 0:
+        raise RuntimeError(f"occtl returned {result.returncode}: {result.stderr.strip()}")
+
+    payload = result.stdout.strip()
+    if not payload:
+        return []
+
+    try:
+        data = json.loads(payload)
+    except json.JSONDecodeError as exc:
+        raise RuntimeError(f"failed to parse occtl JSON: {exc}") from exc
+
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict):
+        for key in ("users", "sessions", "items"):
+            if isinstance(data.get(key), list):
+                return data[key]
+    return []
+
+
+def _clean(value: Any) -> str:
+    if value is None:
+        return ""
+    text = str(value).strip()
+    if text.lower() in ("(none)", "none", "(null)", "null", "n/a", "(n/a)"):
+        return ""
+    return text
+
+
+def _extract_ip(value: Any) -> str:
+    # "10.8.0.5", "10.8.0.5/32", "fd00::5 (peer)" -> bare address; "" when it is not one.
+    text = _clean(value)
+    if not text:
+        return ""
+    text = text.split()[0].split("/", 1)[0]
+    try:
+        ip_address(text)
+    except ValueError:
+        return ""
+    return text
+
+
+def _first(fields: dict[str, Any], keys: Iterable[str]) -> Any:
+    for key in keys:
+        value = fields.get(key)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def _number(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _traffic(raw: dict[str, Any], fields: dict[str, Any], direction: str) -> float:
+    # Newer occtl: {"stats": {"RX": {"bytes": N}}}; older: {"RX": "N"}.
+    stats = raw.get("stats")
+    if isinstance(stats, dict) and isinstance(stats.get(direction), dict) and "bytes" in stats[direction]:
+        return _number(stats[direction]["bytes"])
+    return _number(fields.get(direction.lower()))
+
+
+def normalize(raw_sessions: Iterable[Any]) -> tuple[Session, ...]:
+    """`Session` records from raw occtl entries (entries that are not objects are skipped)."""
+    sessions = []
+    for raw in raw_sessions or ():
+        if not isinstance(raw, dict):
+            continue
+        fields = {str(k).strip().lower(): v for k, v in raw.items()}
+        session_id = _clean(_first(fields, _ID_KEYS))
+        other_ips = []
+        for key, value in fields.items():
+            if "ip" in key and key not in _PRIMARY_IP_KEYS:
+                ip = _extract_ip(value)
+                if ip:
+                    other_ips.append(ip)
+        sessions.append(
+            Session(
+                session_id="" if session_id == "0" else session_id,
+                username=_clean(_first(fields, _USER_KEYS)),
+                group=_clean(_first(fields, _GROUP_KEYS)),
+                remote_ip=_clean(_first(fields, _REMOTE_KEYS)),
+                vpn_ip=_extract_ip(_first(fields, _IPV4_KEYS)),
+                vpn_ipv6=_extract_ip(_first(fields, _IPV6_KEYS)),
+                rx_bytes=_traffic(raw, fields, "RX"),
+                tx_bytes=_traffic(raw, fields, "TX"),
+                connected_at=_number(_first(fields, _CONNECTED_AT_KEYS)),
+                other_ips=tuple(other_ips),
+            )
+        )
+    return tuple(sessions)
+
+
+def encode(snapshot: Snapshot) -> bytes:
+    rows = [
+        [
+            s.session_id,
+            s.username,
+            s.group,
+            s.remote_ip,
+            s.vpn_ip,
+            s.vpn_ipv6,
+            s.rx_bytes,
+            s.tx_bytes,
+            s.connected_at,
+            list(s.other_ips),
+        ]
+        for s in snapshot.sessions
+    ]
+    doc = {
+        "version": snapshot.version,
+        "taken_at": snapshot.taken_at,
+        "error": snapshot.error,
+        "occtl_runs": snapshot.occtl_runs,
+        "occtl_seconds": round(snapshot.occtl_seconds, 6),
+        "fields": SESSION_FIELDS,
+        "sessions": rows,
+    }
+    return json.dumps(doc, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def decode(data: bytes) -> Snapshot:
+    """Inverse of `encode()`; ValueError on anything else (including a server with other fields)."""
+    try:
+        doc = json.loads(data)
+    except ValueError as exc:
+        raise ValueError(f"invalid session snapshot: {exc}") from exc
+    if not isinstance(doc, dict) or tuple(doc.get("fields") or ()) != SESSION_FIELDS:
+        raise ValueError("invalid session snapshot: unexpected layout")
+    try:
+        sessions = tuple(
+            Session(
+                str(row[0]),
+                str(row[1]),
+                str(row[2]),
+                str(row[3]),
+                str(row[4]),
+                str(row[5]),
+                float(row[6]),
+                float(row[7]),
+                float(row[8]),
+                tuple(str(ip) for ip in row[9]),
+            )
+            for row in doc.get("sessions") or ()
+        )
+        return Snapshot(
+            version=int(doc["version"]),
+            taken_at=float(doc["taken_at"]),
+            sessions=sessions,
+            error=str(doc.get("error") or ""),
+            occtl_runs=int(doc.get("occtl_runs") or 0),
+            occtl_seconds=float(doc.get("occtl_seconds") or 0.0),
+        )
+    except (KeyError, IndexError, TypeError, ValueError) as exc:
+        raise ValueError(f"invalid session snapshot: {exc}") from exc
+
+
+def fetch(socket_path: str, *, fresh_after: float = 0.0, timeout: float = _FETCH_TIMEOUT_SECONDS) -> Snapshot:
+    """
+    Snapshot from `tuxedovpn-sessiond` taken at or after `fresh_after` (0: the latest one).
+
+    Raises OSError when the service is unreachable and ValueError on a malformed answer; callers fall back to
+    running occtl themselves.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        sock.sendall(f"GET {max(0.0, float(fresh_after)):.6f}\n".encode("ascii"))
+        chunks = []
+        while True:
+            chunk = sock.recv(256 * 1024)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    return decode(b"".join(chunks))
+
+
+class SnapshotService:
+    """
+    Publishes `Snapshot`s of `load()` (raw occtl entries, RuntimeError on failure), one run at a time.
+
+    `get(fresh_after)` returns the current snapshot when it was taken at or after `fresh_after`. Otherwise the
+    caller either waits for the run in progress, or starts one itself once `min_refresh_seconds` have passed
+    since the previous run started, so a burst of requests costs one occtl run. `poll()` keeps the snapshot at
+    most `interval_seconds` old for clients that only want the latest one.
+    """
+
+    def __init__(
+        self,
+        load: Callable[[], list[dict[str, Any]]],
+        *,
+        interval_seconds: float,
+        min_refresh_seconds: float,
+        wait_seconds: float = _FETCH_TIMEOUT_SECONDS,
+    ):
+        self._load = load
+        self.interval_seconds = max(0.1, float(interval_seconds))
+        self.min_refresh_seconds = max(0.0, float(min_refresh_seconds))
+        self.wait_seconds = float(wait_seconds)
+        self._cond = threading.Condition()
+        self._snapshot = Snapshot(version=0, taken_at=0.0, sessions=(), error="no occtl run yet")
+        self._encoded: bytes | None = None
+        self._refreshing = False
+        self._last_started = 0.0
+        self._occtl_runs = 0
+        self._occtl_seconds = 0.0
+
+    def get(self, fresh_after: float = 0.0) -> Snapshot:
+        # A client clock cannot ask for the future: a run starting now satisfies any request made now.
+        fresh_after = min(float(fresh_after), time.time())
+        deadline = time.monotonic() + self.wait_seconds
+        with self._cond:
+            while True:
+                snapshot = self._snapshot
+                if snapshot.version > 0 and snapshot.taken_at >= fresh_after:
+                    return snapshot
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return snapshot
+                if self._refreshing:
+                    self._cond.wait(remaining)
+                    continue
+                wait = self._last_started + self.min_refresh_seconds - time.time()
+                if wait > 0:
+                    self._cond.wait(min(wait, remaining))
+                    continue
+                started = time.time()
+                self._last_started = started
+                self._refreshing = True
+                break
+        self._refresh(started)
+        with self._cond:
+            return self._snapshot
+
+    def encoded(self, fresh_after: float = 0.0) -> bytes:
+        """`encode(get(fresh_after))`, encoded once per published snapshot."""
+        snapshot = self.get(fresh_after)
+        with self._cond:
+            if snapshot is self._snapshot:
+                if self._encoded is None:
+                    self._encoded = encode(snapshot)
+                return self._encoded
+        return encode(snapshot)
+
+    def poll(self) -> None:
+        """Run forever: refresh whenever the snapshot gets older than `interval_seconds`."""
+        while True:
+            snapshot = self.get(time.time() - self.interval_seconds)
+            time.sleep(max(0.1, snapshot.taken_at + self.interval_seconds - time.time()))
+
+    def _refresh(self, started: float) -> None:
+        error = ""
+        sessions: tuple[Session, ...] = ()
+        try:
+            sessions = normalize(self._load())
+        except RuntimeError as exc:
+            error = str(exc)
+        except Exception as exc:  # keep serving; the next run may succeed
+            error = f"session load failed: {exc!r}"
+        elapsed = time.time() - started
+        with self._cond:
+            self._occtl_runs += 1
+            self._occtl_seconds += elapsed
+            self._snapshot = Snapshot(
+                version=self._snapshot.version + 1,
+                taken_at=started,
+                sessions=sessions,
+                error=error,
+                occtl_runs=self._occtl_runs,
+                occtl_seconds=self._occtl_seconds,
+            )
+            self._encoded = None
+            self._refreshing = False
+            self._cond.notify_all()
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        line = self.rfile.readline(_MAX_REQUEST_BYTES).decode("ascii", errors="replace").split()
+        if len(line) != 2 or line[0] != "GET":
+            return
+        try:
+            fresh_after = float(line[1])
+        except ValueError:
+            return
+        self.wfile.write(self.server.service.encoded(fresh_after))  # type: ignore[attr-defined]
+
+
+class SnapshotServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Serves a `SnapshotService` on a unix socket (mode 0660, optionally group-owned by `group_id`)."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, service: SnapshotService, *, group_id: int | None = None):
+        os.makedirs(os.path.dirname(socket_path) or ".", exist_ok=True)
+        try:
+            os.unlink(socket_path)
+        except FileNotFoundError:
+            pass
+        self.service = service
+        super().__init__(socket_path, _RequestHandler)
+        os.chmod(socket_path, 0o660)
+        if group_id is not None:
+            os.chown(socket_path, -1, group_id)
@@ -16,19 +16,33 @@ class SQLStatement:
     - `slots=True`: enables `__slots__` (less memory, faster attribute access, prevents accidental new fields).
 
     `sensitive_params` are 0-based indices of parameters to redact in output (`***`).
+    `copy_source` is a file-like object (with `read(size)`) streamed into `COPY ... FROM STDIN`;
+    it is only consumed on execution, never when printing SQL.
+    `copy_target` is the reverse: a file-like object (with `write(data)`) that receives the output of
+    `COPY ... TO STDOUT`, in chunks, as the server sends it.
+    `prepare_name` marks statements from the backend's statement catalog: executors may prepare them
+    server-side under that name and run them with `EXECUTE` (the printed SQL is unchanged).
     """
 
     title: str
     sql: str
     params: tuple[Any, ...] = ()
     sensitive_params: frozenset[int] = frozenset()
+    copy_source: Any = None
+    copy_target: Any = None
+    prepare_name: str | None = None
 
     def as_dict(self, *, show_secrets: bool = False) -> Mapping[str, Any]:
-        return {
+        payload: dict[str, Any] = {
             "title": self.title,
             "sql": self.sql,
             "params": _render_params(self.params, self.sensitive_params, show_secrets=show_secrets),
         }
+        if self.copy_source is not None:
+            payload["copy_from_stdin"] = True
+        if self.copy_target is not None:
+            payload["copy_to_stdout"] = True
+        return payload
 
 
 def _render_params(params: tuple[Any, ...], sensitive: frozenset[int], *, show_secrets: bool) -> list[Any]:
@@ -40,6 +54,21 @@ def _render_params(params: tuple[Any, ...], sensitive: frozenset[int], *, show_s
     return rendered
 
 
+def to_positional(sql: str) -> str:
+    """`%s` placeholders -> `$1, $2, ...` (and `%%` -> `%`), the parameter syntax of `PREPARE`."""
+    parts = sql.split("%%")
+    out: list[str] = []
+    n = 0
+    for part in parts:
+        pieces = part.split("%s")
+        chunk = pieces[0]
+        for piece in pieces[1:]:
+            n += 1
+            chunk += f"${n}{piece}"
+        out.append(chunk)
+    return "%".join(out)
+
+
 def render_program(statements: Sequence[SQLStatement], *, show_secrets: bool = False) -> str:
     lines: list[str] = []
     for idx, stmt in enumerate(statements, start=1):
@@ -48,6 +77,10 @@ def render_program(statements: Sequence[SQLStatement], *, show_secrets: bool = F
         if stmt.params:
             params = _render_params(stmt.params, stmt.sensitive_params, show_secrets=show_secrets)
             lines.append(f"-- params: {params!r}")
+        if stmt.copy_source is not None:
+            lines.append("-- data: streamed from input via COPY FROM STDIN")
+        if stmt.copy_target is not None:
+            lines.append("-- data: streamed to output via COPY TO STDOUT")
         lines.append("")
     return "\n".join(lines).rstrip() + "\n"
 
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+
+from .config import _env_int
+
+# Import-time budget of one `tuxedo` run (modules loaded by tuxedo itself, interpreter startup excluded).
+# Override with TUXEDO_STARTUP_BUDGET_MS; `--startup-profile` exits with 1 when a run goes over it.
+DEFAULT_STARTUP_BUDGET_MS = 80
+
+_TOP_IMPORTS = 12
+_DRIVER_MODULES = ("psycopg", "psycopg2")
+
+
+@dataclass(frozen=True, slots=True)
+class ImportRecord:
+    """
+    One line of `python -X importtime` output (times in microseconds; `depth` 0 = imported directly by running code).
+
+    This is `@dataclass(frozen=True, slots=True)`: fields are read-only after creation and no new attributes can be added.
+    """
+
+    name: str
+    depth: int
+    self_us: int
+    cumulative_us: int
+
+
+def parse_importtime(text: str) -> tuple[list[ImportRecord], list[str]]:
+    """Split stderr of an importtime run into import records and the command's own stderr lines."""
+    records: list[ImportRecord] = []
+    other: list[str] = []
+    for line in text.splitlines():
+        if not line.startswith("import time:"):
+            other.append(line)
+            continue
+        parts = line[len("import time:") :].split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            self_us, cumulative_us = int(parts[0]), int(parts[1])
+        except ValueError:
+            continue  # header line
+        raw = parts[2].rstrip()
+        name = raw.lstrip()
+        depth = max(0, (len(raw) - len(name) - 1) // 2)
+        records.append(ImportRecord(name=name, depth=depth, self_us=self_us, cumulative_us=cumulative_us))
+    return records, other
+
+
+def _is_tuxedo(name: str) -> bool:
+    return name == "tuxedo" or name.startswith("tuxedo.")
+
+
+def _command_imports(records: list[ImportRecord]) -> list[ImportRecord]:
+    """Top-level imports from the first `tuxedo` module on (interpreter startup and the wrapper are excluded)."""
+    start = next((i for i, r in enumerate(records) if _is_tuxedo(r.name)), len(records))
+    return [r for r in records[start:] if r.depth == 0]
+
+
+def _self_command() -> list[str]:
+    cmd = [sys.executable]
+    if sys.flags.no_user_site:
+        cmd.append("-s")
+    cmd += ["-X", "importtime"]
+    spec = getattr(sys.modules.get("__main__"), "__spec__", None)
+    if spec is not None and spec.name:
+        # `python -m tuxedo`
+        return cmd + ["-m", spec.name.removesuffix(".__main__")]
+    # Console script / deployed wrapper.
+    return cmd + [sys.argv[0]]
+
+
+def _ms(us: int) -> str:
+    return f"{us / 1000:8.1f} ms"
+
+
+def profile_startup(argv: list[str]) -> int:
+    """
+    `tuxedo --startup-profile ...`: run the rest of the command line in a child interpreter under
+    `python -X importtime`, pass its output through and append a report to stderr.
+
+    Returns the command's exit code, or 1 when it succeeded but its imports went over the budget.
+    """
+    budget_ms = _env_int("TUXEDO_STARTUP_BUDGET_MS") or DEFAULT_STARTUP_BUDGET_MS
+    started = time.perf_counter()
+    proc = subprocess.run(_self_command() + argv, stderr=subprocess.PIPE, text=True, env=os.environ.copy())
+    wall_ms = (time.perf_counter() - started) * 1000
+
+    records, other = parse_importtime(proc.stderr or "")
+    for line in other:
+        sys.stderr.write(line + "\n")
+
+    command = _command_imports(records)
+    total_us = sum(r.cumulative_us for r in command)
+    own_us = sum(r.self_us for r in records if _is_tuxedo(r.name))
+    loaded = {r.name for r in records}
+    drivers = [m for m in _DRIVER_MODULES if m in loaded]
+    over = total_us / 1000 > budget_ms
+
+    out = sys.stderr
+    out.write(f"\nstartup profile: tuxedo {' '.join(argv)}\n")
+    out.write(f"  wall time (incl. interpreter): {wall_ms:.1f} ms\n")
+    out.write(
+        f"  command imports: {total_us / 1000:.1f} ms in {len(command)} top-level imports "
+        f"(budget {budget_ms} ms: {'OVER' if over else 'ok'})\n"
+    )
+    out.write(f"  tuxedo modules (self time): {own_us / 1000:.1f} ms\n")
+    out.write(f"  database driver: {', '.join(drivers) if drivers else 'not imported'}\n")
+    out.write("  slowest imports (cumulative):\n")
+    for r in sorted(command, key=lambda r: r.cumulative_us, reverse=True)[:_TOP_IMPORTS]:
+        out.write(f"    {_ms(r.cumulative_us)}  {r.name}\n")
+    out.flush()
+
+    if proc.returncode:
+        return proc.returncode
+    return 1 if over else 0
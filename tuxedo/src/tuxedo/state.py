@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Iterator, Mapping
+
+from .backends.freeradius import PASSWORD_ATTRIBUTES, _parse_duration_seconds
+from .bulk import open_input
+
+# Column order of the apply staging table (see `FreeradiusBackend.apply_state`).
+# One table carries every kind of desired-state row so the whole file goes to the server in a single COPY.
+STATE_COLUMNS = (
+    "kind",
+    "username",
+    "groupname",
+    "priority",
+    "attribute",
+    "value",
+    "description",
+    "manage_description",
+    "manage_groups",
+    "manage_block",
+    "blocked",
+    "block_reason",
+    "block_seconds",
+)
+
+STATE_FORMATS = ("yaml", "json")
+
+_TOP_LEVEL_KEYS = frozenset({"users", "groups"})
+_USER_KEYS = frozenset(
+    {"username", "password", "password_hash", "password_attribute", "groups", "priority", "block", "block_for"}
+)
+_GROUP_KEYS = frozenset({"name", "description"})
+_DEFAULT_HASH_ATTRIBUTE = "Crypt-Password"
+
+
+def detect_state_format(path: str) -> str:
+    lowered = (path or "").lower()
+    if lowered.endswith(".json"):
+        return "json"
+    return "yaml"
+
+
+def _load_document(path: str, fmt: str) -> Mapping[str, Any]:
+    if fmt not in STATE_FORMATS:
+        raise ValueError(f"Unsupported state format: {fmt!r} (use {'/'.join(STATE_FORMATS)})")
+    with open_input(path) as fh:
+        if fmt == "json":
+            try:
+                doc = json.load(fh)
+            except json.JSONDecodeError as exc:
+                raise ValueError(f"invalid JSON state (line {exc.lineno}): {exc.msg}") from exc
+        else:
+            try:
+                import yaml  # type: ignore[import-not-found]
+            except Exception as exc:  # pragma: no cover
+                raise RuntimeError(
+                    "YAML state files require PyYAML. Install with: pip install ./tuxedo[yaml] "
+                    "or apt install python3-yaml (or use a .json state file)."
+                ) from exc
+            try:
+                doc = yaml.safe_load(fh)
+            except yaml.YAMLError as exc:
+                raise ValueError(f"invalid YAML state: {exc}") from exc
+    if doc is None:
+        return {}
+    if not isinstance(doc, Mapping):
+        raise ValueError("state: top level must be a mapping with 'users' and/or 'groups'")
+    unknown = set(doc) - _TOP_LEVEL_KEYS
+    if unknown:
+        raise ValueError(f"state: unknown top-level keys: {', '.join(sorted(map(str, unknown)))}")
+    return doc
+
+
+def _named_entries(section: Any, *, where: str, name_key: str) -> Iterator[tuple[str, Any]]:
+    """
+    Accepted shapes:
+    - {"alice": {...}, "bob": null} (mapping keyed by name);
+    - [{"username": "alice", ...}, "bob"] (list of objects or bare names).
+    """
+    if section is None:
+        return
+    if isinstance(section, Mapping):
+        items = [(str(name), entry) for name, entry in section.items()]
+    elif isinstance(section, list):
+        items = []
+        for idx, item in enumerate(section):
+            if isinstance(item, Mapping):
+                items.append((str(item.get(name_key) or ""), item))
+            elif isinstance(item, str):
+                items.append((item, None))
+            else:
+                raise ValueError(f"{where}[{idx}]: expected an object or a name, got {item!r}")
+    else:
+        raise ValueError(f"{where}: expected a mapping or a list")
+
+    seen: set[str] = set()
+    for name, entry in items:
+        name = name.strip()
+        if not name:
+            raise ValueError(f"{where}: entry without {name_key}")
+        if name in seen:
+            raise ValueError(f"{where}.{name}: listed twice")
+        seen.add(name)
+        yield name, entry
+
+
+def _priority(value: Any, *, where: str) -> int | None:
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f"{where}: invalid priority: {value!r}")
+    try:
+        return int(value)
+    except (TypeError, ValueError) as exc:
+        raise ValueError(f"{where}: invalid priority: {value!r}") from exc
+
+
+def _memberships(value: Any, *, where: str) -> list[tuple[str, int | None]]:
+    """Same shapes as `tuxedo import` groups: "a:10;b", ["a", "b:5", {"name": ..., "priority": ...}], {"a": 10}."""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        tokens = [t for t in value.replace(",", ";").replace(" ", ";").split(";") if t.strip()]
+        pairs = [(name, prio if sep else None) for name, sep, prio in (t.strip().partition(":") for t in tokens)]
+    elif isinstance(value, Mapping):
+        pairs = [(str(name), prio) for name, prio in value.items()]
+    elif isinstance(value, list):
+        pairs = []
+        for item in value:
+            if isinstance(item, Mapping):
+                pairs.append((str(item.get("name") or ""), item.get("priority")))
+            else:
+                name, sep, prio = str(item).partition(":")
+                pairs.append((name, prio if sep else None))
+    else:
+        raise ValueError(f"{where}: invalid groups value: {value!r}")
+
+    groups: dict[str, int | None] = {}
+    for name, prio in pairs:
+        name = name.strip()
+        if not name:
+            raise ValueError(f"{where}: empty group name")
+        if name in groups:
+            raise ValueError(f"{where}: group {name!r} listed twice")
+        groups[name] = _priority(prio, where=f"{where}.{name}")
+    return list(groups.items())
+
+
+def _password(entry: Mapping[str, Any], *, where: str) -> tuple[str | None, str | None]:
+    if entry.get("password") is not None and entry.get("password_hash") is not None:
+        raise ValueError(f"{where}: give either password or password_hash, not both")
+    if entry.get("password") is not None:
+        if entry.get("password_attribute") is not None:
+            raise ValueError(f"{where}: password_attribute applies to password_hash only")
+        return "Cleartext-Password", str(entry["password"])
+    if entry.get("password_hash") is not None:
+        attribute = str(entry.get("password_attribute") or _DEFAULT_HASH_ATTRIBUTE)
+        if attribute not in PASSWORD_ATTRIBUTES or attribute == "Cleartext-Password":
+            raise ValueError(
+                f"{where}: unsupported password_attribute {attribute!r} "
+                f"(use one of {', '.join(a for a in PASSWORD_ATTRIBUTES if a != 'Cleartext-Password')})"
+            )
+        return attribute, str(entry["password_hash"])
+    return None, None
+
+
+def _block(entry: Mapping[str, Any], *, where: str) -> tuple[bool, str | None, int | None]:
+    value = entry.get("block")
+    duration = entry.get("block_for")
+    if isinstance(value, Mapping):
+        duration = value.get("for", duration)
+        value = value.get("reason") or "MANUAL"
+    if value is None or value is False or (isinstance(value, str) and not value.strip()):
+        if duration not in (None, ""):
+            raise ValueError(f"{where}: block_for given without block")
+        return False, None, None
+    reason = "MANUAL" if value is True else str(value).strip()
+    try:
+        seconds = _parse_duration_seconds(None if duration is None else str(duration))
+    except ValueError as exc:
+        raise ValueError(f"{where}: {exc}") from exc
+    return True, reason, seconds
+
+
+def iter_state_rows(path: str, fmt: str, *, default_group: str, default_priority: int) -> Iterator[tuple[Any, ...]]:
+    """
+    Read a desired-state file and yield staging rows in `STATE_COLUMNS` order.
+
+    - one `user` row per user: password (attribute/value, NULL = unmanaged) and whether the file
+      manages its memberships (`groups` key present) and its block (`block` key present);
+    - one `member` row per membership; a user with an empty `groups` gets the default group;
+    - one `group` row per desired group: declared, referenced by a membership, and the default group.
+
+    The file is read on first iteration, so building the apply program (`--sql`) never touches it.
+    """
+    doc = _load_document(path, fmt)
+    groups: dict[str, tuple[str | None, bool]] = {}
+
+    for name, entry in _named_entries(doc.get("groups"), where="groups", name_key="name"):
+        if entry is None or isinstance(entry, str):
+            groups[name] = (entry, isinstance(entry, str))
+            continue
+        if not isinstance(entry, Mapping):
+            raise ValueError(f"groups.{name}: expected a description or an object")
+        unknown = set(entry) - _GROUP_KEYS
+        if unknown:
+            raise ValueError(f"groups.{name}: unknown keys: {', '.join(sorted(map(str, unknown)))}")
+        description = entry.get("description")
+        groups[name] = (None if description is None else str(description), "description" in entry)
+
+    for name, entry in _named_entries(doc.get("users"), where="users", name_key="username"):
+        where = f"users.{name}"
+        entry = {} if entry is None else entry
+        if not isinstance(entry, Mapping):
+            raise ValueError(f"{where}: expected an object")
+        unknown = set(entry) - _USER_KEYS
+        if unknown:
+            raise ValueError(f"{where}: unknown keys: {', '.join(sorted(map(str, unknown)))}")
+
+        attribute, value = _password(entry, where=where)
+        manage_groups = "groups" in entry
+        manage_block = "block" in entry
+        blocked, reason, seconds = _block(entry, where=where)
+        yield ("user", name, None, None, attribute, value, None, None, manage_groups, manage_block, blocked, reason, seconds)
+
+        if not manage_groups:
+            continue
+        default = _priority(entry.get("priority"), where=f"{where}.priority")
+        memberships = _memberships(entry.get("groups"), where=f"{where}.groups") or [(default_group, default_priority)]
+        for groupname, priority in memberships:
+            if priority is None:
+                priority = default if default is not None else 0
+            groups.setdefault(groupname, (None, False))
+            yield ("member", name, groupname, priority, None, None, None, None, None, None, None, None, None)
+
+    groups.setdefault(default_group, (None, False))
+    for groupname, (description, manage_description) in groups.items():
+        yield ("group", None, groupname, None, None, None, description, manage_description, None, None, None, None, None)
@@ -0,0 +1,190 @@
+"""
+Shared fixtures.
+
+Tests that need PostgreSQL run against the server in `TUXEDO_TEST_DSN` (any database the role may create databases
+from, e.g. `host=/tmp dbname=postgres user=postgres`) and are skipped without it. Each test gets a fresh database
+with FreeRADIUS-shaped `radcheck` / `radusergroup` tables, and runs once per installed driver.
+"""
+
+from __future__ import annotations
+
+import itertools
+import os
+from typing import Any, Callable, Iterator
+
+import pytest
+
+from tuxedo.backends import FreeradiusBackend
+from tuxedo.config import FreeradiusSchema, PostgresConfig
+from tuxedo.db import PostgresExecutor, close_pools
+
+# FreeRADIUS' own PostgreSQL schema (raddb/mods-config/sql/main/postgresql/schema.sql), reduced to the tables tuxedo uses.
+FREERADIUS_SCHEMA_SQL = (
+    """
+CREATE TABLE radcheck (
+  id serial PRIMARY KEY,
+  username text NOT NULL DEFAULT '',
+  attribute text NOT NULL DEFAULT '',
+  op varchar(2) NOT NULL DEFAULT '==',
+  value text NOT NULL DEFAULT ''
+);
+""",
+    """
+CREATE TABLE radusergroup (
+  id serial PRIMARY KEY,
+  username text NOT NULL DEFAULT '',
+  groupname text NOT NULL DEFAULT '',
+  priority integer NOT NULL DEFAULT 0
+);
+""",
+)
+
+# radacct from the same schema.sql, created only by the `accounting` fixture.
+RADACCT_SQL = (
+    """
+CREATE TABLE radacct (
+  RadAcctId bigserial PRIMARY KEY,
+  AcctSessionId text NOT NULL,
+  AcctUniqueId text NOT NULL UNIQUE,
+  UserName text,
+  Realm text,
+  NASIPAddress inet NOT NULL,
+  NASPortId text,
+  NASPortType text,
+  AcctStartTime timestamp with time zone,
+  AcctUpdateTime timestamp with time zone,
+  AcctStopTime timestamp with time zone,
+  AcctInterval bigint,
+  AcctSessionTime bigint,
+  AcctAuthentic text,
+  ConnectInfo_start text,
+  ConnectInfo_stop text,
+  AcctInputOctets bigint,
+  AcctOutputOctets bigint,
+  CalledStationId text,
+  CallingStationId text,
+  AcctTerminateCause text,
+  ServiceType text,
+  FramedProtocol text,
+  FramedIPAddress inet,
+  FramedIPv6Address inet,
+  FramedIPv6Prefix inet,
+  FramedInterfaceId text,
+  DelegatedIPv6Prefix inet,
+  Class text
+);
+""",
+    "CREATE INDEX radacct_active_session_idx ON radacct (AcctUniqueId) WHERE AcctStopTime IS NULL;",
+    "CREATE INDEX radacct_start_user_idx ON radacct (AcctStartTime, UserName);",
+)
+
+_DATABASE_NAMES = itertools.count()
+
+
+def _admin_connect(dsn: str) -> Any:
+    # Whichever driver is installed; only used to create and drop the per-test databases.
+    try:
+        import psycopg  # type: ignore[import-not-found]
+    except ImportError:
+        import psycopg2  # type: ignore[import-not-found]
+
+        conn = psycopg2.connect(dsn)
+        conn.autocommit = True
+        return conn
+    return psycopg.connect(dsn, autocommit=True)
+
+
+def _with_dbname(dsn: str, dbname: str) -> str:
+    try:
+        from psycopg.conninfo import make_conninfo  # type: ignore[import-not-found]
+    except ImportError:
+        from psycopg2.extensions import make_dsn as make_conninfo  # type: ignore[import-not-found]
+    return make_conninfo(dsn, dbname=dbname)
+
+
+@pytest.fixture(scope="session")
+def pg_dsn() -> str:
+    dsn = (os.environ.get("TUXEDO_TEST_DSN") or "").strip()
+    if not dsn:
+        pytest.skip("TUXEDO_TEST_DSN is not set")
+    return dsn
+
+
+@pytest.fixture
+def database(pg_dsn: str) -> Iterator[str]:
+    """DSN of a fresh database with the FreeRADIUS tables (dropped afterwards)."""
+    name = f"tuxedo_test_{os.getpid()}_{next(_DATABASE_NAMES)}"
+    admin = _admin_connect(pg_dsn)
+    try:
+        with admin.cursor() as cur:
+            cur.execute(f"CREATE DATABASE {name};")
+        dsn = _with_dbname(pg_dsn, name)
+        conn = _admin_connect(dsn)
+        try:
+            with conn.cursor() as cur:
+                for sql in FREERADIUS_SCHEMA_SQL:
+                    cur.execute(sql)
+        finally:
+            conn.close()
+        yield dsn
+    finally:
+        close_pools()
+        with admin.cursor() as cur:
+            cur.execute(f"DROP DATABASE IF EXISTS {name} WITH (FORCE);")
+        admin.close()
+
+
+@pytest.fixture(params=["psycopg", "psycopg2"])
+def driver(request: pytest.FixtureRequest) -> str:
+    pytest.importorskip(request.param)
+    return request.param
+
+
+@pytest.fixture
+def pg(database: str, driver: str) -> PostgresConfig:
+    return PostgresConfig(dsn=database, driver=driver)
+
+
+@pytest.fixture
+def executor(pg: PostgresConfig) -> PostgresExecutor:
+    return PostgresExecutor(pg)
+
+
+@pytest.fixture
+def backend() -> FreeradiusBackend:
+    return FreeradiusBackend(FreeradiusSchema())
+
+
+@pytest.fixture
+def migrated(executor: PostgresExecutor, backend: FreeradiusBackend) -> PostgresExecutor:
+    """`executor` on a database `tuxedo migrate` already ran on."""
+    executor.run(backend.migrate())
+    return executor
+
+
+@pytest.fixture
+def accounting(executor: PostgresExecutor, backend: FreeradiusBackend) -> PostgresExecutor:
+    """`executor` on a database with an empty FreeRADIUS `radacct` that `tuxedo migrate` ran on."""
+    from tuxedo.sql import SQLStatement
+
+    executor.run([SQLStatement(title="radacct", sql=sql) for sql in RADACCT_SQL])
+    executor.run(backend.migrate())
+    return executor
+
+
+@pytest.fixture
+def tuxedo(
+    pg: PostgresConfig, tmp_path: Any, capsys: pytest.CaptureFixture[str]
+) -> Callable[..., tuple[int, str, str]]:
+    """Run the CLI in-process against the test database: `tuxedo("show", "users")` -> (exit code, stdout, stderr)."""
+    from tuxedo.cli import main
+
+    config = tmp_path / "tuxedo.ini"
+    config.write_text(f"[postgres]\ndsn = {pg.dsn}\ndriver = {pg.driver}\n", encoding="utf-8")
+
+    def run(*argv: str) -> tuple[int, str, str]:
+        code = main(["--config", str(config), *argv])
+        captured = capsys.readouterr()
+        return code, captured.out, captured.err
+
+    return run
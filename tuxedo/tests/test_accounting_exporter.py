@@ -0,0 +1,274 @@
+"""
+Scrape cache and database connection of the accounting exporter 
+(`roles/freeradius/templates/freeradius_accounting_exporter.py.j2`).
+
+The template is rendered with the role defaults and imported as a module; nothing connects or listens at import time.
+"""
+
+from __future__ import annotations
+
+import importlib.util
+import os
+import threading
+import time
+from pathlib import Path
+from types import ModuleType, SimpleNamespace
+
+import pytest
+
+from tuxedo import exposition
+
+ROLES = Path(__file__).resolve().parents[2] / "roles"
+SRC = Path(__file__).resolve().parents[1] / "src"
+
+
+@pytest.fixture
+def exporter(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> ModuleType:
+    jinja2 = pytest.importorskip("jinja2")
+    yaml = pytest.importorskip("yaml")
+    env = jinja2.Environment(keep_trailing_newline=True)
+    # The two Ansible filters the template uses.
+    env.filters["bool"] = lambda value: str(value).strip().lower() in ("1", "true", "yes", "on")
+    env.filters["ternary"] = lambda value, true, false: true if value else false
+    defaults = yaml.safe_load((ROLES / "freeradius" / "defaults" / "main.yml").read_text(encoding="utf-8"))
+    # Defaults may refer to other variables, as Ansible resolves them.
+    defaults = {
+        key: env.from_string(value).render(**defaults) if isinstance(value, str) else value
+        for key, value in defaults.items()
+    }
+    template = env.from_string(
+        (ROLES / "freeradius" / "templates" / "freeradius_accounting_exporter.py.j2").read_text(encoding="utf-8")
+    )
+    path = tmp_path / "freeradius_accounting_exporter.py"
+    path.write_text(template.render(**defaults, common_tuxedo_pylib_dir=str(SRC)), encoding="utf-8")
+
+    for name in list(os.environ):
+        if name.startswith("FREERADIUS_ACCT_EXPORTER_"):
+            monkeypatch.delenv(name)
+    spec = importlib.util.spec_from_file_location("freeradius_accounting_exporter", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class _Collect:
+    """Fake `collect_metrics()`: counts calls, optionally blocks until released, returns or raises."""
+
+    def __init__(self, status: int = 200, error: Exception | None = None, block: bool = False):
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+        if not block:
+            self.release.set()
+        self._status = status
+        self._error = error
+
+    def __call__(self) -> tuple[exposition.Registry, int]:
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        if self._error is not None:
+            raise self._error
+        registry = exposition.Registry()
+        registry.gauge("collection").add(self.calls)
+        return registry, self._status
+
+
+def _value(registry: exposition.Registry) -> str:
+    return "".join(exposition.render([registry])).splitlines()[-1]
+
+
+def test_cache_hit_within_max_age(exporter: ModuleType) -> None:
+    collect = _Collect()
+    cache = exporter.ScrapeCache(collect, 60)
+    first, status, _ = cache.get()
+    second, _, age = cache.get()
+    assert (status, collect.calls) == (200, 1)
+    assert second is first and age >= 0
+    assert cache.requests == {"hit": 1, "miss": 1, "shared": 0}
+
+
+def test_cache_miss_after_max_age(exporter: ModuleType, monkeypatch: pytest.MonkeyPatch) -> None:
+    clock = [100.0]
+    monkeypatch.setattr(exporter, "time", SimpleNamespace(monotonic=lambda: clock[0]))
+    collect = _Collect()
+    cache = exporter.ScrapeCache(collect, 15)
+    cache.get()
+    clock[0] += 15
+    assert _value(cache.get()[0]) == "collection 1"
+    clock[0] += 0.5
+    registry, _, age = cache.get()
+    assert _value(registry) == "collection 2"
+    assert age == 0
+    assert cache.requests == {"hit": 1, "miss": 2, "shared": 0}
+
+
+def test_concurrent_scrapes_share_one_collection(exporter: ModuleType) -> None:
+    collect = _Collect(block=True)
+    cache = exporter.ScrapeCache(collect, 0)
+    results: list[tuple] = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get())) for _ in range(3)]
+    threads[0].start()
+    assert collect.started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    time.sleep(0.2)
+    # The later scrapes wait on the running collection instead of starting their own.
+    cache.refresh()
+    collect.release.set()
+    for thread in threads:
+        thread.join(5)
+    assert collect.calls == 1
+    assert len({id(registry) for registry, _, _ in results}) == 1
+    assert cache.requests == {"hit": 0, "miss": 1, "shared": 2}
+    assert cache.background_collections == 0
+
+
+def test_failed_collection_is_cached(exporter: ModuleType) -> None:
+    collect = _Collect(error=RuntimeError("db down"))
+    cache = exporter.ScrapeCache(collect, 60)
+    registry, status, _ = cache.get()
+    assert status == 503
+    assert "".join(exposition.render([registry])) == "# ERROR db down\n"
+    assert cache.get()[:2] == (registry, 503)
+    assert collect.calls == 1
+    assert cache.requests == {"hit": 1, "miss": 1, "shared": 0}
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+class _Conn:
+    """Fake psycopg2 connection: records statements; `dead` makes every query fail."""
+
+    def __init__(self) -> None:
+        self.closed = False
+        self.autocommit = False
+        self.dead = False
+        self.executed: list[str] = []
+
+    def cursor(self) -> _Conn:
+        return self
+
+    def __enter__(self) -> _Conn:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        return None
+
+    def execute(self, sql: str) -> None:
+        if self.dead:
+            raise OSError("server closed the connection unexpectedly")
+        self.executed.append(sql)
+
+    def fetchone(self) -> tuple[int]:
+        return (1,)
+
+    def close(self) -> None:
+        self.closed = True
+
+
+@pytest.fixture
+def database(exporter: ModuleType, monkeypatch: pytest.MonkeyPatch) -> tuple[ModuleType, _Clock, list]:
+    """
+    A fresh `Database` on a fake clock, with the opened `_Conn`s in `connects`.
+
+    An exception appended to `connects` makes the next connect attempt raise it.
+    """
+    clock = _Clock()
+    monkeypatch.setattr(exporter, "time", clock)
+    connects: list = []
+
+    def connect() -> _Conn:
+        if connects and isinstance(connects[-1], Exception):
+            raise connects.pop()
+        connects.append(_Conn())
+        return connects[-1]
+
+    monkeypatch.setattr(exporter, "_connect", connect)
+    return exporter.Database(), clock, connects
+
+
+def _query(cur: _Conn) -> str:
+    cur.execute("SELECT query")
+    return "ok"
+
+
+def test_reconnect_backoff(database: tuple, exporter: ModuleType, monkeypatch: pytest.MonkeyPatch) -> None:
+    db, clock, connects = database
+    monkeypatch.setattr(exporter, "RECONNECT_BACKOFF_MAX_SECONDS", 3.0)
+    # Attempts after 1s, 2s, then capped at 3s; collections in between fail without connecting.
+    for delay in (1.0, 2.0, 3.0, 3.0):
+        connects.append(OSError("connection refused"))
+        with pytest.raises(OSError):
+            db.run(_query)
+        clock.now += delay - 0.1
+        with pytest.raises(RuntimeError, match="next connect attempt in 0.1s"):
+            db.run(_query)
+        clock.now += 0.1
+    assert db.connect_failures == 4
+
+    assert db.run(_query) == "ok"
+    assert (db.connects, len(connects)) == (1, 1)
+    assert connects[0].autocommit
+    # A success resets the backoff: the next failure waits 1s again.
+    connects[0].close()
+    connects.append(OSError("connection refused"))
+    with pytest.raises(OSError):
+        db.run(_query)
+    clock.now += 1.0
+    assert db.run(_query) == "ok"
+    assert db.connects == 2
+
+
+def test_idle_connection_is_checked_before_use(database: tuple, exporter: ModuleType) -> None:
+    db, clock, connects = database
+    db.run(_query)
+    conn = connects[0]
+
+    # Used recently: no ping.
+    clock.now += exporter.HEALTH_CHECK_IDLE_SECONDS - 1
+    db.run(_query)
+    assert conn.executed == ["SELECT query", "SELECT query"]
+
+    # Idle: pinged, still alive, kept.
+    clock.now += exporter.HEALTH_CHECK_IDLE_SECONDS
+    db.run(_query)
+    assert conn.executed[-2:] == ["SELECT 1", "SELECT query"]
+    assert db.connects == 1
+
+    # Idle and dead: replaced before the query runs.
+    clock.now += exporter.HEALTH_CHECK_IDLE_SECONDS
+    conn.dead = True
+    assert db.run(_query) == "ok"
+    assert conn.closed
+    assert (db.connects, db.health_check_failures) == (2, 1)
+    assert connects[1].executed == ["SELECT query"]
+
+
+def test_connection_broken_by_a_query_is_reopened(database: tuple) -> None:
+    db, _, connects = database
+
+    def fail(cur: _Conn) -> None:
+        raise ValueError("bad row")
+
+    db.run(_query)
+    # A query error on a live connection keeps it.
+    with pytest.raises(ValueError):
+        db.run(fail)
+    assert db.run(_query) == "ok" and db.connects == 1
+
+    def broken(cur: _Conn) -> None:
+        cur.close()
+        raise OSError("server closed the connection unexpectedly")
+
+    with pytest.raises(OSError):
+        db.run(broken)
+    assert db.run(_query) == "ok"
+    assert db.connects == 2
+    assert not connects[1].closed
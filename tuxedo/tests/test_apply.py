@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Callable
+
+import pytest
+
+from tuxedo.backends import FreeradiusBackend
+from tuxedo.bulk import CopyTextStream
+from tuxedo.db import PostgresExecutor
+from tuxedo.sql import SQLStatement
+
+Tuxedo = Callable[..., tuple[int, str, str]]
+
+
+@pytest.fixture
+def apply(migrated: PostgresExecutor, tuxedo: Tuxedo, tmp_path: Any) -> Callable[..., dict[str, dict[str, int]]]:
+    """Write `state` to a JSON file, run `tuxedo apply` on it, return the per-table summary."""
+
+    def run(state: dict[str, Any], *flags: str) -> dict[str, dict[str, int]]:
+        path = tmp_path / "state.json"
+        path.write_text(json.dumps(state), encoding="utf-8")
+        code, out, err = tuxedo("apply", str(path), "--output", "json", *flags)
+        assert code == 0, err
+        return json.loads(out)["summary"]
+
+    return run
+
+
+def _rows(executor: PostgresExecutor, sql: str) -> list[tuple[Any, ...]]:
+    return executor.run([SQLStatement(title="check", sql=sql)])[0].rows or []
+
+
+def _changes(summary: dict[str, dict[str, int]]) -> int:
+    return sum(sum(counts.values()) for counts in summary.values())
+
+
+STATE = {
+    "groups": {"admins": "Administrators", "ops": None},
+    "users": {
+        "alice": {"password": "a1", "groups": {"admins": 10, "ops": 5}},
+        "bob": {"password_hash": "$6$x", "groups": []},
+        "carol": {"password": "c1", "block": {"reason": "DPI", "for": "1h"}},
+    },
+}
+
+
+def test_apply_creates_then_is_idempotent(apply: Callable[..., Any], migrated: PostgresExecutor) -> None:
+    summary = apply(STATE)
+    assert summary["radcheck"]["inserted"] == 3
+    assert summary["vpn_user_blocklist"]["inserted"] == 1
+    assert _rows(migrated, "SELECT username, groupname, priority FROM radusergroup ORDER BY 1, 2;") == [
+        ("alice", "admins", 10),
+        ("alice", "ops", 5),
+        ("bob", "default", 0),
+    ]
+    assert _rows(migrated, "SELECT attribute FROM radcheck WHERE username = 'bob';") == [("Crypt-Password",)]
+    assert _changes(apply(STATE)) == 0
+
+
+def test_apply_plan_rolls_back(apply: Callable[..., Any], migrated: PostgresExecutor) -> None:
+    summary = apply(STATE, "--plan")
+    assert summary["radcheck"]["inserted"] == 3
+    assert _rows(migrated, "SELECT COUNT(*) FROM radcheck;") == [(0,)]
+
+
+def test_apply_rewrites_block_when_duration_changes(apply: Callable[..., Any], migrated: PostgresExecutor) -> None:
+    apply(STATE)
+    state = json.loads(json.dumps(STATE))
+    state["users"]["carol"]["block"]["for"] = "2h"
+    assert apply(state, "--plan")["vpn_user_blocklist"] == {"inserted": 0, "updated": 1, "deleted": 0}
+    assert apply(state)["vpn_user_blocklist"]["updated"] == 1
+    assert _rows(
+        migrated, "SELECT EXTRACT(EPOCH FROM expires_at - created_at)::int FROM vpn_user_blocklist WHERE username = 'carol';"
+    ) == [(7200,)]
+    assert _changes(apply(state)) == 0
+
+    state["users"]["carol"]["block"] = {"reason": "DPI"}
+    assert apply(state)["vpn_user_blocklist"]["updated"] == 1
+    assert _rows(migrated, "SELECT expires_at FROM vpn_user_blocklist WHERE username = 'carol';") == [(None,)]
+    state["users"]["carol"]["block"] = False
+    assert apply(state)["vpn_user_blocklist"]["deleted"] == 1
+
+
+def test_prune_groups_keeps_the_default_group(apply: Callable[..., Any], migrated: PostgresExecutor) -> None:
+    apply(STATE)
+    state = {"users": {"alice": {"groups": ["ops"]}}}
+    summary = apply(state, "--prune-groups")
+    # alice leaves admins; bob stays in the default group although the state does not list it.
+    assert summary["radusergroup"] == {"inserted": 0, "updated": 1, "deleted": 1}
+    assert _rows(migrated, "SELECT username, groupname FROM radusergroup ORDER BY 1, 2;") == [
+        ("alice", "ops"),
+        ("bob", "default"),
+    ]
+    assert _rows(migrated, "SELECT name FROM vpn_groups ORDER BY 1;") == [("default",), ("ops",)]
+
+
+def test_prune_users(apply: Callable[..., Any], migrated: PostgresExecutor) -> None:
+    apply(STATE)
+    summary = apply({"users": {"alice": None}}, "--prune-users")
+    assert summary["radcheck"]["deleted"] == 2
+    assert summary["vpn_user_blocklist"]["deleted"] == 1
+    assert _rows(migrated, "SELECT DISTINCT username FROM radcheck;") == [("alice",)]
+
+
+def test_prune_groups_keeps_default_group_the_state_rows_omit(
+    migrated: PostgresExecutor, backend: FreeradiusBackend
+) -> None:
+    migrated.run(backend.create_user("bob", "b1") + backend.add_user_to_group("bob", "default", priority=7))
+    # Staging rows as another caller might build them: no row declaring the default group.
+    rows = [
+        ("user", "alice", None, None, None, None, None, None, True, False, False, None, None),
+        ("member", "alice", "ops", 0, None, None, None, None, None, None, None, None, None),
+        ("group", None, "ops", None, None, None, None, False, None, None, None, None, None),
+    ]
+    results = migrated.run(backend.apply_state(CopyTextStream(rows), prune_groups=True))
+    changes = [row for r in results for row in r.rows or [] if row[0] == "radusergroup"]
+    # Not deleted and then reinserted by the orphan reassignment (which would also reset its priority).
+    assert changes == [("radusergroup", 1, 0, 0), ("radusergroup", 0, 0, 0)]
+    assert _rows(migrated, "SELECT username, groupname, priority FROM radusergroup ORDER BY 1, 2;") == [
+        ("alice", "ops", 0),
+        ("bob", "default", 7),
+    ]
@@ -0,0 +1,118 @@
+"""`tuxedo batch`: one session, savepoints per command with --continue-on-error, --commit-every, JSON-lines results."""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Callable
+
+import pytest
+
+from tuxedo.db import PostgresExecutor
+from tuxedo.sql import SQLStatement
+
+
+@pytest.fixture
+def batch(migrated: PostgresExecutor, tuxedo: Callable[..., tuple[int, str, str]], tmp_path) -> Callable[..., Any]:
+    """Run `tuxedo batch` over the given lines: (exit code, parsed JSON lines)."""
+    # Memberships of group "forbidden" and of user "mallory" fail inside the database; `create user mallory`
+    # fails on its second statement, after its radcheck row was written.
+    migrated.run(
+        [
+            SQLStatement(
+                title="check",
+                sql="ALTER TABLE radusergroup ADD CONSTRAINT no_forbidden "
+                "CHECK (groupname <> 'forbidden' AND username <> 'mallory');",
+            )
+        ]
+    )
+
+    def run(lines: list[str], *options: str) -> tuple[int, list[dict[str, Any]]]:
+        path = tmp_path / "commands.txt"
+        path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        code, out, _ = tuxedo("batch", str(path), *options)
+        return code, [json.loads(line) for line in out.splitlines()]
+
+    return run
+
+
+def _memberships(executor: PostgresExecutor) -> list[tuple[str, str]]:
+    sql = "SELECT username, groupname FROM radusergroup ORDER BY 1, 2;"
+    return [tuple(row) for row in executor.run([SQLStatement(title="members", sql=sql)])[0].rows]
+
+
+def _users(executor: PostgresExecutor) -> list[str]:
+    sql = "SELECT username FROM vpn_users ORDER BY 1;"
+    return [row[0] for row in executor.run([SQLStatement(title="users", sql=sql)])[0].rows]
+
+
+def test_continue_on_error_rolls_back_only_the_failed_line(migrated: PostgresExecutor, batch) -> None:
+    code, records = batch(
+        [
+            "create user alice --password x",
+            "# comment",
+            "add alice forbidden",
+            '{"id": "b-1", "argv": ["create", "user", "bob", "--password", "y"]}',
+            "show nothing",
+            '["add", "bob", "ops"]',
+            "create user mallory --password z",
+        ],
+        "--continue-on-error",
+    )
+    assert code == 1
+    assert [(r.get("line"), r.get("ok")) for r in records[:-1]] == [
+        (1, True),
+        (3, False),
+        (4, True),
+        (5, False),
+        (6, True),
+        (7, False),
+    ]
+    assert "no_forbidden" in records[1]["error"]
+    assert "invalid choice" in records[3]["error"]
+    assert records[2]["id"] == "b-1"
+    assert records[-1] == {"transaction": "commit", "commands": 3}
+
+    # Everything but the failed lines committed; the failed `add` left nothing behind.
+    assert _users(migrated) == ["alice", "bob"]
+    assert ("alice", "forbidden") not in _memberships(migrated)
+    assert ("bob", "ops") in _memberships(migrated)
+    sql = "SELECT COUNT(*) FROM radcheck WHERE username = 'mallory';"
+    assert migrated.run([SQLStatement(title="mallory", sql=sql)])[0].rows == [(0,)]
+
+
+def test_failure_rolls_back_uncommitted_commands_and_stops(migrated: PostgresExecutor, batch) -> None:
+    code, records = batch(
+        [
+            "create user alice --password x",
+            "create user bob --password x",
+            "create user carol --password x",
+            "add carol forbidden",
+            "create user dave --password x",
+        ],
+        "--commit-every",
+        "2",
+    )
+    assert code == 1
+    assert records == [
+        records[0],
+        records[1],
+        {"transaction": "commit", "commands": 2},
+        records[3],
+        records[4],
+        {"transaction": "rollback", "commands": 1},
+    ]
+    assert [r["ok"] for r in (records[0], records[1], records[3], records[4])] == [True, True, True, False]
+    # The first two were committed; carol (same transaction as the failure) and dave (never run) are not there.
+    assert _users(migrated) == ["alice", "bob"]
+
+
+def test_one_transaction_by_default(migrated: PostgresExecutor, batch) -> None:
+    code, records = batch(["create user alice --password x", "add alice ops", "add alice forbidden"])
+    assert code == 1
+    assert records[-1] == {"transaction": "rollback", "commands": 2}
+    assert _users(migrated) == []
+
+    code, records = batch(["create user alice --password x", "add alice ops"])
+    assert code == 0
+    assert records[-1] == {"transaction": "commit", "commands": 2}
+    assert ("alice", "ops") in _memberships(migrated)
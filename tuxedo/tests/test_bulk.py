@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import pytest
+
+from tuxedo.bulk import CopyTextStream, _parse_block, _parse_groups, detect_format, iter_import_rows, read_usernames
+
+
+def test_detect_format() -> None:
+    assert detect_format("users.csv") == "csv"
+    assert detect_format("USERS.JSONL") == "jsonl"
+    assert detect_format("users.ndjson") == "jsonl"
+    assert detect_format("-") == "csv"
+
+
+def test_parse_groups_shapes() -> None:
+    assert _parse_groups(None, lineno=1) == []
+    assert _parse_groups("admins:10; users, ops", lineno=1) == [("admins", 10), ("users", None), ("ops", None)]
+    assert _parse_groups(["admins", "users:5", {"name": "ops", "priority": 1}], lineno=1) == [
+        ("admins", None),
+        ("users", 5),
+        ("ops", 1),
+    ]
+    assert _parse_groups({"admins": 10, "users": None}, lineno=1) == [("admins", 10), ("users", None)]
+
+
+@pytest.mark.parametrize(
+    ("value", "message"),
+    [
+        (":5", "line 3: empty group name"),
+        ("admins:x", "line 3: invalid priority"),
+        ([{"priority": 1}], "line 3: group object without name"),
+        (42, "line 3: invalid groups value"),
+    ],
+)
+def test_parse_groups_errors(value: object, message: str) -> None:
+    with pytest.raises(ValueError, match=message):
+        _parse_groups(value, lineno=3)
+
+
+def test_parse_block() -> None:
+    assert _parse_block(None, None, lineno=1) == (False, None, None)
+    assert _parse_block("", None, lineno=1) == (False, None, None)
+    assert _parse_block(True, None, lineno=1) == (True, "MANUAL", None)
+    assert _parse_block("abuse", "2h", lineno=1) == (True, "abuse", 7200)
+    assert _parse_block({"reason": "abuse", "for": "1d"}, None, lineno=1) == (True, "abuse", 86400)
+    assert _parse_block({"for": "30m"}, None, lineno=1) == (True, "MANUAL", 1800)
+    with pytest.raises(ValueError, match="line 2: block_for given without block"):
+        _parse_block(False, "1h", lineno=2)
+    with pytest.raises(ValueError, match="line 2: Invalid duration unit"):
+        _parse_block("abuse", "1w", lineno=2)
+
+
+def test_csv_rows_one_per_group(tmp_path) -> None:
+    path = tmp_path / "users.csv"
+    path.write_text(
+        "Username,Password,Groups,Priority,Block,Block_For\n"
+        "alice,secret,admins:10;users,3,,\n"
+        "bob,,,,abuse,2h\n",
+        encoding="utf-8",
+    )
+    assert list(iter_import_rows(str(path), "csv")) == [
+        ("alice", "secret", "admins", 10, False, None, None),
+        ("alice", "secret", "users", 3, False, None, None),
+        ("bob", None, None, None, True, "abuse", 7200),
+    ]
+
+
+def test_csv_needs_username_column(tmp_path) -> None:
+    path = tmp_path / "users.csv"
+    path.write_text("name,password\nalice,secret\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="'username' column"):
+        list(iter_import_rows(str(path), "csv"))
+
+
+def test_jsonl_rows_and_errors(tmp_path) -> None:
+    path = tmp_path / "users.jsonl"
+    path.write_text(
+        '# comment\n\n{"username": "alice", "groups": {"ops": 1}, "block": {"reason": "x", "for": "1h"}}\n',
+        encoding="utf-8",
+    )
+    assert list(iter_import_rows(str(path), "jsonl")) == [("alice", None, "ops", 1, True, "x", 3600)]
+
+    path.write_text('{"username": "alice"}\n[1]\n', encoding="utf-8")
+    with pytest.raises(ValueError, match="line 2: expected a JSON object"):
+        list(iter_import_rows(str(path), "jsonl"))
+    path.write_text('{"username": " "}\n', encoding="utf-8")
+    with pytest.raises(ValueError, match="line 1: username is empty"):
+        list(iter_import_rows(str(path), "jsonl"))
+    with pytest.raises(ValueError, match="Unsupported input format"):
+        list(iter_import_rows(str(path), "xml"))
+
+
+def test_input_is_opened_lazily(tmp_path) -> None:
+    rows = iter_import_rows(str(tmp_path / "missing.csv"), "csv")
+    with pytest.raises(FileNotFoundError):
+        next(rows)
+
+
+def test_read_usernames(tmp_path) -> None:
+    path = tmp_path / "names.txt"
+    path.write_text("alice\n# everyone below\nbob  # old account\n\nalice\n", encoding="utf-8")
+    assert read_usernames(str(path)) == ["alice", "bob"]
+
+
+def test_copy_text_stream_escapes_values() -> None:
+    stream = CopyTextStream([("a\tb", None, True, False, 5), ("back\\slash", "two\nlines\r", "", 0, None)])
+    assert stream.read() == "a\\tb\t\\N\tt\tf\t5\nback\\\\slash\ttwo\\nlines\\r\t\t0\t\\N\n"
+    assert stream.rows_read == 2
+    assert stream.read() == ""
+
+
+def test_copy_text_stream_reads_in_chunks() -> None:
+    rows = [(f"user{i}", i) for i in range(100)]
+    expected = "".join(f"user{i}\t{i}\n" for i in range(100))
+    stream = CopyTextStream(rows)
+    chunks = []
+    while True:
+        chunk = stream.read(7)
+        if not chunk:
+            break
+        assert len(chunk) <= 7
+        chunks.append(chunk)
+    assert "".join(chunks) == expected
+    assert stream.rows_read == 100
+
+
+def test_copy_text_stream_pulls_rows_on_demand() -> None:
+    pulled = []
+
+    def rows():
+        for i in range(1000):
+            pulled.append(i)
+            yield (i,)
+
+    stream = CopyTextStream(rows())
+    assert stream.read(4) == "0\n1\n"
+    assert len(pulled) == 2
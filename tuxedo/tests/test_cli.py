@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import socket
+import threading
+from typing import Callable
+
+import pytest
+
+from tuxedo import cli
+
+
+@pytest.fixture
+def sql(tmp_path, capsys: pytest.CaptureFixture[str]) -> Callable[..., tuple[int, str, str]]:
+    """Run the CLI with `--sql` and an empty config: nothing connects to a database."""
+    config = tmp_path / "tuxedo.ini"
+    config.write_text("", encoding="utf-8")
+
+    def run(*argv: str) -> tuple[int, str, str]:
+        code = cli.main(["--config", str(config), "--sql", *argv])
+        captured = capsys.readouterr()
+        return code, captured.out, captured.err
+
+    return run
+
+
+def _subcommands(parser: argparse.ArgumentParser) -> dict[str, argparse.ArgumentParser]:
+    for action in parser._actions:
+        if isinstance(action, argparse._SubParsersAction):
+            return dict(action.choices)
+    return {}
+
+
+def test_full_parser_defines_every_command() -> None:
+    commands = _subcommands(cli._build_parser())
+    assert list(commands) == list(cli._COMMANDS)
+    # Every subcommand is fully defined (not a help-only placeholder).
+    assert all(_subcommands(p) or p.get_default("action") for p in commands.values())
+
+
+def test_parser_for_argv_defines_only_that_command() -> None:
+    commands = _subcommands(cli._build_parser(argv=["--output", "json", "show", "users"]))
+    assert list(commands) == ["show"]
+    assert list(_subcommands(commands["show"])) == ["users", "groups", "blocks"]
+
+    # No (or an unknown) subcommand: placeholders, so usage and "invalid choice" still list them all.
+    commands = _subcommands(cli._build_parser(argv=["--help"]))
+    assert list(commands) == list(cli._COMMANDS)
+    assert all(not p._actions for p in commands.values())
+
+
+@pytest.mark.parametrize(
+    ("argv", "expected"),
+    [
+        (["show", "users"], "show"),
+        # "show" is the value of --output here.
+        (["--output", "show", "users"], None),
+        (["--output", "json", "--sql", "find", "user"], "find"),
+        (["--config", "/tmp/x.ini", "radacct", "status"], "radacct"),
+        (["--sql", "nosuch"], None),
+        (["--", "show"], None),
+        (["--sql"], None),
+    ],
+)
+def test_command_name(argv: list[str], expected: str | None) -> None:
+    assert cli._command_name(argv) == expected
+
+
+def _parse(argv: list[str]) -> argparse.Namespace:
+    return cli._build_parser(argv=argv).parse_args(argv)
+
+
+def test_global_flags_either_side_of_the_subcommand() -> None:
+    before = _parse(["--sql", "--output", "json", "show", "users", "--limit", "5"])
+    after = _parse(["show", "users", "--limit", "5", "--sql", "--output", "json"])
+    assert vars(before) == vars(after)
+    assert (before.sql, before.output, before.limit, before.action) == (True, "json", 5, "show_users")
+
+    # Defaults of the subcommand copies never reset a flag given before the subcommand.
+    mixed = _parse(["--output", "csv", "show", "users", "--timings"])
+    assert (mixed.output, mixed.timings, mixed.sql) == ("csv", True, False)
+
+
+def test_parse_errors_raise_in_batch_parser() -> None:
+    parser = cli._build_parser(cli._NonExitingArgumentParser)
+    with pytest.raises(ValueError, match="invalid choice"):
+        parser.parse_args(["show", "nothing"])
+
+
+def test_sql_output_redacts_secrets(sql: Callable[..., tuple[int, str, str]]) -> None:
+    code, out, _ = sql("create", "user", "alice", "--password", "s3cret")
+    assert code == 0
+    assert "-- 1/2: Upsert user password (radcheck)" in out
+    assert "'***'" in out and "s3cret" not in out
+
+    code, out, _ = sql("create", "user", "alice", "--password", "s3cret", "--show-secrets")
+    assert code == 0 and "'s3cret'" in out
+
+
+def test_sql_output_json(sql: Callable[..., tuple[int, str, str]]) -> None:
+    code, out, _ = sql("show", "users", "--limit", "5", "--output", "json")
+    assert code == 0
+    statements = json.loads(out)["statements"]
+    assert [s["title"] for s in statements] == ["List users"]
+    assert statements[0]["params"] == [5]
+
+
+def test_sql_output_ndjson(sql: Callable[..., tuple[int, str, str]]) -> None:
+    code, out, _ = sql("--output", "ndjson", "block", "alice", "--reason", "abuse", "--for", "2h")
+    assert code == 0
+    lines = [json.loads(line) for line in out.splitlines()]
+    assert lines and all(set(line) >= {"title", "sql", "params"} for line in lines)
+
+
+def test_show_secrets_without_sql_warns(tmp_path, capsys: pytest.CaptureFixture[str]) -> None:
+    config = tmp_path / "tuxedo.ini"
+    config.write_text("[postgres]\ndsn = host=/nonexistent\nconnect_timeout_seconds = 1\n", encoding="utf-8")
+    cli.main(["--config", str(config), "show", "groups", "--show-secrets"])
+    assert "--show-secrets has effect only with --sql" in capsys.readouterr().err
+
+
+def test_usage_errors_exit_2(sql: Callable[..., tuple[int, str, str]]) -> None:
+    code, _, err = sql("usage", "--since", "soon")
+    assert code == 2
+    assert "invalid --since 'soon'" in err
+    with pytest.raises(SystemExit) as exc:
+        sql("show", "nothing")
+    assert exc.value.code == 2
+
+
+@pytest.fixture
+def forwarded(tmp_path, monkeypatch: pytest.MonkeyPatch) -> list[list[str]]:
+    """A `tuxedo serve` socket path that exists; records the argv of every command that would be forwarded."""
+    from tuxedo import client
+
+    socket_path = tmp_path / "tuxedo.sock"
+    socket_path.touch()
+    for name in list(os.environ):
+        if name.startswith("TUXEDO_"):
+            monkeypatch.delenv(name)
+    monkeypatch.setenv("TUXEDO_SOCKET", str(socket_path))
+    calls: list[list[str]] = []
+    monkeypatch.setattr(client, "forward", lambda path, argv: calls.append(argv) or 0)
+    return calls
+
+
+@pytest.mark.parametrize(
+    "argv",
+    [
+        ["show", "users"],
+        ["show", "users", "--output", "json"],
+        ["usage", "--since", "7d"],
+        ["create", "user", "alice", "--password", "x"],
+    ],
+)
+def test_forwarded_commands(forwarded: list[list[str]], argv: list[str]) -> None:
+    assert cli._maybe_forward(argv) == 0
+    assert forwarded == [argv]
+
+
+@pytest.mark.parametrize(
+    "argv",
+    [
+        ["--no-server", "show", "users"],
+        ["--config", "/etc/tuxedo.ini", "show", "users"],
+        ["show", "users", "--output", "ndjson"],
+        ["--output=csv", "show", "blocks"],
+        ["usage", "refresh"],
+        ["counters", "verify", "--fix"],
+        ["blocks", "sweep"],
+        ["migrate"],
+        ["create", "user", "alice"],
+        ["show", "users", "--help"],
+    ],
+)
+def test_commands_run_locally(forwarded: list[list[str]], argv: list[str]) -> None:
+    assert cli._maybe_forward(argv) is None
+    assert forwarded == []
+
+
+@pytest.mark.parametrize("name", ["TUXEDO_PG_DSN", "TUXEDO_CONFIG", "TUXEDO_PG_STATEMENT_TIMEOUT_SECONDS"])
+def test_config_overrides_run_locally(forwarded: list[list[str]], monkeypatch: pytest.MonkeyPatch, name: str) -> None:
+    monkeypatch.setenv(name, "x")
+    assert cli._maybe_forward(["show", "users"]) is None
+    assert forwarded == []
+
+
+def _serve_once(path: str, answer: bytes) -> threading.Thread:
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen(1)
+
+    def run() -> None:
+        conn, _ = listener.accept()
+        with conn, listener:
+            conn.recv(65536)
+            conn.sendall(answer)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+@pytest.mark.parametrize(
+    ("answer", "message"),
+    [
+        (b"garbage\r\n\r\n", "malformed response: 'garbage'"),
+        (b"HTTP/1.1 200 OK\r\n\r\n<html>", r"malformed response body \(HTTP 200\)"),
+    ],
+)
+def test_broken_server_answer_is_an_error(
+    tmp_path, monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture[str], answer: bytes, message: str
+) -> None:
+    path = str(tmp_path / "tuxedo.sock")
+    for name in list(os.environ):
+        if name.startswith("TUXEDO_"):
+            monkeypatch.delenv(name)
+    monkeypatch.setenv("TUXEDO_SOCKET", path)
+    thread = _serve_once(path, answer)
+    assert cli.main(["show", "users"]) == 1
+    thread.join(5)
+    err = capsys.readouterr().err
+    assert re.search(f"^error: tuxedo serve: {message}", err), err
+
+
+def test_streamed_text_output_keeps_title(migrated, tuxedo: Callable[..., tuple[int, str, str]]) -> None:
+    assert tuxedo("create", "user", "alice", "--password", "x")[0] == 0
+    assert tuxedo("show", "users") == (0, "List users\nalice\n", "")
+    assert tuxedo("block", "alice", "--reason", "abuse")[0] == 0
+    code, out, _ = tuxedo("show", "blocks")
+    assert code == 0
+    assert out.splitlines()[0] == "List blocks"
+    assert out.splitlines()[1].startswith("alice\tabuse")
+    assert tuxedo("create", "user", "bob", "--password", "x")[0] == 0
+    assert tuxedo("show", "users") == (0, "alice\nbob\n", "")
+
+
+def test_find_user_patterns_merge_in_order(migrated, tuxedo: Callable[..., tuple[int, str, str]]) -> None:
+    for name in ("alice", "alex", "bob", "albert"):
+        assert tuxedo("create", "user", name, "--password", "x")[0] == 0
+    # Each pattern runs on its own connection; rows follow the pattern order, each user once.
+    code, out, err = tuxedo("find", "user", "b*", "al*", "*e*", "--output", "json")
+    assert code == 0, err
+    (result,) = json.loads(out)["results"]
+    assert result["title"] == "Users"
+    assert [row[0] for row in result["rows"]] == ["bob", "albert", "alex", "alice"]
+    assert result["rowcount"] == 4
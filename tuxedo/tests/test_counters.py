@@ -0,0 +1,110 @@
+"""The radacct row trigger behind `vpn_user_counters`, checked against `tuxedo_user_counters_recount()`."""
+
+from __future__ import annotations
+
+from typing import Any
+
+from tuxedo.db import PostgresExecutor
+from tuxedo.sql import SQLStatement
+
+INSERT_SQL = """
+INSERT INTO radacct (acctsessionid, acctuniqueid, username, nasipaddress, acctstarttime, acctupdatetime,
+                     acctinputoctets, acctoutputoctets)
+VALUES (%s, %s, %s, '192.0.2.1', %s, NOW(), %s, %s);
+"""
+
+
+def _sql(executor: PostgresExecutor, sql: str, *params: Any) -> list[tuple[Any, ...]] | None:
+    return executor.run([SQLStatement(title="test", sql=sql, params=params)])[0].rows
+
+
+def _start(executor: PostgresExecutor, uid: str, username: str, *, started: str = "NOW()", octets: int = 0) -> None:
+    start = _sql(executor, f"SELECT {started};")[0][0]
+    _sql(executor, INSERT_SQL, uid, uid, username, start, octets, 0)
+
+
+def _counters(executor: PostgresExecutor) -> dict[str, tuple[int, int]]:
+    rows = _sql(
+        executor,
+        """
+SELECT username, active_sessions,
+       CASE WHEN usage_day = (NOW() AT TIME ZONE 'UTC')::date THEN day_octets ELSE 0 END
+  FROM vpn_user_counters
+ WHERE active_sessions <> 0 OR day_octets <> 0
+ ORDER BY username;
+""",
+    )
+    return {username: (active, octets) for username, active, octets in rows}
+
+
+def _recount(executor: PostgresExecutor) -> dict[str, tuple[int, int]]:
+    rows = _sql(
+        executor,
+        """
+SELECT username, active_sessions, day_octets
+  FROM tuxedo_user_counters_recount()
+ WHERE active_sessions <> 0 OR day_octets <> 0
+ ORDER BY username;
+""",
+    )
+    return {username: (active, octets) for username, active, octets in rows}
+
+
+def _check(executor: PostgresExecutor, expected: dict[str, tuple[int, int]]) -> None:
+    assert _counters(executor) == expected
+    assert _recount(executor) == expected
+
+
+def test_insert_update_stop_delete(accounting: PostgresExecutor) -> None:
+    _start(accounting, "a1", "alice", octets=100)
+    _start(accounting, "a2", "alice", octets=5)
+    # Started yesterday (UTC): an open session, but its octets are not today's.
+    yesterday = "date_trunc('day', NOW() AT TIME ZONE 'UTC') AT TIME ZONE 'UTC' - INTERVAL '1 hour'"
+    _start(accounting, "b1", "bob", started=yesterday, octets=70)
+    _check(accounting, {"alice": (2, 105), "bob": (1, 0)})
+
+    # Interim update: only the octets delta is added.
+    _sql(accounting, "UPDATE radacct SET acctinputoctets = 160, acctoutputoctets = 40 WHERE acctuniqueid = 'a1';")
+    _sql(accounting, "UPDATE radacct SET acctinputoctets = 90 WHERE acctuniqueid = 'b1';")
+    _check(accounting, {"alice": (2, 205), "bob": (1, 0)})
+
+    # Stop: one session less, the final octets still count.
+    _sql(accounting, "UPDATE radacct SET acctstoptime = NOW(), acctinputoctets = 170 WHERE acctuniqueid = 'a1';")
+    _sql(accounting, "UPDATE radacct SET acctstoptime = NOW() WHERE acctuniqueid = 'b1';")
+    _check(accounting, {"alice": (1, 215)})
+
+    # Delete an open and a stopped session.
+    _sql(accounting, "DELETE FROM radacct WHERE acctuniqueid IN ('a2', 'b1');")
+    _check(accounting, {"alice": (0, 210)})
+
+
+def test_username_change_moves_the_counts(accounting: PostgresExecutor) -> None:
+    _start(accounting, "a1", "alice", octets=100)
+    _start(accounting, "a2", "alice", octets=1)
+    _sql(accounting, "UPDATE radacct SET username = 'carol', acctinputoctets = 120 WHERE acctuniqueid = 'a1';")
+    _check(accounting, {"alice": (1, 1), "carol": (1, 120)})
+
+    # An empty username is not counted for anyone.
+    _sql(accounting, "UPDATE radacct SET username = '' WHERE acctuniqueid = 'a2';")
+    _check(accounting, {"carol": (1, 120)})
+
+
+def test_late_transaction_from_yesterday_keeps_today(accounting: PostgresExecutor) -> None:
+    _start(accounting, "a1", "alice", octets=100)
+    # A transaction of the next UTC day already moved the row on (as if this one committed after midnight).
+    _sql(
+        accounting,
+        "UPDATE vpn_user_counters SET usage_day = usage_day + 1, day_octets = 7 WHERE username = 'alice';",
+    )
+    _start(accounting, "a2", "alice", octets=50)
+    _sql(accounting, "UPDATE radacct SET acctinputoctets = 300 WHERE acctuniqueid = 'a1';")
+    row = _sql(
+        accounting,
+        """
+SELECT active_sessions, usage_day - (NOW() AT TIME ZONE 'UTC')::date, day_octets
+  FROM vpn_user_counters
+ WHERE username = 'alice';
+""",
+    )
+    # Sessions still count; the later day and its octets are left alone.
+    assert row == [(2, 1, 7)]
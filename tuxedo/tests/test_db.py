@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import io
+import threading
+import time
+from dataclasses import replace
+
+import pytest
+
+from tuxedo import db
+from tuxedo.config import PostgresConfig
+from tuxedo.db import AsyncPostgresExecutor, PostgresExecutor, get_pool
+from tuxedo.sql import SQLStatement
+
+
+def _show(executor: PostgresExecutor, setting: str) -> str:
+    return executor.run([SQLStatement(title=setting, sql=f"SHOW {setting};")])[0].rows[0][0]
+
+
+def test_pool_opens_connections_with_statement_timeout(pg: PostgresConfig, driver: str) -> None:
+    pg = replace(pg, statement_timeout_seconds=7)
+    pool = get_pool(pg)
+    conn = pool.acquire()
+    try:
+        assert pool.driver.name == ("psycopg" if driver == "psycopg" else "psycopg2")
+        with conn.cursor() as cur:
+            cur.execute("SHOW statement_timeout;")
+            assert cur.fetchone()[0] == "7s"
+    finally:
+        pool.release(conn)
+    # The timeout is session-level: it survives the rollback on release and applies to reused connections.
+    assert _show(PostgresExecutor(pg), "statement_timeout") == "7s"
+
+
+def test_run_autocommit_overrides_and_restores_statement_timeout(executor: PostgresExecutor) -> None:
+    show = [SQLStatement(title="timeout", sql="SHOW statement_timeout;")]
+    assert executor.run_autocommit(show, statement_timeout_ms=0)[0].rows == [("0",)]
+    assert executor.run_autocommit(show, statement_timeout_ms=250)[0].rows == [("250ms",)]
+    assert _show(executor, "statement_timeout") == "5s"
+
+
+def test_statement_without_params_keeps_literal_percent(executor: PostgresExecutor) -> None:
+    res = executor.run([SQLStatement(title="like", sql="SELECT 'a%b' LIKE 'a%';")])
+    assert res[0].rows == [(True,)]
+
+
+def test_timings_record_elapsed_and_bytes(executor: PostgresExecutor) -> None:
+    res = executor.run([SQLStatement(title="values", sql="SELECT 'abc', NULL::text, 12;")], timings=True)[0]
+    assert res.rows == [("abc", None, 12)]
+    assert res.elapsed_ms is not None and res.elapsed_ms >= 0
+    # "abc" and "12" in text form; NULL sends no value.
+    assert res.bytes_fetched == 5
+
+
+def test_copy_to_stdout_writes_target(executor: PostgresExecutor) -> None:
+    target = io.BytesIO()
+    res = executor.run(
+        [
+            SQLStatement(
+                title="copy",
+                sql="COPY (SELECT n FROM generate_series(1, 3) AS n) TO STDOUT;",
+                copy_target=target,
+            )
+        ]
+    )[0]
+    assert target.getvalue() == b"1\n2\n3\n"
+    assert res.rows is None
+    assert res.rowcount == 3
+
+
+def test_pool_replaces_connection_closed_by_server(
+    pg: PostgresConfig, executor: PostgresExecutor, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    pid = [SQLStatement(title="pid", sql="SELECT pg_backend_pid();")]
+    first = executor.run(pid)[0].rows[0][0]
+
+    # Another session ends the pooled backend, as a server restart or `idle_session_timeout` would.
+    other = get_pool(pg).driver.connect(pg)
+    try:
+        with other.cursor() as cur:
+            cur.execute("SELECT pg_terminate_backend(%s, 5000);", (first,))
+        other.commit()
+    finally:
+        other.close()
+
+    # Without the idle check the next run would fail on the dead connection.
+    monkeypatch.setattr(db, "_IDLE_CHECK_SECONDS", 0.0)
+    second = executor.run(pid)[0].rows[0][0]
+    assert second != first
+
+
+def _sleep_program(seconds: float, value: int) -> list[SQLStatement]:
+    return [SQLStatement(title=f"p{value}", sql="SELECT %s::int FROM pg_sleep(%s);", params=(value, seconds))]
+
+
+def test_async_executor_keeps_program_order(pg: PostgresConfig) -> None:
+    # The first programs finish last; results still come back in program order.
+    programs = [_sleep_program(0.05 * (4 - i), i) for i in range(4)]
+    results = AsyncPostgresExecutor(pg).run(programs)
+    assert [r[0].rows for r in results] == [[(i,)] for i in range(4)]
+
+
+def test_async_executor_bounds_concurrency(pg: PostgresConfig, monkeypatch: pytest.MonkeyPatch) -> None:
+    in_flight = 0
+    peak = 0
+    lock = threading.Lock()
+    run = PostgresExecutor.run
+
+    def counting_run(self: PostgresExecutor, statements, **kwargs):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        try:
+            return run(self, statements, **kwargs)
+        finally:
+            with lock:
+                in_flight -= 1
+
+    monkeypatch.setattr(PostgresExecutor, "run", counting_run)
+    started = time.monotonic()
+    results = AsyncPostgresExecutor(pg, concurrency=2).run([_sleep_program(0.2, i) for i in range(5)])
+    elapsed = time.monotonic() - started
+    assert [r[0].rows for r in results] == [[(i,)] for i in range(5)]
+    assert peak == 2
+    # Three waves of at most two programs each.
+    assert elapsed >= 0.55
+
+
+PLUS_ONE = SQLStatement(title="plus one", sql="SELECT %s::int + 1;", params=(1,), prepare_name="tuxedo_test_plus_one")
+COUNT_PREPARED = SQLStatement(title="prepared", sql="SELECT count(*) FROM pg_prepared_statements;")
+
+
+def _prepared_after_each_use(pool: db.ConnectionPool, conn, uses: int) -> list[int]:
+    counts: list[int] = []
+    for _ in range(uses):
+        assert pool.driver.execute(conn, [PLUS_ONE])[0].rows == [(2,)]
+        counts.append(pool.driver.execute(conn, [COUNT_PREPARED])[0].rows[0][0])
+    return counts
+
+
+def test_catalog_statement_prepared_on_second_use(pg: PostgresConfig) -> None:
+    pool = get_pool(pg)
+    conn = pool.acquire()
+    try:
+        # psycopg2 runs PREPARE/EXECUTE, psycopg 3 a protocol-level prepare: both show in pg_prepared_statements.
+        assert _prepared_after_each_use(pool, conn, 3) == [0, 1, 1]
+        # In a pipeline too, and a rollback keeps the prepared statement.
+        conn.rollback()
+        results = pool.driver.execute(conn, [PLUS_ONE, COUNT_PREPARED])
+        assert [r.rows for r in results] == [[(2,)], [(1,)]]
+    finally:
+        pool.release(conn)
+
+
+def test_prepare_statements_disabled(pg: PostgresConfig) -> None:
+    pool = get_pool(replace(pg, prepare_statements=False))
+    conn = pool.acquire()
+    try:
+        assert _prepared_after_each_use(pool, conn, 3) == [0, 0, 0]
+    finally:
+        pool.release(conn)
+
+
+def test_discarded_connection_does_not_leak_prepared_state(pg: PostgresConfig) -> None:
+    pool = get_pool(pg)
+    conn = pool.acquire()
+    assert _prepared_after_each_use(pool, conn, 2) == [0, 1]
+    pool.release(conn, discard=True)
+    del conn
+
+    # The replacement connection counts from zero: running `EXECUTE` there before its own `PREPARE` would fail.
+    conn = pool.acquire()
+    try:
+        assert _prepared_after_each_use(pool, conn, 2) == [0, 1]
+    finally:
+        pool.release(conn)
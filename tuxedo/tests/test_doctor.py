@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import json
+from typing import Callable
+
+from tuxedo.db import PostgresExecutor
+from tuxedo.doctor import describe_scans, large_seq_scans, scan_nodes
+
+PLAN = {
+    "Plan": {
+        "Node Type": "Nested Loop",
+        "Plans": [
+            {"Node Type": "Seq Scan", "Relation Name": "radcheck"},
+            {"Node Type": "Index Scan", "Relation Name": "radusergroup", "Index Name": "radusergroup_username"},
+            {"Node Type": "Seq Scan", "Relation Name": "radcheck"},
+        ],
+    }
+}
+
+
+def test_scan_nodes_in_plan_order() -> None:
+    scans = scan_nodes(PLAN)
+    assert scans == [
+        ("Seq Scan", "radcheck", ""),
+        ("Index Scan", "radusergroup", "radusergroup_username"),
+        ("Seq Scan", "radcheck", ""),
+    ]
+    assert describe_scans(scans) == "Seq Scan on radcheck, Index Scan using radusergroup_username on radusergroup"
+    assert scan_nodes(None) == []
+
+
+def test_large_seq_scans_use_row_estimates() -> None:
+    scans = scan_nodes(PLAN)
+    assert large_seq_scans(scans, {"radcheck": 10}, min_rows=100) == []
+    assert large_seq_scans(scans, {"radcheck": 5000, "radusergroup": 9000}, min_rows=100) == ["radcheck (~5000 rows)"]
+
+
+def test_doctor_indexes_runs_under_each_driver(
+    migrated: PostgresExecutor, tuxedo: Callable[..., tuple[int, str, str]]
+) -> None:
+    code, out, err = tuxedo("doctor", "indexes", "--output", "json", "--timings")
+    assert code in (0, 1), err
+    report = json.loads(out)
+    assert [r["title"] for r in report["results"]][1] == "Hot queries"
+    assert isinstance(report["pending_indexes"], list)
+
+
+def test_doctor_indexes_apply_builds_missing_indexes(
+    migrated: PostgresExecutor, tuxedo: Callable[..., tuple[int, str, str]]
+) -> None:
+    code, out, err = tuxedo("doctor", "indexes", "--apply", "--output", "json")
+    report = json.loads(out)
+    assert report["pending_indexes"] == [], err
+    assert code == (1 if report["seq_scans"] else 0)
@@ -0,0 +1,322 @@
+"""
+Pure helpers of the DPI agent (`roles/dpi/templates/tuxedovpn-dpi-agent.py.j2`).
+
+The template is rendered with the role defaults and imported as a module; nothing is started at import time.
+"""
+
+from __future__ import annotations
+
+import importlib.util
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from types import ModuleType
+from typing import Iterator
+
+import pytest
+
+ROLES = Path(__file__).resolve().parents[2] / "roles"
+SRC = Path(__file__).resolve().parents[1] / "src"
+
+
+@pytest.fixture
+def agent(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> ModuleType:
+    jinja2 = pytest.importorskip("jinja2")
+    yaml = pytest.importorskip("yaml")
+    defaults = yaml.safe_load((ROLES / "dpi" / "defaults" / "main.yml").read_text(encoding="utf-8"))
+    template = jinja2.Environment(keep_trailing_newline=True).from_string(
+        (ROLES / "dpi" / "templates" / "tuxedovpn-dpi-agent.py.j2").read_text(encoding="utf-8")
+    )
+    path = tmp_path / "tuxedovpn_dpi_agent.py"
+    path.write_text(template.render(**defaults, common_tuxedo_pylib_dir=str(SRC)), encoding="utf-8")
+
+    monkeypatch.delenv("SIGNATURE_MATCH_REGEX", raising=False)
+    monkeypatch.setenv("VPN_SUBNETS", "10.10.0.0/24, 10.10.1.0/24,bogus, 10.20.0.0/16, fd00:10::/64")
+    monkeypatch.setenv("IGNORE_SIDS", "7, 9,x")
+    monkeypatch.setenv("RULESET_PATH", str(tmp_path / "suricata.rules"))
+    monkeypatch.setenv("SID_POLICY_PATH", str(tmp_path / "sid-policy.json"))
+    spec = importlib.util.spec_from_file_location("tuxedovpn_dpi_agent", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_default_signature_regex(agent: ModuleType) -> None:
+    assert agent.SIGNATURE_MATCH_REGEX == r"(?i)\b(p2p|torrent|bittorrent)\b"
+    assert agent.signature_re.search("ET P2P BitTorrent peer sync")
+    assert not agent.signature_re.search("ET POLICY torrentz lookalike domain")
+
+
+@pytest.mark.parametrize(
+    ("line", "sid"),
+    [
+        (b'alert tcp any any -> any any (msg:"x"; sid:2027397; rev:1;)', b"2027397"),
+        (b'alert udp any any -> any any (msg:"x"; sid : 12 ; rev:3;)', b"12"),
+        (b'alert tcp any any -> any any (msg:"x";sid:5;)', b"5"),
+        (b'alert tcp any any -> any any (msg:"x"; xsid:5; rev:1;)', None),
+        (b'alert tcp any any -> any any (msg:"x"; sid:5 rev:1;)', None),
+    ],
+)
+def test_sid_regex(agent: ModuleType, line: bytes, sid: bytes | None) -> None:
+    m = agent._sid_re.search(line)
+    assert (m.group(1) if m else None) == sid
+
+
+def test_load_sids_from_rules(agent: ModuleType, tmp_path: Path) -> None:
+    rules = tmp_path / "suricata.rules"
+    rules.write_bytes(
+        b'alert tcp any any -> any any (msg:"a"; sid:2000001; rev:1;)\n'
+        b'# alert tcp any any -> any any (msg:"disabled"; sid:2000002; rev:1;)\n'
+        b"\n"
+        b'  alert udp any any -> any any (msg:"b"; sid: 3000000 ; rev:2;)\n'
+        b'alert tcp any any -> any any (msg:"zero"; sid:0;)\n'
+        b'alert tcp any any -> any any (msg:"too big"; sid:4294967296;)\n'
+        b'alert tcp any any -> any any (msg:"no sid";)\n'
+    )
+    sids = agent._load_sids_from_rules(str(rules))
+    assert len(sids) == 2
+    assert 2000001 in sids and 3000000 in sids
+    assert 2000002 not in sids and 0 not in sids
+    with pytest.raises(OSError):
+        agent._load_sids_from_rules(str(tmp_path / "missing.rules"))
+
+
+@pytest.mark.parametrize("span", [None, 16])
+def test_sid_set(agent: ModuleType, monkeypatch: pytest.MonkeyPatch, span: int | None) -> None:
+    if span is not None:
+        # Force the sorted-array form.
+        monkeypatch.setattr(agent, "_SID_BITMAP_MAX_SPAN", span)
+    sids = agent.SidSet([2000001, 2000003, 2000001, 2000100, 3000000])
+    assert (sids._bits is None) == (span is not None)
+    assert len(sids) == 4
+    for sid in (2000001, 2000003, 2000100, 3000000):
+        assert sid in sids
+    for sid in (0, 2000000, 2000002, 2000099, 2999999, 3000001, 1 << 40):
+        assert sid not in sids
+
+
+def test_empty_sid_set(agent: ModuleType) -> None:
+    sids = agent.SidSet(())
+    assert len(sids) == 0
+    assert 1 not in sids
+
+
+def test_sid_policy(agent: ModuleType, tmp_path: Path) -> None:
+    path = tmp_path / "sid-policy.json"
+    assert agent._load_sid_policy(str(path)) == {7: ("ignore", None), 9: ("ignore", None)}
+
+    path.write_text(
+        json.dumps({"sids": {"2027397": "detect", "2008581": {"action": "disconnect", "block_seconds": 3600}, "9": "detect"}}),
+        encoding="utf-8",
+    )
+    assert agent._load_sid_policy(str(path)) == {
+        7: ("ignore", None),
+        9: ("detect", None),
+        2027397: ("detect", None),
+        2008581: ("disconnect", 3600),
+    }
+
+    for doc, message in (
+        ({"sids": {"abc": "detect"}}, "invalid SID 'abc'"),
+        ({"sids": {"1": "kill"}}, "unknown action 'kill'"),
+        ({"sids": {"1": {"block_seconds": "soon"}}}, "invalid block_seconds"),
+        ({"sids": []}, "'sids' must be an object"),
+    ):
+        path.write_text(json.dumps(doc), encoding="utf-8")
+        with pytest.raises(ValueError, match=message):
+            agent._load_sid_policy(str(path))
+
+
+def test_subnet_matcher(agent: ModuleType) -> None:
+    matcher = agent.VPN_SUBNET_MATCHER
+    assert matcher
+    # The two adjacent /24s merge into one range; "bogus" is skipped.
+    starts, ends = matcher.ranges[agent.socket.AF_INET]
+    assert len(starts) == 2
+    for ip in ("10.10.0.1", "10.10.1.255", "10.20.255.254", "fd00:10::1"):
+        assert ip in matcher
+    for ip in ("10.10.2.0", "10.9.255.255", "192.0.2.1", "fd00:11::1", "", "not-an-ip", "10.10.0.300", "::1"):
+        assert ip not in matcher
+    assert agent._ip_in_vpn_subnets("10.10.0.7")
+
+
+def test_subnet_matcher_overlaps_and_memo(agent: ModuleType, monkeypatch: pytest.MonkeyPatch) -> None:
+    matcher = agent.SubnetMatcher(agent._parse_subnets("10.0.0.0/8,10.1.0.0/16,192.168.0.0/24"))
+    assert matcher.ranges[agent.socket.AF_INET] == (
+        [int(agent.ip_network("10.0.0.0/8").network_address), int(agent.ip_network("192.168.0.0/24").network_address)],
+        [int(agent.ip_network("10.0.0.0/8").broadcast_address), int(agent.ip_network("192.168.0.0/24").broadcast_address)],
+    )
+    assert agent.socket.AF_INET6 not in matcher.ranges
+    assert "fd00::1" not in matcher
+
+    monkeypatch.setattr(agent, "_SUBNET_MEMO_MAX", 3)
+    for i in range(10):
+        assert f"10.0.0.{i}" in matcher
+        assert len(matcher._memo) <= 3
+    assert not agent.SubnetMatcher([])
+
+
+def _eve(event_type: str, n: int) -> bytes:
+    # Compact JSON, as Suricata writes it.
+    return json.dumps({"event_type": event_type, "n": n}, separators=(",", ":")).encode() + b"\n"
+
+
+def test_eve_decoder_keeps_partial_lines(agent: ModuleType) -> None:
+    records: list[dict] = []
+    decoder = agent.EveDecoder(records.append)
+    data = _eve("alert", 1) + _eve("drop", 2) + _eve("alert", 3)
+    # Split inside the second and the third record.
+    decoder.feed(data[:40])
+    assert [r["n"] for r in records] == [1]
+    decoder.feed(data[40:-5])
+    assert [r["n"] for r in records] == [1, 2]
+    decoder.feed(data[-5:])
+    assert [r["n"] for r in records] == [1, 2, 3]
+    assert decoder.pending == b""
+
+    decoder.feed(_eve("alert", 4).rstrip(b"\n"))
+    assert len(records) == 3
+    decoder.flush()
+    assert [r["n"] for r in records] == [1, 2, 3, 4]
+
+
+def test_eve_decoder_prefilter(agent: ModuleType) -> None:
+    records: list[dict] = []
+    decoder = agent.EveDecoder(records.append)
+    decoder.feed(
+        _eve("flow", 1)
+        + _eve("alert", 2)
+        + b'{"event_type": "drop", "n": 3}\n'
+        + b"not json at all\n"
+        + b'{"event_type":"alert", broken\n'
+        + b'["event_type":"alert"]\n'
+        + _eve("bittorrent_dht", 4)
+        + _eve("alerting", 5)
+    )
+    assert [r["n"] for r in records] == [2, 3, 4]
+    # flow, the line that names no event_type and "alerting" are dropped before json.loads().
+    assert agent.metrics.eve_records_total == {"prefiltered": 3, "parsed": 3, "invalid": 2}
+
+    assert agent._eve_prefilter(set()) is None
+    assert agent._eve_prefilter({"dns"}).search(b'{"event_type":"dns"}')
+
+
+@pytest.fixture
+def follower(agent: ModuleType, tmp_path: Path) -> Iterator[tuple]:
+    """An `EveFileFollower` on a file that already has a record (skipped: followed from its end)."""
+    path = tmp_path / "eve.json"
+    path.write_bytes(_eve("alert", 0))
+    records: list[dict] = []
+    eve = agent.EveFileFollower(str(path), agent.EveDecoder(records.append))
+    assert eve._open(from_end=True)
+    yield eve, path, records
+    if eve.fd is not None:
+        os.close(eve.fd)
+
+
+def _follow(eve) -> None:
+    # One iteration of `EveFileFollower.run()` after a wake-up.
+    eve._read_to_eof()
+    eve._check_rotation()
+
+
+def test_eve_file_follower_rotation(agent: ModuleType, follower: tuple) -> None:
+    eve, path, records = follower
+    with path.open("ab") as out:
+        out.write(_eve("alert", 1))
+    _follow(eve)
+    assert [r["n"] for r in records] == [1]
+
+    # Renamed away: the old inode is still read until a new file appears.
+    rotated = path.with_name("eve.json.1")
+    path.rename(rotated)
+    with rotated.open("ab") as out:
+        out.write(_eve("alert", 2))
+    _follow(eve)
+    assert [r["n"] for r in records] == [1, 2]
+
+    # The last record of the old file has no newline; the new file is read from its start.
+    with rotated.open("ab") as out:
+        out.write(_eve("alert", 3).rstrip(b"\n"))
+    path.write_bytes(_eve("alert", 4))
+    _follow(eve)
+    _follow(eve)
+    assert [r["n"] for r in records] == [1, 2, 3, 4]
+    assert agent.metrics.eve_reopen_total == {"rotate": 1, "truncate": 0}
+
+
+def test_eve_file_follower_truncation(agent: ModuleType, follower: tuple) -> None:
+    eve, path, records = follower
+    with path.open("ab") as out:
+        out.write(_eve("alert", 1) + _eve("alert", 2) + b'{"event_type":"alert","n":')
+    _follow(eve)
+    assert [r["n"] for r in records] == [1, 2]
+
+    # copytruncate: same inode, shorter content; the partial record before the truncation is discarded.
+    with path.open("r+b") as out:
+        out.truncate(0)
+        out.write(_eve("alert", 3))
+    _follow(eve)
+    _follow(eve)
+    assert [r["n"] for r in records] == [1, 2, 3]
+    assert agent.metrics.eve_reopen_total == {"rotate": 0, "truncate": 1}
+
+
+def _queue_totals(agent: ModuleType, name: str) -> dict[str, int]:
+    return {res: n for (queue, res), n in agent.metrics.action_queue_total.items() if queue == name}
+
+
+def _wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_action_queue_coalesces_and_drops_when_full(agent: ModuleType) -> None:
+    handled: list[str] = []
+
+    def handler(job: str) -> None:
+        if job == "bad":
+            raise RuntimeError("occtl failed")
+        handled.append(job)
+
+    queue = agent.ActionQueue("test", handler, workers=1, maxsize=2)
+    assert queue.submit("alice", "first", detected_at=1.0)
+    # Same key while waiting: merged into the queued job, which keeps its detection time.
+    assert not queue.submit("alice", "second", detected_at=2.0)
+    assert queue.jobs["alice"] == (1.0, "first")
+    assert queue.submit("bob", "bad", detected_at=3.0)
+    assert not queue.submit("carol", "third", detected_at=4.0)
+    assert queue.depth() == 2
+    assert _queue_totals(agent, "test") == {"queued": 2, "coalesced": 1, "dropped": 1, "done": 0}
+
+    # A failing job does not stop the worker.
+    queue.start()
+    _wait_for(lambda: _queue_totals(agent, "test")["done"] == 2)
+    assert handled == ["first"]
+    assert queue.submit("alice", "again", detected_at=time.monotonic())
+    _wait_for(lambda: handled == ["first", "again"])
+    assert agent.metrics.action_last_latency_seconds["test"] < 5
+
+
+def test_action_queue_block_policy(agent: ModuleType, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(agent, "ACTION_QUEUE_FULL_POLICY", "block")
+    handled: list[str] = []
+    queue = agent.ActionQueue("test", handled.append, workers=1, maxsize=1)
+    assert queue.submit("alice", "first", detected_at=time.monotonic())
+    submitted: list[bool] = []
+    thread = threading.Thread(
+        target=lambda: submitted.append(queue.submit("bob", "second", detected_at=time.monotonic()))
+    )
+    thread.start()
+    thread.join(0.2)
+    # Full: the submitter waits for room instead of dropping the job.
+    assert thread.is_alive()
+    queue.start()
+    thread.join(5)
+    assert submitted == [True]
+    _wait_for(lambda: handled == ["first", "second"])
+    assert _queue_totals(agent, "test")["dropped"] == 0
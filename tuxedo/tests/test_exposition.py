@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import gzip
+import http.client
+import socket
+import threading
+from http.server import ThreadingHTTPServer
+from typing import Iterator
+
+import pytest
+
+from tuxedo import exposition
+from tuxedo.exposition import LabelSet, MetricsHandler, Registry, render
+
+
+def _registry() -> Registry:
+    registry = Registry(const_labels={"node": "vpn1"})
+    users = LabelSet(("user",), const={"node": "vpn1"})
+    sessions = registry.gauge("tuxedo_sessions", "Open sessions.", users)
+    errors = registry.counter("tuxedo_errors_total", "Errors\nso far.")
+    sessions.add(2, "alice")
+    registry.comment("ERROR  scrape   failed")
+    errors.add(3)
+    sessions.add(1.5, 'b"o\\b')
+    registry.gauge("tuxedo_up").add(True)
+    return registry
+
+
+def test_render_text_groups_families() -> None:
+    assert "".join(render([_registry()])) == (
+        "# HELP tuxedo_sessions Open sessions.\n"
+        "# TYPE tuxedo_sessions gauge\n"
+        'tuxedo_sessions{node="vpn1",user="alice"} 2\n'
+        'tuxedo_sessions{node="vpn1",user="b\\"o\\\\b"} 1.5\n'
+        "# HELP tuxedo_errors_total Errors\\nso far.\n"
+        "# TYPE tuxedo_errors_total counter\n"
+        'tuxedo_errors_total{node="vpn1"} 3\n'
+        "# ERROR scrape failed\n"
+        "# TYPE tuxedo_up gauge\n"
+        'tuxedo_up{node="vpn1"} 1\n'
+    )
+
+
+def test_render_openmetrics() -> None:
+    registry = Registry()
+    registry.counter("jobs_total", 'Jobs "done".').add(1)
+    registry.counter("restarts").add(2)
+    registry.comment("not in OpenMetrics")
+    registry.gauge("ratio").add(float("nan"))
+    registry.gauge("limit").add(float("-inf"))
+    assert "".join(render([registry], openmetrics=True)) == (
+        '# HELP jobs Jobs \\"done\\".\n'
+        "# TYPE jobs counter\n"
+        "jobs_total 1\n"
+        "# TYPE restarts unknown\n"
+        "restarts 2\n"
+        "# TYPE ratio gauge\n"
+        "ratio NaN\n"
+        "# TYPE limit gauge\n"
+        "limit -Inf\n"
+        "# EOF\n"
+    )
+
+
+def test_label_set_caches_and_checks_arity() -> None:
+    labels = LabelSet(("user", "node"), const={"node": "ignored", "site": "a", "empty": None})
+    first = labels("alice", "n1")
+    assert first == '{site="a",user="alice",node="n1"}'
+    assert labels("alice", "n1") is first
+    assert LabelSet()() == ""
+    with pytest.raises(ValueError, match="expected 2 label values"):
+        labels("alice")
+
+
+@pytest.mark.parametrize(
+    ("header", "token", "expected"),
+    [
+        ("gzip, deflate", "gzip", True),
+        ("deflate;q=1, GZIP;q=0.5", "gzip", True),
+        ("gzip;q=0", "gzip", False),
+        ("gzip;q=x", "gzip", False),
+        ("", "gzip", False),
+        ("application/openmetrics-text; version=1.0.0, text/plain;q=0.5", "application/openmetrics-text", True),
+    ],
+)
+def test_accepts(header: str, token: str, expected: bool) -> None:
+    assert exposition._accepts(header, token) is expected
+
+
+def test_encoded_chunks_bounded_and_gzip(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(exposition, "_CHUNK_BYTES", 100)
+    pieces = [f"metric{{i=\"{i}\"}} {i}\n" for i in range(200)]
+    text = "".join(pieces).encode("utf-8")
+
+    plain = list(exposition._encoded_chunks(pieces, compress=False))
+    assert len(plain) > 10
+    assert all(len(chunk) < 100 + 30 for chunk in plain)
+    assert b"".join(plain) == text
+
+    assert gzip.decompress(b"".join(exposition._encoded_chunks(pieces, compress=True))) == text
+    assert list(exposition._encoded_chunks([], compress=False)) == []
+
+
+class _Handler(MetricsHandler):
+    metrics_path = "/metrics"
+
+    def collect(self) -> tuple[int, list[Registry]]:
+        return 200, [_registry()]
+
+
+@pytest.fixture
+def server() -> Iterator[int]:
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield httpd.server_address[1]
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def _get(port: int, path: str, headers: dict[str, str]) -> tuple[http.client.HTTPResponse, bytes]:
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    conn.request("GET", path, headers=headers)
+    response = conn.getresponse()
+    body = response.read()
+    conn.close()
+    return response, body
+
+
+def test_handler_streams_chunked_gzip(server: int) -> None:
+    response, body = _get(server, "/metrics?x=1", {"Accept-Encoding": "gzip"})
+    assert response.status == 200
+    assert response.getheader("Transfer-Encoding") == "chunked"
+    assert response.getheader("Content-Encoding") == "gzip"
+    assert response.getheader("Content-Type") == exposition.TEXT_CONTENT_TYPE
+    assert gzip.decompress(body).decode("utf-8") == "".join(render([_registry()]))
+
+
+def test_handler_negotiates_openmetrics(server: int) -> None:
+    response, body = _get(server, "/metrics/", {"Accept": "application/openmetrics-text; version=1.0.0"})
+    assert response.getheader("Content-Type") == exposition.OPENMETRICS_CONTENT_TYPE
+    assert body.decode("utf-8").endswith("# EOF\n")
+
+
+def test_handler_http10_gets_content_length(server: int) -> None:
+    with socket.create_connection(("127.0.0.1", server), timeout=5) as sock:
+        sock.sendall(b"GET /metrics HTTP/1.0\r\n\r\n")
+        raw = b"".join(iter(lambda: sock.recv(65536), b""))
+    head, _, body = raw.partition(b"\r\n\r\n")
+    assert b"Transfer-Encoding" not in head
+    assert f"Content-Length: {len(body)}".encode() in head.split(b"\r\n")
+    assert body.decode("utf-8") == "".join(render([_registry()]))
+
+
+def test_handler_unknown_path(server: int) -> None:
+    response, body = _get(server, "/other", {})
+    assert (response.status, body) == (404, b"Not Found\n")
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Callable
+
+import pytest
+
+from tuxedo.db import PostgresExecutor
+from tuxedo.sql import SQLStatement
+
+Tuxedo = Callable[..., tuple[int, str, str]]
+
+USERS_CSV = """username,password,groups,priority,block,block_for
+alice,s3cret,admins:10;users,0,,
+bob,hunter2,,,DPI,2h
+carol,pw,users,,MANUAL,
+"""
+
+
+@pytest.fixture
+def import_file(migrated: PostgresExecutor, tuxedo: Tuxedo, tmp_path: Any) -> Callable[[str, str], tuple[int, Any, str]]:
+    """Write `text` to a file named `name`, run `tuxedo import` on it: (exit code, JSON summary or None, stderr)."""
+
+    def run(name: str, text: str) -> tuple[int, Any, str]:
+        path = tmp_path / name
+        path.write_text(text, encoding="utf-8")
+        code, out, err = tuxedo("import", str(path), "--output", "json")
+        return code, (json.loads(out)["summary"] if code == 0 else None), err
+
+    return run
+
+
+def _rows(executor: PostgresExecutor, sql: str) -> list[tuple[Any, ...]]:
+    return executor.run([SQLStatement(title="check", sql=sql)])[0].rows or []
+
+
+def test_import_is_idempotent(import_file: Callable[..., Any], migrated: PostgresExecutor) -> None:
+    code, summary, err = import_file("users.csv", USERS_CSV)
+    assert code == 0, err
+    assert summary["radcheck"]["inserted"] == 3
+    assert summary["vpn_user_blocklist"]["inserted"] == 2
+    assert _rows(migrated, "SELECT username, groupname, priority FROM radusergroup ORDER BY 1, 2;") == [
+        ("alice", "admins", 10),
+        ("alice", "users", 0),
+        ("bob", "default", 0),
+        ("carol", "users", 0),
+    ]
+
+    code, summary, err = import_file("users.csv", USERS_CSV)
+    assert code == 0, err
+    assert all(counts["inserted"] == counts["updated"] == 0 for counts in summary.values()), summary
+    assert summary["vpn_user_blocklist"]["unchanged"] == 2
+
+
+def test_import_updates_changed_block_duration(import_file: Callable[..., Any], migrated: PostgresExecutor) -> None:
+    import_file("users.csv", USERS_CSV)
+    _, summary, _ = import_file("users.csv", USERS_CSV.replace("DPI,2h", "DPI,3h"))
+    assert summary["vpn_user_blocklist"] == {"inserted": 0, "updated": 1, "unchanged": 1}
+    assert _rows(
+        migrated, "SELECT EXTRACT(EPOCH FROM expires_at - created_at)::int FROM vpn_user_blocklist WHERE username = 'bob';"
+    ) == [(3 * 3600,)]
+
+
+def test_import_creates_the_default_group(import_file: Callable[..., Any], migrated: PostgresExecutor) -> None:
+    import_file("users.jsonl", '{"username": "dave", "password": "x"}\n')
+    assert _rows(migrated, "SELECT name FROM vpn_groups ORDER BY 1;") == [("default",)]
+
+
+def test_import_rejects_new_users_without_password(import_file: Callable[..., Any], migrated: PostgresExecutor) -> None:
+    code, _, err = import_file("users.jsonl", '{"username": "erin", "password": "x"}\n{"username": "frank"}\n')
+    assert code != 0
+    assert "frank" in err and "erin" not in err
+    # One transaction: nothing from the file was written.
+    assert _rows(migrated, "SELECT COUNT(*) FROM radcheck;") == [(0,)]
+
+    # Existing users may omit it (group/block-only updates).
+    import_file("users.jsonl", '{"username": "frank", "password": "x"}\n')
+    code, summary, err = import_file("users.jsonl", '{"username": "frank", "groups": ["ops"]}\n')
+    assert code == 0, err
+    assert summary["radusergroup"]["inserted"] == 1
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import threading
+
+from tuxedo.backends import FreeradiusBackend
+from tuxedo.config import PostgresConfig
+from tuxedo.db import PostgresExecutor, get_pool
+from tuxedo.sql import SQLStatement
+
+
+def test_migrate_runs_and_is_idempotent(executor: PostgresExecutor, backend: FreeradiusBackend) -> None:
+    # pg_trgm is best effort: on servers without contrib the migration still completes.
+    executor.run(backend.migrate())
+    executor.run(backend.migrate())
+    tables = executor.run(
+        [
+            SQLStatement(
+                title="tables",
+                sql="SELECT to_regclass('vpn_users') IS NOT NULL, to_regclass('vpn_groups') IS NOT NULL;",
+            )
+        ]
+    )
+    assert tables[0].rows == [(True, True)]
+
+
+ADD_PASSWORD_SQL = (
+    "INSERT INTO radcheck (username, attribute, op, value) VALUES ('alice', 'Cleartext-Password', ':=', 'x');"
+)
+
+
+def _run(executor: PostgresExecutor, sql: str) -> None:
+    executor.run([SQLStatement(title="test", sql=sql)])
+
+
+def _users(executor: PostgresExecutor) -> list[str]:
+    rows = executor.run([SQLStatement(title="users", sql="SELECT username FROM vpn_users ORDER BY 1;")])[0].rows
+    return [username for (username,) in rows]
+
+
+def test_users_directory_follows_the_sources(migrated: PostgresExecutor) -> None:
+    _run(migrated, ADD_PASSWORD_SQL)
+    _run(migrated, "INSERT INTO radusergroup (username, groupname) VALUES ('alice', 'a'), ('bob', 'a'), ('', 'a');")
+    assert _users(migrated) == ["alice", "bob"]
+    _run(migrated, "UPDATE radusergroup SET username = 'carol' WHERE username = 'bob';")
+    assert _users(migrated) == ["alice", "carol"]
+    _run(migrated, "DELETE FROM radusergroup;")
+    # alice still has a radcheck row.
+    assert _users(migrated) == ["alice"]
+
+
+def test_users_directory_keeps_user_referenced_concurrently(pg: PostgresConfig, migrated: PostgresExecutor) -> None:
+    _run(migrated, "INSERT INTO radusergroup (username, groupname) VALUES ('alice', 'vpn');")
+    driver = get_pool(pg).driver
+    adding, removing = driver.connect(pg), driver.connect(pg)
+    try:
+        # A new reference to alice, not committed yet...
+        with adding.cursor() as cur:
+            cur.execute(ADD_PASSWORD_SQL)
+
+        # ...while another transaction removes her last committed one.
+        def remove() -> None:
+            with removing.cursor() as cur:
+                cur.execute("DELETE FROM radusergroup WHERE username = 'alice';")
+            removing.commit()
+
+        thread = threading.Thread(target=remove)
+        thread.start()
+        thread.join(0.5)
+        # The removal waits for the other writer of alice instead of deleting her directory row under it.
+        assert thread.is_alive()
+        adding.commit()
+        thread.join(5)
+        assert not thread.is_alive()
+    finally:
+        adding.close()
+        removing.close()
+    assert _users(migrated) == ["alice"]
+
+
+def test_users_directory_sync_of_a_bulk_statement(migrated: PostgresExecutor) -> None:
+    _run(migrated, "INSERT INTO radusergroup (username, groupname) SELECT 'u' || n, 'a' FROM generate_series(1, 500) n")
+    assert len(_users(migrated)) == 500
+    _run(migrated, "DELETE FROM radusergroup;")
+    assert _users(migrated) == []
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import datetime
+import io
+import json
+
+from tuxedo.output import write_csv, write_ndjson, write_text
+
+
+def _text(rows, **kwargs) -> str:
+    out = io.StringIO()
+    write_text(rows, out, **kwargs)
+    return out.getvalue()
+
+
+def test_write_text_title_like_buffered_output() -> None:
+    # A plain list (one column, several rows) has no title line, like `_print_results_text`.
+    assert _text(iter([("alice",), ("bob",)]), title="List users") == "alice\nbob\n"
+    assert _text(iter([("alice",)]), title="List users") == "List users\nalice\n"
+    assert _text(iter([]), title="List users") == "List users\n"
+    assert _text(iter([("alice", None, 3)]), title="List blocks") == "List blocks\nalice\t\t3\n"
+    assert _text([("alice", 1), ("bob", 2)]) == "alice\t1\nbob\t2\n"
+
+
+def test_write_text_column_header() -> None:
+    rows = [("alice", 10, 20), ("bob", 1, 2)]
+    assert _text(rows, title="Usage", columns=["username", "input", "output"]) == (
+        "Usage\nusername\tinput\toutput\nalice\t10\t20\nbob\t1\t2\n"
+    )
+
+
+def test_write_ndjson_and_csv() -> None:
+    day = datetime.date(2026, 1, 2)
+    out = io.StringIO()
+    assert write_ndjson(["user", "day"], [("alice", day), ("bob", None)], out) == 2
+    assert [json.loads(line) for line in out.getvalue().splitlines()] == [
+        {"user": "alice", "day": "2026-01-02"},
+        {"user": "bob", "day": None},
+    ]
+
+    out = io.StringIO()
+    assert write_csv(["user", "day"], [("a,b", day), ("bob", None)], out) == 2
+    assert out.getvalue() == 'user,day\n"a,b",2026-01-02\nbob,\n'
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import datetime
+import json
+from typing import Callable
+
+import pytest
+
+from tuxedo.db import PostgresExecutor
+from tuxedo.sql import SQLStatement
+from tuxedo.radacct import legacy_start, migration_boundary
+
+# One session per month, from five months back to the current one; the oldest is still open.
+SEED_SQL = """
+INSERT INTO radacct (acctsessionid, acctuniqueid, username, nasipaddress, acctstarttime, acctupdatetime, acctstoptime,
+                     acctinputoctets, acctoutputoctets)
+SELECT 's' || n, 'u' || n, 'alice', '192.0.2.1',
+       date_trunc('month', NOW()) - n * INTERVAL '1 month' + INTERVAL '1 hour',
+       date_trunc('month', NOW()) - n * INTERVAL '1 month' + INTERVAL '2 hours',
+       CASE WHEN n = 5 THEN NULL ELSE date_trunc('month', NOW()) - n * INTERVAL '1 month' + INTERVAL '2 hours' END,
+       100, 200
+  FROM generate_series(0, 5) AS n;
+"""
+
+
+@pytest.fixture
+def radacct(accounting: PostgresExecutor) -> PostgresExecutor:
+    """`accounting` with one session per month in `radacct`."""
+    accounting.run([SQLStatement(title="Seed radacct", sql=SEED_SQL)])
+    return accounting
+
+
+def _months_back(n: int) -> str:
+    month = legacy_start(datetime.datetime.now(datetime.timezone.utc).date())
+    for _ in range(n):
+        month = (month - datetime.timedelta(days=1)).replace(day=1)
+    return month.strftime("%Y%m")
+
+
+def test_migration_bounds() -> None:
+    assert legacy_start(datetime.date(2025, 11, 17)) == datetime.date(2025, 11, 1)
+    assert migration_boundary(datetime.date(2025, 11, 17)) == datetime.date(2026, 1, 1)
+    assert migration_boundary(datetime.date(2025, 12, 1)) == datetime.date(2026, 2, 1)
+
+
+def test_partition_migrate_splits_history_by_month(
+    radacct: PostgresExecutor, tuxedo: Callable[..., tuple[int, str, str]]
+) -> None:
+    code, _, err = tuxedo("radacct", "partition-migrate", "--months-ahead", "3")
+    assert code == 0, err
+
+    code, out, err = tuxedo("radacct", "status", "--output", "json")
+    assert code == 0, err
+    partitions = [row[0] for row in json.loads(out)["results"][0]["rows"]]
+    for n in range(1, 6):
+        assert f"radacct_p{_months_back(n)}" in partitions
+    assert "radacct_legacy" in partitions
+    assert "radacct_default" in partitions
+
+    rows = radacct.run(
+        [
+            SQLStatement(
+                title="Rows per partition",
+                sql="SELECT tableoid::regclass::text, COUNT(*) FROM radacct GROUP BY 1 ORDER BY 1;",
+            )
+        ]
+    )[0].rows
+    assert dict(rows) == {**{f"radacct_p{_months_back(n)}": 1 for n in range(1, 6)}, "radacct_legacy": 1}
+
+    # The open session moved with its month and still counts.
+    code, out, err = tuxedo("counters", "verify", "--output", "json")
+    assert code == 0, err
+    assert json.loads(out)["results"][-1]["rows"] == []
+
+
+def test_archive_drops_old_months_after_migration(
+    radacct: PostgresExecutor, tuxedo: Callable[..., tuple[int, str, str]], tmp_path
+) -> None:
+    assert tuxedo("radacct", "partition-migrate")[0] == 0
+
+    # Every month that ended more than ~3 months ago: the fourth and fifth month back.
+    code, out, err = tuxedo(
+        "radacct", "archive", "--older-than", "95d", "--dir", str(tmp_path), "--drop", "--output", "json"
+    )
+    assert code == 0, err
+    archived = {row["partition"] for row in json.loads(out)["partitions"]}
+    assert {f"radacct_p{_months_back(5)}", f"radacct_p{_months_back(4)}"} <= archived
+    assert "radacct_legacy" not in archived
+    assert f"radacct_p{_months_back(1)}" not in archived
+    assert (tmp_path / f"radacct_p{_months_back(5)}.ndjson.gz").exists()
+
+    code, out, err = tuxedo("counters", "verify", "--output", "json")
+    assert code == 0, err
+    assert json.loads(out)["results"][-1]["rows"] == []
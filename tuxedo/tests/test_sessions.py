@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import json
+import socket
+import threading
+import time
+from typing import Any, Iterator
+
+import pytest
+
+from tuxedo import sessions
+from tuxedo.sessions import (
+    SESSION_FIELDS,
+    Session,
+    Snapshot,
+    SnapshotServer,
+    SnapshotService,
+    decode,
+    encode,
+    normalize,
+)
+
+
+def test_normalize_key_spellings() -> None:
+    newer = {
+        "ID": 41,
+        "Username": "alice",
+        "Groupname": "admins",
+        "Remote IP": "198.51.100.7",
+        "IPv4": "10.8.0.5",
+        "IPv6": "fd00::5/128",
+        "P-t-P IPv4": "10.8.0.1",
+        "stats": {"RX": {"bytes": 1200}, "TX": {"bytes": "300"}},
+        "raw_connected_at": 1700000000,
+        "sid": "abc",
+    }
+    older = {
+        "user": "bob",
+        "group": "(none)",
+        "remote": "203.0.113.9",
+        "ip": "10.8.0.6 (peer)",
+        "RX": "15",
+        "TX": "x",
+        "session_id": "0",
+    }
+    alice, bob = normalize([newer, "not an object", older])
+    assert alice == Session(
+        session_id="abc",
+        username="alice",
+        group="admins",
+        remote_ip="198.51.100.7",
+        vpn_ip="10.8.0.5",
+        vpn_ipv6="fd00::5",
+        rx_bytes=1200.0,
+        tx_bytes=300.0,
+        connected_at=1700000000.0,
+        other_ips=("198.51.100.7", "10.8.0.1"),
+    )
+    assert (bob.username, bob.group, bob.vpn_ip, bob.vpn_ipv6) == ("bob", "", "10.8.0.6", "")
+    # "0" is occtl's placeholder, not an ID; unparsable counters are 0.
+    assert (bob.session_id, bob.rx_bytes, bob.tx_bytes, bob.connected_at) == ("", 15.0, 0.0, 0.0)
+    assert normalize(None) == ()
+
+
+def _snapshot() -> Snapshot:
+    return Snapshot(
+        version=3,
+        taken_at=1700000000.5,
+        sessions=normalize([{"username": "alice", "ipv4": "10.8.0.5", "rx": 1, "tx": 2, "ptp ip": "10.8.0.1"}]),
+        error="",
+        occtl_runs=4,
+        occtl_seconds=0.25,
+    )
+
+
+def test_encode_decode_round_trip() -> None:
+    snapshot = _snapshot()
+    data = encode(snapshot)
+    assert json.loads(data)["fields"] == list(SESSION_FIELDS)
+    assert decode(data) == snapshot
+    empty = Snapshot(version=1, taken_at=2.0, sessions=(), error="occtl returned 1: down")
+    assert decode(encode(empty)) == empty
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"not json",
+        b"[]",
+        # A server with another field layout (older or newer release).
+        json.dumps({"version": 1, "taken_at": 0, "fields": ["session_id", "username"], "sessions": []}).encode(),
+        json.dumps({"version": 1, "taken_at": 0, "fields": list(SESSION_FIELDS), "sessions": [["short"]]}).encode(),
+        json.dumps({"taken_at": 0, "fields": list(SESSION_FIELDS), "sessions": []}).encode(),
+    ],
+)
+def test_decode_rejects_other_layouts(data: bytes) -> None:
+    with pytest.raises(ValueError, match="invalid session snapshot"):
+        decode(data)
+
+
+class _Loader:
+    """`load()` for a SnapshotService: counts calls and blocks until `release` is set."""
+
+    def __init__(self, result: Any = ()) -> None:
+        self.calls = 0
+        self.release = threading.Event()
+        self.release.set()
+        self.result = result
+
+    def __call__(self) -> list[dict[str, Any]]:
+        self.calls += 1
+        self.release.wait(5)
+        if isinstance(self.result, BaseException):
+            raise self.result
+        return list(self.result)
+
+
+def test_concurrent_gets_share_one_load() -> None:
+    load = _Loader([{"username": "alice"}])
+    load.release.clear()
+    service = SnapshotService(load, interval_seconds=60, min_refresh_seconds=0)
+    fresh_after = time.time()
+    results: list[Snapshot] = []
+    threads = [threading.Thread(target=lambda: results.append(service.get(fresh_after))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    load.release.set()
+    for thread in threads:
+        thread.join(5)
+    assert load.calls == 1
+    assert len(results) == 8 and all(r is results[0] for r in results)
+    assert results[0].version == 1 and results[0].sessions[0].username == "alice"
+    # Already fresh enough: served without another run.
+    assert service.get(fresh_after) is results[0]
+    assert service.encoded(fresh_after) is service.encoded(0)
+    assert load.calls == 1
+
+
+def test_min_refresh_seconds_spaces_runs() -> None:
+    load = _Loader()
+    service = SnapshotService(load, interval_seconds=60, min_refresh_seconds=0.3)
+    first = service.get(time.time())
+    started = time.monotonic()
+    second = service.get(time.time())
+    assert time.monotonic() - started >= 0.2
+    assert (load.calls, second.version) == (2, first.version + 1)
+
+
+def test_get_gives_up_after_wait_seconds() -> None:
+    load = _Loader()
+    service = SnapshotService(load, interval_seconds=60, min_refresh_seconds=10, wait_seconds=0.1)
+    first = service.get()
+    # The next run may start only 10s after this one: the caller gets the current snapshot instead.
+    assert service.get(time.time()) is first
+    assert load.calls == 1
+
+
+@pytest.mark.parametrize(
+    ("error", "message"),
+    [
+        (RuntimeError("occtl returned 1: no socket"), "occtl returned 1: no socket"),
+        (KeyError("users"), "session load failed: KeyError('users')"),
+    ],
+)
+def test_failed_load_publishes_error_snapshot(error: Exception, message: str) -> None:
+    load = _Loader(error)
+    service = SnapshotService(load, interval_seconds=60, min_refresh_seconds=0)
+    snapshot = service.get(time.time())
+    assert (snapshot.version, snapshot.sessions, snapshot.error, snapshot.occtl_runs) == (1, (), message, 1)
+    # The next run recovers.
+    load.result = [{"username": "alice"}]
+    snapshot = service.get(time.time())
+    assert (snapshot.version, snapshot.error, len(snapshot.sessions)) == (2, "", 1)
+
+
+def test_poll_keeps_snapshot_fresh() -> None:
+    load = _Loader()
+    service = SnapshotService(load, interval_seconds=0.1, min_refresh_seconds=0)
+    threading.Thread(target=service.poll, daemon=True).start()
+    time.sleep(0.5)
+    assert 2 <= load.calls <= 8
+    assert time.time() - service.get().taken_at < 0.5
+
+
+@pytest.fixture
+def server(tmp_path) -> Iterator[tuple[str, _Loader]]:
+    load = _Loader([{"username": "alice", "ipv4": "10.8.0.5"}])
+    path = str(tmp_path / "run" / "sessiond.sock")
+    srv = SnapshotServer(path, SnapshotService(load, interval_seconds=60, min_refresh_seconds=0))
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield path, load
+    finally:
+        srv.shutdown()
+        srv.server_close()
+
+
+def test_fetch_over_the_socket(server: tuple[str, _Loader]) -> None:
+    path, load = server
+    snapshot = sessions.fetch(path, fresh_after=time.time(), timeout=5)
+    assert (snapshot.version, snapshot.sessions[0].vpn_ip) == (1, "10.8.0.5")
+    assert sessions.fetch(path, timeout=5) == snapshot
+    assert load.calls == 1
+
+
+def test_fetch_errors(server: tuple[str, _Loader], tmp_path) -> None:
+    path, _ = server
+    with pytest.raises(OSError):
+        sessions.fetch(str(tmp_path / "missing.sock"), timeout=1)
+    # A malformed request gets no answer, which is not a snapshot.
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(5)
+        sock.connect(path)
+        sock.sendall(b"PUT 0\n")
+        assert sock.recv(1024) == b""
+    with pytest.raises(ValueError, match="invalid session snapshot"):
+        decode(b"")
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from tuxedo.state import STATE_COLUMNS, _block, _memberships, _password, detect_state_format, iter_state_rows
+
+YAML_STATE = """
+groups:
+  admins: Administrators
+  users:
+users:
+  alice:
+    password: secret
+    groups: admins:10;users
+  bob:
+    password_hash: $6$salt$hash
+    groups: []
+    block: {reason: abuse, for: 2h}
+  carol:
+    priority: 4
+    groups: [ops]
+"""
+
+
+def _rows(tmp_path, text: str, name: str = "state.yaml") -> list[dict]:
+    path = tmp_path / name
+    path.write_text(text, encoding="utf-8")
+    rows = iter_state_rows(str(path), detect_state_format(name), default_group="vpn", default_priority=0)
+    return [dict(zip(STATE_COLUMNS, row)) for row in rows]
+
+
+def test_detect_state_format() -> None:
+    assert detect_state_format("state.json") == "json"
+    assert detect_state_format("state.yml") == "yaml"
+    assert detect_state_format("-") == "yaml"
+
+
+def test_state_rows(tmp_path) -> None:
+    rows = _rows(tmp_path, YAML_STATE)
+    users = {r["username"]: r for r in rows if r["kind"] == "user"}
+    assert (users["alice"]["attribute"], users["alice"]["value"]) == ("Cleartext-Password", "secret")
+    assert (users["bob"]["attribute"], users["bob"]["value"]) == ("Crypt-Password", "$6$salt$hash")
+    assert users["carol"]["attribute"] is None
+    assert [u["manage_groups"] for u in users.values()] == [True, True, True]
+    assert [u["manage_block"] for u in users.values()] == [False, True, False]
+    assert (users["bob"]["blocked"], users["bob"]["block_reason"], users["bob"]["block_seconds"]) == (True, "abuse", 7200)
+
+    members = [(r["username"], r["groupname"], r["priority"]) for r in rows if r["kind"] == "member"]
+    # bob's empty list means "only the default group"; carol's groups take her default priority.
+    assert members == [("alice", "admins", 10), ("alice", "users", 0), ("bob", "vpn", 0), ("carol", "ops", 4)]
+
+    groups = {r["groupname"]: (r["description"], r["manage_description"]) for r in rows if r["kind"] == "group"}
+    assert groups == {
+        "admins": ("Administrators", True),
+        "users": (None, False),
+        "vpn": (None, False),
+        "ops": (None, False),
+    }
+
+
+def test_user_without_groups_key_leaves_memberships_alone(tmp_path) -> None:
+    rows = _rows(tmp_path, json.dumps({"users": ["dave"]}), "state.json")
+    assert [r["kind"] for r in rows] == ["user", "group"]
+    assert rows[0]["manage_groups"] is False
+    # The default group is always part of the desired state.
+    assert rows[1]["groupname"] == "vpn"
+
+
+def test_empty_document(tmp_path) -> None:
+    assert [r["groupname"] for r in _rows(tmp_path, "")] == ["vpn"]
+
+
+@pytest.mark.parametrize(
+    ("text", "message"),
+    [
+        ("[]", "top level must be a mapping"),
+        ("hosts: {}", "unknown top-level keys: hosts"),
+        ("users: [alice, alice]", "users.alice: listed twice"),
+        ("users: [{password: x}]", "users: entry without username"),
+        ("users: [1]", r"users\[0\]: expected an object or a name"),
+        ("users: {alice: {shell: bash}}", "users.alice: unknown keys: shell"),
+        ("users: {alice: {groups: 'a;a'}}", "users.alice.groups: group 'a' listed twice"),
+        ("users: {alice: {groups: {a: x}}}", "users.alice.groups.a: invalid priority"),
+        ("users: {alice: {block_for: 1h}}", "users.alice: block_for given without block"),
+        ("groups: {admins: {size: 3}}", "groups.admins: unknown keys: size"),
+        ("users: {alice: [x]}", "users.alice: expected an object"),
+        ("users: {alice: {password: [}", "invalid YAML state"),
+    ],
+)
+def test_state_errors(tmp_path, text: str, message: str) -> None:
+    with pytest.raises(ValueError, match=message):
+        _rows(tmp_path, text)
+
+
+def test_invalid_json_reports_line(tmp_path) -> None:
+    with pytest.raises(ValueError, match=r"invalid JSON state \(line 2\)"):
+        _rows(tmp_path, '{"users":\n  nope}', "state.json")
+
+
+def test_memberships_shapes() -> None:
+    assert _memberships(None, where="w") == []
+    assert _memberships("a:10, b", where="w") == [("a", 10), ("b", None)]
+    assert _memberships(["a", "b:5", {"name": "c", "priority": 1}], where="w") == [("a", None), ("b", 5), ("c", 1)]
+    assert _memberships({"a": 10, "b": None}, where="w") == [("a", 10), ("b", None)]
+    with pytest.raises(ValueError, match="w: empty group name"):
+        _memberships([{"priority": 1}], where="w")
+    with pytest.raises(ValueError, match="w: invalid groups value"):
+        _memberships(3, where="w")
+
+
+def test_password_forms() -> None:
+    assert _password({}, where="w") == (None, None)
+    assert _password({"password": 1234}, where="w") == ("Cleartext-Password", "1234")
+    assert _password({"password_hash": "h", "password_attribute": "SSHA-Password"}, where="w") == ("SSHA-Password", "h")
+    with pytest.raises(ValueError, match="either password or password_hash"):
+        _password({"password": "a", "password_hash": "h"}, where="w")
+    with pytest.raises(ValueError, match="password_attribute applies to password_hash only"):
+        _password({"password": "a", "password_attribute": "SSHA-Password"}, where="w")
+    with pytest.raises(ValueError, match="unsupported password_attribute 'Cleartext-Password'"):
+        _password({"password_hash": "h", "password_attribute": "Cleartext-Password"}, where="w")
+
+
+def test_block_forms() -> None:
+    assert _block({}, where="w") == (False, None, None)
+    assert _block({"block": False}, where="w") == (False, None, None)
+    assert _block({"block": True}, where="w") == (True, "MANUAL", None)
+    assert _block({"block": "abuse", "block_for": "90m"}, where="w") == (True, "abuse", 5400)
+    assert _block({"block": {"for": "1d"}}, where="w") == (True, "MANUAL", 86400)
+    with pytest.raises(ValueError, match="w: Invalid duration"):
+        _block({"block": "abuse", "block_for": "soon"}, where="w")
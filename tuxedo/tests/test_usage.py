@@ -0,0 +1,90 @@
+"""The usage rollup: `tuxedo usage refresh` (the `<prefix>_refresh()` function) and `tuxedo usage`."""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Callable
+
+from tuxedo.backends import FreeradiusBackend
+from tuxedo.config import FreeradiusSchema
+from tuxedo.db import PostgresExecutor
+from tuxedo.sql import SQLStatement
+
+INSERT_SQL = """
+INSERT INTO radacct (acctsessionid, acctuniqueid, username, nasipaddress, acctstarttime, acctupdatetime,
+                     acctinputoctets, acctoutputoctets)
+VALUES (%s, %s, %s, '192.0.2.1', NOW(), NOW(), %s, %s);
+"""
+
+
+def _sql(executor: PostgresExecutor, sql: str, *params: Any) -> list[tuple[Any, ...]] | None:
+    return executor.run([SQLStatement(title="test", sql=sql, params=params)])[0].rows
+
+
+def _refresh(tuxedo: Callable[..., tuple[int, str, str]]) -> dict[str, Any]:
+    code, out, err = tuxedo("usage", "refresh", "--output", "json")
+    assert code == 0, err
+    result = json.loads(out)["results"][-1]
+    columns = ["rows_read", "sessions_changed", "sessions_new", "input_octets", "output_octets"]
+    return dict(zip(columns, result["rows"][0]))
+
+
+def _totals(executor: PostgresExecutor) -> list[tuple[Any, ...]]:
+    return _sql(executor, "SELECT username, input_octets, output_octets, sessions FROM vpn_usage_totals ORDER BY 1;")
+
+
+def test_refresh_adds_only_the_delta(accounting: PostgresExecutor, tuxedo: Callable[..., tuple[int, str, str]]) -> None:
+    _sql(accounting, INSERT_SQL, "s1", "u1", "alice", 100, 10)
+    _sql(accounting, INSERT_SQL, "s2", "u2", "bob", 5, 5)
+    assert _refresh(tuxedo) == {
+        "rows_read": 2,
+        "sessions_changed": 2,
+        "sessions_new": 2,
+        "input_octets": 105,
+        "output_octets": 15,
+    }
+    assert _totals(accounting) == [("alice", 100, 10, 1), ("bob", 5, 5, 1)]
+
+    # Interim update of one session: only its growth is added, and the session is not counted again.
+    _sql(accounting, "UPDATE radacct SET acctinputoctets = 250, acctupdatetime = NOW() WHERE acctuniqueid = 'u1';")
+    refresh = _refresh(tuxedo)
+    assert (refresh["sessions_changed"], refresh["sessions_new"], refresh["input_octets"]) == (1, 0, 150)
+    assert _totals(accounting) == [("alice", 250, 10, 1), ("bob", 5, 5, 1)]
+
+    # Nothing changed: rows within the overlap are re-read but add nothing.
+    refresh = _refresh(tuxedo)
+    assert (refresh["sessions_changed"], refresh["input_octets"], refresh["output_octets"]) == (0, 0, 0)
+    assert _totals(accounting) == [("alice", 250, 10, 1), ("bob", 5, 5, 1)]
+
+
+def test_refresh_and_report_text(accounting: PostgresExecutor, tuxedo: Callable[..., tuple[int, str, str]]) -> None:
+    _sql(accounting, INSERT_SQL, "s1", "u1", "alice", 100, 10)
+    code, out, _ = tuxedo("usage", "refresh")
+    assert code == 0
+    lines = out.splitlines()
+    assert lines[:3] == ["rows read: 1", "sessions: changed=1 new=1", "octets added: input=100 output=10"]
+    assert lines[3].startswith("watermark: radacctid=1 last_update=")
+
+    code, out, _ = tuxedo("usage")
+    assert code == 0
+    title, header, row = out.splitlines()
+    assert title == "Usage"
+    assert header.split("\t")[:3] == ["username", "input_octets", "output_octets"]
+    assert row.split("\t")[:3] == ["alice", "100", "10"]
+
+
+def test_refresh_function_follows_the_prefix(accounting: PostgresExecutor) -> None:
+    _sql(accounting, "CREATE SCHEMA acct;")
+    other = FreeradiusBackend(FreeradiusSchema(usage_table_prefix="acct.vpn_usage"))
+    accounting.run(other.migrate())
+    functions = _sql(
+        accounting,
+        "SELECT p.oid::regprocedure::text FROM pg_proc p WHERE p.proname LIKE '%usage_refresh' ORDER BY 1;",
+    )
+    assert functions == [("acct.vpn_usage_refresh()",), ("vpn_usage_refresh()",)]
+
+    _sql(accounting, INSERT_SQL, "s1", "u1", "alice", 100, 10)
+    accounting.run(other.usage_refresh())
+    assert _sql(accounting, "SELECT username, input_octets FROM acct.vpn_usage_totals;") == [("alice", 100)]
+    # The default rollup is untouched by the other one's refresh.
+    assert _totals(accounting) == []